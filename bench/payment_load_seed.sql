@@ -0,0 +1,66 @@
+-- ============================================================================
+-- payment_load_seed.sql - 支付熱路徑壓測（bench/payment_load.py）的測試資料
+-- 在已載入 schema/mps_schema.sql + rpc/*.sql 的可丟棄本地資料庫上執行（寫入後提交，不回滾）：
+--   psql "$DATABASE_URL" -v members=10000 -v merchants=50 -v balance=100000 -f bench/payment_load_seed.sql
+-- 寫入：
+--   members 個會員（姓名 load-member-<i>，手機 17xxxxxxxxx）及每人一張標準卡（卡名 load-card-<i>，初始餘額 balance）
+--   merchants 個商戶（代碼 LOAD00001 ...）
+--   super_admin session 'bench-load'（24 小時有效），壓測腳本以此 session 調用全部 RPC
+-- 可重複執行：已存在的會員 / 卡 / 商戶跳過，已有卡片的餘額重置為 balance，session 延期。
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+\if :{?members}
+\else
+  \set members 10000
+\endif
+\if :{?merchants}
+\else
+  \set merchants 50
+\endif
+\if :{?balance}
+\else
+  \set balance 100000
+\endif
+
+BEGIN;
+
+INSERT INTO public.app_sessions(session_id, user_role, user_id, expires_at, last_accessed_at)
+VALUES ('bench-load', 'super_admin', extensions.gen_random_uuid(),
+        now_utc() + interval '24 hours', now_utc())
+ON CONFLICT (session_id) DO UPDATE SET expires_at = EXCLUDED.expires_at;
+
+INSERT INTO member_profiles(name, phone, email)
+SELECT 'load-member-' || i,
+       '17' || lpad(i::text, 9, '0'),
+       'load' || i || '@example.com'
+FROM generate_series(1, :members) AS i
+ON CONFLICT DO NOTHING;
+
+INSERT INTO member_cards(card_type, owner_member_id, name, balance)
+SELECT 'standard', m.id, 'load-card-' || substr(m.name, 13), :balance
+FROM member_profiles m
+WHERE m.name LIKE 'load-member-%'
+  AND NOT EXISTS (
+    SELECT 1 FROM member_cards c
+    WHERE c.owner_member_id = m.id AND c.name LIKE 'load-card-%'
+  );
+
+UPDATE member_cards
+SET balance = :balance, status = 'active'
+WHERE name LIKE 'load-card-%' AND (balance <> :balance OR status <> 'active');
+
+INSERT INTO merchants(code, name, status)
+SELECT 'LOAD' || lpad(i::text, 5, '0'), 'load-merchant-' || i, 'active'
+FROM generate_series(1, :merchants) AS i
+ON CONFLICT (code) DO NOTHING;
+
+COMMIT;
+
+ANALYZE member_profiles;
+ANALYZE member_cards;
+ANALYZE merchants;
+
+SELECT (SELECT count(*) FROM member_profiles WHERE name LIKE 'load-member-%') AS members,
+       (SELECT count(*) FROM member_cards WHERE name LIKE 'load-card-%') AS cards,
+       (SELECT count(*) FROM merchants WHERE code LIKE 'LOAD%') AS merchants;
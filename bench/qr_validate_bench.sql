@@ -0,0 +1,88 @@
+-- ============================================================================
+-- qr_validate_bench.sql - validate_qr_plain 延遲基準測試
+-- 在已載入 mps_schema.sql + mps_rpc.sql 的本地資料庫上執行：
+--   psql "$DATABASE_URL" -f bench/qr_validate_bench.sql
+-- 依序建立 100 / 1k / 10k / 100k 個有效 QR 碼，每個規模隨機驗證 500 次，
+-- 輸出平均與 p95 延遲。全部在交易中完成並 ROLLBACK，不留測試資料。
+-- 預期：各規模延遲持平（單行索引查找 + 一次 HMAC）。
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+BEGIN;
+
+CREATE TEMP TABLE bench_qr_tokens (
+  seq int primary key,
+  card_id uuid not null,
+  qr_plain text not null
+) ON COMMIT DROP;
+
+CREATE TEMP TABLE bench_qr_results (
+  active_codes int,
+  samples int,
+  avg_ms numeric,
+  p95_ms numeric
+) ON COMMIT DROP;
+
+DO $$
+DECLARE
+  v_sizes int[] := ARRAY[100, 1000, 10000, 100000];
+  v_samples int := 500;
+  v_size int;
+  v_have int := 0;
+  v_plain text;
+  v_card uuid;
+  v_t0 timestamptz;
+  v_ms numeric[];
+  i int;
+BEGIN
+  FOREACH v_size IN ARRAY v_sizes LOOP
+    -- 補足到目標數量的有效 QR 碼
+    WITH cards AS (
+      INSERT INTO member_cards(card_type, name, status)
+      SELECT 'corporate', 'bench-qr-' || g, 'active'
+      FROM generate_series(v_have + 1, v_size) g
+      RETURNING id
+    ), numbered AS (
+      SELECT id, v_have + row_number() OVER () AS seq FROM cards
+    ), issued AS (
+      SELECT n.seq, n.id, t.*
+      FROM numbered n
+      CROSS JOIN LATERAL sec.issue_qr_token() t
+    ), state AS (
+      INSERT INTO card_qr_state(card_id, token_lookup, token_hash, expires_at)
+      SELECT id, token_lookup, token_hash, now_utc() + interval '1 hour'
+      FROM issued
+    )
+    INSERT INTO bench_qr_tokens(seq, card_id, qr_plain)
+    SELECT seq, id, qr_plain FROM issued;
+
+    v_have := v_size;
+    ANALYZE card_qr_state;
+
+    v_ms := ARRAY[]::numeric[];
+    FOR i IN 1..v_samples LOOP
+      SELECT card_id, qr_plain INTO v_card, v_plain
+      FROM bench_qr_tokens
+      WHERE seq = 1 + floor(random() * v_have)::int;
+
+      v_t0 := clock_timestamp();
+      IF validate_qr_plain(v_plain) IS DISTINCT FROM v_card THEN
+        RAISE EXCEPTION 'bench: validate_qr_plain returned wrong card';
+      END IF;
+      v_ms := v_ms || (extract(epoch FROM clock_timestamp() - v_t0) * 1000)::numeric;
+    END LOOP;
+
+    INSERT INTO bench_qr_results
+    SELECT v_size, v_samples,
+           round(avg(x), 4),
+           round((percentile_cont(0.95) WITHIN GROUP (ORDER BY x))::numeric, 4)
+    FROM unnest(v_ms) x;
+  END LOOP;
+END;
+$$;
+
+SELECT active_codes, samples, avg_ms, p95_ms
+FROM bench_qr_results
+ORDER BY active_codes;
+
+ROLLBACK;
@@ -0,0 +1,89 @@
+-- ============================================================================
+-- role_resolution_bench.sql - get_user_role 授權開銷基準測試
+-- 在已載入 mps_schema.sql + mps_rpc.sql 的本地 Supabase 資料庫上執行：
+--   psql "$DATABASE_URL" -f bench/role_resolution_bench.sql
+-- 以 Supabase Auth 身份（request.jwt.claims）模擬 admin / merchant / member / 無角色四類用戶，
+-- 每個模擬請求調用 get_user_role 5 次（check_permission + RPC 內授權分支的典型次數），
+-- 輸出每請求平均與 p95 延遲：
+--   first    ：請求內首次調用（單次索引查詢 + 寫入事務級緩存）
+--   per_rpc  ：整個請求 5 次調用合計
+-- 預期：四類用戶延遲持平，per_rpc 與 first 相差很小（後續調用命中緩存）。
+-- 全部在交易中完成並 ROLLBACK，不留測試資料。
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+BEGIN;
+
+CREATE TEMP TABLE bench_role_results (
+  identity text,
+  samples int,
+  first_avg_ms numeric,
+  per_rpc_avg_ms numeric,
+  per_rpc_p95_ms numeric
+) ON COMMIT DROP;
+
+DO $$
+DECLARE
+  v_samples int := 1000;
+  v_calls int := 5;
+  v_uid uuid;
+  v_kind text;
+  v_merchant uuid;
+  v_t0 timestamptz;
+  v_t1 timestamptz;
+  v_first numeric[];
+  v_total numeric[];
+  i int;
+  j int;
+BEGIN
+  -- 自定義登入變數會優先於 Supabase Auth，先清除
+  PERFORM reset_session_variables();
+
+  INSERT INTO merchants(code, name) VALUES ('BENCHROLE', 'bench-role') RETURNING id INTO v_merchant;
+
+  FOREACH v_kind IN ARRAY ARRAY['admin', 'merchant', 'member', 'none'] LOOP
+    v_uid := extensions.gen_random_uuid();
+    INSERT INTO auth.users(id) VALUES (v_uid);
+
+    IF v_kind = 'admin' THEN
+      INSERT INTO admin_users(auth_user_id, name, role) VALUES (v_uid, 'bench-role', 'super_admin');
+    ELSIF v_kind = 'merchant' THEN
+      INSERT INTO merchant_users(merchant_id, auth_user_id) VALUES (v_merchant, v_uid);
+    ELSIF v_kind = 'member' THEN
+      INSERT INTO member_profiles(name, auth_user_id) VALUES ('bench-role', v_uid);
+    END IF;
+
+    PERFORM set_config('request.jwt.claims', json_build_object('sub', v_uid, 'role', 'authenticated')::text, true);
+    PERFORM set_config('request.jwt.claim.sub', v_uid::text, true);
+
+    v_first := ARRAY[]::numeric[];
+    v_total := ARRAY[]::numeric[];
+    FOR i IN 1..v_samples LOOP
+      -- 新請求：清空事務級緩存
+      PERFORM set_config('app.auth_role_cache', '', true);
+
+      v_t0 := clock_timestamp();
+      PERFORM get_user_role();
+      v_t1 := clock_timestamp();
+      FOR j IN 2..v_calls LOOP
+        PERFORM get_user_role();
+      END LOOP;
+
+      v_first := v_first || (extract(epoch FROM v_t1 - v_t0) * 1000)::numeric;
+      v_total := v_total || (extract(epoch FROM clock_timestamp() - v_t0) * 1000)::numeric;
+    END LOOP;
+
+    INSERT INTO bench_role_results
+    SELECT v_kind, v_samples,
+           (SELECT round(avg(x), 4) FROM unnest(v_first) x),
+           round(avg(x), 4),
+           round((percentile_cont(0.95) WITHIN GROUP (ORDER BY x))::numeric, 4)
+    FROM unnest(v_total) x;
+  END LOOP;
+END;
+$$;
+
+SELECT identity, samples, first_avg_ms, per_rpc_avg_ms, per_rpc_p95_ms
+FROM bench_role_results;
+
+ROLLBACK;
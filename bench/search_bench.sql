@@ -0,0 +1,114 @@
+-- ============================================================================
+-- search_bench.sql - search_members / search_cards 搜尋延遲基準測試
+-- 在已載入 mps_schema.sql + mps_rpc.sql 的本地資料庫上執行：
+--   psql "$DATABASE_URL" -f bench/search_bench.sql
+-- 寫入 1,000,000 個測試會員（每 3 個中 1 個為中文姓名，每 10 個會員一張標準卡）後 ANALYZE，
+-- 以 super_admin session 調用搜尋 RPC，每類關鍵字 200 次，輸出平均與 p95 延遲：
+--   exact_member_no / exact_phone ：完整識別碼，p_exact_only 走唯一索引
+--   prefix_phone / fuzzy_name      ：選擇性高的部分手機號 / 姓名片段
+--   common_prefix                  ："bench"，所有會員姓名的共同前綴（前綴階段按索引順序截取候選）
+--   short_phone                    ："09"，2 個字符且匹配全部手機號（無法使用 trigram 索引）
+--   short_cjk                      ：2 字中文姓名前綴，如 "王小"（同上）
+--   common_fuzzy                   ："ice"，無前綴命中、子串匹配數十萬行（子串階段候選有上限）
+--   card_no                        ：search_cards 完整卡號
+-- 預期：精確查找 < 1 ms，其餘各類（含短 / 常見關鍵字）在數十毫秒內，不隨匹配行數增長。
+-- 全部在交易中完成並 ROLLBACK，不留測試資料。
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+BEGIN;
+
+INSERT INTO public.app_sessions(session_id, user_role, user_id, expires_at, last_accessed_at)
+VALUES ('bench-search', 'super_admin', extensions.gen_random_uuid(),
+        now_utc() + interval '1 hour', now_utc());
+
+INSERT INTO member_profiles(member_no, name, phone, email)
+SELECT 'B' || lpad(i::text, 9, '0'),
+       CASE WHEN i % 3 = 0
+            THEN (ARRAY['王', '李', '張', '陳', '林', '黃'])[1 + i % 6]
+                 || (ARRAY['小明', '小華', '志強', '淑芬'])[1 + (i / 6) % 4] || i
+            ELSE 'bench-' || (ARRAY['alice', 'bob', 'carol', 'david', 'erin', 'frank'])[1 + i % 6] || '-' || i
+       END,
+       '09' || lpad(i::text, 8, '0'),
+       'bench' || i || '@example.com'
+FROM generate_series(1, 1000000) AS i;
+
+INSERT INTO member_cards(card_type, owner_member_id, name)
+SELECT 'standard', m.id, m.name
+FROM member_profiles m
+WHERE m.member_no LIKE 'B%' AND right(m.member_no, 1) = '0';
+
+ANALYZE member_profiles;
+ANALYZE member_cards;
+
+CREATE TEMP TABLE bench_search_results (
+  label text,
+  samples int,
+  avg_ms numeric,
+  p95_ms numeric,
+  avg_rows numeric
+) ON COMMIT DROP;
+
+DO $$
+DECLARE
+  v_samples int := 200;
+  v_labels text[] := ARRAY['exact_member_no', 'exact_phone', 'prefix_phone', 'fuzzy_name',
+                            'common_prefix', 'short_phone', 'short_cjk', 'common_fuzzy', 'card_no'];
+  v_label text;
+  v_keyword text;
+  v_card_nos text[];
+  v_t0 timestamptz;
+  v_ms numeric[];
+  v_rows numeric[];
+  v_count int;
+  i int;
+  n int;
+BEGIN
+  SELECT array_agg(c.card_no) INTO v_card_nos
+  FROM (SELECT mc.card_no FROM member_cards mc
+        JOIN member_profiles mp ON mp.id = mc.owner_member_id
+        WHERE mp.member_no LIKE 'B%' LIMIT v_samples) c;
+
+  FOREACH v_label IN ARRAY v_labels LOOP
+    v_ms := ARRAY[]::numeric[];
+    v_rows := ARRAY[]::numeric[];
+
+    FOR i IN 1..v_samples LOOP
+      n := 1 + (i * 4999) % 1000000;
+      v_keyword := CASE v_label
+        WHEN 'exact_member_no' THEN 'B' || lpad(n::text, 9, '0')
+        WHEN 'exact_phone' THEN '09' || lpad(n::text, 8, '0')
+        WHEN 'prefix_phone' THEN left('09' || lpad(n::text, 8, '0'), 7)
+        WHEN 'fuzzy_name' THEN (ARRAY['alice', 'bob', 'carol', 'david', 'erin', 'frank'])[1 + i % 6] || '-' || (n % 1000)
+        WHEN 'common_prefix' THEN 'bench'
+        WHEN 'short_phone' THEN '09'
+        WHEN 'short_cjk' THEN (ARRAY['王', '李', '張', '陳', '林', '黃'])[1 + i % 6] || '小'
+        WHEN 'common_fuzzy' THEN 'ice'
+        ELSE v_card_nos[i]
+      END;
+
+      v_t0 := clock_timestamp();
+      IF v_label = 'card_no' THEN
+        SELECT count(*) INTO v_count FROM search_cards(v_keyword, 50, true, 'bench-search');
+      ELSE
+        SELECT count(*) INTO v_count
+        FROM search_members(v_keyword, 50, v_label LIKE 'exact%', 'bench-search');
+      END IF;
+      v_ms := v_ms || (extract(epoch FROM clock_timestamp() - v_t0) * 1000)::numeric;
+      v_rows := v_rows || v_count::numeric;
+    END LOOP;
+
+    INSERT INTO bench_search_results
+    SELECT v_label, v_samples,
+           round(avg(x), 3),
+           round((percentile_cont(0.95) WITHIN GROUP (ORDER BY x))::numeric, 3),
+           (SELECT round(avg(r), 1) FROM unnest(v_rows) r)
+    FROM unnest(v_ms) x;
+  END LOOP;
+END;
+$$;
+
+SELECT label, samples, avg_ms, p95_ms, avg_rows
+FROM bench_search_results;
+
+ROLLBACK;
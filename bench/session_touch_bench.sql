@@ -0,0 +1,92 @@
+-- ============================================================================
+-- session_touch_bench.sql - load_session 每次 RPC 開銷基準測試（合併寫入前 / 後）
+-- 在已載入 mps_schema.sql + mps_rpc.sql 的本地資料庫上執行（不可包在 BEGIN 中）：
+--   psql "$DATABASE_URL" -f bench/session_touch_bench.sql
+-- 每次迭代模擬一個獨立的 RPC 事務：load_session + 一次只讀查詢 + COMMIT，
+-- 記錄平均 / p95 延遲、實際寫入 app_sessions 的次數與產生的 WAL 量。
+--   before：app.session_touch_interval = 0 且每次清除已加載標記（等同舊版：每次 set_config + UPDATE）
+--   after ：默認 60 秒合併寫入 + 同 session 快速路徑
+-- 預期：after 的 touches 接近 0、WAL 明顯下降，延遲不高於 before。
+-- 結束時刪除測試 session。
+-- ============================================================================
+
+\set ON_ERROR_STOP on
+
+CREATE TEMP TABLE bench_session_results (
+  mode text,
+  samples int,
+  avg_ms numeric,
+  p95_ms numeric,
+  touches int,
+  wal_bytes numeric
+);
+
+INSERT INTO public.app_sessions(session_id, user_role, user_id, expires_at, last_accessed_at)
+VALUES ('bench-session-touch', 'super_admin', extensions.gen_random_uuid(),
+        now_utc() + interval '1 hour', now_utc() - interval '1 hour');
+
+DO $$
+DECLARE
+  v_modes text[] := ARRAY['before', 'after'];
+  v_samples int := 2000;
+  v_mode text;
+  v_t0 timestamptz;
+  v_lsn pg_lsn;
+  v_touched timestamptz;
+  v_last timestamptz;
+  v_touches int;
+  v_ms numeric[];
+  i int;
+BEGIN
+  FOREACH v_mode IN ARRAY v_modes LOOP
+    PERFORM set_config('app.session_touch_interval',
+                       CASE WHEN v_mode = 'before' THEN '0 seconds' ELSE '' END, false);
+    PERFORM reset_session_variables();
+    UPDATE public.app_sessions SET last_accessed_at = now_utc() - interval '1 hour'
+    WHERE session_id = 'bench-session-touch';
+    COMMIT;
+
+    v_ms := ARRAY[]::numeric[];
+    v_touches := 0;
+    v_last := NULL;
+    v_lsn := pg_current_wal_lsn();
+
+    FOR i IN 1..v_samples LOOP
+      IF v_mode = 'before' THEN
+        PERFORM set_config('app.loaded_session_id', '', false);
+      END IF;
+
+      v_t0 := clock_timestamp();
+      IF NOT load_session('bench-session-touch') THEN
+        RAISE EXCEPTION 'bench: load_session failed';
+      END IF;
+      PERFORM count(*) FROM merchants WHERE status = 'active';
+      COMMIT;
+      v_ms := v_ms || (extract(epoch FROM clock_timestamp() - v_t0) * 1000)::numeric;
+
+      SELECT last_accessed_at INTO v_touched FROM public.app_sessions WHERE session_id = 'bench-session-touch';
+      IF v_touched IS DISTINCT FROM v_last THEN
+        v_touches := v_touches + 1;
+        v_last := v_touched;
+      END IF;
+    END LOOP;
+
+    INSERT INTO bench_session_results
+    SELECT v_mode, v_samples,
+           round(avg(x), 4),
+           round((percentile_cont(0.95) WITHIN GROUP (ORDER BY x))::numeric, 4),
+           v_touches,
+           pg_wal_lsn_diff(pg_current_wal_lsn(), v_lsn)
+    FROM unnest(v_ms) x;
+    COMMIT;
+  END LOOP;
+END;
+$$;
+
+SELECT mode, samples, avg_ms, p95_ms, touches, pg_size_pretty(wal_bytes) AS wal
+FROM bench_session_results
+ORDER BY mode DESC;
+
+DELETE FROM public.app_sessions WHERE session_id = 'bench-session-touch';
+SELECT reset_session_variables();
+DROP TABLE bench_session_results;
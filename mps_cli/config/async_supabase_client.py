@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
+
+from .settings import settings
+from .http_transport import AsyncPooledTransport
+from utils.logger import lazy_repr
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopState:
+    """單個事件循環內的客戶端、連接池與並發控制（asyncio 原語與連接均綁定所屬事件循環）"""
+
+    def __init__(self, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.init_lock = asyncio.Lock()
+        self.client: Optional[AsyncClient] = None
+        self.transport: Optional[AsyncPooledTransport] = None
+
+
+class AsyncSupabaseClient:
+    """asyncio Supabase 客戶端封裝類
+
+    每個事件循環在首次使用時各自建立客戶端、AsyncPooledTransport 連接池與信號量，
+    模組級實例可在多次 asyncio.run（包括測試）之間安全復用；所有請求經由信號量限制並發數。
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.url = settings.database.url
+        self.anon_key = settings.database.anon_key
+        self.timeout = settings.database.timeout
+        self.max_concurrency = max_concurrency or settings.database.max_concurrency
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = \
+            weakref.WeakKeyDictionary()
+        self._states_lock = threading.Lock()
+
+    def _state(self) -> _LoopState:
+        """當前事件循環的狀態（不存在時建立）"""
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is None:
+                state = self._states[loop] = _LoopState(self.max_concurrency)
+        return state
+
+    def _current_state(self) -> Optional[_LoopState]:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        with self._states_lock:
+            return self._states.get(loop)
+
+    @property
+    def client(self) -> Optional[AsyncClient]:
+        """當前事件循環的客戶端（未初始化時為 None）"""
+        state = self._current_state()
+        return state.client if state else None
+
+    @property
+    def transport(self) -> Optional[AsyncPooledTransport]:
+        """當前事件循環的連接池（未初始化時為 None）"""
+        state = self._current_state()
+        return state.transport if state else None
+
+    async def _ensure_client(self) -> AsyncClient:
+        """延遲初始化當前事件循環的異步客戶端"""
+        state = self._state()
+        if state.client is not None:
+            return state.client
+
+        async with state.init_lock:
+            if state.client is None:
+                try:
+                    state.transport = AsyncPooledTransport(settings.database)
+                    options = AsyncClientOptions(httpx_client=state.transport.client)
+                    state.client = await acreate_client(self.url, self.anon_key, options=options)
+                    logger.info(f"Supabase 異步客戶端初始化成功，並發上限 {self.max_concurrency}")
+                except Exception as e:
+                    logger.error(f"Supabase 異步客戶端初始化失敗: {e}")
+                    raise Exception(f"無法連接到 Supabase: {e}")
+        return state.client
+
+    async def rpc(self, function_name: str, params: Dict[str, Any],
+                  timeout: Optional[float] = None) -> Any:
+        """調用 RPC 函數（受並發上限與單次超時約束）"""
+        client = await self._ensure_client()
+
+        try:
+            logger.debug("異步調用 RPC: %s, 參數: %s", function_name, lazy_repr(params),
+                         extra={"rpc": function_name, "sample": True})
+            async with self._state().semaphore:
+                response = await asyncio.wait_for(
+                    client.rpc(function_name, params).execute(),
+                    timeout or self.timeout
+                )
+
+            if hasattr(response, 'data'):
+                logger.debug("RPC 調用成功: %s", function_name)
+                return response.data
+            else:
+                logger.warning("RPC 響應格式異常: %s", function_name)
+                return response
+
+        except Exception as e:
+            transport = self.transport
+            if isinstance(e, httpx.TransportError) and transport:
+                transport.metrics.record_error()
+            logger.error("RPC 調用失敗: %s, 錯誤: %s", function_name, e)
+            raise Exception(f"RPC 調用失敗: {e}")
+
+    async def query(self, table: str):
+        """取得表格查詢構建器（執行時請使用 execute）"""
+        client = await self._ensure_client()
+        return client.table(table)
+
+    async def execute(self, query, timeout: Optional[float] = None) -> Any:
+        """在並發上限內執行查詢構建器"""
+        async with self._state().semaphore:
+            return await asyncio.wait_for(query.execute(), timeout or self.timeout)
+
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """取得當前事件循環連接池的命中/未命中統計"""
+        transport = self.transport
+        return transport.metrics.snapshot() if transport else {}
+
+    async def close(self):
+        """關閉當前事件循環的連接池"""
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.pop(loop, None)
+        if state and state.transport:
+            await state.transport.aclose()
+
+
+# 全局異步 Supabase 客戶端實例（延遲連接）
+async_supabase_client = AsyncSupabaseClient()
@@ -0,0 +1,170 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .settings import DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  # HTTP/2 需要 httpx[http2]
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 當前線程 / 協程內的單次調用超時覆蓋，由請求鉤子寫入各請求的 timeout 擴展
+_call_timeout: ContextVar[Optional[httpx.Timeout]] = ContextVar("mps_call_timeout", default=None)
+
+
+class PoolMetrics:
+    """連接池統計（命中 = 復用已有連接，未命中 = 新建 TCP/TLS 連接）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """重置統計"""
+        with self._lock:
+            self.requests = 0
+            self.pool_hits = 0
+            self.pool_misses = 0
+            self.errors = 0
+            self.http2_requests = 0
+
+    def record(self, new_connection: bool, http_version: Optional[str]):
+        with self._lock:
+            self.requests += 1
+            if new_connection:
+                self.pool_misses += 1
+            else:
+                self.pool_hits += 1
+            if http_version == "HTTP/2":
+                self.http2_requests += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回當前統計快照"""
+        with self._lock:
+            total = self.pool_hits + self.pool_misses
+            return {
+                "requests": self.requests,
+                "pool_hits": self.pool_hits,
+                "pool_misses": self.pool_misses,
+                "hit_ratio": round(self.pool_hits / total, 4) if total else 0.0,
+                "http2_requests": self.http2_requests,
+                "errors": self.errors
+            }
+
+
+class PooledTransport:
+    """持久連接池 HTTP 傳輸層
+
+    單一 httpx.Client 供 PostgREST 與 Auth 共用：keep-alive 連接復用、
+    可選 HTTP/2 多路復用、超時取自 DatabaseConfig。
+    """
+
+    client_class = httpx.Client
+
+    def __init__(self, config: DatabaseConfig):
+        self.config = config
+        self.metrics = PoolMetrics()
+        self.http2 = config.http2 and HTTP2_AVAILABLE
+        if config.http2 and not HTTP2_AVAILABLE:
+            logger.warning("未安裝 h2，HTTP/2 已停用，改用 HTTP/1.1 keep-alive")
+
+        self.default_timeout = self._build_timeout(config.timeout)
+        self.client = self.client_class(
+            http2=self.http2,
+            timeout=self.default_timeout,
+            limits=httpx.Limits(
+                max_connections=config.pool_max_connections,
+                max_keepalive_connections=config.pool_max_keepalive,
+                keepalive_expiry=config.keepalive_expiry
+            ),
+            follow_redirects=True,
+            event_hooks=self._event_hooks()
+        )
+        logger.info(f"HTTP 連接池已建立: {self.client_class.__name__}, http2={self.http2}, "
+                    f"max_connections={config.pool_max_connections}, "
+                    f"timeout={config.timeout}s, connect_timeout={config.connect_timeout}s")
+
+    def _build_timeout(self, seconds: float) -> httpx.Timeout:
+        return httpx.Timeout(seconds, connect=self.config.connect_timeout)
+
+    def _event_hooks(self) -> Dict[str, list]:
+        return {"request": [self._on_request], "response": [self._on_response]}
+
+    def _make_trace(self, state: Dict[str, bool]):
+        def trace(event_name: str, info: Dict[str, Any]):
+            if event_name.startswith("connection.connect_tcp"):
+                state["new_connection"] = True
+        return trace
+
+    def _on_request(self, request: httpx.Request):
+        # httpcore trace：出現 connect_tcp 事件即表示本次請求新建了連接
+        state = {"new_connection": False}
+        request.extensions["trace"] = self._make_trace(state)
+        request.extensions["mps_pool_state"] = state
+
+        timeout = _call_timeout.get()
+        if timeout is not None:
+            request.extensions["timeout"] = timeout.as_dict()
+
+    def _on_response(self, response: httpx.Response):
+        state = response.request.extensions.get("mps_pool_state", {})
+        self.metrics.record(state.get("new_connection", False), response.http_version)
+        if response.status_code >= 500:
+            self.metrics.record_error()
+
+    @contextmanager
+    def call_timeout(self, seconds: Optional[float]):
+        """覆蓋當前線程 / 協程內請求的讀寫超時（連接超時保持不變）
+
+        超時經請求擴展逐個請求傳遞，不修改共享客戶端，並發的其他調用不受影響
+        """
+        if seconds is None:
+            yield
+            return
+        token = _call_timeout.set(self._build_timeout(seconds))
+        try:
+            yield
+        finally:
+            _call_timeout.reset(token)
+
+    def close(self):
+        """關閉連接池"""
+        self.client.close()
+
+
+class AsyncPooledTransport(PooledTransport):
+    """asyncio 版連接池（httpx.AsyncClient），統計方式與同步版相同"""
+
+    client_class = httpx.AsyncClient
+
+    def _make_trace(self, state: Dict[str, bool]):
+        # 異步傳輸要求 trace 回調為協程
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name.startswith("connection.connect_tcp"):
+                state["new_connection"] = True
+        return trace
+
+    def _event_hooks(self) -> Dict[str, list]:
+        async def on_request(request: httpx.Request):
+            self._on_request(request)
+
+        async def on_response(response: httpx.Response):
+            self._on_response(response)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    async def aclose(self):
+        """關閉連接池"""
+        await self.client.aclose()
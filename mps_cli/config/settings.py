@@ -12,16 +12,44 @@ class DatabaseConfig:
     url: str
     service_role_key: str
     anon_key: str
-    timeout: int = 30
+    timeout: float = 30             # 單次調用讀寫超時（秒）
+    connect_timeout: float = 5      # 建立連接超時（秒）
+    pool_max_connections: int = 10
+    pool_max_keepalive: int = 10    # 不宜小於 pool_max_connections，否則並發時連接反覆重建
+    keepalive_expiry: float = 60    # 閒置連接保留時間（秒）
+    http2: bool = True
+    max_concurrency: int = 50       # 異步客戶端同時進行的請求上限
 
 @dataclass
 class UIConfig:
     """UI 配置"""
     page_size: int = 20
     qr_ttl_seconds: int = 900
+    qr_rotate_chunk_size: int = 1000
+    settlement_chunk_size: int = 500  # 批量結算每次 RPC 處理的商戶數
+    tx_count_cache_ttl: int = 60    # 交易總數估算緩存時間（秒）
+    search_index_enabled: bool = False  # 管理端本地搜尋索引（會員 / 卡片選擇器）
+    search_index_max_entries: int = 50000  # 本地索引每類最多記錄數（約 1.5 KB/條），超出則回退服務端搜尋
+    search_index_refresh_seconds: int = 30  # 本地索引增量刷新間隔（秒）
     auto_refresh: bool = True
     show_colors: bool = True
 
+@dataclass
+class CacheConfig:
+    """客戶端緩存配置"""
+    max_entries: int = 1024         # 超出後按 LRU 淘汰
+    default_ttl: int = 300          # 默認過期時間（秒）
+    reference_ttl: int = 3600       # 等級表等參考數據的過期時間（秒）
+    status_ttl: int = 30            # 含餘額 / 狀態的記錄（卡片詳情、商戶、會員）的過期時間（秒）
+
+@dataclass
+class MetricsConfig:
+    """RPC 指標配置"""
+    enabled: bool = True
+    port: int = 0                   # 本地 /metrics 端點端口（0 = 不啟動）
+    file_path: str = ""             # 定期寫入的 Prometheus 文本文件（空 = 不寫入）
+    dump_interval: int = 15         # 寫入文件的間隔（秒）
+
 @dataclass
 class LogConfig:
     """日誌配置"""
@@ -29,6 +57,9 @@ class LogConfig:
     file_path: str = "logs/mps_cli.log"
     max_size: int = 10485760  # 10MB
     backup_count: int = 5
+    format: str = "text"            # text / json（結構化，含 RPC 耗時字段）
+    async_enabled: bool = True      # 經 QueueListener 後台線程寫入
+    debug_sample_rate: float = 1.0  # 高頻調試日誌（RPC 參數 / 結果）的採樣比例
 
 class Settings:
     """應用設置類"""
@@ -37,18 +68,48 @@ class Settings:
         self.database = DatabaseConfig(
             url=os.getenv("SUPABASE_URL", ""),
             service_role_key=os.getenv("SUPABASE_SERVICE_ROLE_KEY", ""),
-            anon_key=os.getenv("SUPABASE_ANON_KEY", "")
+            anon_key=os.getenv("SUPABASE_ANON_KEY", ""),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT", "30")),
+            connect_timeout=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5")),
+            pool_max_connections=int(os.getenv("SUPABASE_POOL_SIZE", "10")),
+            pool_max_keepalive=int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "60")),
+            http2=os.getenv("SUPABASE_HTTP2", "true").lower() == "true",
+            max_concurrency=int(os.getenv("SUPABASE_MAX_CONCURRENCY", "50"))
         )
         
         self.ui = UIConfig(
             page_size=int(os.getenv("UI_PAGE_SIZE", "20")),
             qr_ttl_seconds=int(os.getenv("QR_TTL_SECONDS", "900")),
+            qr_rotate_chunk_size=int(os.getenv("QR_ROTATE_CHUNK_SIZE", "1000")),
+            settlement_chunk_size=int(os.getenv("SETTLEMENT_CHUNK_SIZE", "500")),
+            tx_count_cache_ttl=int(os.getenv("TX_COUNT_CACHE_TTL", "60")),
+            search_index_enabled=os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true",
+            search_index_max_entries=int(os.getenv("SEARCH_INDEX_MAX_ENTRIES", "50000")),
+            search_index_refresh_seconds=int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "30")),
             show_colors=os.getenv("SHOW_COLORS", "true").lower() == "true"
         )
         
+        self.cache = CacheConfig(
+            max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+            default_ttl=int(os.getenv("CACHE_DEFAULT_TTL", "300")),
+            reference_ttl=int(os.getenv("CACHE_REFERENCE_TTL", "3600")),
+            status_ttl=int(os.getenv("CACHE_STATUS_TTL", "30"))
+        )
+        
+        self.metrics = MetricsConfig(
+            enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true",
+            port=int(os.getenv("METRICS_PORT", "0")),
+            file_path=os.getenv("METRICS_FILE", ""),
+            dump_interval=int(os.getenv("METRICS_DUMP_INTERVAL", "15"))
+        )
+        
         self.logging = LogConfig(
             level=os.getenv("LOG_LEVEL", "INFO"),
-            file_path=os.getenv("LOG_FILE", "logs/mps_cli.log")
+            file_path=os.getenv("LOG_FILE", "logs/mps_cli.log"),
+            format=os.getenv("LOG_FORMAT", "text").lower(),
+            async_enabled=os.getenv("LOG_ASYNC", "true").lower() == "true",
+            debug_sample_rate=float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
         )
     
     def validate(self) -> bool:
@@ -1,50 +1,115 @@
-from supabase import create_client, Client
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 import logging
+import threading
 from .settings import settings
+from utils.logger import lazy_repr
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from .http_transport import PooledTransport
 
 logger = logging.getLogger(__name__)
 
 class SupabaseClient:
-    """Supabase 客戶端封裝類"""
+    """Supabase 客戶端封裝類
+    
+    導入本模塊不加載 Supabase SDK：SDK、HTTP 連接池與客戶端在首次使用時才建立，
+    preload() 可在後台線程提前建立，與歡迎界面、登入輸入等等待時間重疊。
+    """
     
     def __init__(self):
         self.url = settings.database.url
         self.service_role_key = settings.database.service_role_key
         self.anon_key = settings.database.anon_key
-        self.client: Optional[Client] = None
         self.auth_session = None
-        self._initialize_client()
+        self._client: Optional["Client"] = None
+        self._transport: Optional["PooledTransport"] = None
+        self._init_lock = threading.RLock()
+        self._preload_thread: Optional[threading.Thread] = None
+    
+    @property
+    def transport(self) -> "PooledTransport":
+        """HTTP 連接池（首次使用時建立）"""
+        if self._transport is None:
+            with self._init_lock:
+                if self._transport is None:
+                    from .http_transport import PooledTransport
+                    self._transport = PooledTransport(settings.database)
+        return self._transport
+    
+    @property
+    def client(self) -> "Client":
+        """Supabase 客戶端（首次使用時導入 SDK 並建立）"""
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    self._initialize_client()
+        return self._client
+    
+    @client.setter
+    def client(self, value: Optional["Client"]):
+        self._client = value
+    
+    @property
+    def initialized(self) -> bool:
+        """客戶端是否已建立"""
+        return self._client is not None
+    
+    def preload(self):
+        """在後台線程建立客戶端（失敗時只記錄日誌，首次使用時會重試並拋出錯誤）"""
+        if self._client is not None or self._preload_thread is not None:
+            return
+        
+        def build():
+            try:
+                self.client
+            except Exception as e:
+                logger.warning(f"後台預建 Supabase 客戶端失敗: {e}")
+        
+        self._preload_thread = threading.Thread(target=build, name="supabase-preload", daemon=True)
+        self._preload_thread.start()
+    
+    def _create_client(self) -> "Client":
+        """創建共用連接池的 Supabase 客戶端"""
+        from supabase import create_client, ClientOptions
+        options = ClientOptions(httpx_client=self.transport.client)
+        # 使用 anon_key 創建客戶端（訪問 public schema）
+        return create_client(self.url, self.anon_key, options=options)
     
     def _initialize_client(self):
         """初始化 Supabase 客戶端"""
         try:
-            # 使用 anon_key 創建客戶端（訪問 public schema）
-            self.client = create_client(self.url, self.anon_key)
+            self._client = self._create_client()
             logger.info("Supabase 客戶端初始化成功")
         except Exception as e:
             logger.error(f"Supabase 客戶端初始化失敗: {e}")
             raise Exception(f"無法連接到 Supabase: {e}")
     
-    def rpc(self, function_name: str, params: Dict[str, Any]) -> Any:
-        """調用 RPC 函數"""
+    def rpc(self, function_name: str, params: Dict[str, Any],
+            timeout: Optional[float] = None) -> Any:
+        """調用 RPC 函數（timeout 為單次調用超時，默認取 DatabaseConfig.timeout）"""
         if not self.client:
             raise Exception("Supabase 客戶端未初始化")
         
         try:
-            logger.debug(f"調用 RPC: {function_name}, 參數: {params}")
-            response = self.client.rpc(function_name, params).execute()
+            logger.debug("調用 RPC: %s, 參數: %s", function_name, lazy_repr(params),
+                         extra={"rpc": function_name, "sample": True})
+            with self.transport.call_timeout(timeout):
+                response = self.client.rpc(function_name, params).execute()
             
             # 檢查響應
             if hasattr(response, 'data'):
-                logger.debug(f"RPC 調用成功: {function_name}")
+                logger.debug("RPC 調用成功: %s", function_name)
                 return response.data
             else:
-                logger.warning(f"RPC 響應格式異常: {function_name}")
+                logger.warning("RPC 響應格式異常: %s", function_name)
                 return response
                 
         except Exception as e:
-            logger.error(f"RPC 調用失敗: {function_name}, 錯誤: {e}")
+            import httpx
+            if isinstance(e, httpx.TransportError):
+                self.transport.metrics.record_error()
+            logger.error("RPC 調用失敗: %s, 錯誤: %s", function_name, e)
             raise Exception(f"RPC 調用失敗: {e}")
     
     def query(self, table: str):
@@ -128,10 +193,20 @@ class SupabaseClient:
             raise Exception(f"刪除數據失敗: {e}")
     
     def test_connection(self) -> bool:
-        """測試連接"""
+        """測試連接
+        
+        直接經連接池調用 test_connection RPC，不需要等待 Supabase SDK 加載；
+        同時在後台預建客戶端，登入時通常已可直接使用。
+        """
+        self.preload()
         try:
-            # 使用 RPC 函數測試連接
-            result = self.rpc("test_connection", {})
+            response = self.transport.client.post(
+                f"{self.url.rstrip('/')}/rest/v1/rpc/test_connection",
+                json={},
+                headers={"apikey": self.anon_key, "Authorization": f"Bearer {self.anon_key}"}
+            )
+            response.raise_for_status()
+            result = response.json()
             if result and result.get('status') == 'success':
                 logger.info("Supabase 連接測試成功")
                 return True
@@ -170,7 +245,7 @@ class SupabaseClient:
     
     def sign_out(self):
         """登出"""
-        if not self.client:
+        if self._client is None:
             return
         
         try:
@@ -191,8 +266,8 @@ class SupabaseClient:
             # 先登出
             self.sign_out()
             
-            # 重新創建客戶端
-            self.client = create_client(self.url, self.anon_key)
+            # 重新創建客戶端（保留連接池，已建立的連接繼續復用）
+            self._client = self._create_client()
             self.auth_session = None
             
             logger.info("Client reinitialized successfully")
@@ -229,7 +304,7 @@ class SupabaseClient:
     
     def get_current_user(self) -> Optional[Dict]:
         """取得當前登入用戶"""
-        if not self.client:
+        if self._client is None:
             return None
         
         try:
@@ -242,6 +317,15 @@ class SupabaseClient:
     def is_authenticated(self) -> bool:
         """檢查是否已登入"""
         return self.auth_session is not None
+    
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """取得連接池命中/未命中統計"""
+        return self.transport.metrics.snapshot()
+    
+    def close(self):
+        """關閉連接池"""
+        if self._transport is not None:
+            self._transport.close()
 
 # 全局 Supabase 客戶端實例
 supabase_client = SupabaseClient()
\ No newline at end of file
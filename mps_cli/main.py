@@ -12,11 +12,8 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+# 角色界面與 Supabase SDK 按需導入：終端只加載登入後實際使用的界面
 from config.settings import settings
-from ui.login_ui import LoginUI
-from ui.member_ui import MemberUI
-from ui.merchant_ui import MerchantUI
-from ui.admin_ui import AdminUI
 from ui.base_ui import BaseUI
 from utils.logger import setup_logging, get_logger
 
@@ -29,6 +26,10 @@ def main():
         setup_logging()
         logger.info("MPS CLI Started")
         
+        # 指標導出（METRICS_PORT / METRICS_FILE）
+        from utils.metrics import start_metrics_exporters
+        start_metrics_exporters()
+        
         # 驗證配置
         settings.validate()
         logger.info("Configuration validation passed")
@@ -56,6 +57,7 @@ def main():
         show_welcome()
         
         # 統一登入
+        from ui.login_ui import LoginUI
         login_ui = LoginUI()
         login_result = login_ui.show_login()
         
@@ -74,14 +76,17 @@ def main():
         try:
             if role in ["admin", "super_admin"]:
                 logger.info("Starting admin interface")
+                from ui.admin_ui import AdminUI
                 admin_ui = AdminUI(auth_service)
                 admin_ui.start()
             elif role == "merchant":
                 logger.info("Starting merchant interface")
+                from ui.merchant_ui import MerchantUI
                 merchant_ui = MerchantUI(auth_service)
                 merchant_ui.start()
             elif role == "member":
                 logger.info("Starting member interface")
+                from ui.member_ui import MemberUI
                 member_ui = MemberUI(auth_service)
                 member_ui.start()
             else:
@@ -201,6 +206,16 @@ def test_connection():
         print(f"║  ❌ 錯誤: {str(e)[:64]:<64} ║")
         print("╚═══════════════════════════════════════════════════════════════════════════╝")
 
+def profile_startup():
+    """輸出冷啟動各階段耗時與導入耗時最多的套件（用於追蹤低配終端的啟動時間）"""
+    from utils.startup_profile import profile_startup as run_profile, print_startup_profile
+    
+    try:
+        print_startup_profile(run_profile())
+    except Exception as e:
+        print(f"✗ 啟動分析失敗: {e}")
+        sys.exit(1)
+
 def show_help():
     """顯示幫助信息 - 商業版"""
     print("╔═══════════════════════════════════════════════════════════════════════════╗")
@@ -212,6 +227,7 @@ def show_help():
     print("║  python main.py              啟動主程序（推薦）                           ║")
     print("║  python main.py test         測試數據庫連接                               ║")
     print("║  python main.py help         顯示此幫助信息                               ║")
+    print("║  python main.py --profile-startup  輸出啟動耗時分析                       ║")
     print("║                                                                           ║")
     print("╠═══════════════════════════════════════════════════════════════════════════╣")
     print("║  環境配置：                                                               ║")
@@ -253,6 +269,8 @@ if __name__ == "__main__":
             admin_main()
         elif command == "test":
             test_connection()
+        elif command == "--profile-startup":
+            profile_startup()
         elif command in ["help", "-h", "--help"]:
             show_help()
         else:
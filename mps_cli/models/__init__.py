@@ -3,4 +3,5 @@ from .base import BaseModel
 from .member import Member
 from .card import Card
 from .transaction import Transaction
-from .settlement import Settlement
\ No newline at end of file
+from .settlement import Settlement
+from .level import LevelInfo, LevelTable
\ No newline at end of file
@@ -1,12 +1,78 @@
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional, Type, TypeVar
+import gc
+from dataclasses import dataclass, asdict, fields, MISSING
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type, TypeVar
 from datetime import datetime
 
 T = TypeVar('T', bound='BaseModel')
 
+# from_rows 超過此行數時在構造期間暫停 GC
+BULK_GC_PAUSE_ROWS = 5000
+
+def slotted(cls):
+    """把 dataclass 重建為 __slots__ 類（等同 Python 3.10+ 的 dataclass(slots=True)，兼容 3.8）
+
+    實例不再攜帶 __dict__，大結果集下內存顯著減少、屬性訪問更快。
+    重建後的類中方法不能使用無參 super()，需顯式調用基類方法。
+    """
+    names = tuple(f.name for f in fields(cls))
+    inherited = {name for base in cls.__mro__[1:] for name in getattr(base, '__slots__', ())}
+    
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = tuple(name for name in names if name not in inherited)
+    for name in names:
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    
+    new_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    new_cls.__qualname__ = cls.__qualname__
+    return new_cls
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> FrozenSet[str]:
+    """模型字段名集合（每個類只計算一次）"""
+    return frozenset(f.name for f in fields(cls) if f.init)
+
+@lru_cache(maxsize=None)
+def _field_spec(cls) -> Tuple[Tuple[str, Any, Any], ...]:
+    """按 __init__ 參數順序排列的 (字段名, 默認值, 默認工廠)"""
+    return tuple((f.name, f.default, f.default_factory) for f in fields(cls) if f.init)
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """ISO 時間字符串 -> datetime（兼容結尾 Z），無法解析時返回 None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return None
+
+def to_decimal(value: Any, default: Optional[Decimal] = None) -> Optional[Decimal]:
+    """JSON 數值 -> Decimal（經 str 轉換避免浮點誤差），空值或無法解析時返回 default"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return default
+
+@slotted
 @dataclass
 class BaseModel:
-    """基礎模型類"""
+    """基礎模型類
+    
+    模型保存 RPC 返回的原始值（時間為 ISO 字符串、金額為 JSON 數值），
+    需要時再通過 get_datetime / get_decimal 轉換，構建大列表時不做逐行轉換。
+    """
     
     id: Optional[str] = None
     created_at: Optional[str] = None
@@ -18,13 +84,45 @@ class BaseModel:
         if not data:
             return cls()
         
-        # 獲取類的字段
-        field_names = {field.name for field in cls.__dataclass_fields__.values()}
+        field_names = _field_names(cls)
+        return cls(**{k: v for k, v in data.items() if k in field_names})
+    
+    @classmethod
+    def from_rows(cls: Type[T], rows: Iterable[Dict[str, Any]]) -> List[T]:
+        """從 RPC 結果列表批量創建模型
+        
+        按列取值後以位置參數批量構造：字段查找每列一次而不是每行一次，
+        結果中不存在的列直接使用默認值。
+        """
+        rows = rows if isinstance(rows, list) else list(rows or [])
+        if not rows:
+            return []
+        
+        present = set()
+        for row in rows:
+            present.update(row.keys())
         
-        # 過濾出有效字段
-        filtered_data = {k: v for k, v in data.items() if k in field_names}
+        columns = []
+        for name, default, factory in _field_spec(cls):
+            if name in present:
+                if factory is MISSING:
+                    columns.append([row.get(name, default) for row in rows])
+                else:
+                    columns.append([row[name] if name in row else factory() for row in rows])
+            elif factory is MISSING:
+                columns.append(repeat(default, len(rows)))
+            else:
+                columns.append([factory() for _ in rows])
         
-        return cls(**filtered_data)
+        # 構造期間只新建不釋放對象，暫停分代回收避免反覆掃描正在增長的結果列表
+        gc_enabled = gc.isenabled() and len(rows) >= BULK_GC_PAUSE_ROWS
+        if gc_enabled:
+            gc.disable()
+        try:
+            return list(map(cls, *columns))
+        finally:
+            if gc_enabled:
+                gc.enable()
     
     def to_dict(self) -> Dict[str, Any]:
         """轉換為字典"""
@@ -32,8 +130,9 @@ class BaseModel:
     
     def update_from_dict(self, data: Dict[str, Any]):
         """從字典更新模型"""
+        field_names = _field_names(type(self))
         for key, value in data.items():
-            if hasattr(self, key):
+            if key in field_names:
                 setattr(self, key, value)
     
     def is_valid(self) -> bool:
@@ -51,6 +150,14 @@ class BaseModel:
         else:
             return "未知"
     
+    def get_datetime(self, field_name: str) -> Optional[datetime]:
+        """按需把時間字段解析為 datetime"""
+        return parse_datetime(getattr(self, field_name, None))
+    
+    def get_decimal(self, field_name: str, default: Optional[Decimal] = None) -> Optional[Decimal]:
+        """按需把金額字段轉換為 Decimal"""
+        return to_decimal(getattr(self, field_name, None), default)
+    
     def format_datetime(self, field_name: str) -> str:
         """格式化日期時間字段"""
         value = getattr(self, field_name, None)
@@ -58,13 +165,8 @@ class BaseModel:
             return ""
         
         if isinstance(value, str):
-            try:
-                if value.endswith('Z'):
-                    value = value[:-1] + '+00:00'
-                dt = datetime.fromisoformat(value)
-                return dt.strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                return value
+            dt = parse_datetime(value)
+            return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else value
         
         return str(value)
     
@@ -75,13 +177,8 @@ class BaseModel:
             return ""
         
         if isinstance(value, str):
-            try:
-                if value.endswith('Z'):
-                    value = value[:-1] + '+00:00'
-                dt = datetime.fromisoformat(value)
-                return dt.strftime("%Y-%m-%d")
-            except ValueError:
-                return value
+            dt = parse_datetime(value)
+            return dt.strftime("%Y-%m-%d") if dt else value
         
         return str(value)
     
@@ -93,40 +190,18 @@ class BaseModel:
         """詳細字符串表示"""
         return f"{self.__class__.__name__}(id={self.id})"
 
-@dataclass
 class TimestampMixin:
-    """時間戳混入類"""
+    """時間戳混入類（created_at / updated_at 字段由 BaseModel 提供）"""
     
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    __slots__ = ()
     
     def get_created_datetime(self) -> Optional[datetime]:
         """獲取創建時間"""
-        if not self.created_at:
-            return None
-        
-        try:
-            if self.created_at.endswith('Z'):
-                time_str = self.created_at[:-1] + '+00:00'
-            else:
-                time_str = self.created_at
-            return datetime.fromisoformat(time_str)
-        except ValueError:
-            return None
+        return parse_datetime(self.created_at)
     
     def get_updated_datetime(self) -> Optional[datetime]:
         """獲取更新時間"""
-        if not self.updated_at:
-            return None
-        
-        try:
-            if self.updated_at.endswith('Z'):
-                time_str = self.updated_at[:-1] + '+00:00'
-            else:
-                time_str = self.updated_at
-            return datetime.fromisoformat(time_str)
-        except ValueError:
-            return None
+        return parse_datetime(self.updated_at)
     
     def is_recent(self, hours: int = 24) -> bool:
         """檢查是否是最近創建的"""
@@ -138,11 +213,10 @@ class TimestampMixin:
         now = datetime.now(created.tzinfo)
         return (now - created) <= timedelta(hours=hours)
 
-@dataclass
 class StatusMixin:
-    """狀態混入類"""
+    """狀態混入類（status 字段由各模型聲明）"""
     
-    status: Optional[str] = None
+    __slots__ = ()
     
     def is_active(self) -> bool:
         """檢查是否激活"""
@@ -194,4 +268,4 @@ class ModelFactory:
     @staticmethod
     def create_list_from_db_rows(model_class: Type[T], rows: List[Dict[str, Any]]) -> List[T]:
         """從數據庫行列表創建模型列表"""
-        return [model_class.from_dict(row) for row in rows]
\ No newline at end of file
+        return model_class.from_rows(rows)
\ No newline at end of file
@@ -1,13 +1,15 @@
 from dataclasses import dataclass
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
-from .base import BaseModel, StatusMixin, TimestampMixin
+from .base import BaseModel, StatusMixin, TimestampMixin, slotted
 from config.constants import CARD_TYPES, CARD_STATUS, BIND_ROLES
 
+@slotted
 @dataclass
 class Card(BaseModel, StatusMixin, TimestampMixin):
     """卡片模型"""
     
+    status: Optional[str] = None
     card_no: Optional[str] = None
     card_type: Optional[str] = None
     owner_member_id: Optional[str] = None
@@ -21,6 +23,7 @@ class Card(BaseModel, StatusMixin, TimestampMixin):
     fixed_discount: Optional[float] = None
     binding_password_hash: Optional[str] = None
     expires_at: Optional[str] = None
+    binding_role: Optional[str] = None  # 當前會員與卡片的關係（owner/admin/member/viewer，從 RPC 查詢返回）
     
     def get_display_name(self) -> str:
         """獲取顯示名稱"""
@@ -29,7 +32,7 @@ class Card(BaseModel, StatusMixin, TimestampMixin):
         elif self.card_no:
             return self.card_no
         else:
-            return super().get_display_name()
+            return BaseModel.get_display_name(self)
     
     def get_card_type_display(self) -> str:
         """獲取卡片類型顯示"""
@@ -37,7 +40,7 @@ class Card(BaseModel, StatusMixin, TimestampMixin):
     
     def get_status_display(self) -> str:
         """獲取狀態顯示"""
-        return super().get_status_display(CARD_STATUS)
+        return StatusMixin.get_status_display(self, CARD_STATUS)
     
     def display_info(self) -> str:
         """顯示卡片信息"""
@@ -115,6 +118,7 @@ class Card(BaseModel, StatusMixin, TimestampMixin):
             "過期時間": self.format_datetime("expires_at") if self.expires_at else "永久有效"
         }
 
+@slotted
 @dataclass
 class CardBinding(BaseModel, TimestampMixin):
     """卡片綁定模型"""
@@ -143,6 +147,7 @@ class CardBinding(BaseModel, TimestampMixin):
         """檢查是否只能查看"""
         return self.role == "viewer"
 
+@slotted
 @dataclass
 class QRCode(BaseModel, TimestampMixin):
     """QR 碼模型"""
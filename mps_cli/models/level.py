@@ -0,0 +1,80 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+@dataclass(frozen=True)
+class LevelInfo:
+    """會員等級"""
+
+    level: int
+    name: str
+    min_points: int
+    max_points: Optional[int] = None
+    discount: float = 1.0
+
+    def contains(self, points: int) -> bool:
+        return points >= self.min_points and (self.max_points is None or points <= self.max_points)
+
+class LevelTable:
+    """會員等級查找表
+
+    建表時把等級區間展開為有序分段（起始積分 -> 等級），查找時二分定位；
+    規則與服務端 compute_level / compute_discount 一致：
+    取 min_points <= 積分 <= max_points 的最高等級，無匹配時為 0 級、無折扣。
+    """
+
+    def __init__(self, levels: Iterable[LevelInfo]):
+        self._by_level: Dict[int, LevelInfo] = {info.level: info for info in levels}
+        self._default = LevelInfo(level=0, name=self._by_level[0].name if 0 in self._by_level else "", min_points=0)
+
+        bounds = set()
+        for info in self._by_level.values():
+            bounds.add(info.min_points)
+            if info.max_points is not None:
+                bounds.add(info.max_points + 1)
+
+        self._starts: List[int] = []
+        self._segments: List[Optional[LevelInfo]] = []
+        for start in sorted(bounds):
+            matched = [info for info in self._by_level.values() if info.contains(start)]
+            segment = max(matched, key=lambda info: info.level) if matched else None
+            if self._segments and self._segments[-1] == segment:
+                continue
+            self._starts.append(start)
+            self._segments.append(segment)
+
+    @classmethod
+    def from_mapping(cls, levels: Dict[int, Dict[str, Any]]) -> 'LevelTable':
+        """從 {level: {name, min_points, max_points, discount}} 建表"""
+        return cls(
+            LevelInfo(
+                level=int(level),
+                name=info.get("name", ""),
+                min_points=int(info["min_points"]),
+                max_points=None if info.get("max_points") is None else int(info["max_points"]),
+                discount=float(info.get("discount", 1.0))
+            )
+            for level, info in levels.items()
+        )
+
+    def lookup(self, points: int) -> LevelInfo:
+        """積分對應的等級"""
+        index = bisect_right(self._starts, points or 0) - 1
+        if index < 0:
+            return self._default
+        return self._segments[index] or self._default
+
+    def level_for(self, points: int) -> int:
+        return self.lookup(points).level
+
+    def discount_for(self, points: int) -> float:
+        return self.lookup(points).discount
+
+    def get(self, level: int) -> Optional[LevelInfo]:
+        return self._by_level.get(level)
+
+    def next_level(self, points: int) -> Optional[LevelInfo]:
+        """下一等級（高於當前等級的最低等級），已是最高等級時返回 None"""
+        current = self.level_for(points)
+        higher = [level for level in self._by_level if level > current]
+        return self._by_level[min(higher)] if higher else None
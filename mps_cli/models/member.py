@@ -1,12 +1,14 @@
 from dataclasses import dataclass
 from typing import Optional, List, Dict, Any
-from .base import BaseModel, StatusMixin, TimestampMixin
+from .base import BaseModel, StatusMixin, TimestampMixin, slotted
 from config.constants import MEMBER_STATUS
 
+@slotted
 @dataclass
 class Member(BaseModel, StatusMixin, TimestampMixin):
     """會員模型"""
     
+    status: Optional[str] = None
     member_no: Optional[str] = None
     name: Optional[str] = None
     phone: Optional[str] = None
@@ -27,11 +29,11 @@ class Member(BaseModel, StatusMixin, TimestampMixin):
         elif self.phone:
             return self.phone
         else:
-            return super().get_display_name()
+            return BaseModel.get_display_name(self)
     
     def get_status_display(self) -> str:
         """獲取狀態顯示"""
-        return super().get_status_display(MEMBER_STATUS)
+        return StatusMixin.get_status_display(self, MEMBER_STATUS)
     
     def get_contact_info(self) -> str:
         """獲取聯繫信息"""
@@ -72,6 +74,7 @@ class Member(BaseModel, StatusMixin, TimestampMixin):
             "創建時間": self.format_datetime("created_at")
         }
 
+@slotted
 @dataclass
 class MemberExternalIdentity(BaseModel, TimestampMixin):
     """會員外部身份模型"""
@@ -96,6 +99,7 @@ class MemberExternalIdentity(BaseModel, TimestampMixin):
         """獲取顯示信息"""
         return f"{self.get_provider_display()}: {self.external_id}"
 
+@slotted
 @dataclass
 class MembershipLevel(BaseModel, TimestampMixin):
     """會員等級模型"""
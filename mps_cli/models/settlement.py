@@ -1,8 +1,9 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from decimal import Decimal
-from .base import BaseModel, TimestampMixin
+from .base import BaseModel, TimestampMixin, slotted
 
+@slotted
 @dataclass
 class Settlement(BaseModel, TimestampMixin):
     """結算模型"""
@@ -32,6 +33,9 @@ class Settlement(BaseModel, TimestampMixin):
     status: Optional[str] = None  # pending/completed/failed
     settled_at: Optional[str] = None
     
+    # 按日明細（來自 payload.days）
+    daily_breakdown: Optional[List[Dict[str, Any]]] = None
+    
     def get_mode_display(self) -> str:
         """獲取結算模式顯示"""
         from config.constants import SETTLEMENT_MODES
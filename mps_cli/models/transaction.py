@@ -1,13 +1,15 @@
 from dataclasses import dataclass
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
-from .base import BaseModel, StatusMixin, TimestampMixin
+from .base import BaseModel, StatusMixin, TimestampMixin, slotted
 from config.constants import TRANSACTION_TYPES, TRANSACTION_STATUS, PAYMENT_METHODS
 
+@slotted
 @dataclass
 class Transaction(BaseModel, StatusMixin, TimestampMixin):
     """交易模型"""
     
+    status: Optional[str] = None
     tx_no: Optional[str] = None
     tx_type: Optional[str] = None
     card_id: Optional[str] = None
@@ -23,6 +25,7 @@ class Transaction(BaseModel, StatusMixin, TimestampMixin):
     original_tx_id: Optional[str] = None
     processed_by_user_id: Optional[str] = None
     tag: Optional[Dict[str, Any]] = None
+    refunded_amount: Optional[float] = None
     
     def get_tx_type_display(self) -> str:
         """獲取交易類型顯示"""
@@ -30,7 +33,7 @@ class Transaction(BaseModel, StatusMixin, TimestampMixin):
     
     def get_status_display(self) -> str:
         """獲取狀態顯示"""
-        return super().get_status_display(TRANSACTION_STATUS)
+        return StatusMixin.get_status_display(self, TRANSACTION_STATUS)
     
     def get_payment_method_display(self) -> str:
         """獲取支付方式顯示"""
@@ -71,6 +74,10 @@ class Transaction(BaseModel, StatusMixin, TimestampMixin):
         return (self.is_payment() and 
                 self.status in ["completed", "refunded"])
     
+    def get_remaining_refundable(self) -> Decimal:
+        """剩餘可退金額（原交易金額 - 累計退款額）"""
+        return Decimal(str(self.final_amount or 0)) - Decimal(str(self.refunded_amount or 0))
+    
     def get_discount_info(self) -> str:
         """獲取折扣信息"""
         if not self.discount_applied or self.discount_applied >= 1.0:
@@ -114,6 +121,7 @@ class Transaction(BaseModel, StatusMixin, TimestampMixin):
             "時間": self.format_datetime("created_at")
         }
 
+@slotted
 @dataclass
 class Merchant(BaseModel, TimestampMixin):
     """商戶模型"""
@@ -130,7 +138,7 @@ class Merchant(BaseModel, TimestampMixin):
         elif self.code:
             return self.code
         else:
-            return super().get_display_name()
+            return BaseModel.get_display_name(self)
     
     def is_active(self) -> bool:
         """檢查是否激活"""
@@ -150,10 +158,12 @@ class Merchant(BaseModel, TimestampMixin):
             "創建時間": self.format_datetime("created_at")
         }
 
+@slotted
 @dataclass
 class Settlement(BaseModel, StatusMixin, TimestampMixin):
     """結算模型"""
     
+    status: Optional[str] = None
     merchant_id: Optional[str] = None
     mode: Optional[str] = None
     period_start: Optional[str] = None
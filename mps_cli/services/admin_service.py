@@ -1,5 +1,6 @@
-from typing import List, Optional, Dict, Any
-from .base_service import BaseService
+from typing import Callable, List, Optional, Dict, Any
+from config.settings import settings
+from .base_service import BaseService, cache_service, invalidates_cache
 from .member_service import MemberService
 from models.member import Member
 from models.card import Card
@@ -41,6 +42,7 @@ class AdminService(BaseService):
                 "email": email
             })
     
+    @invalidates_cache("card:{card_id}")
     def freeze_card(self, card_id: str) -> bool:
         """凍結卡片"""
         self.require_role('admin')
@@ -61,6 +63,7 @@ class AdminService(BaseService):
             self.logger.error(f"卡片凍結失敗: {card_id}, 錯誤: {e}")
             raise self.handle_service_error("凍結卡片", e, {"card_id": card_id})
     
+    @invalidates_cache("card:{card_id}")
     def unfreeze_card(self, card_id: str) -> bool:
         """解凍卡片"""
         self.require_role('admin')
@@ -81,6 +84,7 @@ class AdminService(BaseService):
             self.logger.error(f"卡片解凍失敗: {card_id}, 錯誤: {e}")
             raise self.handle_service_error("解凍卡片", e, {"card_id": card_id})
     
+    @invalidates_cache("member:{member_id}")
     def suspend_member(self, member_id: str) -> bool:
         """暫停會員"""
         self.require_role('admin')
@@ -101,6 +105,7 @@ class AdminService(BaseService):
             self.logger.error(f"會員暫停失敗: {member_id}, 錯誤: {e}")
             raise self.handle_service_error("暫停會員", e, {"member_id": member_id})
     
+    @invalidates_cache("merchant:{merchant_id}")
     def suspend_merchant(self, merchant_id: str) -> bool:
         """暫停商戶"""
         self.require_role('admin')
@@ -121,6 +126,7 @@ class AdminService(BaseService):
             self.logger.error(f"商戶暫停失敗: {merchant_id}, 錯誤: {e}")
             raise self.handle_service_error("暫停商戶", e, {"merchant_id": merchant_id})
     
+    @invalidates_cache("card:{card_id}")
     def update_points_and_level(self, card_id: str, delta_points: int, 
                                reason: str = "manual_adjust") -> bool:
         """調整積分和等級"""
@@ -153,81 +159,55 @@ class AdminService(BaseService):
                 "delta_points": delta_points
             })
     
-    def batch_rotate_qr_tokens(self, ttl_seconds: int = 300) -> int:
-        """批量輪換 QR 碼"""
+    def batch_rotate_qr_tokens(self, ttl_seconds: int = 300, chunk_size: Optional[int] = None,
+                               progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """批量輪換 QR 碼（分塊執行，返回數量與吞吐量）"""
         self.require_role('admin')
-        self.log_operation("批量輪換 QR 碼", {"ttl_seconds": ttl_seconds})
+        self.log_operation("批量輪換 QR 碼", {"ttl_seconds": ttl_seconds, "chunk_size": chunk_size})
         
         from services.qr_service import QRService
         qr_service = QRService()
+        qr_service.set_auth_service(self.auth_service)
         
         try:
-            affected_count = qr_service.batch_rotate_qr(ttl_seconds)
+            result = qr_service.batch_rotate_qr(ttl_seconds, chunk_size, progress_callback)
             
-            self.logger.info(f"批量 QR 碼輪換成功，影響 {affected_count} 張卡片")
-            return affected_count
+            self.logger.info(f"批量 QR 碼輪換成功，影響 {result['rotated']} 張卡片")
+            return result
             
         except Exception as e:
             self.logger.error(f"批量 QR 碼輪換失敗: {e}")
             raise self.handle_service_error("批量輪換 QR 碼", e, {"ttl_seconds": ttl_seconds})
     
     def get_system_statistics(self) -> Dict[str, Any]:
-        """獲取系統統計信息"""
+        """獲取系統統計信息（單次服務端聚合，返回大小與數據量無關）"""
         try:
-            stats = {}
-            
-            # 會員統計
-            total_members = self.count_records("member_profiles")
-            active_members = self.count_records("member_profiles", {"status": "active"})
-            
-            # 卡片統計
-            total_cards = self.count_records("member_cards")
-            active_cards = self.count_records("member_cards", {"status": "active"})
-            
-            # 商戶統計
-            total_merchants = self.count_records("merchants")
-            active_merchants = self.count_records("merchants", {"active": True})
-            
-            # 今日交易統計
-            from datetime import datetime, time
-            today = datetime.now().date()
-            start_time = datetime.combine(today, time.min)
-            end_time = datetime.combine(today, time.max)
-            
-            # 簡化的今日交易統計（直接查詢表）
-            today_transactions = self.query_table("transactions", 
-                                                 limit=10000,  # 假設單日不超過10000筆
-                                                 order_by="created_at")
-            
-            today_tx_count = 0
-            today_payment_amount = 0.0
+            result = self.rpc_call("get_system_statistics", {})
+            row = result[0] if isinstance(result, list) and result else (result or {})
             
-            for tx in today_transactions:
-                tx_time = tx.get("created_at", "")
-                if tx_time and start_time.isoformat() <= tx_time <= end_time.isoformat():
-                    today_tx_count += 1
-                    if tx.get("tx_type") == "payment":
-                        today_payment_amount += tx.get("final_amount", 0)
+            if not row:
+                return {}
             
             stats = {
                 "members": {
-                    "total": total_members,
-                    "active": active_members,
-                    "inactive": total_members - active_members
+                    "total": row.get("members_total", 0),
+                    "active": row.get("members_active", 0),
+                    "inactive": row.get("members_total", 0) - row.get("members_active", 0)
                 },
                 "cards": {
-                    "total": total_cards,
-                    "active": active_cards,
-                    "inactive": total_cards - active_cards
+                    "total": row.get("cards_total", 0),
+                    "active": row.get("cards_active", 0),
+                    "inactive": row.get("cards_total", 0) - row.get("cards_active", 0)
                 },
                 "merchants": {
-                    "total": total_merchants,
-                    "active": active_merchants,
-                    "inactive": total_merchants - active_merchants
+                    "total": row.get("merchants_total", 0),
+                    "active": row.get("merchants_active", 0),
+                    "inactive": row.get("merchants_total", 0) - row.get("merchants_active", 0)
                 },
                 "today": {
-                    "transaction_count": today_tx_count,
-                    "payment_amount": today_payment_amount
+                    "transaction_count": row.get("transactions_today", 0),
+                    "payment_count": row.get("payments_today", 0),
+                    "payment_amount": float(row.get("payments_today_amount") or 0)
                 }
             }
             
@@ -246,14 +226,16 @@ class AdminService(BaseService):
                 "limit": limit
             })
             
-            # 直接調用 RPC 函數
+            # 完整卡號 / 持卡人識別碼只走唯一索引精確查找；其他關鍵字由服務端模糊匹配並按相關度排序
             result = self.rpc_call("search_cards", {
                 "p_keyword": keyword,
-                "p_limit": limit
+                "p_limit": limit,
+                "p_exact_only": IdentifierResolver.is_exact_search(
+                    keyword, IdentifierResolver.CARD_EXACT_TYPES)
             })
             
             if result:
-                cards = [Card.from_dict(card_data) for card_data in result]
+                cards = Card.from_rows(result)
                 self.logger.debug(f"搜索卡片成功: 關鍵字 '{keyword}', 返回 {len(cards)} 個結果")
                 return cards
             else:
@@ -264,37 +246,54 @@ class AdminService(BaseService):
             return []
     
     def get_card_detail(self, card_id: str) -> Optional[Dict[str, Any]]:
-        """獲取卡片詳細信息"""
+        """獲取卡片詳細信息（短時緩存，凍結/解凍/調積分/綁定變更時失效）
+
+        其他終端的交易與其他進程的寫操作不會觸發本進程失效，餘額 / 狀態最多滯後 CACHE_STATUS_TTL 秒
+        """
         try:
-            card_data = self.get_single_record("member_cards", {"id": card_id})
-            
-            if not card_data:
-                return None
-            
-            card = Card.from_dict(card_data)
-            
-            # 獲取綁定信息
-            bindings = self.member_service.get_card_bindings(card_id)
-            
-            # 獲取擁有者信息
-            owner = None
-            if card.owner_member_id:
-                owner = self.member_service.get_member_by_id(card.owner_member_id)
-            
-            detail = {
-                "card": card,
-                "owner": owner,
-                "bindings": bindings,
-                "binding_count": len(bindings)
-            }
-            
-            self.logger.debug(f"獲取卡片詳情成功: {card_id}")
-            return detail
+            return cache_service.get_or_load(
+                f"card:detail:{card_id}",
+                lambda: self._fetch_card_detail(card_id),
+                ttl=settings.cache.status_ttl,
+                tags=self._card_detail_tags
+            )
             
         except Exception as e:
             self.logger.error(f"獲取卡片詳情失敗: {card_id}, 錯誤: {e}")
             return None
     
+    def _fetch_card_detail(self, card_id: str) -> Optional[Dict[str, Any]]:
+        card_data = self.get_single_record("member_cards", {"id": card_id})
+        
+        if not card_data:
+            return None
+        
+        card = Card.from_dict(card_data)
+        
+        # 獲取綁定信息
+        bindings = self.member_service.get_card_bindings(card_id)
+        
+        # 獲取擁有者信息
+        owner = None
+        if card.owner_member_id:
+            owner = self.member_service.get_member_by_id(card.owner_member_id)
+        
+        self.logger.debug(f"獲取卡片詳情成功: {card_id}")
+        return {
+            "card": card,
+            "owner": owner,
+            "bindings": bindings,
+            "binding_count": len(bindings)
+        }
+    
+    @staticmethod
+    def _card_detail_tags(detail: Dict[str, Any]) -> List[str]:
+        card = detail["card"]
+        tags = [f"card:{card.id}", f"card_no:{card.card_no}"]
+        if card.owner_member_id:
+            tags.append(f"member:{card.owner_member_id}")
+        return tags
+    
     # 新增的卡片管理擴展功能
     def get_all_cards(self, limit: int = 50, offset: int = 0, card_type: Optional[str] = None,
                      status: Optional[str] = None, owner_name: Optional[str] = None) -> Dict[str, Any]:
@@ -324,7 +323,7 @@ class AdminService(BaseService):
                 total_pages = (total_count + limit - 1) // limit
                 current_page = offset // limit
                 
-                cards = [Card.from_dict(card) for card in result]
+                cards = Card.from_rows(result)
                 
                 self.logger.info(f"獲取所有卡片成功，返回 {len(cards)} 張卡片")
                 
@@ -371,14 +370,16 @@ class AdminService(BaseService):
         
         params = {
             "p_keyword": keyword,
-            "p_limit": limit
+            "p_limit": limit,
+            "p_exact_only": IdentifierResolver.is_exact_search(
+                keyword, IdentifierResolver.CARD_EXACT_TYPES)
         }
         
         try:
             result = self.rpc_call("search_cards", params)
             
             if result:
-                cards = [Card.from_dict(card) for card in result]
+                cards = Card.from_rows(result)
                 self.logger.info(f"高級卡片搜尋成功，返回 {len(cards)} 張卡片")
                 return cards
             else:
@@ -447,7 +448,80 @@ class AdminService(BaseService):
                 "merchant_id": merchant_id,
                 "group_by": group_by
             })
-    
+
+    def refresh_daily_rollup(self, from_date: Optional[str] = None,
+                             to_date: Optional[str] = None) -> int:
+        """重算商戶日彙總（默認從上次彙總日期續算到昨天），返回寫入行數"""
+        self.log_operation("重算商戶日彙總", {"from_date": from_date, "to_date": to_date})
+
+        params = {"p_from": from_date, "p_to": to_date}
+
+        try:
+            result = self.rpc_call("refresh_merchant_daily_rollup", params)
+            rows = int(result or 0)
+            self.logger.info(f"商戶日彙總重算完成，寫入 {rows} 行")
+            return rows
+        except Exception as e:
+            self.logger.error(f"重算商戶日彙總失敗: {e}")
+            raise self.handle_service_error("重算商戶日彙總", e, params)
+
+    def maintain_transaction_partitions(self, months_ahead: int = 3,
+                                        keep_months: Optional[int] = None) -> Dict[str, Any]:
+        """預建交易月度分區；指定 keep_months 時歸檔更早的分區"""
+        self.log_operation("維護交易分區", {"months_ahead": months_ahead, "keep_months": keep_months})
+
+        params = {"p_months_ahead": months_ahead, "p_keep_months": keep_months}
+
+        try:
+            result = self.rpc_call("maintain_transaction_partitions", params)
+            row = result[0] if result else {}
+            summary = {
+                "created_count": row.get("created_count", 0),
+                "archived_partitions": row.get("archived_partitions") or []
+            }
+            self.logger.info(f"交易分區維護完成: 新建 {summary['created_count']} 個，"
+                             f"歸檔 {len(summary['archived_partitions'])} 個")
+            return summary
+        except Exception as e:
+            self.logger.error(f"維護交易分區失敗: {e}")
+            raise self.handle_service_error("維護交易分區", e, params)
+
+    def maintain_audit_log(self, months_ahead: int = 3,
+                           keep_months: Optional[int] = None) -> Dict[str, Any]:
+        """排空審計 staging 並預建審計月度分區；指定 keep_months 時歸檔更早的分區"""
+        self.log_operation("維護審計日誌", {"months_ahead": months_ahead, "keep_months": keep_months})
+
+        params = {"p_months_ahead": months_ahead, "p_keep_months": keep_months}
+
+        try:
+            result = self.rpc_call("maintain_audit_log", params)
+            row = result[0] if result else {}
+            summary = {
+                "drained_count": row.get("drained_count", 0),
+                "created_count": row.get("created_count", 0),
+                "archived_partitions": row.get("archived_partitions") or []
+            }
+            self.logger.info(f"審計日誌維護完成: 排空 {summary['drained_count']} 條，"
+                             f"新建分區 {summary['created_count']} 個，"
+                             f"歸檔 {len(summary['archived_partitions'])} 個")
+            return summary
+        except Exception as e:
+            self.logger.error(f"維護審計日誌失敗: {e}")
+            raise self.handle_service_error("維護審計日誌", e, params)
+
+    def generate_all_settlements(self, mode: str, period_start: Optional[str] = None,
+                                 period_end: Optional[str] = None,
+                                 progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """為全部商戶批量生成結算（分批提交，返回數量與吞吐量）"""
+        self.require_role('admin')
+        
+        from services.settlement_service import SettlementService
+        settlement_service = SettlementService()
+        settlement_service.set_auth_service(self.auth_service)
+        
+        return settlement_service.generate_all(mode, period_start, period_end,
+                                               progress_callback=progress_callback)
+
     # 新增的系統管理擴展功能
     def get_system_statistics_extended(self) -> Dict[str, Any]:
         """獲取擴展系統統計信息"""
@@ -514,6 +588,7 @@ class AdminService(BaseService):
             self.logger.error(f"通過卡號獲取卡片失敗: {card_no}, 錯誤: {e}")
             return None
     
+    @invalidates_cache("card_no:{card_no}")
     def toggle_card_status_by_card_no(self, card_no: str, new_status: str) -> bool:
         """通過卡號切換卡片狀態
         
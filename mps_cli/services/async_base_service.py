@@ -0,0 +1,112 @@
+import asyncio
+import time
+from abc import ABC
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+from config.async_supabase_client import async_supabase_client
+from utils.error_handler import error_handler
+from utils.logger import get_logger, lazy_repr, result_size
+from utils.metrics import metrics_registry
+
+class AsyncBaseService(ABC):
+    """異步基礎服務類（與 BaseService 相同的參數注入與錯誤映射）"""
+    
+    def __init__(self, client=None):
+        self.client = client or async_supabase_client
+        self.logger = get_logger(self.__class__.__name__)
+        self.error_handler = error_handler
+        self.auth_service = None
+    
+    async def rpc_call(self, function_name: str, params: Dict[str, Any]) -> Any:
+        """安全的異步 RPC 調用"""
+        started = time.perf_counter()
+        try:
+            # 如果有 session_id，自動添加到參數中
+            if (self.auth_service and
+                getattr(self.auth_service, 'session_id', None) and
+                'p_session_id' not in params):
+                params['p_session_id'] = self.auth_service.session_id
+            
+            self.logger.debug("調用 RPC: %s, 參數: %s", function_name, lazy_repr(params),
+                              extra={"rpc": function_name, "sample": True})
+            
+            result = await self.client.rpc(function_name, params)
+            duration_ms = (time.perf_counter() - started) * 1000
+            rows = result_size(result)
+            metrics_registry.observe("rpc", function_name, getattr(self.auth_service, "current_role", None),
+                                     duration_ms, rows)
+            
+            self.logger.info("RPC 調用成功: %s (%.1f ms)", function_name, duration_ms,
+                             extra={"rpc": function_name, "duration_ms": round(duration_ms, 2), "rows": rows})
+            self.logger.debug("RPC 結果: %s", lazy_repr(result),
+                              extra={"rpc": function_name, "sample": True})
+            return result
+            
+        except Exception as e:
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics_registry.observe("rpc", function_name, getattr(self.auth_service, "current_role", None),
+                                     duration_ms, error=e)
+            self.logger.error("RPC 調用失敗: %s, 錯誤: %s", function_name, e,
+                              extra={"rpc": function_name, "duration_ms": round(duration_ms, 2)})
+            raise self.error_handler.handle_rpc_error(e)
+    
+    async def query_table(self, table: str, filters: Optional[Dict] = None,
+                          limit: Optional[int] = None, offset: Optional[int] = None,
+                          order_by: Optional[str] = None, ascending: bool = True) -> List[Dict]:
+        """異步查詢表格數據"""
+        started = time.perf_counter()
+        try:
+            self.logger.debug(f"查詢表格: {table}, 過濾條件: {filters}")
+            
+            query = (await self.client.query(table)).select("*")
+            
+            if filters:
+                for key, value in filters.items():
+                    query = query.eq(key, value)
+            
+            if order_by:
+                query = query.order(order_by, desc=not ascending)
+            
+            if limit:
+                query = query.limit(limit)
+            
+            if offset:
+                query = query.offset(offset)
+            
+            result = await self.client.execute(query)
+            data = getattr(result, "data", [])
+            metrics_registry.observe("query", table, getattr(self.auth_service, "current_role", None),
+                                     (time.perf_counter() - started) * 1000, len(data))
+            
+            self.logger.debug(f"查詢成功: {table}, 返回 {len(data)} 條記錄")
+            return data
+            
+        except Exception as e:
+            metrics_registry.observe("query", table, getattr(self.auth_service, "current_role", None),
+                                     (time.perf_counter() - started) * 1000, error=e)
+            self.logger.error(f"查詢失敗: {table}, 錯誤: {e}")
+            raise self.error_handler.handle_query_error(e)
+    
+    async def gather(self, calls: Iterable[Awaitable], return_exceptions: bool = True) -> List[Any]:
+        """並發執行多個調用；並發數由客戶端信號量限制"""
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+    
+    def log_operation(self, operation: str, details: Dict[str, Any] = None):
+        """記錄操作"""
+        message = f"執行操作: {operation}"
+        if details:
+            message += f" - 詳情: {details}"
+        self.logger.info(message)
+    
+    def handle_service_error(self, operation: str, error: Exception,
+                           context: Dict[str, Any] = None) -> Exception:
+        """處理服務錯誤"""
+        self.logger.error(f"服務操作失敗: {operation}, 錯誤: {error}")
+        
+        if context:
+            return Exception(self.error_handler.handle_with_context(error, context))
+        else:
+            return self.error_handler.handle_rpc_error(error)
+    
+    def set_auth_service(self, auth_service):
+        """設定認證服務"""
+        self.auth_service = auth_service
@@ -0,0 +1,52 @@
+from typing import Any, Dict, List, Optional
+from .async_base_service import AsyncBaseService
+from .member_service import MemberService
+from models.member import Member
+from models.card import Card
+
+class AsyncMemberService(AsyncBaseService):
+    """異步會員服務（請求參數與返回映射沿用 MemberService）"""
+    
+    async def get_member_by_id(self, member_id: str) -> Optional[Member]:
+        """根據 ID 獲取會員"""
+        try:
+            members = await self.query_table("member_profiles", {"id": member_id})
+            return Member.from_dict(members[0]) if members else None
+                
+        except Exception as e:
+            self.logger.error(f"獲取會員失敗: {member_id}, 錯誤: {e}")
+            return None
+    
+    async def get_member_cards(self, member_id: str) -> List[Card]:
+        """獲取會員的所有卡片（擁有的與綁定的，單次 RPC，附帶 binding_role）"""
+        try:
+            result = await self.rpc_call("get_member_cards", {"p_member_id": member_id}) or []
+            return Card.from_rows(result)
+            
+        except Exception as e:
+            self.logger.error(f"獲取會員卡片失敗: {member_id}, 錯誤: {e}")
+            return []
+    
+    async def get_member_transactions(self, member_id: str, limit: int = 20,
+                                      offset: int = 0) -> Dict[str, Any]:
+        """獲取會員交易記錄"""
+        try:
+            result = await self.rpc_call("get_member_transactions",
+                                         MemberService.transactions_params(member_id, limit, offset))
+            return MemberService.transaction_page(result, limit, offset)
+                
+        except Exception as e:
+            self.logger.error(f"獲取會員交易失敗: {member_id}, 錯誤: {e}")
+            raise self.handle_service_error("查詢會員交易", e, {"member_id": member_id})
+
+    async def get_member_transactions_page(self, member_id: str, limit: int = 20,
+                                           cursor: Optional[str] = None) -> Dict[str, Any]:
+        """游標分頁獲取會員交易記錄"""
+        try:
+            result = await self.rpc_call("get_member_transactions_page",
+                                         MemberService.transactions_page_params(member_id, limit, cursor))
+            return MemberService.transaction_cursor_page(result)
+
+        except Exception as e:
+            self.logger.error(f"游標查詢會員交易失敗: {member_id}, 錯誤: {e}")
+            raise self.handle_service_error("游標查詢會員交易", e, {"member_id": member_id})
@@ -0,0 +1,46 @@
+from typing import Any, Dict, Optional
+from .async_base_service import AsyncBaseService
+from .merchant_service import MerchantService
+from models.transaction import Merchant
+
+class AsyncMerchantService(AsyncBaseService):
+    """異步商戶服務（請求參數與返回映射沿用 MerchantService）"""
+    
+    async def get_merchant_by_code(self, merchant_code: str) -> Optional[Merchant]:
+        """根據商戶代碼獲取商戶"""
+        try:
+            merchants = await self.query_table("merchants", {"code": merchant_code})
+            return Merchant.from_dict(merchants[0]) if merchants else None
+                
+        except Exception as e:
+            self.logger.error(f"獲取商戶失敗: {merchant_code}, 錯誤: {e}")
+            return None
+    
+    async def get_merchant_transactions(self, merchant_id: str, limit: int = 20,
+                                        offset: int = 0, start_date: Optional[str] = None,
+                                        end_date: Optional[str] = None) -> Dict[str, Any]:
+        """獲取商戶交易記錄"""
+        params = MerchantService.transactions_params(merchant_id, limit, offset, start_date, end_date)
+        
+        try:
+            result = await self.rpc_call("get_merchant_transactions", params)
+            return MerchantService.transaction_page(result, limit, offset)
+                
+        except Exception as e:
+            self.logger.error(f"獲取商戶交易失敗: {merchant_id}, 錯誤: {e}")
+            raise self.handle_service_error("查詢商戶交易", e, {"merchant_id": merchant_id})
+
+    async def get_merchant_transactions_page(self, merchant_id: str, limit: int = 20,
+                                             cursor: Optional[str] = None,
+                                             start_date: Optional[str] = None,
+                                             end_date: Optional[str] = None) -> Dict[str, Any]:
+        """游標分頁獲取商戶交易記錄"""
+        params = MerchantService.transactions_page_params(merchant_id, limit, cursor, start_date, end_date)
+
+        try:
+            result = await self.rpc_call("get_merchant_transactions_page", params)
+            return MerchantService.transaction_cursor_page(result)
+
+        except Exception as e:
+            self.logger.error(f"游標查詢商戶交易失敗: {merchant_id}, 錯誤: {e}")
+            raise self.handle_service_error("游標查詢商戶交易", e, {"merchant_id": merchant_id})
@@ -0,0 +1,96 @@
+from typing import Dict, Optional
+from decimal import Decimal
+from .async_base_service import AsyncBaseService
+from .payment_service import PaymentService
+from models.transaction import Transaction
+
+class AsyncPaymentService(AsyncBaseService):
+    """異步支付服務（批量終端 / 批處理場景；請求參數與返回映射沿用 PaymentService）"""
+    
+    async def charge_by_qr(self, merchant_code: str, qr_plain: str, amount: Decimal,
+                           tag: Optional[Dict] = None, external_order_id: Optional[str] = None,
+                           idempotency_key: Optional[str] = None) -> Dict:
+        """掃碼支付"""
+        self.log_operation("掃碼支付", {
+            "merchant_code": merchant_code,
+            "amount": float(amount),
+            "has_external_order": bool(external_order_id)
+        })
+        
+        params = PaymentService.charge_params(merchant_code, qr_plain, amount, tag,
+                                              external_order_id, idempotency_key)
+        
+        try:
+            payment = PaymentService.charge_result(await self.rpc_call("merchant_charge_by_qr", params), amount)
+            self.logger.info(f"掃碼支付成功: {payment['tx_no']}")
+            return payment
+                
+        except Exception as e:
+            self.logger.error(f"掃碼支付失敗: {e}")
+            raise self.handle_service_error("掃碼支付", e, {
+                "merchant_code": merchant_code,
+                "amount": float(amount)
+            })
+    
+    async def refund_transaction(self, merchant_code: str, original_tx_no: str,
+                                 refund_amount: Decimal, reason: Optional[str] = None) -> Dict:
+        """退款交易"""
+        self.log_operation("退款交易", {
+            "merchant_code": merchant_code,
+            "original_tx_no": original_tx_no,
+            "refund_amount": float(refund_amount)
+        })
+        
+        params = PaymentService.refund_params(merchant_code, original_tx_no, refund_amount, reason)
+        
+        try:
+            refund = PaymentService.refund_result(await self.rpc_call("merchant_refund_tx", params),
+                                                  original_tx_no)
+            self.logger.info(f"退款成功: {refund['refund_tx_no']}")
+            return refund
+                
+        except Exception as e:
+            self.logger.error(f"退款失敗: {e}")
+            raise self.handle_service_error("退款交易", e, {
+                "merchant_code": merchant_code,
+                "original_tx_no": original_tx_no,
+                "refund_amount": float(refund_amount)
+            })
+    
+    async def recharge_card(self, card_id: str, amount: Decimal, payment_method: str = "wechat",
+                            tag: Optional[Dict] = None, external_order_id: Optional[str] = None) -> Dict:
+        """充值卡片"""
+        self.log_operation("充值卡片", {
+            "card_id": card_id,
+            "amount": float(amount),
+            "payment_method": payment_method
+        })
+        
+        params = PaymentService.recharge_params(card_id, amount, payment_method, tag, external_order_id)
+        
+        try:
+            recharge = PaymentService.recharge_result(await self.rpc_call("user_recharge_card", params),
+                                                      payment_method)
+            self.logger.info(f"充值成功: {recharge['tx_no']}")
+            return recharge
+                
+        except Exception as e:
+            self.logger.error(f"充值失敗: {e}")
+            raise self.handle_service_error("充值卡片", e, {
+                "card_id": card_id,
+                "amount": float(amount)
+            })
+    
+    async def get_transaction_detail(self, tx_no: str) -> Optional[Transaction]:
+        """獲取交易詳情"""
+        try:
+            transaction = PaymentService.transaction_from_result(
+                await self.rpc_call("get_transaction_detail", {"p_tx_no": tx_no})
+            )
+            if not transaction:
+                self.logger.warning(f"交易不存在: {tx_no}")
+            return transaction
+                
+        except Exception as e:
+            self.logger.error(f"獲取交易詳情失敗: {tx_no}, 錯誤: {e}")
+            raise self.handle_service_error("查詢交易詳情", e, {"tx_no": tx_no})
@@ -0,0 +1,50 @@
+from typing import Dict
+from .async_base_service import AsyncBaseService
+from .qr_service import QRService
+from utils.validators import Validator
+
+class AsyncQRService(AsyncBaseService):
+    """異步 QR 碼服務（請求參數與返回映射沿用 QRService）"""
+    
+    async def rotate_qr(self, card_id: str, ttl_seconds: int = 900) -> Dict:
+        """生成/刷新 QR 碼"""
+        self.log_operation("生成 QR 碼", {"card_id": card_id, "ttl": ttl_seconds})
+        
+        try:
+            result = await self.rpc_call("rotate_card_qr", QRService.rotate_params(card_id, ttl_seconds))
+            return QRService.rotate_result(result, card_id)
+                
+        except Exception as e:
+            self.logger.error(f"QR 碼生成失敗: {card_id}, 錯誤: {e}")
+            raise self.handle_service_error("生成 QR 碼", e, {"card_id": card_id})
+    
+    async def validate_qr(self, qr_plain: str) -> str:
+        """驗證 QR 碼並返回卡片 ID"""
+        if not Validator.validate_qr_code(qr_plain):
+            raise Exception("QR 碼格式不正確")
+        
+        qr_plain = qr_plain.strip()
+        
+        try:
+            card_id = await self.rpc_call("validate_qr_plain", {"p_qr_plain": qr_plain})
+            
+            if card_id:
+                return card_id
+            else:
+                raise Exception("QR 碼驗證失敗")
+                
+        except Exception as e:
+            self.logger.error(f"QR 碼驗證失敗: {e}")
+            raise self.handle_service_error("驗證 QR 碼", e, {"qr_lookup": qr_plain.split(".")[0]})
+    
+    async def revoke_qr(self, card_id: str) -> bool:
+        """撤銷 QR 碼"""
+        self.log_operation("撤銷 QR 碼", {"card_id": card_id})
+        
+        try:
+            result = await self.rpc_call("revoke_card_qr", {"p_card_id": card_id})
+            return bool(result)
+                
+        except Exception as e:
+            self.logger.error(f"QR 碼撤銷失敗: {card_id}, 錯誤: {e}")
+            raise self.handle_service_error("撤銷 QR 碼", e, {"card_id": card_id})
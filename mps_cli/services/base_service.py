@@ -1,8 +1,16 @@
+import functools
+import inspect
+import threading
+import time
 from abc import ABC
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from config.settings import settings
 from config.supabase_client import supabase_client
+from models.transaction import Transaction
 from utils.error_handler import error_handler
-from utils.logger import get_logger
+from utils.logger import get_logger, lazy_repr, result_size
+from utils.metrics import metrics_registry
 
 class BaseService(ABC):
     """基礎服務類"""
@@ -15,6 +23,7 @@ class BaseService(ABC):
     
     def rpc_call(self, function_name: str, params: Dict[str, Any]) -> Any:
         """安全的 RPC 調用"""
+        started = time.perf_counter()
         try:
             # 如果有 session_id，自動添加到參數中
             if (self.auth_service and
@@ -23,17 +32,23 @@ class BaseService(ABC):
                 'p_session_id' not in params):
                 params['p_session_id'] = self.auth_service.session_id
             
-            self.logger.info(f"調用 RPC: {function_name}")
-            self.logger.debug(f"RPC 參數: {params}")
+            self.logger.debug("調用 RPC: %s, 參數: %s", function_name, lazy_repr(params),
+                              extra={"rpc": function_name, "sample": True})
             
             # 特別調試 get_user_profile
             if function_name == "get_user_profile":
                 self.logger.debug(f"[DEBUG] 調用 get_user_profile，當前 auth.uid() 應該存在")
             
             result = self.client.rpc(function_name, params)
+            duration_ms = (time.perf_counter() - started) * 1000
+            rows = result_size(result)
+            metrics_registry.observe("rpc", function_name, self._metrics_role(), duration_ms, rows)
             
-            self.logger.info(f"RPC 調用成功: {function_name}")
-            self.logger.debug(f"RPC 結果: {result}")
+            # 參數 / 結果按需格式化（DEBUG 關閉時不會生成 repr），大結果集只輸出摘要
+            self.logger.info("RPC 調用成功: %s (%.1f ms)", function_name, duration_ms,
+                             extra={"rpc": function_name, "duration_ms": round(duration_ms, 2), "rows": rows})
+            self.logger.debug("RPC 結果: %s", lazy_repr(result),
+                              extra={"rpc": function_name, "sample": True})
             
             # 特別調試 get_user_profile 的返回值
             if function_name == "get_user_profile":
@@ -49,13 +64,17 @@ class BaseService(ABC):
             return result
             
         except Exception as e:
-            self.logger.error(f"RPC 調用失敗: {function_name}, 錯誤: {e}")
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics_registry.observe("rpc", function_name, self._metrics_role(), duration_ms, error=e)
+            self.logger.error("RPC 調用失敗: %s, 錯誤: %s", function_name, e,
+                              extra={"rpc": function_name, "duration_ms": round(duration_ms, 2)})
             raise self.error_handler.handle_rpc_error(e)
     
     def query_table(self, table: str, filters: Optional[Dict] = None,
                    limit: Optional[int] = None, offset: Optional[int] = None,
                    order_by: Optional[str] = None, ascending: bool = True) -> List[Dict]:
         """查詢表格數據"""
+        started = time.perf_counter()
         try:
             # 直接使用表名（public schema）
             self.logger.debug(f"查詢表格: {table}, 過濾條件: {filters}")
@@ -80,11 +99,15 @@ class BaseService(ABC):
             
             result = query.execute()
             data = getattr(result, "data", [])
+            metrics_registry.observe("query", table, self._metrics_role(),
+                                     (time.perf_counter() - started) * 1000, len(data))
             
-            self.logger.debug(f"查詢成功: {table}, 返回 {len(data)} 條記錄")
+            self.logger.debug("查詢成功: %s, 返回 %d 條記錄", table, len(data))
             return data
             
         except Exception as e:
+            metrics_registry.observe("query", table, self._metrics_role(),
+                                     (time.perf_counter() - started) * 1000, error=e)
             self.logger.error(f"查詢失敗: {table}, 錯誤: {e}")
             raise self.error_handler.handle_query_error(e)
     
@@ -136,6 +159,7 @@ class BaseService(ABC):
     
     def count_records(self, table: str, filters: Optional[Dict] = None) -> int:
         """統計記錄數量"""
+        started = time.perf_counter()
         try:
             query = self.client.query(table).select("id", count="exact")
             
@@ -144,9 +168,13 @@ class BaseService(ABC):
                     query = query.eq(key, value)
             
             result = query.execute()
+            metrics_registry.observe("count", table, self._metrics_role(),
+                                     (time.perf_counter() - started) * 1000)
             return getattr(result, "count", 0) or 0
             
         except Exception as e:
+            metrics_registry.observe("count", table, self._metrics_role(),
+                                     (time.perf_counter() - started) * 1000, error=e)
             self.logger.error(f"統計失敗: {table}, 錯誤: {e}")
             return 0
     
@@ -198,6 +226,10 @@ class BaseService(ABC):
         else:
             return self.error_handler.handle_rpc_error(error)
     
+    def _metrics_role(self) -> Optional[str]:
+        """指標按當前登入角色分組"""
+        return getattr(self.auth_service, "current_role", None)
+    
     def set_auth_service(self, auth_service):
         """設定認證服務"""
         self.auth_service = auth_service
@@ -227,6 +259,38 @@ class BaseService(ABC):
         
         return None
 
+    @staticmethod
+    def transaction_page(result: Optional[List[Dict]], limit: int, offset: int) -> Dict[str, Any]:
+        """offset 分頁交易 RPC 的返回行 → data + pagination（同步 / 異步服務共用）"""
+        result = result or []
+        total_count = result[0].get('total_count', 0) if result else 0
+        total_pages = (total_count + limit - 1) // limit
+        current_page = offset // limit if result else 0
+
+        return {
+            "data": Transaction.from_rows(result),
+            "pagination": {
+                "current_page": current_page,
+                "page_size": limit,
+                "total_count": total_count,
+                "total_pages": total_pages,
+                "has_next": current_page < total_pages - 1,
+                "has_prev": current_page > 0
+            }
+        }
+
+    @staticmethod
+    def transaction_cursor_page(result: Optional[List[Dict]]) -> Dict[str, Any]:
+        """游標分頁交易 RPC 的返回行 → data + next_cursor（同步 / 異步服務共用）"""
+        result = result or []
+        next_cursor = result[-1].get("next_cursor") if result else None
+
+        return {
+            "data": Transaction.from_rows(result),
+            "next_cursor": next_cursor,
+            "has_next": next_cursor is not None
+        }
+
 class QueryService(BaseService):
     """查詢服務基類"""
     
@@ -286,52 +350,176 @@ class QueryService(BaseService):
             return []
 
 class CacheService:
-    """緩存服務"""
+    """有界緩存（TTL + LRU）
+
+    - get 只返回未過期的值，命中的條目移到 LRU 隊尾
+    - 條目數超過 max_entries 時淘汰最久未使用的條目
+    - 條目可帶標籤（如 "card:<id>"），寫操作按標籤批量失效
+    """
     
-    def __init__(self):
-        self._cache = {}
+    def __init__(self, max_entries: Optional[int] = None, default_ttl: Optional[int] = None):
+        self._cache: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.max_entries = max_entries or settings.cache.max_entries
+        self.default_ttl = default_ttl or settings.cache.default_ttl
         self.logger = get_logger(self.__class__.__name__)
+        self._reset_counters()
     
-    def get(self, key: str) -> Any:
-        """獲取緩存"""
-        return self._cache.get(key)
+    def _reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def _remove(self, key: str):
+        """移除條目並清理標籤索引（調用方持有鎖）"""
+        _, _, tags = self._cache.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """獲取緩存值，不存在或已過期時返回 default"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            if time.monotonic() >= entry[0]:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
     
-    def set(self, key: str, value: Any, ttl: int = 300):
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Iterable[str] = ()):
         """設置緩存"""
-        import time
-        self._cache[key] = {
-            "value": value,
-            "expires_at": time.time() + ttl
-        }
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        tags = tuple(tags)
+        
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+            
+            self._cache[key] = (expires_at, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            
+            while len(self._cache) > self.max_entries:
+                oldest = next(iter(self._cache))
+                self._remove(oldest)
+                self.evictions += 1
     
-    def is_expired(self, key: str) -> bool:
-        """檢查是否過期"""
-        import time
-        if key not in self._cache:
-            return True
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None,
+                    tags: Union[Iterable[str], Callable[[Any], Iterable[str]]] = ()) -> Any:
+        """命中則返回緩存，否則調用 loader 並緩存結果（None 不緩存）
+
+        tags 可以是可調用對象，按加載結果生成標籤（如按返回對象的 id）
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
         
-        return time.time() > self._cache[key]["expires_at"]
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl, tags(value) if callable(tags) else tags)
+        return value
+    
+    def invalidate(self, *keys: str) -> int:
+        """按鍵失效，返回實際移除數量"""
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+    
+    def invalidate_tag(self, *tags: str) -> int:
+        """按標籤失效，返回實際移除數量"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+        if removed:
+            self.logger.debug(f"緩存失效: {tags}, 移除 {removed} 條")
+        return removed
+    
+    def is_expired(self, key: str) -> bool:
+        """檢查是否過期（不存在視為過期）"""
+        with self._lock:
+            entry = self._cache.get(key)
+            return entry is None or time.monotonic() >= entry[0]
     
     def clear_expired(self):
         """清理過期緩存"""
-        import time
-        current_time = time.time()
-        
-        expired_keys = [
-            key for key, data in self._cache.items()
-            if current_time > data["expires_at"]
-        ]
-        
-        for key in expired_keys:
-            del self._cache[key]
+        now = time.monotonic()
+        with self._lock:
+            expired_keys = [key for key, entry in self._cache.items() if now >= entry[0]]
+            for key in expired_keys:
+                self._remove(key)
+            self.expirations += len(expired_keys)
         
         if expired_keys:
             self.logger.debug(f"清理了 {len(expired_keys)} 個過期緩存")
     
     def clear_all(self):
         """清理所有緩存"""
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
+            self._tags.clear()
         self.logger.debug("清理了所有緩存")
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回緩存統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
 
 # 全局緩存服務實例
-cache_service = CacheService()
\ No newline at end of file
+cache_service = CacheService()
+
+
+def invalidates_cache(*tag_templates: str):
+    """寫操作裝飾器：調用結束後（無論成功與否）按參數失效相關緩存標籤
+
+    例如 @invalidates_cache("card:{card_id}") 會在 freeze_card(card_id=...) 後
+    失效所有帶 "card:<card_id>" 標籤的條目
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                cache_service.invalidate_tag(*(t.format(**bound.arguments) for t in tag_templates))
+        
+        return wrapper
+    return decorator
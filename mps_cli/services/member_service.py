@@ -1,13 +1,17 @@
-from typing import List, Optional, Dict, Any
-from .base_service import BaseService, QueryService
+from typing import List, Optional, Dict, Any, Tuple
+from config.settings import settings
+from .base_service import BaseService, QueryService, cache_service, invalidates_cache
 from models.member import Member
 from models.card import Card, CardBinding
-from models.transaction import Transaction
+from models.level import LevelTable
 from utils.identifier_resolver import IdentifierResolver
+from config.constants import MEMBERSHIP_LEVELS
 
 class MemberService(QueryService):
     """會員服務"""
     
+    _level_table: Optional[Tuple[Dict[int, Dict[str, Any]], LevelTable]] = None
+    
     def create_member(self, name: str, phone: str, email: str,
                      password: Optional[str] = None,
                      binding_user_org: Optional[str] = None,
@@ -83,26 +87,11 @@ class MemberService(QueryService):
             return None
     
     def get_member_cards(self, member_id: str) -> List[Card]:
-        """獲取會員的所有卡片"""
+        """獲取會員的所有卡片（擁有的與綁定的，單次 RPC，附帶 binding_role）"""
         try:
-            # 查詢會員擁有的卡片
-            owned_cards = self.query_table("member_cards", {"owner_member_id": member_id})
-            
-            # 查詢會員綁定的共享卡片
-            bindings = self.query_table("card_bindings", {"member_id": member_id})
-            shared_card_ids = [b["card_id"] for b in bindings]
-            
-            shared_cards = []
-            for card_id in shared_card_ids:
-                cards = self.query_table("member_cards", {"id": card_id})
-                if cards:
-                    shared_cards.extend(cards)
+            result = self.rpc_call("get_member_cards", {"p_member_id": member_id}) or []
             
-            # 合併並去重
-            all_cards_data = owned_cards + shared_cards
-            unique_cards = {card["id"]: card for card in all_cards_data}.values()
-            
-            cards = [Card.from_dict(card_data) for card_data in unique_cards]
+            cards = Card.from_rows(result)
             
             self.logger.debug(f"獲取會員卡片成功: {member_id}, 共 {len(cards)} 張")
             return cards
@@ -111,6 +100,25 @@ class MemberService(QueryService):
             self.logger.error(f"獲取會員卡片失敗: {member_id}, 錯誤: {e}")
             return []
     
+    @staticmethod
+    def transactions_params(member_id: str, limit: int, offset: int) -> Dict[str, Any]:
+        """get_member_transactions 請求參數（同步 / 異步服務共用）"""
+        return {
+            "p_member_id": member_id,
+            "p_limit": limit,
+            "p_offset": offset
+        }
+
+    @staticmethod
+    def transactions_page_params(member_id: str, limit: int,
+                                 cursor: Optional[str]) -> Dict[str, Any]:
+        """get_member_transactions_page 請求參數（同步 / 異步服務共用）"""
+        return {
+            "p_member_id": member_id,
+            "p_limit": limit,
+            "p_cursor": cursor
+        }
+
     def get_member_transactions(self, member_id: str, limit: int = 20, 
                               offset: int = 0) -> Dict[str, Any]:
         """獲取會員交易記錄"""
@@ -120,53 +128,50 @@ class MemberService(QueryService):
             "offset": offset
         })
         
-        params = {
-            "p_member_id": member_id,
-            "p_limit": limit,
-            "p_offset": offset
-        }
-        
         try:
-            result = self.rpc_call("get_member_transactions", params)
+            result = self.rpc_call("get_member_transactions",
+                                   self.transactions_params(member_id, limit, offset))
+            page = self.transaction_page(result, limit, offset)
             
-            if result:
-                # 計算分頁信息
-                total_count = result[0].get('total_count', 0) if result else 0
-                total_pages = (total_count + limit - 1) // limit
-                current_page = offset // limit
-                
-                transactions = [Transaction.from_dict(tx) for tx in result]
-                
-                self.logger.info(f"獲取會員交易成功: {member_id}, 返回 {len(transactions)} 筆")
-                
-                return {
-                    "data": transactions,
-                    "pagination": {
-                        "current_page": current_page,
-                        "page_size": limit,
-                        "total_count": total_count,
-                        "total_pages": total_pages,
-                        "has_next": current_page < total_pages - 1,
-                        "has_prev": current_page > 0
-                    }
-                }
-            else:
-                return {
-                    "data": [],
-                    "pagination": {
-                        "current_page": 0,
-                        "page_size": limit,
-                        "total_count": 0,
-                        "total_pages": 0,
-                        "has_next": False,
-                        "has_prev": False
-                    }
-                }
+            self.logger.info(f"獲取會員交易成功: {member_id}, 返回 {len(page['data'])} 筆")
+            return page
                 
         except Exception as e:
             self.logger.error(f"獲取會員交易失敗: {member_id}, 錯誤: {e}")
             raise self.handle_service_error("查詢會員交易", e, {"member_id": member_id})
+
+    def get_member_transactions_page(self, member_id: str, limit: int = 20,
+                                     cursor: Optional[str] = None) -> Dict[str, Any]:
+        """游標分頁獲取會員交易記錄（不計算總數，next_cursor 為 None 表示最後一頁）"""
+        self.log_operation("游標查詢會員交易", {
+            "member_id": member_id,
+            "limit": limit,
+            "has_cursor": cursor is not None
+        })
+
+        try:
+            result = self.rpc_call("get_member_transactions_page",
+                                   self.transactions_page_params(member_id, limit, cursor))
+            return self.transaction_cursor_page(result)
+
+        except Exception as e:
+            self.logger.error(f"游標查詢會員交易失敗: {member_id}, 錯誤: {e}")
+            raise self.handle_service_error("游標查詢會員交易", e, {"member_id": member_id})
+
+    def get_member_transaction_count(self, member_id: str) -> int:
+        """會員交易總數（緩存，不隨翻頁重算）"""
+        try:
+            return cache_service.get_or_load(
+                f"tx_count:member:{member_id}",
+                lambda: int(self.rpc_call("get_member_transaction_count", {"p_member_id": member_id}) or 0),
+                ttl=settings.ui.tx_count_cache_ttl
+            )
+
+        except Exception as e:
+            self.logger.error(f"獲取會員交易總數失敗: {member_id}, 錯誤: {e}")
+            raise self.handle_service_error("獲取會員交易總數", e, {"member_id": member_id})
     
+    @invalidates_cache("card:{card_id}")
     def bind_card(self, card_id: str, member_id: str, role: str = "member",
                  binding_password: Optional[str] = None) -> bool:
         """綁定卡片到會員"""
@@ -199,6 +204,7 @@ class MemberService(QueryService):
                 "member_id": member_id
             })
     
+    @invalidates_cache("card:{card_id}")
     def unbind_card(self, card_id: str, member_id: str) -> bool:
         """解綁會員卡片"""
         self.log_operation("解綁卡片", {"card_id": card_id, "member_id": member_id})
@@ -228,7 +234,7 @@ class MemberService(QueryService):
         """獲取卡片綁定信息"""
         try:
             bindings_data = self.query_table("card_bindings", {"card_id": card_id})
-            bindings = [CardBinding.from_dict(binding) for binding in bindings_data]
+            bindings = CardBinding.from_rows(bindings_data)
             
             self.logger.debug(f"獲取卡片綁定成功: {card_id}, 共 {len(bindings)} 個綁定")
             return bindings
@@ -254,14 +260,16 @@ class MemberService(QueryService):
                 "limit": limit
             })
             
-            # 直接調用 RPC 函數
+            # 完整會員號 / 手機號 / 郵箱只走唯一索引精確查找；其他關鍵字由服務端模糊匹配並按相關度排序
             result = self.rpc_call("search_members", {
                 "p_keyword": keyword,
-                "p_limit": limit
+                "p_limit": limit,
+                "p_exact_only": IdentifierResolver.is_exact_search(
+                    keyword, IdentifierResolver.MEMBER_EXACT_TYPES)
             })
             
             if result:
-                members = [Member.from_dict(member_data) for member_data in result]
+                members = Member.from_rows(result)
                 self.logger.debug(f"搜索會員成功: 關鍵字 '{keyword}', 返回 {len(members)} 個結果")
                 return members
             else:
@@ -301,6 +309,7 @@ class MemberService(QueryService):
             self.logger.error(f"獲取會員摘要失敗: {member_id}, 錯誤: {e}")
             return {}
     
+    @invalidates_cache("member:{member_id}")
     def update_member_info(self, member_id: str, updates: Dict[str, Any]) -> bool:
         """更新會員信息"""
         self.log_operation("更新會員信息", {"member_id": member_id, "updates": updates})
@@ -334,6 +343,44 @@ class MemberService(QueryService):
         """激活會員"""
         return self.update_member_info(member_id, {"status": "active"})
     
+    def get_membership_levels(self) -> Dict[int, Dict[str, Any]]:
+        """獲取會員等級表（參考數據，長時間緩存；讀取失敗時退回內置常量）"""
+        try:
+            return cache_service.get_or_load(
+                "membership_levels",
+                self._fetch_membership_levels,
+                ttl=settings.cache.reference_ttl,
+                tags=("membership_levels",)
+            ) or MEMBERSHIP_LEVELS
+            
+        except Exception as e:
+            self.logger.error(f"獲取會員等級表失敗: {e}")
+            return MEMBERSHIP_LEVELS
+    
+    def get_level_table(self) -> LevelTable:
+        """獲取會員等級查找表（跟隨等級表緩存，等級表未變時復用同一張表）"""
+        levels = self.get_membership_levels()
+        cached = self._level_table
+        if cached is None or cached[0] is not levels:
+            cached = (levels, LevelTable.from_mapping(levels))
+            MemberService._level_table = cached
+        return cached[1]
+    
+    def _fetch_membership_levels(self) -> Optional[Dict[int, Dict[str, Any]]]:
+        rows = self.query_table("membership_levels", {"is_active": True}, order_by="level")
+        if not rows:
+            return None
+        
+        return {
+            row["level"]: {
+                "name": row["name"],
+                "min_points": row["min_points"],
+                "max_points": row.get("max_points"),
+                "discount": float(row["discount"])
+            }
+            for row in rows
+        }
+    
     def get_member_external_identities(self, member_id: str) -> List[Dict]:
         """獲取會員外部身份"""
         try:
@@ -446,7 +493,7 @@ class MemberService(QueryService):
                 total_pages = (total_count + limit - 1) // limit
                 current_page = offset // limit
                 
-                members = [Member.from_dict(member) for member in result]
+                members = Member.from_rows(result)
                 
                 self.logger.info(f"獲取所有會員成功，返回 {len(members)} 個會員")
                 
@@ -508,7 +555,7 @@ class MemberService(QueryService):
             result = self.rpc_call("search_members_advanced", params)
             
             if result:
-                members = [Member.from_dict(member) for member in result]
+                members = Member.from_rows(result)
                 self.logger.info(f"高級會員搜尋成功，返回 {len(members)} 個會員")
                 return members
             else:
@@ -524,6 +571,7 @@ class MemberService(QueryService):
                 "status": status
             })
     
+    @invalidates_cache("member:{member_id}")
     def update_member_profile(self, member_id: str, name: Optional[str] = None,
                             phone: Optional[str] = None, email: Optional[str] = None) -> bool:
         """更新會員資料"""
@@ -564,6 +612,8 @@ class MemberService(QueryService):
     def get_member_by_identifier(self, identifier: str) -> Optional[Member]:
         """通過任意識別碼獲取會員
         
+        短時緩存：本進程的寫操作按標籤失效，其他進程的變更（如暫停會員）最多滯後 CACHE_STATUS_TTL 秒
+        
         支持的識別碼類型：
         - 會員號 (member_no)
         - 手機號 (phone)
@@ -585,24 +635,42 @@ class MemberService(QueryService):
                 "type": id_type
             })
             
-            # 如果是 UUID，使用原有方法
-            if id_type == 'uuid':
-                return self.get_member_by_id(identifier)
-            
-            # 使用新的 RPC 函數
-            result = self.rpc_call("get_member_by_identifier", {
-                "p_identifier": identifier
-            })
-            
-            if result:
-                return Member.from_dict(result)
-            return None
+            return cache_service.get_or_load(
+                f"member:ident:{identifier}",
+                lambda: self._fetch_member_by_identifier(identifier, id_type),
+                ttl=settings.cache.status_ttl,
+                tags=self._member_cache_tags
+            )
             
         except Exception as e:
             self.logger.error(f"通過識別碼獲取會員失敗: {identifier}, 錯誤: {e}")
             # 不拋出異常，返回 None
             return None
     
+    def _fetch_member_by_identifier(self, identifier: str, id_type: str) -> Optional[Member]:
+        # 如果是 UUID，使用原有方法
+        if id_type == 'uuid':
+            return self.get_member_by_id(identifier)
+        
+        # 使用新的 RPC 函數
+        result = self.rpc_call("get_member_by_identifier", {
+            "p_identifier": identifier
+        })
+        
+        if result:
+            return Member.from_dict(result)
+        return None
+    
+    @staticmethod
+    def _member_cache_tags(member: Member) -> List[str]:
+        """會員緩存標籤：按 id 或任一識別碼寫入時都能命中"""
+        tags = [f"member:{member.id}", f"member_ident:{member.id}"]
+        for identifier in (member.member_no, member.phone, member.email):
+            if identifier:
+                tags.append(f"member_ident:{identifier}")
+        return tags
+    
+    @invalidates_cache("member_ident:{identifier}")
     def update_member_by_identifier(self, identifier: str, name: str = None,
                                    phone: str = None, email: str = None) -> bool:
         """通過識別碼更新會員資料
@@ -688,6 +756,7 @@ class MemberService(QueryService):
                 "identifier": identifier
             })
     
+    @invalidates_cache("member_ident:{identifier}")
     def toggle_member_status_by_identifier(self, identifier: str, new_status: str) -> bool:
         """通過識別碼切換會員狀態
         
@@ -1,27 +1,38 @@
 from typing import List, Optional, Dict, Any
-from .base_service import BaseService
-from models.transaction import Merchant, Transaction
+from config.settings import settings
+from .base_service import BaseService, cache_service
+from models.transaction import Merchant
 
 class MerchantService(BaseService):
     """商戶服務"""
     
     def get_merchant_by_code(self, merchant_code: str) -> Optional[Merchant]:
-        """根據商戶代碼獲取商戶"""
+        """根據商戶代碼獲取商戶（短時緩存，本進程暫停商戶時失效）
+
+        其他進程暫停商戶不會觸發本進程失效，商戶狀態最多滯後 CACHE_STATUS_TTL 秒
+        """
         try:
-            merchants = self.query_table("merchants", {"code": merchant_code})
-            
-            if merchants:
-                merchant_data = merchants[0]
-                self.logger.debug(f"獲取商戶成功: {merchant_code}")
-                return Merchant.from_dict(merchant_data)
-            else:
-                self.logger.debug(f"商戶不存在: {merchant_code}")
-                return None
+            return cache_service.get_or_load(
+                f"merchant:code:{merchant_code}",
+                lambda: self._fetch_merchant_by_code(merchant_code),
+                ttl=settings.cache.status_ttl,
+                tags=lambda merchant: (f"merchant:{merchant.id}",)
+            )
                 
         except Exception as e:
             self.logger.error(f"獲取商戶失敗: {merchant_code}, 錯誤: {e}")
             return None
     
+    def _fetch_merchant_by_code(self, merchant_code: str) -> Optional[Merchant]:
+        merchants = self.query_table("merchants", {"code": merchant_code})
+        
+        if merchants:
+            self.logger.debug(f"獲取商戶成功: {merchant_code}")
+            return Merchant.from_dict(merchants[0])
+        
+        self.logger.debug(f"商戶不存在: {merchant_code}")
+        return None
+    
     def validate_merchant_login(self, merchant_code: str) -> Optional[Merchant]:
         """驗證商戶登入"""
         self.log_operation("商戶登入驗證", {"merchant_code": merchant_code})
@@ -44,6 +55,32 @@ class MerchantService(BaseService):
             self.logger.error(f"商戶登入驗證失敗: {merchant_code}, 錯誤: {e}")
             return None
     
+    @staticmethod
+    def transactions_params(merchant_id: str, limit: int, offset: int,
+                            start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> Dict[str, Any]:
+        """get_merchant_transactions 請求參數（同步 / 異步服務共用）"""
+        return {
+            "p_merchant_id": merchant_id,
+            "p_limit": limit,
+            "p_offset": offset,
+            "p_start_date": start_date,
+            "p_end_date": end_date
+        }
+
+    @staticmethod
+    def transactions_page_params(merchant_id: str, limit: int, cursor: Optional[str],
+                                 start_date: Optional[str] = None,
+                                 end_date: Optional[str] = None) -> Dict[str, Any]:
+        """get_merchant_transactions_page 請求參數（同步 / 異步服務共用）"""
+        return {
+            "p_merchant_id": merchant_id,
+            "p_limit": limit,
+            "p_cursor": cursor,
+            "p_start_date": start_date,
+            "p_end_date": end_date
+        }
+
     def get_merchant_transactions(self, merchant_id: str, limit: int = 20, 
                                 offset: int = 0, start_date: Optional[str] = None,
                                 end_date: Optional[str] = None) -> Dict[str, Any]:
@@ -55,55 +92,60 @@ class MerchantService(BaseService):
             "date_range": f"{start_date} ~ {end_date}" if start_date and end_date else None
         })
         
+        try:
+            result = self.rpc_call("get_merchant_transactions",
+                                   self.transactions_params(merchant_id, limit, offset, start_date, end_date))
+            page = self.transaction_page(result, limit, offset)
+            
+            self.logger.info(f"獲取商戶交易成功: {merchant_id}, 返回 {len(page['data'])} 筆")
+            return page
+                
+        except Exception as e:
+            self.logger.error(f"獲取商戶交易失敗: {merchant_id}, 錯誤: {e}")
+            raise self.handle_service_error("查詢商戶交易", e, {"merchant_id": merchant_id})
+
+    def get_merchant_transactions_page(self, merchant_id: str, limit: int = 20,
+                                       cursor: Optional[str] = None,
+                                       start_date: Optional[str] = None,
+                                       end_date: Optional[str] = None) -> Dict[str, Any]:
+        """游標分頁獲取商戶交易記錄（不計算總數，next_cursor 為 None 表示最後一頁）"""
+        self.log_operation("游標查詢商戶交易", {
+            "merchant_id": merchant_id,
+            "limit": limit,
+            "has_cursor": cursor is not None
+        })
+
+        try:
+            result = self.rpc_call("get_merchant_transactions_page",
+                                   self.transactions_page_params(merchant_id, limit, cursor,
+                                                                 start_date, end_date))
+            return self.transaction_cursor_page(result)
+
+        except Exception as e:
+            self.logger.error(f"游標查詢商戶交易失敗: {merchant_id}, 錯誤: {e}")
+            raise self.handle_service_error("游標查詢商戶交易", e, {"merchant_id": merchant_id})
+
+    def get_merchant_transaction_count(self, merchant_id: str,
+                                       start_date: Optional[str] = None,
+                                       end_date: Optional[str] = None) -> int:
+        """商戶交易總數（按查詢條件緩存，不隨翻頁重算）"""
         params = {
             "p_merchant_id": merchant_id,
-            "p_limit": limit,
-            "p_offset": offset,
             "p_start_date": start_date,
             "p_end_date": end_date
         }
-        
+
         try:
-            result = self.rpc_call("get_merchant_transactions", params)
-            
-            if result:
-                # 計算分頁信息
-                total_count = result[0].get('total_count', 0) if result else 0
-                total_pages = (total_count + limit - 1) // limit
-                current_page = offset // limit
-                
-                transactions = [Transaction.from_dict(tx) for tx in result]
-                
-                self.logger.info(f"獲取商戶交易成功: {merchant_id}, 返回 {len(transactions)} 筆")
-                
-                return {
-                    "data": transactions,
-                    "pagination": {
-                        "current_page": current_page,
-                        "page_size": limit,
-                        "total_count": total_count,
-                        "total_pages": total_pages,
-                        "has_next": current_page < total_pages - 1,
-                        "has_prev": current_page > 0
-                    }
-                }
-            else:
-                return {
-                    "data": [],
-                    "pagination": {
-                        "current_page": 0,
-                        "page_size": limit,
-                        "total_count": 0,
-                        "total_pages": 0,
-                        "has_next": False,
-                        "has_prev": False
-                    }
-                }
-                
+            return cache_service.get_or_load(
+                f"tx_count:merchant:{merchant_id}:{start_date}:{end_date}",
+                lambda: int(self.rpc_call("get_merchant_transaction_count", params) or 0),
+                ttl=settings.ui.tx_count_cache_ttl
+            )
+
         except Exception as e:
-            self.logger.error(f"獲取商戶交易失敗: {merchant_id}, 錯誤: {e}")
-            raise self.handle_service_error("查詢商戶交易", e, {"merchant_id": merchant_id})
-    
+            self.logger.error(f"獲取商戶交易總數失敗: {merchant_id}, 錯誤: {e}")
+            raise self.handle_service_error("獲取商戶交易總數", e, {"merchant_id": merchant_id})
+
     def get_today_transactions(self, merchant_id: str) -> Dict[str, Any]:
         """獲取今日交易統計"""
         from datetime import datetime, time
@@ -1,14 +1,105 @@
 from typing import Dict, Any, Optional, List
 from decimal import Decimal
 from .base_service import BaseService
+from .member_service import MemberService
 from models.transaction import Transaction
 import uuid
 
 class PaymentService(BaseService):
     """支付服務"""
+
+    CHARGE_BATCH_SIZE = 200  # 與 merchant_charge_batch 單批上限一致
+    
+    def __init__(self):
+        super().__init__()
+        self.member_service = MemberService()
     
+    # ---- 請求參數與返回映射（同步 / 異步服務共用，僅 RPC 調用方式不同） ----
+
+    @staticmethod
+    def charge_params(merchant_code: str, qr_plain: str, amount: Decimal,
+                      tag: Optional[Dict] = None, external_order_id: Optional[str] = None,
+                      idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "p_merchant_code": merchant_code,
+            "p_qr_plain": qr_plain,
+            "p_raw_amount": float(amount),
+            "p_idempotency_key": idempotency_key or f"payment-{uuid.uuid4()}",
+            "p_tag": tag or {"source": "cli"},
+            "p_external_order_id": external_order_id
+        }
+
+    @staticmethod
+    def charge_result(result: Any, amount: Decimal) -> Dict:
+        if not result:
+            raise Exception("支付失敗：無返回數據")
+        payment_data = result[0]
+        return {
+            "tx_id": payment_data.get("tx_id"),
+            "tx_no": payment_data.get("tx_no"),
+            "card_id": payment_data.get("card_id"),
+            "final_amount": payment_data.get("final_amount"),
+            "discount": payment_data.get("discount"),
+            "raw_amount": float(amount)
+        }
+
+    @staticmethod
+    def refund_params(merchant_code: str, original_tx_no: str, refund_amount: Decimal,
+                      reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "p_merchant_code": merchant_code,
+            "p_original_tx_no": original_tx_no,
+            "p_refund_amount": float(refund_amount),
+            "p_tag": {"reason": reason or "", "source": "cli"}
+        }
+
+    @staticmethod
+    def refund_result(result: Any, original_tx_no: str) -> Dict:
+        if not result:
+            raise Exception("退款失敗：無返回數據")
+        refund_data = result[0]
+        return {
+            "refund_tx_id": refund_data.get("refund_tx_id"),
+            "refund_tx_no": refund_data.get("refund_tx_no"),
+            "refunded_amount": refund_data.get("refunded_amount"),
+            "original_tx_no": original_tx_no
+        }
+
+    @staticmethod
+    def recharge_params(card_id: str, amount: Decimal, payment_method: str = "wechat",
+                        tag: Optional[Dict] = None,
+                        external_order_id: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "p_card_id": card_id,
+            "p_amount": float(amount),
+            "p_payment_method": payment_method,
+            "p_tag": tag or {"source": "cli"},
+            "p_idempotency_key": f"recharge-{uuid.uuid4()}",
+            "p_external_order_id": external_order_id
+        }
+
+    @staticmethod
+    def recharge_result(result: Any, payment_method: str) -> Dict:
+        if not result:
+            raise Exception("充值失敗：無返回數據")
+        recharge_data = result[0]
+        return {
+            "tx_id": recharge_data.get("tx_id"),
+            "tx_no": recharge_data.get("tx_no"),
+            "card_id": recharge_data.get("card_id"),
+            "amount": recharge_data.get("amount"),
+            "payment_method": payment_method
+        }
+
+    @staticmethod
+    def transaction_from_result(result: Any) -> Optional[Transaction]:
+        if not result:
+            return None
+        return Transaction.from_dict(result if isinstance(result, dict) else result[0])
+
     def charge_by_qr(self, merchant_code: str, qr_plain: str, amount: Decimal,
-                    tag: Optional[Dict] = None, external_order_id: Optional[str] = None) -> Dict:
+                    tag: Optional[Dict] = None, external_order_id: Optional[str] = None,
+                    idempotency_key: Optional[str] = None) -> Dict:
         """掃碼支付"""
         self.log_operation("掃碼支付", {
             "merchant_code": merchant_code,
@@ -16,35 +107,13 @@ class PaymentService(BaseService):
             "has_external_order": bool(external_order_id)
         })
         
-        idempotency_key = f"payment-{uuid.uuid4()}"
-        
-        params = {
-            "p_merchant_code": merchant_code,
-            "p_qr_plain": qr_plain,
-            "p_raw_amount": float(amount),
-            "p_idempotency_key": idempotency_key,
-            "p_tag": tag or {"source": "cli"},
-            "p_external_order_id": external_order_id
-        }
+        params = self.charge_params(merchant_code, qr_plain, amount, tag,
+                                    external_order_id, idempotency_key)
         
         try:
-            result = self.rpc_call("merchant_charge_by_qr", params)
-            
-            if result and len(result) > 0:
-                payment_data = result[0]
-                
-                self.logger.info(f"掃碼支付成功: {payment_data.get('tx_no')}")
-                
-                return {
-                    "tx_id": payment_data.get("tx_id"),
-                    "tx_no": payment_data.get("tx_no"),
-                    "card_id": payment_data.get("card_id"),
-                    "final_amount": payment_data.get("final_amount"),
-                    "discount": payment_data.get("discount"),
-                    "raw_amount": float(amount)
-                }
-            else:
-                raise Exception("支付失敗：無返回數據")
+            payment = self.charge_result(self.rpc_call("merchant_charge_by_qr", params), amount)
+            self.logger.info(f"掃碼支付成功: {payment['tx_no']}")
+            return payment
                 
         except Exception as e:
             self.logger.error(f"掃碼支付失敗: {e}")
@@ -53,6 +122,90 @@ class PaymentService(BaseService):
                 "amount": float(amount)
             })
     
+    def charge_many(self, merchant_code: str, items: List[Dict[str, Any]]) -> List[Dict]:
+        """批量掃碼支付（終端重連後補發積壓收款）
+
+        items 每項包含 qr_plain、amount，可選 idempotency_key、tag、external_order_id；
+        未提供 idempotency_key 時在首次 RPC 前自動生成並寫回 items 中對應的 dict，
+        因此某一批 RPC 失敗（超時、斷線）後原樣重發同一個 items，已提交的筆數會按鍵重放而不會重複扣款。
+        返回與 items 順序一致的逐筆結果，單筆失敗不影響其他筆。
+        """
+        self.log_operation("批量掃碼支付", {
+            "merchant_code": merchant_code,
+            "count": len(items)
+        })
+
+        for item in items:
+            if not item.get("idempotency_key"):
+                item["idempotency_key"] = f"payment-{uuid.uuid4()}"
+
+        payload = [self._build_batch_item(item) for item in items]
+        results: List[Dict] = []
+
+        try:
+            for start in range(0, len(payload), self.CHARGE_BATCH_SIZE):
+                chunk = payload[start:start + self.CHARGE_BATCH_SIZE]
+                rows = self.rpc_call("merchant_charge_batch", {
+                    "p_merchant_code": merchant_code,
+                    "p_items": chunk
+                }) or []
+
+                by_index = {row.get("item_index"): row for row in rows}
+                for offset, item in enumerate(chunk):
+                    results.append(self._batch_item_result(
+                        start + offset, item, by_index.get(offset)
+                    ))
+
+            failed = sum(1 for r in results if not r["success"])
+            self.logger.info(f"批量掃碼支付完成: 成功 {len(results) - failed} 筆, 失敗 {failed} 筆")
+            return results
+
+        except Exception as e:
+            self.logger.error(f"批量掃碼支付失敗: {e}")
+            raise self.handle_service_error("批量掃碼支付", e, {
+                "merchant_code": merchant_code,
+                "count": len(items)
+            })
+
+    @staticmethod
+    def _build_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "qr_plain": item["qr_plain"],
+            "amount": float(item["amount"]),
+            "idempotency_key": item["idempotency_key"],
+            "tag": item.get("tag") or {"source": "cli"},
+            "external_order_id": item.get("external_order_id")
+        }
+
+    @staticmethod
+    def _batch_item_result(index: int, item: Dict[str, Any], row: Optional[Dict]) -> Dict:
+        if row is None:
+            return {
+                "index": index,
+                "idempotency_key": item["idempotency_key"],
+                "success": False,
+                "error": "NO_RESULT"
+            }
+        if not row.get("success"):
+            return {
+                "index": index,
+                "idempotency_key": item["idempotency_key"],
+                "success": False,
+                "error": row.get("error_code")
+            }
+        return {
+            "index": index,
+            "idempotency_key": item["idempotency_key"],
+            "success": True,
+            "replayed": bool(row.get("replayed")),
+            "tx_id": row.get("tx_id"),
+            "tx_no": row.get("tx_no"),
+            "card_id": row.get("card_id"),
+            "final_amount": row.get("final_amount"),
+            "discount": row.get("discount"),
+            "raw_amount": item["amount"]
+        }
+
     def refund_transaction(self, merchant_code: str, original_tx_no: str, 
                           refund_amount: Decimal, reason: Optional[str] = None) -> Dict:
         """退款交易"""
@@ -63,29 +216,12 @@ class PaymentService(BaseService):
             "reason": reason
         })
         
-        params = {
-            "p_merchant_code": merchant_code,
-            "p_original_tx_no": original_tx_no,
-            "p_refund_amount": float(refund_amount),
-            "p_tag": {"reason": reason or "", "source": "cli"}
-        }
+        params = self.refund_params(merchant_code, original_tx_no, refund_amount, reason)
         
         try:
-            result = self.rpc_call("merchant_refund_tx", params)
-            
-            if result and len(result) > 0:
-                refund_data = result[0]
-                
-                self.logger.info(f"退款成功: {refund_data.get('refund_tx_no')}")
-                
-                return {
-                    "refund_tx_id": refund_data.get("refund_tx_id"),
-                    "refund_tx_no": refund_data.get("refund_tx_no"),
-                    "refunded_amount": refund_data.get("refunded_amount"),
-                    "original_tx_no": original_tx_no
-                }
-            else:
-                raise Exception("退款失敗：無返回數據")
+            refund = self.refund_result(self.rpc_call("merchant_refund_tx", params), original_tx_no)
+            self.logger.info(f"退款成功: {refund['refund_tx_no']}")
+            return refund
                 
         except Exception as e:
             self.logger.error(f"退款失敗: {e}")
@@ -104,34 +240,12 @@ class PaymentService(BaseService):
             "payment_method": payment_method
         })
         
-        idempotency_key = f"recharge-{uuid.uuid4()}"
-        
-        params = {
-            "p_card_id": card_id,
-            "p_amount": float(amount),
-            "p_payment_method": payment_method,
-            "p_tag": tag or {"source": "cli"},
-            "p_idempotency_key": idempotency_key,
-            "p_external_order_id": external_order_id
-        }
+        params = self.recharge_params(card_id, amount, payment_method, tag, external_order_id)
         
         try:
-            result = self.rpc_call("user_recharge_card", params)
-            
-            if result and len(result) > 0:
-                recharge_data = result[0]
-                
-                self.logger.info(f"充值成功: {recharge_data.get('tx_no')}")
-                
-                return {
-                    "tx_id": recharge_data.get("tx_id"),
-                    "tx_no": recharge_data.get("tx_no"),
-                    "card_id": recharge_data.get("card_id"),
-                    "amount": recharge_data.get("amount"),
-                    "payment_method": payment_method
-                }
-            else:
-                raise Exception("充值失敗：無返回數據")
+            recharge = self.recharge_result(self.rpc_call("user_recharge_card", params), payment_method)
+            self.logger.info(f"充值成功: {recharge['tx_no']}")
+            return recharge
                 
         except Exception as e:
             self.logger.error(f"充值失敗: {e}")
@@ -147,17 +261,13 @@ class PaymentService(BaseService):
         params = {"p_tx_no": tx_no}
         
         try:
-            result = self.rpc_call("get_transaction_detail", params)
+            transaction = self.transaction_from_result(self.rpc_call("get_transaction_detail", params))
             
-            if result:
-                transaction_data = result if isinstance(result, dict) else result[0]
-                transaction = Transaction.from_dict(transaction_data)
-                
+            if transaction:
                 self.logger.info(f"獲取交易詳情成功: {tx_no}")
-                return transaction
             else:
                 self.logger.warning(f"交易不存在: {tx_no}")
-                return None
+            return transaction
                 
         except Exception as e:
             self.logger.error(f"獲取交易詳情失敗: {tx_no}, 錯誤: {e}")
@@ -175,21 +285,11 @@ class PaymentService(BaseService):
             if not original_tx.can_refund():
                 return {"valid": False, "error": "此交易不支持退款"}
             
-            # 計算已退款金額
-            refunded_txs = self.query_table("transactions", {
-                "reason": original_tx_no,
-                "tx_type": "refund"
-            })
-            
-            total_refunded = sum(
-                tx.get("final_amount", 0) 
-                for tx in refunded_txs 
-                if tx.get("status") in ["completed", "processing"]
-            )
-            
-            remaining_amount = (original_tx.final_amount or 0) - total_refunded
+            # 已退款金額由退款 RPC 累加在原交易上，無需再掃描退款記錄
+            total_refunded = original_tx.refunded_amount or 0
+            remaining_amount = original_tx.get_remaining_refundable()
             
-            if float(refund_amount) > remaining_amount:
+            if Decimal(str(refund_amount)) > remaining_amount:
                 return {
                     "valid": False, 
                     "error": f"退款金額超過可退金額 ¥{remaining_amount:.2f}"
@@ -229,14 +329,11 @@ class PaymentService(BaseService):
             discount_rate = 1.0
             
             if card.get("card_type") == "standard":
-                # 標準卡根據積分計算折扣
-                points = card.get("points", 0)
-                if points >= 10000:
-                    discount_rate = 0.85
-                elif points >= 5000:
-                    discount_rate = 0.90
-                elif points >= 1000:
-                    discount_rate = 0.95
+                # 標準卡按會員等級表計算折扣，與服務端一致取等級折扣與企業折扣的較優值
+                points = card.get("points") or 0
+                discount_rate = self.member_service.get_level_table().discount_for(points)
+                if card.get("corporate_discount") is not None:
+                    discount_rate = min(discount_rate, float(card["corporate_discount"]))
             # Standard Card 已移除 prepaid，不需要此邏輯
             elif card.get("card_type") == "corporate":
                 # 企業卡使用固定折扣
@@ -344,7 +441,7 @@ class PaymentService(BaseService):
                 total_pages = (total_count + limit - 1) // limit
                 current_page = offset // limit
                 
-                transactions = [Transaction.from_dict(tx) for tx in result]
+                transactions = Transaction.from_rows(result)
                 
                 self.logger.info(f"獲取商戶交易記錄成功: {merchant_id}, 返回 {len(transactions)} 筆")
                 
@@ -1,32 +1,42 @@
-from typing import Dict, Optional, List
+import time
+from typing import Callable, Dict, Optional, List
 from .base_service import BaseService
 from models.card import QRCode
+from utils.validators import Validator
+from config.settings import settings
 
 class QRService(BaseService):
     """QR 碼服務"""
     
-    def rotate_qr(self, card_id: str, ttl_seconds: int = 900) -> Dict:
-        """生成/刷新 QR 碼"""
-        self.log_operation("生成 QR 碼", {"card_id": card_id, "ttl": ttl_seconds})
-        
-        params = {
+    @staticmethod
+    def rotate_params(card_id: str, ttl_seconds: int) -> Dict:
+        """rotate_card_qr 請求參數（同步 / 異步服務共用）"""
+        return {
             "p_card_id": card_id,
             "p_ttl_seconds": ttl_seconds
         }
+
+    @staticmethod
+    def rotate_result(result, card_id: str) -> Dict:
+        """rotate_card_qr 返回行 → QR 碼信息（同步 / 異步服務共用）"""
+        if not result:
+            raise Exception("QR 碼生成失敗：無返回數據")
+        qr_data = result[0]
+        return {
+            "qr_plain": qr_data.get("qr_plain"),
+            "expires_at": qr_data.get("qr_expires_at"),
+            "card_id": card_id
+        }
+    
+    def rotate_qr(self, card_id: str, ttl_seconds: int = 900) -> Dict:
+        """生成/刷新 QR 碼"""
+        self.log_operation("生成 QR 碼", {"card_id": card_id, "ttl": ttl_seconds})
         
         try:
-            result = self.rpc_call("rotate_card_qr", params)
-            
-            if result and len(result) > 0:
-                qr_data = result[0]
-                self.logger.info(f"QR 碼生成成功: {card_id}")
-                return {
-                    "qr_plain": qr_data.get("qr_plain"),
-                    "expires_at": qr_data.get("qr_expires_at"),
-                    "card_id": card_id
-                }
-            else:
-                raise Exception("QR 碼生成失敗：無返回數據")
+            qr = self.rotate_result(self.rpc_call("rotate_card_qr", self.rotate_params(card_id, ttl_seconds)),
+                                    card_id)
+            self.logger.info(f"QR 碼生成成功: {card_id}")
+            return qr
                 
         except Exception as e:
             self.logger.error(f"QR 碼生成失敗: {card_id}, 錯誤: {e}")
@@ -36,9 +46,10 @@ class QRService(BaseService):
         """驗證 QR 碼並返回卡片 ID"""
         self.log_operation("驗證 QR 碼", {"qr_length": len(qr_plain) if qr_plain else 0})
         
-        if not qr_plain or len(qr_plain) < 16:
+        if not Validator.validate_qr_code(qr_plain):
             raise Exception("QR 碼格式不正確")
         
+        qr_plain = qr_plain.strip()
         params = {"p_qr_plain": qr_plain}
         
         try:
@@ -52,7 +63,7 @@ class QRService(BaseService):
                 
         except Exception as e:
             self.logger.error(f"QR 碼驗證失敗: {e}")
-            raise self.handle_service_error("驗證 QR 碼", e, {"qr_plain": qr_plain[:10] + "..."})
+            raise self.handle_service_error("驗證 QR 碼", e, {"qr_lookup": qr_plain.split(".")[0]})
     
     def revoke_qr(self, card_id: str) -> bool:
         """撤銷 QR 碼"""
@@ -73,21 +84,61 @@ class QRService(BaseService):
             self.logger.error(f"QR 碼撤銷失敗: {card_id}, 錯誤: {e}")
             raise self.handle_service_error("撤銷 QR 碼", e, {"card_id": card_id})
     
-    def batch_rotate_qr(self, ttl_seconds: int = 300) -> int:
-        """批量輪換 QR 碼"""
-        self.log_operation("批量輪換 QR 碼", {"ttl": ttl_seconds})
+    def batch_rotate_qr(self, ttl_seconds: int = 300, chunk_size: Optional[int] = None,
+                        progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """分塊批量輪換 QR 碼
         
-        params = {"p_ttl_seconds": ttl_seconds}
+        每個分塊是一次獨立的 RPC 調用（各自提交），以上一塊返回的
+        last_card_id 作為游標，直到服務端返回 done。
+        """
+        chunk_size = chunk_size or settings.ui.qr_rotate_chunk_size
+        self.log_operation("批量輪換 QR 碼", {"ttl": ttl_seconds, "chunk_size": chunk_size})
+        
+        rotated = 0
+        chunks = 0
+        total = None
+        after_card_id = None
+        started = time.monotonic()
         
         try:
-            affected_count = self.rpc_call("cron_rotate_qr_tokens", params)
+            while True:
+                params = {
+                    "p_ttl_seconds": ttl_seconds,
+                    "p_chunk_size": chunk_size,
+                    "p_after_card_id": after_card_id
+                }
+                result = self.rpc_call("cron_rotate_qr_tokens_chunk", params)
+                row = result[0] if isinstance(result, list) and result else (result or {})
+                
+                chunks += 1
+                rotated += row.get("rotated") or 0
+                if total is None:
+                    total = row.get("total_cards")
+                after_card_id = row.get("last_card_id")
+                
+                elapsed = time.monotonic() - started
+                progress = {
+                    "rotated": rotated,
+                    "total": total,
+                    "chunks": chunks,
+                    "elapsed_seconds": elapsed,
+                    "cards_per_second": rotated / elapsed if elapsed > 0 else 0.0
+                }
+                if progress_callback:
+                    progress_callback(progress)
+                
+                if row.get("done", True) or not after_card_id:
+                    break
             
-            self.logger.info(f"批量 QR 碼輪換完成，影響 {affected_count} 張卡片")
-            return affected_count or 0
+            self.logger.info(f"批量 QR 碼輪換完成，影響 {rotated} 張卡片，"
+                             f"{chunks} 個分塊，{progress['cards_per_second']:.0f} 張/秒")
+            return progress
             
         except Exception as e:
             self.logger.error(f"批量 QR 碼輪換失敗: {e}")
-            raise self.handle_service_error("批量輪換 QR 碼", e, {"ttl": ttl_seconds})
+            raise self.handle_service_error("批量輪換 QR 碼", e, {
+                "ttl": ttl_seconds, "rotated": rotated, "after_card_id": after_card_id
+            })
     
     def get_qr_history(self, card_id: str, limit: int = 10) -> List[Dict]:
         """獲取 QR 碼歷史"""
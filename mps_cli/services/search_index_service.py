@@ -0,0 +1,254 @@
+import time
+from dataclasses import replace
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+from config.settings import settings
+from .base_service import BaseService
+from models.base import parse_datetime
+from models.card import Card
+from models.member import Member
+from utils.identifier_resolver import IdentifierResolver
+from utils.search_index import SearchIndex
+
+class SearchIndexService(BaseService):
+    """管理端本地搜尋索引服務
+
+    從 get_all_members_page / get_all_cards_page 按 updated_at 游標流式載入會員與卡片，
+    之後按上次同步到的 updated_at 增量刷新；選擇器的搜尋、結果篩選與翻頁在本地完成。
+    任一類記錄超過 search_index_max_entries 時放棄本地索引（釋放內存），調用方回退服務端 RPC。
+    """
+
+    LOAD_PAGE_SIZE = 1000
+    # 增量刷新回看窗口：覆蓋事務開始早於上次同步、提交晚於上次同步的寫入
+    REFRESH_OVERLAP = timedelta(seconds=5)
+    MEMBER_FIELDS = (("member_no", 3), ("phone", 3), ("email", 3), ("name", 2))
+    CARD_FIELDS = (("card_no", 3), ("owner_phone", 3), ("name", 2), ("owner_name", 2))
+
+    def __init__(self):
+        super().__init__()
+        max_entries = settings.ui.search_index_max_entries
+        self.members = SearchIndex(self.MEMBER_FIELDS, max_entries)
+        self.cards = SearchIndex(self.CARD_FIELDS, max_entries)
+        self._cards_by_owner: Dict[str, Set[str]] = {}
+        self._synced_at: Dict[str, Optional[str]] = {"members": None, "cards": None}
+        self._ordered: Dict[str, Any] = {}
+        self.loaded = False
+        self.overflowed = False
+        self.last_refresh: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ui.search_index_enabled and not self.overflowed
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.loaded
+
+    def ensure_ready(self, progress_callback: Optional[Callable[[Dict], None]] = None) -> bool:
+        """首次使用時全量載入，之後超過刷新間隔時增量刷新；返回本地索引是否可用"""
+        if not self.enabled:
+            return False
+
+        if not self.loaded:
+            self.load(progress_callback)
+        elif (self.last_refresh is None or
+              time.monotonic() - self.last_refresh >= settings.ui.search_index_refresh_seconds):
+            self.refresh()
+
+        return self.ready
+
+    def mark_stale(self):
+        """本地可能已過期（如剛執行過寫操作），下次使用前先增量刷新"""
+        self.last_refresh = None
+
+    def load(self, progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """全量載入會員與卡片索引"""
+        self.log_operation("載入本地搜尋索引", {"max_entries": self.members.max_entries})
+
+        self._reset()
+        progress = {"members": 0, "cards": 0, "elapsed_seconds": 0.0, "rows_per_second": 0.0}
+        started = time.monotonic()
+
+        try:
+            for kind in ("members", "cards"):
+                for rows in self._stream(kind, None):
+                    if not self._apply(kind, rows):
+                        self._overflow(kind)
+                        return progress
+
+                    progress[kind] += len(rows)
+                    progress["elapsed_seconds"] = time.monotonic() - started
+                    progress["rows_per_second"] = (
+                        (progress["members"] + progress["cards"]) / progress["elapsed_seconds"]
+                        if progress["elapsed_seconds"] > 0 else 0.0
+                    )
+                    if progress_callback:
+                        progress_callback(dict(progress))
+
+            self.loaded = True
+            self.last_refresh = time.monotonic()
+            self.logger.info(
+                f"本地搜尋索引載入完成: 會員 {progress['members']}，卡片 {progress['cards']}，"
+                f"耗時 {progress['elapsed_seconds']:.1f}s"
+            )
+            return progress
+
+        except Exception as e:
+            self._reset()
+            self.logger.error(f"載入本地搜尋索引失敗: {e}")
+            raise self.handle_service_error("載入本地搜尋索引", e, progress)
+
+    def refresh(self) -> Dict[str, int]:
+        """按 updated_at 增量刷新，會員變更同步到其卡片的持卡人姓名 / 手機"""
+        changed = {"members": 0, "cards": 0}
+
+        try:
+            for kind in ("members", "cards"):
+                for rows in self._stream(kind, self._refresh_since(kind)):
+                    if not self._apply(kind, rows):
+                        self._overflow(kind)
+                        return changed
+                    changed[kind] += len(rows)
+
+            self.last_refresh = time.monotonic()
+            if changed["members"] or changed["cards"]:
+                self.logger.debug(f"本地搜尋索引增量刷新: {changed}")
+            return changed
+
+        except Exception as e:
+            self.logger.error(f"刷新本地搜尋索引失敗: {e}")
+            raise self.handle_service_error("刷新本地搜尋索引", e, changed)
+
+    def search_members(self, keyword: str, limit: int = 50) -> Optional[List[Member]]:
+        """本地搜尋會員，索引不可用時返回 None"""
+        return self.members.search(keyword, limit) if self.ready else None
+
+    def search_cards(self, keyword: str, limit: int = 50) -> Optional[List[Card]]:
+        """本地搜尋卡片，索引不可用時返回 None
+
+        完整會員號 / 郵箱與服務端 search_cards 一樣先精確找到會員，再返回其擁有的卡片
+        """
+        if not self.ready:
+            return None
+        if IdentifierResolver.is_member_no(keyword) or IdentifierResolver.is_email(keyword):
+            return self._cards_of_owner(keyword, limit)
+        return self.cards.search(keyword, limit)
+
+    def page_members(self, limit: int = 50, offset: int = 0) -> Optional[Dict[str, Any]]:
+        """本地分頁（同 get_all_members：按創建時間倒序），索引不可用時返回 None"""
+        return self._page("members", limit, offset) if self.ready else None
+
+    def page_cards(self, limit: int = 50, offset: int = 0) -> Optional[Dict[str, Any]]:
+        """本地分頁（同 get_all_cards：按創建時間倒序），索引不可用時返回 None"""
+        return self._page("cards", limit, offset) if self.ready else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "loaded": self.loaded,
+            "overflowed": self.overflowed,
+            "members": len(self.members),
+            "cards": len(self.cards),
+            "max_entries": self.members.max_entries,
+            "synced_at": dict(self._synced_at)
+        }
+
+    def _reset(self):
+        self.members.clear()
+        self.cards.clear()
+        self._cards_by_owner.clear()
+        self._synced_at = {"members": None, "cards": None}
+        self._ordered.clear()
+        self.loaded = False
+        self.last_refresh = None
+
+    def _overflow(self, kind: str):
+        self.logger.warning(
+            f"本地搜尋索引超過上限 {self.members.max_entries}（{kind}），改用服務端搜尋"
+        )
+        self._reset()
+        self.overflowed = True
+
+    def _refresh_since(self, kind: str) -> Optional[str]:
+        synced_at = parse_datetime(self._synced_at[kind])
+        return (synced_at - self.REFRESH_OVERLAP).isoformat() if synced_at else None
+
+    def _stream(self, kind: str, updated_after: Optional[str]) -> Iterator[List[Dict]]:
+        """逐頁讀取 updated_after 之後變更的記錄（按 updated_at, id 升序）"""
+        function_name = "get_all_members_page" if kind == "members" else "get_all_cards_page"
+        cursor = None
+
+        while True:
+            rows = self.rpc_call(function_name, {
+                "p_limit": self.LOAD_PAGE_SIZE,
+                "p_cursor": cursor,
+                "p_updated_after": updated_after
+            }) or []
+            if rows:
+                yield rows
+
+            cursor = rows[-1].get("next_cursor") if rows else None
+            if cursor is None:
+                return
+
+    def _apply(self, kind: str, rows: List[Dict]) -> bool:
+        """把一頁記錄寫入索引，超出上限時返回 False"""
+        if kind == "members":
+            for member in Member.from_rows(rows):
+                if not self.members.upsert(member.id, member):
+                    return False
+                self._sync_owner(member)
+        else:
+            for card in Card.from_rows(rows):
+                previous = self.cards.get(card.id)
+                if not self.cards.upsert(card.id, card):
+                    return False
+                if previous is not None and previous.owner_member_id != card.owner_member_id:
+                    self._cards_by_owner.get(previous.owner_member_id, set()).discard(card.id)
+                if card.owner_member_id:
+                    self._cards_by_owner.setdefault(card.owner_member_id, set()).add(card.id)
+
+        synced_at = rows[-1].get("updated_at")
+        if synced_at and (self._synced_at[kind] is None or
+                          parse_datetime(synced_at) > parse_datetime(self._synced_at[kind])):
+            self._synced_at[kind] = synced_at
+        return True
+
+    def _sync_owner(self, member: Member):
+        """持卡人資料變更不會更新卡片的 updated_at，在本地同步到其卡片"""
+        for card_id in self._cards_by_owner.get(member.id, ()):
+            card = self.cards.get(card_id)
+            if card and (card.owner_name, card.owner_phone) != (member.name, member.phone):
+                self.cards.upsert(card_id, replace(card, owner_name=member.name, owner_phone=member.phone))
+
+    def _cards_of_owner(self, identifier: str, limit: int) -> List[Card]:
+        target = SearchIndex.normalize(identifier)
+        cards = []
+        for member in self.members.search(identifier, limit):
+            if target in (SearchIndex.normalize(member.member_no), SearchIndex.normalize(member.email)):
+                cards.extend(filter(None, map(self.cards.get, self._cards_by_owner.get(member.id, ()))))
+        cards.sort(key=lambda card: card.created_at or '', reverse=True)
+        return cards[:limit]
+
+    def _page(self, kind: str, limit: int, offset: int) -> Dict[str, Any]:
+        index = self.members if kind == "members" else self.cards
+        version, ordered = self._ordered.get(kind, (None, None))
+        if version != index.version:
+            ordered = sorted(index.records(), key=lambda record: record.created_at or '', reverse=True)
+            self._ordered[kind] = (index.version, ordered)
+
+        total_count = len(ordered)
+        total_pages = (total_count + limit - 1) // limit
+        current_page = offset // limit
+
+        return {
+            "data": ordered[offset:offset + limit],
+            "pagination": {
+                "current_page": current_page,
+                "page_size": limit,
+                "total_count": total_count,
+                "total_pages": total_pages,
+                "has_next": current_page < total_pages - 1,
+                "has_prev": current_page > 0
+            }
+        }
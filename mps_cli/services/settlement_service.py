@@ -1,11 +1,21 @@
-from typing import Dict, List, Optional
+import csv
+import json
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from config.settings import settings
 from .base_service import BaseService
 from models.settlement import Settlement
 
 class SettlementService(BaseService):
     """結算服務"""
+
+    EXPORT_PAGE_SIZE = 1000
+    EXPORT_FIELDS = [
+        "tx_no", "tx_type", "card_id", "raw_amount", "discount_applied",
+        "final_amount", "status", "created_at"
+    ]
     
     def generate_settlement(
         self,
@@ -43,7 +53,10 @@ class SettlementService(BaseService):
             result = self.rpc_call("generate_settlement", params)
             
             if result and len(result) > 0:
-                settlement_data = result[0]
+                settlement_data = dict(result[0])
+                settlement_data.setdefault("id", settlement_data.get("settlement_id"))
+                settlement_data.setdefault("settlement_no", settlement_data.get("settlement_id"))
+                settlement_data["daily_breakdown"] = self._parse_daily_breakdown(settlement_data.get("payload"))
                 self.logger.info(f"結算生成成功: {settlement_data.get('settlement_no')}")
                 return settlement_data
             else:
@@ -53,6 +66,123 @@ class SettlementService(BaseService):
             self.logger.error(f"結算生成失敗: {e}")
             raise self.handle_service_error("生成結算", e, params)
     
+    @staticmethod
+    def settlement_period(mode: str, now: Optional[datetime] = None) -> Tuple[str, str]:
+        """
+        按結算模式推算上一個完整結算期間（UTC，左閉右開）
+        
+        t_plus_1 為前一天，monthly 為上一個自然月；realtime 沒有固定期間，需顯式指定
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        today = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+        
+        if mode == "t_plus_1":
+            start, end = today - timedelta(days=1), today
+        elif mode == "monthly":
+            end = today.replace(day=1)
+            start = (end - timedelta(days=1)).replace(day=1)
+        else:
+            raise ValueError(f"結算模式 {mode} 需要指定結算期間")
+        
+        return start.isoformat(), end.isoformat()
+    
+    def generate_all(
+        self,
+        mode: str,
+        period_start: Optional[str] = None,
+        period_end: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        after_merchant_id: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        為全部商戶批量生成結算
+        
+        每批商戶是一次獨立的 RPC 調用（各自提交），以上一批返回的 last_merchant_id
+        作為游標，直到服務端返回 done。已存在的（商戶, 模式, 期間）結算會被跳過，
+        中斷後可原樣重跑，或傳入 after_merchant_id 從斷點續跑。
+        
+        Args:
+            mode: 結算模式 (realtime/t_plus_1/monthly)
+            period_start: 期間開始時間，缺省按模式推算
+            period_end: 期間結束時間，缺省按模式推算
+            chunk_size: 每批商戶數
+            after_merchant_id: 續跑游標
+            progress_callback: 每批完成後回調進度
+            
+        Returns:
+            彙總結果（含 merchants_per_second 吞吐量）
+        """
+        if period_start is None or period_end is None:
+            period_start, period_end = self.settlement_period(mode)
+        chunk_size = chunk_size or settings.ui.settlement_chunk_size
+        
+        self.log_operation("批量生成結算", {
+            "mode": mode,
+            "period": f"{period_start} ~ {period_end}",
+            "chunk_size": chunk_size,
+            "after_merchant_id": after_merchant_id
+        })
+        
+        progress = {
+            "mode": mode,
+            "period_start": period_start,
+            "period_end": period_end,
+            "merchants": 0,
+            "total": None,
+            "created": 0,
+            "skipped_existing": 0,
+            "no_activity": 0,
+            "negative_net": 0,
+            "chunks": 0,
+            "last_merchant_id": after_merchant_id,
+            "elapsed_seconds": 0.0,
+            "merchants_per_second": 0.0
+        }
+        started = time.monotonic()
+        
+        try:
+            while True:
+                params = {
+                    "p_mode": mode,
+                    "p_period_start": period_start,
+                    "p_period_end": period_end,
+                    "p_chunk_size": chunk_size,
+                    "p_after_merchant_id": progress["last_merchant_id"]
+                }
+                result = self.rpc_call("generate_settlements_chunk", params)
+                row = result[0] if isinstance(result, list) and result else (result or {})
+                
+                progress["chunks"] += 1
+                progress["merchants"] += row.get("scanned") or 0
+                for key in ("created", "skipped_existing", "no_activity", "negative_net"):
+                    progress[key] += row.get(key) or 0
+                if progress["total"] is None:
+                    progress["total"] = row.get("total_merchants")
+                progress["last_merchant_id"] = row.get("last_merchant_id") or progress["last_merchant_id"]
+                
+                elapsed = time.monotonic() - started
+                progress["elapsed_seconds"] = elapsed
+                progress["merchants_per_second"] = progress["merchants"] / elapsed if elapsed > 0 else 0.0
+                if progress_callback:
+                    progress_callback(dict(progress))
+                
+                if row.get("done", True) or not row.get("last_merchant_id"):
+                    break
+            
+            self.logger.info(f"批量結算完成: {progress['merchants']} 個商戶，新建 {progress['created']} 張，"
+                             f"已存在 {progress['skipped_existing']} 張，淨額為負 {progress['negative_net']} 個，"
+                             f"{progress['merchants_per_second']:.0f} 商戶/秒")
+            return progress
+            
+        except Exception as e:
+            self.logger.error(f"批量結算失敗: {e}")
+            raise self.handle_service_error("批量生成結算", e, {
+                "mode": mode,
+                "merchants": progress["merchants"],
+                "after_merchant_id": progress["last_merchant_id"]
+            })
+    
     def list_settlements(
         self,
         merchant_id: str,
@@ -85,28 +215,7 @@ class SettlementService(BaseService):
         try:
             result = self.rpc_call("list_settlements", params)
             
-            settlements = []
-            for item in result:
-                settlement = Settlement(
-                    id=item.get('id'),
-                    settlement_no=item.get('settlement_no'),
-                    merchant_id=item.get('merchant_id'),
-                    settlement_mode=item.get('settlement_mode'),
-                    period_start=item.get('period_start'),
-                    period_end=item.get('period_end'),
-                    total_transactions=item.get('total_transactions'),
-                    payment_count=item.get('payment_count'),
-                    refund_count=item.get('refund_count'),
-                    payment_amount=Decimal(str(item.get('payment_amount', 0))),
-                    refund_amount=Decimal(str(item.get('refund_amount', 0))),
-                    net_amount=Decimal(str(item.get('net_amount', 0))),
-                    fee_amount=Decimal(str(item.get('fee_amount', 0))),
-                    settlement_amount=Decimal(str(item.get('settlement_amount', 0))),
-                    status=item.get('status'),
-                    settled_at=item.get('settled_at'),
-                    created_at=item.get('created_at')
-                )
-                settlements.append(settlement)
+            settlements = [self._to_settlement(item) for item in result or []]
             
             return {
                 "data": settlements,
@@ -123,7 +232,7 @@ class SettlementService(BaseService):
     
     def get_settlement_detail(self, settlement_id: str) -> Settlement:
         """
-        獲取結算詳情
+        獲取結算詳情（含 payload 中的按日明細）
         
         Args:
             settlement_id: 結算 ID
@@ -132,33 +241,138 @@ class SettlementService(BaseService):
             結算對象
         """
         try:
-            filters = {"id": settlement_id}
-            settlements = self.query_table("settlements", filters, limit=1)
-            
-            if settlements:
-                item = settlements[0]
-                return Settlement(
-                    id=item.get('id'),
-                    settlement_no=item.get('settlement_no'),
-                    merchant_id=item.get('merchant_id'),
-                    settlement_mode=item.get('settlement_mode'),
-                    period_start=item.get('period_start'),
-                    period_end=item.get('period_end'),
-                    total_transactions=item.get('total_transactions'),
-                    payment_count=item.get('payment_count'),
-                    refund_count=item.get('refund_count'),
-                    payment_amount=Decimal(str(item.get('payment_amount', 0))),
-                    refund_amount=Decimal(str(item.get('refund_amount', 0))),
-                    net_amount=Decimal(str(item.get('net_amount', 0))),
-                    fee_amount=Decimal(str(item.get('fee_amount', 0))),
-                    settlement_amount=Decimal(str(item.get('settlement_amount', 0))),
-                    status=item.get('status'),
-                    settled_at=item.get('settled_at'),
-                    created_at=item.get('created_at')
-                )
-            else:
+            result = self.rpc_call("get_settlement_detail", {"p_settlement_id": settlement_id})
+            item = result[0] if isinstance(result, list) and result else result
+            
+            if not item or not item.get('id'):
                 raise Exception("結算不存在")
+            
+            return self._to_settlement(item)
                 
         except Exception as e:
             self.logger.error(f"獲取結算詳情失敗: {settlement_id}, 錯誤: {e}")
-            raise
+            raise self.handle_service_error("獲取結算詳情", e, {"settlement_id": settlement_id})
+    
+    def iter_settlement_transactions(self, settlement_id: str,
+                                     page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        逐筆遍歷結算期間的交易明細
+        
+        按游標逐頁請求 get_settlement_transactions_page，任何時刻只持有一頁數據
+        
+        Args:
+            settlement_id: 結算 ID
+            page_size: 每頁筆數
+            
+        Yields:
+            交易明細字典
+        """
+        cursor = None
+        while True:
+            params = {
+                "p_settlement_id": settlement_id,
+                "p_limit": page_size,
+                "p_cursor": cursor
+            }
+            try:
+                result = self.rpc_call("get_settlement_transactions_page", params) or []
+            except Exception as e:
+                self.logger.error(f"獲取結算明細失敗: {settlement_id}, 錯誤: {e}")
+                raise self.handle_service_error("獲取結算明細", e, {"settlement_id": settlement_id})
+            
+            for row in result:
+                yield row
+            
+            cursor = result[-1].get("next_cursor") if result else None
+            if cursor is None:
+                return
+    
+    def export_settlement_transactions(self, settlement_id: str, output: TextIO,
+                                       fmt: str = "csv",
+                                       page_size: int = EXPORT_PAGE_SIZE) -> int:
+        """
+        流式導出結算交易明細
+        
+        Args:
+            settlement_id: 結算 ID
+            output: 可寫文本流（文件或 sys.stdout）
+            fmt: csv / jsonl
+            page_size: 每頁筆數
+            
+        Returns:
+            導出筆數
+        """
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"不支持的導出格式: {fmt}")
+        
+        self.log_operation("導出結算明細", {
+            "settlement_id": settlement_id,
+            "format": fmt,
+            "page_size": page_size
+        })
+        
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(output, fieldnames=self.EXPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+        
+        count = 0
+        for row in self.iter_settlement_transactions(settlement_id, page_size):
+            if writer:
+                writer.writerow(row)
+            else:
+                output.write(json.dumps({k: row.get(k) for k in self.EXPORT_FIELDS}, ensure_ascii=False))
+                output.write("\n")
+            count += 1
+        
+        self.logger.info(f"結算明細導出完成: {settlement_id}, 共 {count} 筆")
+        return count
+    
+    def _to_settlement(self, item: Dict[str, Any]) -> Settlement:
+        """將 RPC 返回的結算行轉換為 Settlement；彙總字段缺失時從 payload.totals 補齊"""
+        payload = self._parse_payload(item.get('payload'))
+        totals = payload.get('totals') or {}
+        
+        def pick(key, default=None):
+            value = item.get(key)
+            return totals.get(key, default) if value is None else value
+        
+        payment_amount = Decimal(str(pick('payment_amount', 0)))
+        refund_amount = Decimal(str(pick('refund_amount', 0)))
+        net_amount = Decimal(str(pick('net_amount', item.get('total_amount') or 0)))
+        fee_amount = Decimal(str(pick('fee_amount', 0)))
+        
+        return Settlement(
+            id=item.get('id'),
+            settlement_no=item.get('settlement_no') or item.get('id'),
+            merchant_id=item.get('merchant_id'),
+            settlement_mode=item.get('settlement_mode') or item.get('mode'),
+            period_start=item.get('period_start'),
+            period_end=item.get('period_end'),
+            total_transactions=item.get('total_transactions') or item.get('total_tx_count'),
+            payment_count=pick('payment_count'),
+            refund_count=pick('refund_count'),
+            payment_amount=payment_amount,
+            refund_amount=refund_amount,
+            net_amount=net_amount,
+            fee_amount=fee_amount,
+            settlement_amount=Decimal(str(item.get('settlement_amount') or (net_amount - fee_amount))),
+            status=item.get('status'),
+            settled_at=item.get('settled_at'),
+            daily_breakdown=self._parse_daily_breakdown(payload),
+            created_at=item.get('created_at')
+        )
+    
+    @staticmethod
+    def _parse_payload(payload: Any) -> Dict[str, Any]:
+        if isinstance(payload, str):
+            try:
+                payload = json.loads(payload)
+            except ValueError:
+                return {}
+        return payload if isinstance(payload, dict) else {}
+    
+    @classmethod
+    def _parse_daily_breakdown(cls, payload: Any) -> List[Dict[str, Any]]:
+        """payload.days -> 按日明細列表"""
+        return list(cls._parse_payload(payload).get('days') or [])
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+httpx.MockTransport 測試輔助
+將全局 supabase_client 換成以 handler 處理請求的客戶端，無需連接數據庫
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+from supabase import create_client, ClientOptions
+from config.supabase_client import supabase_client
+
+
+def use_mock_transport(test_case: unittest.TestCase,
+                       handler: Callable[[httpx.Request], httpx.Response]):
+    """在 setUp 中調用：替換 supabase_client.client，測試結束後自動還原"""
+    http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    original_client = supabase_client.client
+    supabase_client.client = create_client(
+        supabase_client.url, supabase_client.anon_key,
+        options=ClientOptions(httpx_client=http_client)
+    )
+    test_case.addCleanup(setattr, supabase_client, "client", original_client)
+    test_case.addCleanup(http_client.close)
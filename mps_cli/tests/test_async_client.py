@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+異步客戶端測試
+- 模組級 async_supabase_client 在多次 asyncio.run 之間可復用（信號量 / 鎖 / 連接池按事件循環建立）
+- 異步服務與同步服務的請求參數、返回映射一致
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import asyncio
+import unittest
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from config import async_supabase_client as async_module
+from config.async_supabase_client import async_supabase_client
+from config.http_transport import AsyncPooledTransport
+from services.member_service import MemberService
+from services.payment_service import PaymentService
+from services.async_member_service import AsyncMemberService
+from services.async_payment_service import AsyncPaymentService
+
+ROWS = {
+    "get_member_transactions": [
+        {"id": "tx-1", "tx_no": "T1", "tx_type": "payment", "final_amount": 10, "total_count": 3},
+        {"id": "tx-2", "tx_no": "T2", "tx_type": "payment", "final_amount": 20, "total_count": 3},
+    ],
+    "merchant_charge_by_qr": [
+        {"tx_id": "tx-9", "tx_no": "T9", "card_id": "c-1", "final_amount": 9, "discount": 0.9},
+    ],
+}
+
+
+class AsyncClientTestCase(unittest.TestCase):
+    """異步與同步請求均經 MockTransport 返回 ROWS"""
+
+    def setUp(self):
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return httpx.Response(200, json=ROWS[request.url.path.rsplit("/", 1)[-1]])
+
+        class MockAsyncClient(httpx.AsyncClient):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+        class MockAsyncPooledTransport(AsyncPooledTransport):
+            client_class = MockAsyncClient
+
+        patcher = mock.patch.object(async_module, "AsyncPooledTransport", MockAsyncPooledTransport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        use_mock_transport(self, handler)
+
+    def bodies(self):
+        return [(request.url.path.rsplit("/", 1)[-1], json.loads(request.content))
+                for request in self.requests]
+
+
+class PerLoopStateTest(AsyncClientTestCase):
+    """每次 asyncio.run 使用新的事件循環"""
+
+    def test_module_client_survives_consecutive_runs(self):
+        states = []
+
+        async def call():
+            page = await AsyncMemberService().get_member_transactions("m-1", limit=2)
+            states.append(async_supabase_client._state())
+            return page
+
+        first = asyncio.run(call())
+        second = asyncio.run(call())
+
+        self.assertEqual(len(first["data"]), 2)
+        self.assertEqual(second["pagination"], first["pagination"])
+        self.assertIsNot(states[0], states[1])
+        self.assertIsNot(states[0].semaphore, states[1].semaphore)
+        self.assertIsNot(states[0].transport, states[1].transport)
+
+    def test_close_releases_current_loop_only(self):
+        async def call_and_close():
+            await AsyncMemberService().get_member_transactions("m-1")
+            self.assertIsNotNone(async_supabase_client.transport)
+            await async_supabase_client.close()
+            self.assertIsNone(async_supabase_client.transport)
+
+        asyncio.run(call_and_close())
+        asyncio.run(call_and_close())
+        self.assertEqual(len(self.requests), 2)
+
+
+class SharedMappingTest(AsyncClientTestCase):
+    """異步服務與同步服務發出相同的請求並返回相同結構"""
+
+    def test_member_transactions_match(self):
+        sync_page = MemberService().get_member_transactions("m-1", limit=2, offset=0)
+        async_page = asyncio.run(AsyncMemberService().get_member_transactions("m-1", limit=2, offset=0))
+
+        sync_request, async_request = self.bodies()
+        self.assertEqual(sync_request, async_request)
+        self.assertEqual(async_page["pagination"], sync_page["pagination"])
+        self.assertEqual([tx.tx_no for tx in async_page["data"]], [tx.tx_no for tx in sync_page["data"]])
+
+    def test_charge_by_qr_match(self):
+        sync_result = PaymentService().charge_by_qr("M001", "qr", Decimal("10"), idempotency_key="k-1")
+        async_result = asyncio.run(
+            AsyncPaymentService().charge_by_qr("M001", "qr", Decimal("10"), idempotency_key="k-1")
+        )
+
+        sync_request, async_request = self.bodies()
+        self.assertEqual(sync_request, async_request)
+        self.assertEqual(async_result, sync_result)
+
+
+if __name__ == "__main__":
+    unittest.main()
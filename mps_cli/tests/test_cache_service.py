@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+CacheService（TTL + LRU）與寫操作失效測試
+"""
+
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+from services.base_service import CacheService, cache_service, invalidates_cache
+
+
+class CacheServiceTest(unittest.TestCase):
+    """緩存基本行為"""
+
+    def setUp(self):
+        self.cache = CacheService(max_entries=3, default_ttl=60)
+
+    def test_get_returns_value_and_counts_hits(self):
+        self.cache.set("a", 1)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("missing"))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_expired_entry_not_returned(self):
+        self.cache.set("a", 1, ttl=10)
+
+        with patch("services.base_service.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertIsNone(self.cache.get("a"))
+
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_lru_eviction(self):
+        for key in ("a", "b", "c"):
+            self.cache.set(key, key)
+        self.cache.get("a")  # a 變為最近使用
+        self.cache.set("d", "d")
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "a")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_get_or_load_caches_non_none(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"id": "x"}
+
+        self.cache.get_or_load("k", loader)
+        self.cache.get_or_load("k", loader)
+        self.cache.get_or_load("none", lambda: None)
+        self.cache.get_or_load("none", lambda: None)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.stats()["size"], 1)
+
+    def test_invalidate_by_tag(self):
+        self.cache.get_or_load("card:detail:1", lambda: {"id": "1"},
+                               tags=lambda v: (f"card:{v['id']}", "card_no:C1"))
+        self.cache.set("other", 2, tags=("card:2",))
+
+        self.assertEqual(self.cache.invalidate_tag("card_no:C1"), 1)
+        self.assertIsNone(self.cache.get("card:detail:1"))
+        self.assertEqual(self.cache.get("other"), 2)
+
+    def test_evicted_entry_leaves_no_tag(self):
+        self.cache.set("a", 1, tags=("t",))
+        for key in ("b", "c", "d"):
+            self.cache.set(key, key)
+
+        self.assertEqual(self.cache.invalidate_tag("t"), 0)
+
+
+class InvalidatesCacheDecoratorTest(unittest.TestCase):
+    """寫操作裝飾器"""
+
+    def tearDown(self):
+        cache_service.clear_all()
+
+    def test_write_invalidates_tagged_entries(self):
+        class Service:
+            @invalidates_cache("card:{card_id}")
+            def freeze_card(self, card_id):
+                return True
+
+        cache_service.set("card:detail:42", {"status": "active"}, tags=("card:42",))
+        Service().freeze_card("42")
+
+        self.assertIsNone(cache_service.get("card:detail:42"))
+
+    def test_failed_write_still_invalidates(self):
+        class Service:
+            @invalidates_cache("card_no:{card_no}")
+            def toggle(self, card_no, new_status="frozen"):
+                raise RuntimeError("boom")
+
+        cache_service.set("card:detail:1", {}, tags=("card_no:C1",))
+        with self.assertRaises(RuntimeError):
+            Service().toggle(card_no="C1")
+
+        self.assertIsNone(cache_service.get("card:detail:1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
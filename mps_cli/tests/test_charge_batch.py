@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+批量掃碼支付測試
+PaymentService.charge_many：每批一次 RPC，逐筆保留冪等鍵並返回各自的成功 / 錯誤結果
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.payment_service import PaymentService
+
+
+class ChargeManyTest(unittest.TestCase):
+    """charge_many 請求與逐筆結果"""
+
+    def setUp(self):
+        self.requests = []
+
+        self.fail_requests = set()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            if len(self.requests) in self.fail_requests:
+                raise httpx.ReadTimeout("timed out", request=request)
+            items = json.loads(request.content)["p_items"]
+            rows = []
+            for i, item in enumerate(items):
+                if item["qr_plain"] == "bad":
+                    rows.append({"item_index": i, "idempotency_key": item["idempotency_key"],
+                                 "success": False, "error_code": "INSUFFICIENT_BALANCE"})
+                else:
+                    rows.append({"item_index": i, "idempotency_key": item["idempotency_key"],
+                                 "success": True, "replayed": False, "tx_no": f"PAY{i}",
+                                 "final_amount": item["amount"], "discount": 1.0})
+            return httpx.Response(200, json=rows)
+
+        use_mock_transport(self, handler)
+        self.service = PaymentService()
+
+    def test_single_round_trip_with_per_item_results(self):
+        items = [
+            {"qr_plain": "ok", "amount": 10, "idempotency_key": "k-1"},
+            {"qr_plain": "bad", "amount": 20, "idempotency_key": "k-2"},
+            {"qr_plain": "ok", "amount": 30},
+        ]
+
+        results = self.service.charge_many("M001", items)
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertTrue(self.requests[0].url.path.endswith("/rpc/merchant_charge_batch"))
+        sent = json.loads(self.requests[0].content)["p_items"]
+        self.assertEqual([i["idempotency_key"] for i in sent][:2], ["k-1", "k-2"])
+        self.assertTrue(sent[2]["idempotency_key"].startswith("payment-"))
+
+        self.assertEqual([r["success"] for r in results], [True, False, True])
+        self.assertEqual(results[1]["error"], "INSUFFICIENT_BALANCE")
+        self.assertEqual(results[2]["idempotency_key"], sent[2]["idempotency_key"])
+        self.assertEqual(results[2]["tx_no"], "PAY2")
+
+    def test_large_batches_are_chunked(self):
+        items = [{"qr_plain": "ok", "amount": 1} for _ in range(PaymentService.CHARGE_BATCH_SIZE + 5)]
+
+        results = self.service.charge_many("M001", items)
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual([r["index"] for r in results], list(range(len(items))))
+        self.assertEqual(len({r["idempotency_key"] for r in results}), len(items))
+
+    def test_retry_after_failed_chunk_reuses_keys(self):
+        items = [{"qr_plain": "ok", "amount": 1} for _ in range(PaymentService.CHARGE_BATCH_SIZE + 5)]
+        self.fail_requests = {2}
+
+        with self.assertRaises(Exception):
+            self.service.charge_many("M001", items)
+        first_attempt = [json.loads(r.content)["p_items"] for r in self.requests]
+
+        self.requests.clear()
+        self.fail_requests = set()
+        results = self.service.charge_many("M001", items)
+        retry = [json.loads(r.content)["p_items"] for r in self.requests]
+
+        sent_keys = lambda chunks: [item["idempotency_key"] for chunk in chunks for item in chunk]
+        self.assertEqual(sent_keys(retry), sent_keys(first_attempt))
+        self.assertEqual(sent_keys(retry), [item["idempotency_key"] for item in items])
+        self.assertEqual([r["idempotency_key"] for r in results], sent_keys(retry))
+        self.assertTrue(all(r["success"] for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+交易記錄游標分頁測試
+- PaginatedTable 游標模式：翻頁只傳遞游標，返回上一頁復用已記錄的游標，總數只取一次
+- MemberService.get_member_transactions_page：透傳游標並返回 next_cursor
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.member_service import MemberService
+from ui.components.table import PaginatedTable
+
+MEMBER_ID = "11111111-1111-1111-1111-111111111111"
+
+
+class PaginatedTableCursorModeTest(unittest.TestCase):
+    """PaginatedTable 游標模式"""
+
+    def setUp(self):
+        self.pages = {
+            None: {"data": [{"No": "TX1"}, {"No": "TX2"}], "next_cursor": "c1"},
+            "c1": {"data": [{"No": "TX3"}, {"No": "TX4"}], "next_cursor": "c2"},
+            "c2": {"data": [{"No": "TX5"}], "next_cursor": None},
+        }
+        self.fetched = []
+        self.count_calls = 0
+
+    def fetch(self, cursor, page_size):
+        self.fetched.append(cursor)
+        return self.pages[cursor]
+
+    def count(self):
+        self.count_calls += 1
+        return 5
+
+    def run_table(self, keys):
+        table = PaginatedTable(["No"], self.fetch, page_size=2,
+                               cursor_mode=True, count_fetcher=self.count)
+        with patch("builtins.input", side_effect=keys), patch("builtins.print"):
+            table.display_interactive()
+        return table
+
+    def test_next_and_previous_reuse_cursors(self):
+        self.run_table(["N", "N", "P", "P", "Q"])
+
+        self.assertEqual(self.fetched, [None, "c1", "c2", "c1", None])
+        self.assertEqual(self.count_calls, 1)
+
+    def test_next_ignored_on_last_page(self):
+        self.run_table(["N", "N", "N", "Q"])
+
+        self.assertEqual(self.fetched, [None, "c1", "c2", "c2"])
+
+    def test_offset_mode_unchanged(self):
+        calls = []
+
+        def fetch(page, page_size):
+            calls.append(page)
+            return {"data": [{"No": "TX"}], "pagination": {"has_next": page < 1}}
+
+        table = PaginatedTable(["No"], fetch, page_size=1)
+        with patch("builtins.input", side_effect=["N", "Q"]), patch("builtins.print"):
+            table.display_interactive()
+
+        self.assertEqual(calls, [0, 1])
+
+
+class MemberTransactionsPageTest(unittest.TestCase):
+    """get_member_transactions_page 請求與返回"""
+
+    def setUp(self):
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            rows = [
+                {"id": "a", "tx_no": "TX1", "tx_type": "payment", "final_amount": 10, "next_cursor": "c1"},
+                {"id": "b", "tx_no": "TX2", "tx_type": "payment", "final_amount": 20, "next_cursor": "c1"},
+            ]
+            return httpx.Response(200, json=rows)
+
+        use_mock_transport(self, handler)
+        self.service = MemberService()
+
+    def test_cursor_forwarded_and_next_cursor_returned(self):
+        result = self.service.get_member_transactions_page(MEMBER_ID, 2, "c0")
+
+        self.assertTrue(self.requests[0].url.path.endswith("/rpc/get_member_transactions_page"))
+        self.assertEqual(json.loads(self.requests[0].content),
+                         {"p_member_id": MEMBER_ID, "p_limit": 2, "p_cursor": "c0"})
+        self.assertEqual([tx.tx_no for tx in result["data"]], ["TX1", "TX2"])
+        self.assertEqual(result["next_cursor"], "c1")
+        self.assertTrue(result["has_next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
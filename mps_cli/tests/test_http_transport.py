@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+HTTP 連接池傳輸層測試
+call_timeout 只作用於當前線程 / 協程發出的請求，不修改共享客戶端的超時
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.http_transport import PooledTransport
+from config.settings import DatabaseConfig
+
+
+class CallTimeoutTest(unittest.TestCase):
+    """單次調用超時"""
+
+    def setUp(self):
+        self.timeouts = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.timeouts.append(request.extensions["timeout"])
+            return httpx.Response(200, json=[])
+
+        class MockClient(httpx.Client):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+        class MockPooledTransport(PooledTransport):
+            client_class = MockClient
+
+        config = DatabaseConfig(url="http://127.0.0.1:54321", service_role_key="", anon_key="",
+                                timeout=30, connect_timeout=5, http2=False)
+        self.transport = MockPooledTransport(config)
+        self.addCleanup(self.transport.close)
+
+    def get(self):
+        self.transport.client.get("http://127.0.0.1:54321/rest/v1/rpc/test")
+
+    def test_override_applies_per_request(self):
+        with self.transport.call_timeout(2):
+            self.get()
+        self.get()
+
+        self.assertEqual(self.timeouts[0], {"connect": 5, "read": 2, "write": 2, "pool": 2})
+        self.assertEqual(self.timeouts[1], {"connect": 5, "read": 30, "write": 30, "pool": 30})
+        self.assertEqual(self.transport.client.timeout, self.transport.default_timeout)
+
+    def test_concurrent_calls_keep_default_timeout(self):
+        with self.transport.call_timeout(2):
+            self.assertEqual(self.transport.client.timeout, self.transport.default_timeout)
+            other = threading.Thread(target=self.get)
+            other.start()
+            other.join()
+            self.get()
+
+        self.assertEqual([t["read"] for t in self.timeouts], [30, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
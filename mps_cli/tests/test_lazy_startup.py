@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+啟動按需導入測試
+- 導入 main 不加載角色界面與 Supabase SDK
+- supabase_client 首次訪問 client 時才建立
+（在子進程中冷啟動檢查 sys.modules，無需連接數據庫）
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.startup_profile import _parse_importtime
+
+
+def loaded_modules(code: str):
+    env = dict(os.environ,
+               SUPABASE_URL="http://127.0.0.1:54321",
+               SUPABASE_ANON_KEY="test-anon-key",
+               SUPABASE_SERVICE_ROLE_KEY="test-service-role-key")
+    script = code + "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    completed = subprocess.run([sys.executable, "-c", script], cwd=str(project_root),
+                               env=env, capture_output=True, text=True, check=True)
+    return set(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+
+class LazyStartupTest(unittest.TestCase):
+    """按需導入"""
+
+    def test_main_import_is_lightweight(self):
+        modules = loaded_modules("import main")
+
+        for name in ("ui.login_ui", "ui.member_ui", "ui.merchant_ui", "ui.admin_ui", "supabase"):
+            with self.subTest(module=name):
+                self.assertNotIn(name, modules)
+
+    def test_client_built_on_first_use(self):
+        modules = loaded_modules(
+            "from config.supabase_client import supabase_client\n"
+            "assert not supabase_client.initialized\n"
+            "import services.admin_service\n"
+            "assert not supabase_client.initialized"
+        )
+        self.assertNotIn("supabase", modules)
+
+        modules = loaded_modules(
+            "from config.supabase_client import supabase_client\n"
+            "supabase_client.client\n"
+            "assert supabase_client.initialized"
+        )
+        self.assertIn("supabase", modules)
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   config.settings\n"
+            "import time:      3000 |       3120 | main\n"
+        )
+        self.assertEqual(_parse_importtime(stderr), [("config.settings", 120), ("main", 3000)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+會員等級查找表測試
+LevelTable 二分查找結果須與服務端 compute_level / compute_discount 的查表規則一致
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.constants import MEMBERSHIP_LEVELS
+from models.level import LevelTable
+
+
+def reference_lookup(levels, points):
+    """服務端原查表規則：符合區間的最高等級，無匹配時 (0, 1.0)"""
+    matched = [
+        (level, info["discount"]) for level, info in levels.items()
+        if points >= info["min_points"] and (info["max_points"] is None or points <= info["max_points"])
+    ]
+    return max(matched) if matched else (0, 1.0)
+
+
+class LevelTableTest(unittest.TestCase):
+    """LevelTable 查找"""
+
+    def test_default_levels(self):
+        table = LevelTable.from_mapping(MEMBERSHIP_LEVELS)
+
+        self.assertEqual(table.level_for(0), 0)
+        self.assertEqual(table.level_for(999), 0)
+        self.assertEqual(table.level_for(1000), 1)
+        self.assertEqual(table.discount_for(9999), 0.90)
+        self.assertEqual(table.discount_for(10000), 0.85)
+        self.assertEqual(table.discount_for(10 ** 9), 0.85)
+
+    def test_next_level(self):
+        table = LevelTable.from_mapping(MEMBERSHIP_LEVELS)
+
+        self.assertEqual(table.next_level(1200).name, MEMBERSHIP_LEVELS[2]["name"])
+        self.assertEqual(table.next_level(1200).min_points - 1200, 3800)
+        self.assertIsNone(table.next_level(20000))
+
+    def test_matches_reference_with_gaps_and_overlaps(self):
+        levels = {
+            0: {"name": "L0", "min_points": 100, "max_points": 499, "discount": 0.99},
+            1: {"name": "L1", "min_points": 300, "max_points": 800, "discount": 0.95},
+            2: {"name": "L2", "min_points": 1000, "max_points": None, "discount": 0.90},
+        }
+        table = LevelTable.from_mapping(levels)
+
+        for points in range(0, 1200):
+            with self.subTest(points=points):
+                lookup = table.lookup(points)
+                self.assertEqual((lookup.level, lookup.discount), reference_lookup(levels, points))
+
+
+if __name__ == "__main__":
+    unittest.main()
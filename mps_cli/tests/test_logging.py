@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+日誌子系統測試
+- RPC 參數 / 結果在 DEBUG 關閉時不格式化，開啟時只輸出限長摘要
+- JSON 記錄帶 rpc / duration_ms / rows 字段
+- 調試日誌採樣與 QueueListener 後台寫入
+"""
+
+import os
+import sys
+import io
+import json
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+from config.settings import settings
+from services.base_service import BaseService
+from utils.logger import DebugSampler, JsonFormatter, lazy_repr, setup_logging, shutdown_logging
+
+
+class Expensive:
+    """記錄 repr 被調用的次數"""
+
+    calls = 0
+
+    def __repr__(self):
+        Expensive.calls += 1
+        return "Expensive()"
+
+
+class FakeClient:
+    def __init__(self, result):
+        self.result = result
+
+    def rpc(self, function_name, params):
+        return self.result
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RpcLoggingTest(unittest.TestCase):
+    """rpc_call 日誌"""
+
+    def setUp(self):
+        Expensive.calls = 0
+        self.service = BaseService()
+        self.service.client = FakeClient([Expensive() for _ in range(100)])
+        self.handler = RecordingHandler()
+        self.service.logger.addHandler(self.handler)
+        self.addCleanup(self.service.logger.removeHandler, self.handler)
+
+    def test_debug_disabled_skips_formatting(self):
+        self.service.logger.setLevel(logging.INFO)
+        self.addCleanup(self.service.logger.setLevel, logging.NOTSET)
+
+        self.service.rpc_call("get_all_cards", {"p_limit": 100})
+
+        self.assertEqual(Expensive.calls, 0)
+        [record] = self.handler.records
+        self.assertEqual(record.rpc, "get_all_cards")
+        self.assertEqual(record.rows, 100)
+        self.assertGreaterEqual(record.duration_ms, 0)
+
+    def test_debug_result_is_truncated(self):
+        self.service.logger.setLevel(logging.DEBUG)
+        self.addCleanup(self.service.logger.setLevel, logging.NOTSET)
+
+        self.service.rpc_call("get_all_cards", {"p_limit": 100})
+
+        result_record = self.handler.records[-1]
+        Expensive.calls = 0
+        message = result_record.getMessage()
+        self.assertIn("(共 100 項)", message)
+        self.assertLessEqual(Expensive.calls, 5)
+
+
+class FormattingTest(unittest.TestCase):
+    """JSON 格式與採樣"""
+
+    def make_record(self, level=logging.DEBUG, **extra):
+        record = logging.makeLogRecord({"name": "svc", "levelno": level,
+                                        "levelname": logging.getLevelName(level),
+                                        "msg": "RPC 調用成功: %s", "args": ("f",)})
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra(self):
+        entry = json.loads(JsonFormatter().format(
+            self.make_record(logging.INFO, rpc="get_all_cards", duration_ms=12.5, rows=3)))
+
+        self.assertEqual(entry["message"], "RPC 調用成功: f")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual((entry["rpc"], entry["duration_ms"], entry["rows"]), ("get_all_cards", 12.5, 3))
+
+    def test_sampler_keeps_one_in_n(self):
+        sampler = DebugSampler(0.25)
+        kept = sum(sampler.filter(self.make_record(sample=True)) for _ in range(100))
+
+        self.assertEqual(kept, 25)
+        self.assertTrue(sampler.filter(self.make_record()))
+        self.assertTrue(sampler.filter(self.make_record(logging.INFO, sample=True)))
+        self.assertFalse(DebugSampler(0).filter(self.make_record(sample=True)))
+
+    def test_lazy_repr_bounds_output(self):
+        text = str(lazy_repr([{"card_no": "X" * 500}] * 1000))
+
+        self.assertLess(len(text), 600)
+        self.assertIn("(共 1000 項)", text)
+
+
+class QueueLoggingTest(unittest.TestCase):
+    """後台寫入"""
+
+    def test_records_reach_file_through_listener(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = os.path.join(tmp, "logs", "mps.log")
+            root = logging.getLogger()
+            previous_level = root.level
+            with patch.multiple(settings.logging, file_path=log_file, format="json",
+                                async_enabled=True, level="INFO"), \
+                    patch("sys.stderr", io.StringIO()):
+                setup_logging()
+                logging.getLogger("svc").info("RPC 調用成功: %s", "f", extra={"rpc": "f", "duration_ms": 1.0})
+                shutdown_logging()
+            root.setLevel(previous_level)
+
+            with open(log_file, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertEqual([(e["logger"], e["rpc"]) for e in entries], [("svc", "f")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+會員卡片查詢往返次數回歸測試
+MemberService.get_member_cards 不論綁定多少張共享卡，都只應發出一次 RPC / 一次 HTTP 請求
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.member_service import MemberService
+
+MEMBER_ID = "11111111-1111-1111-1111-111111111111"
+
+
+def build_card_rows(shared_count: int):
+    """一張自有標準卡 + shared_count 張綁定企業卡"""
+    rows = [{
+        "id": "00000000-0000-0000-0000-000000000000",
+        "card_no": "STD00000001",
+        "card_type": "standard",
+        "owner_member_id": MEMBER_ID,
+        "balance": 100.0,
+        "status": "active",
+        "binding_role": "owner"
+    }]
+    for i in range(1, shared_count + 1):
+        rows.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "card_no": f"COR{i:08d}",
+            "card_type": "corporate",
+            "owner_member_id": None,
+            "balance": 500.0,
+            "status": "active",
+            "binding_role": "member"
+        })
+    return rows
+
+
+class MemberCardsRoundTripTest(unittest.TestCase):
+    """get_member_cards 往返次數"""
+
+    def setUp(self):
+        self.requests = []
+        self.rows = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            if request.url.path.endswith("/rpc/get_member_cards"):
+                return httpx.Response(200, json=self.rows)
+            return httpx.Response(200, json=[])
+
+        use_mock_transport(self, handler)
+
+        self.rpc_calls = []
+        self.service = MemberService()
+        original_rpc = self.service.rpc_call
+
+        def counting_rpc(function_name, params):
+            self.rpc_calls.append(function_name)
+            return original_rpc(function_name, params)
+
+        self.service.rpc_call = counting_rpc
+
+    def test_single_round_trip_regardless_of_bindings(self):
+        for shared_count in (0, 1, 25):
+            with self.subTest(shared_count=shared_count):
+                self.requests.clear()
+                self.rpc_calls.clear()
+                self.rows = build_card_rows(shared_count)
+
+                cards = self.service.get_member_cards(MEMBER_ID)
+
+                self.assertEqual(len(cards), shared_count + 1)
+                self.assertEqual(self.rpc_calls, ["get_member_cards"])
+                self.assertEqual(len(self.requests), 1)
+                self.assertEqual(json.loads(self.requests[0].content), {"p_member_id": MEMBER_ID})
+
+    def test_binding_role_attached(self):
+        self.rows = build_card_rows(2)
+
+        cards = self.service.get_member_cards(MEMBER_ID)
+
+        roles = {card.card_no: card.binding_role for card in cards}
+        self.assertEqual(roles["STD00000001"], "owner")
+        self.assertEqual(roles["COR00000001"], "member")
+
+    def test_summary_reuses_single_fetch(self):
+        self.rows = build_card_rows(3)
+
+        self.service.get_active_cards(MEMBER_ID)
+
+        self.assertEqual(len(self.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+RPC 指標測試
+- 延遲直方圖分位數估算
+- rpc_call / query_table 按函數與角色記錄延遲、行數與錯誤碼（含異步服務）
+- Prometheus 文本導出與本地 /metrics 端點
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+import urllib.request
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+from config.settings import settings
+from services.base_service import BaseService
+from services.async_base_service import AsyncBaseService
+from utils.metrics import LatencyHistogram, MetricsRegistry, metrics_registry, _serve_metrics
+
+
+class FakeClient:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+
+    def rpc(self, function_name, params):
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class FakeQuery:
+    def __init__(self):
+        self.filters = {}
+
+    def select(self, columns):
+        return self
+
+    def eq(self, key, value):
+        self.filters[key] = value
+        return self
+
+    def limit(self, limit):
+        return self
+
+
+class FakeAsyncClient:
+    def __init__(self, data=None, error=None):
+        self.data = data
+        self.error = error
+
+    async def query(self, table):
+        return FakeQuery()
+
+    async def execute(self, query):
+        if self.error:
+            raise self.error
+        return SimpleNamespace(data=self.data)
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    """分位數估算"""
+
+    def test_quantiles_within_bucket_resolution(self):
+        histogram = LatencyHistogram()
+        for duration_ms in range(1, 1001):
+            histogram.observe(duration_ms)
+
+        self.assertAlmostEqual(histogram.quantile(0.50), 500, delta=50)
+        self.assertAlmostEqual(histogram.quantile(0.95), 950, delta=50)
+        self.assertLessEqual(histogram.quantile(0.99), 1000)
+        self.assertIsNone(LatencyHistogram().quantile(0.5))
+
+    def test_overflow_bucket_clamped_to_max(self):
+        histogram = LatencyHistogram()
+        histogram.observe(30000)
+
+        self.assertEqual(histogram.quantile(0.99), 30000)
+
+
+class ServiceInstrumentationTest(unittest.TestCase):
+    """BaseService 埋點"""
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.service = BaseService()
+        self.service.set_auth_service(SimpleNamespace(session_id=None, current_role="merchant"))
+
+    def series(self, name):
+        return next(row for row in metrics_registry.snapshot() if row["name"] == name)
+
+    def test_success_records_latency_and_rows(self):
+        self.service.client = FakeClient([{"id": 1}, {"id": 2}])
+        self.service.rpc_call("get_merchant_transactions", {})
+        self.service.rpc_call("get_merchant_transactions", {})
+
+        row = self.series("get_merchant_transactions")
+        self.assertEqual((row["kind"], row["role"], row["calls"], row["errors"]), ("rpc", "merchant", 2, 0))
+        self.assertEqual((row["rows_total"], row["rows_max"]), (4, 2))
+        self.assertIsNotNone(row["p99_ms"])
+
+    def test_errors_counted_by_code(self):
+        self.service.client = FakeClient(error=Exception("P0001: INSUFFICIENT_BALANCE"))
+        with self.assertRaises(Exception):
+            self.service.rpc_call("merchant_charge_by_qr", {})
+        self.service.client = FakeClient(error=Exception("connection reset"))
+        with self.assertRaises(Exception):
+            self.service.rpc_call("merchant_charge_by_qr", {})
+
+        row = self.series("merchant_charge_by_qr")
+        self.assertEqual(row["error_codes"], {"INSUFFICIENT_BALANCE": 1, "UNKNOWN": 1})
+
+    def test_disabled(self):
+        self.service.client = FakeClient([])
+        with patch.object(settings.metrics, "enabled", False):
+            self.service.rpc_call("search_cards", {})
+
+        self.assertEqual(metrics_registry.snapshot(), [])
+
+
+class AsyncServiceInstrumentationTest(unittest.TestCase):
+    """AsyncBaseService 埋點"""
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+
+    def service(self, client):
+        service = AsyncBaseService(client=client)
+        service.auth_service = SimpleNamespace(session_id=None, current_role="admin")
+        return service
+
+    def test_query_table_records_rows_and_errors(self):
+        asyncio.run(self.service(FakeAsyncClient([{"id": 1}, {"id": 2}, {"id": 3}]))
+                    .query_table("merchants", {"status": "active"}, limit=10))
+        with self.assertRaises(Exception):
+            asyncio.run(self.service(FakeAsyncClient(error=Exception("connection reset")))
+                        .query_table("merchants"))
+
+        row = next(row for row in metrics_registry.snapshot() if row["name"] == "merchants")
+        self.assertEqual((row["kind"], row["role"], row["calls"], row["errors"]), ("query", "admin", 2, 1))
+        self.assertEqual((row["rows_total"], row["rows_max"]), (3, 3))
+        self.assertEqual(row["error_codes"], {"UNKNOWN": 1})
+
+
+class ExportTest(unittest.TestCase):
+    """Prometheus 導出"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.observe("rpc", "search_cards", "admin", 12.0, rows=3)
+        self.registry.observe("rpc", "search_cards", "admin", 40.0, error=Exception("CARD_NOT_FOUND_OR_INACTIVE"))
+
+    def test_render_prometheus(self):
+        text = self.registry.render_prometheus()
+        labels = 'kind="rpc",function="search_cards",role="admin"'
+
+        self.assertIn(f'mps_rpc_duration_seconds_bucket{{{labels},le="0.025"}} 1', text)
+        self.assertIn(f'mps_rpc_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f"mps_rpc_duration_seconds_sum{{{labels}}} 0.052", text)
+        self.assertIn(f"mps_rpc_duration_seconds_count{{{labels}}} 2", text)
+        self.assertIn(f"mps_rpc_result_rows_total{{{labels}}} 3", text)
+        self.assertIn(f'mps_rpc_errors_total{{{labels},code="CARD_NOT_FOUND_OR_INACTIVE"}} 1', text)
+
+    def test_dump_and_endpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.registry.dump(os.path.join(tmp, "metrics", "mps.prom"))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), self.registry.render_prometheus())
+
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        metrics_registry.observe("rpc", "get_all_cards", "admin", 5.0)
+        port = _serve_metrics(0)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+
+        self.assertIn('function="get_all_cards"', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+行模型構建測試
+- from_rows 與逐行 from_dict 結果一致（缺列取默認值，多餘列忽略）
+- 模型為 __slots__ 類，時間 / 金額字段按需轉換
+"""
+
+import sys
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from models import Card, Member, Transaction
+from models.base import ModelFactory
+
+
+class FromRowsTest(unittest.TestCase):
+    """from_rows 批量構建"""
+
+    def test_matches_from_dict(self):
+        rows = [
+            {"id": "c-1", "card_no": "C001", "status": "active", "balance": 10.5, "total_count": 2},
+            {"id": "c-2", "card_no": "C002", "points": 300, "created_at": "2026-01-01T00:00:00Z"},
+        ]
+
+        self.assertEqual(Card.from_rows(rows), [Card.from_dict(row) for row in rows])
+        self.assertEqual(ModelFactory.create_list_from_db_rows(Card, rows), Card.from_rows(rows))
+
+    def test_empty_and_none(self):
+        self.assertEqual(Transaction.from_rows([]), [])
+        self.assertEqual(Transaction.from_rows(None), [])
+        self.assertEqual(Member.from_rows([{}]), [Member()])
+
+    def test_large_batch_restores_gc(self):
+        import gc
+
+        rows = [{"id": str(i), "tx_no": f"TX{i}"} for i in range(6000)]
+        self.assertEqual(len(Transaction.from_rows(rows)), 6000)
+        self.assertTrue(gc.isenabled())
+
+
+class SlottedModelTest(unittest.TestCase):
+    """__slots__ 模型行為"""
+
+    def test_no_instance_dict(self):
+        card = Card(card_no="C001")
+
+        self.assertFalse(hasattr(card, "__dict__"))
+        with self.assertRaises(AttributeError):
+            card.unknown_field = 1
+
+    def test_mixin_methods(self):
+        card = Card(card_no="C001", status="active")
+        member = Member(id="1234567890abcdef")
+
+        self.assertTrue(card.is_active())
+        self.assertEqual(card.get_display_name(), "C001")
+        self.assertEqual(member.get_display_name(), "ID: 12345678...")
+        self.assertEqual(Transaction(status="completed").get_status_display(), "已完成")
+
+    def test_lazy_conversion(self):
+        tx = Transaction.from_dict({"final_amount": 95.1, "created_at": "2026-01-01T08:00:00Z"})
+
+        self.assertEqual(tx.final_amount, 95.1)
+        self.assertEqual(tx.get_decimal("final_amount"), Decimal("95.1"))
+        self.assertEqual(tx.get_created_datetime().hour, 8)
+        self.assertIsNone(tx.get_decimal("refunded_amount"))
+
+    def test_update_from_dict_ignores_methods(self):
+        member = Member(name="A")
+        member.update_from_dict({"name": "B", "is_active": True})
+
+        self.assertEqual(member.name, "B")
+        self.assertFalse(member.is_active())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+搜尋識別碼快速路徑測試
+完整會員號 / 卡號 / 手機號 / 郵箱以 p_exact_only 走服務端精確查找，其他關鍵字走模糊搜尋
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.admin_service import AdminService
+from services.member_service import MemberService
+from utils.identifier_resolver import IdentifierResolver
+
+
+class IdentifierFormatTest(unittest.TestCase):
+    """識別碼格式與 gen_member_no / gen_card_no 一致"""
+
+    def test_member_no(self):
+        self.assertTrue(IdentifierResolver.is_member_no("M00000001"))
+        for keyword in ("Mary", "M0001", "M202501001", "MSHOP0001"):
+            with self.subTest(keyword=keyword):
+                self.assertFalse(IdentifierResolver.is_member_no(keyword))
+
+    def test_card_no(self):
+        for card_no in ("STD00000001", "VCH00000002", "COR00000003", "CARD00000004", "C202501001"):
+            with self.subTest(card_no=card_no):
+                self.assertTrue(IdentifierResolver.is_card_no(card_no))
+        self.assertFalse(IdentifierResolver.is_card_no("STD0001"))
+        self.assertFalse(IdentifierResolver.is_card_no("Carol"))
+
+    def test_email(self):
+        self.assertTrue(IdentifierResolver.is_email("a.b+c@example.com.tw"))
+        for keyword in ("@gmail.com", "gmail.com", "a@b", "a@gmail.", "a.b@"):
+            with self.subTest(keyword=keyword):
+                self.assertFalse(IdentifierResolver.is_email(keyword))
+
+
+class SearchFastPathTest(unittest.TestCase):
+    """搜尋 RPC 參數"""
+
+    def setUp(self):
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append((request.url.path, json.loads(request.content)))
+            return httpx.Response(200, json=[])
+
+        use_mock_transport(self, handler)
+
+    def last_params(self):
+        return self.requests[-1][1]
+
+    def test_member_search(self):
+        service = MemberService()
+
+        for keyword in ("M00000001", "13812345678", "a@example.com"):
+            with self.subTest(keyword=keyword):
+                service.search_members(keyword)
+                self.assertTrue(self.last_params()["p_exact_only"])
+
+        for keyword in ("王小", "@gmail.com", "M0000000"):
+            with self.subTest(keyword=keyword):
+                service.search_members(keyword)
+                self.assertEqual(self.requests[-1][0], "/rest/v1/rpc/search_members")
+                self.assertFalse(self.last_params()["p_exact_only"])
+
+    def test_card_search(self):
+        service = AdminService()
+
+        service.search_cards("STD00000001")
+        self.assertEqual(self.requests[-1][0], "/rest/v1/rpc/search_cards")
+        self.assertTrue(self.last_params()["p_exact_only"])
+
+        service.search_cards_advanced("13812345678")
+        self.assertTrue(self.last_params()["p_exact_only"])
+
+        service.search_cards("STD0000")
+        self.assertFalse(self.last_params()["p_exact_only"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+管理端本地搜尋索引測試
+- SearchIndex：前綴 / n-gram 匹配、相關度排序、增量更新與容量上限
+- SearchIndexService：按 updated_at 游標流式載入、增量刷新與持卡人資料同步
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from config.settings import settings
+from services.search_index_service import SearchIndexService
+from utils.search_index import SearchIndex
+
+
+def member(key, member_no, name, phone):
+    return SimpleNamespace(id=key, member_no=member_no, name=name, phone=phone)
+
+
+class SearchIndexTest(unittest.TestCase):
+    """SearchIndex 查找與更新"""
+
+    def setUp(self):
+        self.index = SearchIndex((("member_no", 3), ("phone", 3), ("name", 2)), max_entries=10)
+        self.index.upsert("1", member("1", "M00000001", "王小明", "13800001111"))
+        self.index.upsert("2", member("2", "M00000002", "Alice Wang", "13900002222"))
+        self.index.upsert("3", member("3", "M00000013", "李小明", "13800003333"))
+
+    def keys(self, keyword, limit=50):
+        return [record.id for record in self.index.search(keyword, limit)]
+
+    def test_substring_and_prefix(self):
+        self.assertEqual(self.keys("0002222"), ["2"])
+        self.assertEqual(sorted(self.keys("小明")), ["1", "3"])
+        self.assertEqual(self.keys("王"), ["1"])
+        self.assertEqual(self.keys("wang"), ["2"])
+        self.assertEqual(self.keys("zzz"), [])
+
+    def test_exact_and_prefix_rank_first(self):
+        self.assertEqual(self.keys("M00000001")[0], "1")
+        self.assertEqual(self.keys("138")[:2], ["3", "1"])
+        self.assertEqual(self.keys("M0000001"), ["3"])
+
+    def test_update_and_remove(self):
+        self.index.upsert("1", member("1", "M00000001", "王大明", "13800001111"))
+        self.assertEqual(self.keys("小明"), ["3"])
+        self.assertEqual(self.keys("大明"), ["1"])
+
+        self.assertTrue(self.index.remove("3"))
+        self.assertEqual(self.keys("小明"), [])
+        self.assertEqual(self.keys("138"), ["1"])
+        self.assertEqual(len(self.index), 2)
+
+    def test_max_entries(self):
+        index = SearchIndex((("name", 2),), max_entries=2)
+        self.assertTrue(index.upsert("1", member("1", None, "a", None)))
+        self.assertTrue(index.upsert("2", member("2", None, "b", None)))
+        self.assertFalse(index.upsert("3", member("3", None, "c", None)))
+        self.assertTrue(index.upsert("2", member("2", None, "bb", None)))
+
+    def test_stale_sorted_entries_compacted(self):
+        for i in range(3000):
+            self.index.upsert("1", member("1", "M00000001", f"王{i}", "13800001111"))
+        self.assertEqual(self.keys("王"), ["1"])
+        self.assertLess(sum(len(entries) for entries in self.index._sorted), 3000)
+
+
+class SearchIndexServiceTest(unittest.TestCase):
+    """SearchIndexService 載入與刷新"""
+
+    def setUp(self):
+        self.requests = []
+        self.pages = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            function_name = request.url.path.rsplit("/", 1)[-1]
+            params = json.loads(request.content)
+            self.requests.append((function_name, params))
+            rows = self.pages[function_name].get(params.get("p_cursor"), [])
+            return httpx.Response(200, json=rows)
+
+        use_mock_transport(self, handler)
+
+        self.member_rows = [
+            {"id": "m1", "member_no": "M00000001", "name": "王小明", "phone": "13800001111",
+             "email": "wxm@example.com", "status": "active", "created_at": "2026-01-01T00:00:00+00:00",
+             "updated_at": "2026-01-01T00:00:00+00:00", "next_cursor": None},
+            {"id": "m2", "member_no": "M00000002", "name": "李小華", "phone": "13900002222",
+             "status": "active", "created_at": "2026-01-02T00:00:00+00:00",
+             "updated_at": "2026-01-02T00:00:00+00:00", "next_cursor": "c1"},
+        ]
+        self.card_rows = [
+            {"id": "c1", "card_no": "STD00000001", "card_type": "standard", "owner_member_id": "m1",
+             "owner_name": "王小明", "owner_phone": "13800001111", "balance": 10, "status": "active",
+             "created_at": "2026-01-01T00:00:00+00:00", "updated_at": "2026-01-01T00:00:00+00:00",
+             "next_cursor": None},
+        ]
+        self.pages = {
+            "get_all_members_page": {None: self.member_rows[:2], "c1": []},
+            "get_all_cards_page": {None: self.card_rows},
+        }
+
+        self._settings = patch.multiple(settings.ui, search_index_enabled=True,
+                                        search_index_max_entries=100, search_index_refresh_seconds=0)
+        self._settings.start()
+
+    def tearDown(self):
+        self._settings.stop()
+
+    def test_streaming_load_and_local_queries(self):
+        service = SearchIndexService()
+
+        self.assertTrue(service.ensure_ready())
+        self.assertEqual([name for name, _ in self.requests],
+                         ["get_all_members_page", "get_all_members_page", "get_all_cards_page"])
+        self.assertEqual(self.requests[1][1]["p_cursor"], "c1")
+        self.assertIsNone(self.requests[0][1]["p_updated_after"])
+
+        self.requests.clear()
+        self.assertEqual([m.member_no for m in service.search_members("M0000000")], ["M00000002", "M00000001"])
+        self.assertEqual([m.member_no for m in service.search_members("李")], ["M00000002"])
+        self.assertEqual([c.card_no for c in service.search_cards("王小")], ["STD00000001"])
+        self.assertEqual([m.member_no for m in service.search_members("wxm@example.com")], ["M00000001"])
+        self.assertEqual([c.card_no for c in service.search_cards("M00000001")], ["STD00000001"])
+        self.assertEqual([c.card_no for c in service.search_cards("WXM@example.com")], ["STD00000001"])
+        self.assertEqual(service.search_cards("M00000002"), [])
+        page = service.page_members(limit=1, offset=0)
+        self.assertEqual(page["data"][0].id, "m2")
+        self.assertTrue(page["pagination"]["has_next"])
+        self.assertEqual(self.requests, [])
+
+    def test_refresh_uses_high_water_mark_and_syncs_owner(self):
+        service = SearchIndexService()
+        service.ensure_ready()
+
+        renamed = dict(self.member_rows[0], name="王大明", updated_at="2026-01-03T00:00:00+00:00")
+        self.pages = {
+            "get_all_members_page": {None: [renamed]},
+            "get_all_cards_page": {None: []},
+        }
+        self.requests.clear()
+        service.ensure_ready()
+
+        self.assertEqual(self.requests[0][1]["p_updated_after"], "2026-01-01T23:59:55+00:00")
+        self.assertEqual(self.requests[1][1]["p_updated_after"], "2025-12-31T23:59:55+00:00")
+        self.assertEqual([c.card_no for c in service.search_cards("大明")], ["STD00000001"])
+        self.assertEqual(service.search_cards("小明"), [])
+
+    def test_overflow_falls_back(self):
+        settings.ui.search_index_max_entries = 1
+        service = SearchIndexService()
+
+        self.assertFalse(service.ensure_ready())
+        self.assertTrue(service.overflowed)
+        self.assertIsNone(service.search_members("王"))
+        self.assertEqual(len(service.members), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
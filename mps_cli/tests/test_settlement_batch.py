@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+批量結算測試
+- SettlementService.generate_all：按 last_merchant_id 游標逐批調用直到 done，累計各批結果並計算吞吐量
+- settlement_period：按結算模式推算上一個完整期間
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import sys
+import json
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.settlement_service import SettlementService
+
+
+class GenerateAllTest(unittest.TestCase):
+    """generate_all 分批調用"""
+
+    def setUp(self):
+        self.requests = []
+        self.chunks = {
+            None: {"scanned": 2, "created": 1, "skipped_existing": 1, "no_activity": 0, "negative_net": 0,
+                   "last_merchant_id": "m-2", "done": False, "total_merchants": 3},
+            "m-2": {"scanned": 1, "created": 0, "skipped_existing": 0, "no_activity": 1, "negative_net": 0,
+                    "last_merchant_id": "m-3", "done": True, "total_merchants": None},
+        }
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            body = json.loads(request.content)
+            return httpx.Response(200, json=[self.chunks[body["p_after_merchant_id"]]])
+
+        use_mock_transport(self, handler)
+        self.service = SettlementService()
+
+    def test_follows_cursor_and_accumulates(self):
+        progress = []
+
+        result = self.service.generate_all("monthly", "2026-09-01T00:00:00+00:00", "2026-10-01T00:00:00+00:00",
+                                           chunk_size=2, progress_callback=progress.append)
+
+        sent = [json.loads(r.content) for r in self.requests]
+        self.assertTrue(all(r.url.path.endswith("/rpc/generate_settlements_chunk") for r in self.requests))
+        self.assertEqual([b["p_after_merchant_id"] for b in sent], [None, "m-2"])
+        self.assertTrue(all(b["p_chunk_size"] == 2 and b["p_mode"] == "monthly" for b in sent))
+
+        self.assertEqual(result["merchants"], 3)
+        self.assertEqual(result["total"], 3)
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["skipped_existing"], 1)
+        self.assertEqual(result["no_activity"], 1)
+        self.assertEqual(result["chunks"], 2)
+        self.assertEqual(result["last_merchant_id"], "m-3")
+        self.assertGreater(result["merchants_per_second"], 0)
+        self.assertEqual([p["merchants"] for p in progress], [2, 3])
+
+    def test_resume_from_cursor(self):
+        result = self.service.generate_all("monthly", "2026-09-01T00:00:00+00:00", "2026-10-01T00:00:00+00:00",
+                                           after_merchant_id="m-2")
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(result["merchants"], 1)
+
+
+class SettlementPeriodTest(unittest.TestCase):
+    """settlement_period 推算"""
+
+    def test_periods(self):
+        now = datetime(2026, 3, 15, 8, 30, tzinfo=timezone.utc)
+
+        self.assertEqual(SettlementService.settlement_period("t_plus_1", now),
+                         ("2026-03-14T00:00:00+00:00", "2026-03-15T00:00:00+00:00"))
+        self.assertEqual(SettlementService.settlement_period("monthly", now),
+                         ("2026-02-01T00:00:00+00:00", "2026-03-01T00:00:00+00:00"))
+        with self.assertRaises(ValueError):
+            SettlementService.settlement_period("realtime", now)
+
+
+if __name__ == "__main__":
+    unittest.main()
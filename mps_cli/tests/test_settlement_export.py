@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+結算明細流式導出測試
+- SettlementService.export_settlement_transactions：按游標逐頁請求直到 next_cursor 為空，逐行寫出 CSV / JSONL
+- get_settlement_detail：從 payload 解析彙總與按日明細
+（使用 httpx.MockTransport 攔截請求，無需連接數據庫）
+"""
+
+import io
+import sys
+import csv
+import json
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.settlement_service import SettlementService
+
+SETTLEMENT_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def make_row(n, next_cursor):
+    return {"id": f"tx-{n}", "tx_no": f"PAY{n:04d}", "tx_type": "payment", "card_id": "card-1",
+            "raw_amount": 10, "discount_applied": 1.0, "final_amount": 10, "status": "completed",
+            "created_at": f"2026-09-01T00:00:{n:02d}+00:00", "next_cursor": next_cursor}
+
+
+class SettlementExportTest(unittest.TestCase):
+    """結算明細導出"""
+
+    def setUp(self):
+        self.requests = []
+        self.pages = {
+            None: [make_row(1, "c1"), make_row(2, "c1")],
+            "c1": [make_row(3, "c2"), make_row(4, "c2")],
+            "c2": [make_row(5, None)],
+        }
+        self.detail = {
+            "id": SETTLEMENT_ID, "merchant_id": "m-1", "mode": "monthly",
+            "period_start": "2026-09-01T00:00:00+00:00", "period_end": "2026-10-01T00:00:00+00:00",
+            "total_amount": 90, "total_tx_count": 5, "status": "pending",
+            "payload": {"version": 1,
+                        "totals": {"payment_count": 4, "payment_amount": 100, "refund_count": 1,
+                                   "refund_amount": 10, "net_amount": 90, "fee_amount": 0},
+                        "days": [{"day": "2026-09-01", "payment_count": 4, "payment_amount": 100,
+                                  "refund_count": 1, "refund_amount": 10}]},
+        }
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            body = json.loads(request.content)
+            if request.url.path.endswith("/rpc/get_settlement_detail"):
+                return httpx.Response(200, json=self.detail)
+            return httpx.Response(200, json=self.pages[body.get("p_cursor")])
+
+        use_mock_transport(self, handler)
+        self.service = SettlementService()
+
+    def test_csv_export_follows_cursor_until_last_page(self):
+        output = io.StringIO()
+
+        count = self.service.export_settlement_transactions(SETTLEMENT_ID, output, "csv", page_size=2)
+
+        self.assertEqual(count, 5)
+        sent = [json.loads(r.content) for r in self.requests]
+        self.assertEqual([b["p_cursor"] for b in sent], [None, "c1", "c2"])
+        self.assertTrue(all(b["p_limit"] == 2 for b in sent))
+
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertEqual([r["tx_no"] for r in rows], ["PAY0001", "PAY0002", "PAY0003", "PAY0004", "PAY0005"])
+        self.assertNotIn("next_cursor", rows[0])
+
+    def test_jsonl_export(self):
+        output = io.StringIO()
+
+        count = self.service.export_settlement_transactions(SETTLEMENT_ID, output, "jsonl")
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(count, len(lines))
+        self.assertEqual(json.loads(lines[-1])["tx_no"], "PAY0005")
+
+    def test_detail_parses_payload(self):
+        settlement = self.service.get_settlement_detail(SETTLEMENT_ID)
+
+        self.assertEqual(settlement.payment_count, 4)
+        self.assertEqual(settlement.refund_count, 1)
+        self.assertEqual(str(settlement.net_amount), "90")
+        self.assertEqual(settlement.settlement_mode, "monthly")
+        self.assertEqual(settlement.daily_breakdown[0]["day"], "2026-09-01")
+
+
+if __name__ == "__main__":
+    unittest.main()
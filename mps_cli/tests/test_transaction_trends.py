@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+交易趨勢測試
+- AdminService / PaymentService.get_transaction_trends：請求參數與返回行（MockTransport）
+- rpc/mps_rpc.sql：按日彙總 CTE（WITH daily AS）各 UNION ALL 分支列數一致
+- 設定 MPS_TEST_DATABASE_URL 且本機有 psql 時，在回滾的事務中實際調用 get_transaction_trends
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import subprocess
+import unittest
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.mock_client import use_mock_transport
+from services.admin_service import AdminService
+from services.payment_service import PaymentService
+
+RPC_SQL = project_root.parent / "rpc" / "mps_rpc.sql"
+DATABASE_URL = os.environ.get("MPS_TEST_DATABASE_URL")
+
+
+def split_top_level(text: str, separator: str):
+    """按括號外的分隔符（不分大小寫）切分"""
+    parts, depth, start, i = [], 0, 0, 0
+    pattern = re.compile(re.escape(separator), re.I)
+    while i < len(text):
+        char = text[i]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and pattern.match(text, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def daily_cte_branches(function_sql: str):
+    """WITH daily AS (...) 內各 UNION ALL 分支的 SELECT 列表"""
+    body = function_sql[function_sql.index("WITH daily AS (") + len("WITH daily AS ("):]
+    depth = 1
+    for end, char in enumerate(body):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth == 0:
+            break
+    branches = []
+    for branch in split_top_level(body[:end], "UNION ALL"):
+        select_list = split_top_level(branch.strip()[len("SELECT"):], "\n    FROM ")[0]
+        branches.append([column.strip() for column in split_top_level(select_list, ",")])
+    return branches
+
+
+def function_sql(name: str) -> str:
+    sql = re.sub(r"--[^\n]*", "", RPC_SQL.read_text(encoding="utf-8"))
+    start = sql.index(f"CREATE OR REPLACE FUNCTION {name}(")
+    return sql[start:sql.index("$$;", start)]
+
+
+class TrendsServiceTest(unittest.TestCase):
+    """get_transaction_trends 請求與返回"""
+
+    def setUp(self):
+        self.requests = []
+        self.rows = [{
+            "period_start": "2026-09-01T00:00:00+00:00", "period_end": "2026-09-02T00:00:00+00:00",
+            "transaction_count": 3, "payment_amount": 30, "refund_amount": 5, "net_amount": 25,
+            "unique_customers": 2, "average_transaction": 10,
+        }]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return httpx.Response(200, json=self.rows)
+
+        use_mock_transport(self, handler)
+
+    def test_admin_and_merchant_trends_call_rpc(self):
+        for service in (AdminService(), PaymentService()):
+            with self.subTest(service=type(service).__name__):
+                self.requests.clear()
+
+                trends = service.get_transaction_trends("2026-09-01T00:00:00+00:00", "2026-10-01T00:00:00+00:00",
+                                                        "m-1", "week")
+
+                self.assertEqual(len(self.requests), 1)
+                self.assertTrue(self.requests[0].url.path.endswith("/rpc/get_transaction_trends"))
+                self.assertEqual(json.loads(self.requests[0].content), {
+                    "p_start_date": "2026-09-01T00:00:00+00:00", "p_end_date": "2026-10-01T00:00:00+00:00",
+                    "p_merchant_id": "m-1", "p_group_by": "week",
+                })
+                self.assertEqual(trends, self.rows)
+
+
+class DailyCteShapeTest(unittest.TestCase):
+    """彙總表分支與原始交易分支的列數、列順序一致"""
+
+    def test_union_branches_match(self):
+        for name, first_column in (("get_transaction_trends", "day"), ("sec.merchant_daily_breakdown", "merchant_id")):
+            with self.subTest(function=name):
+                branches = daily_cte_branches(function_sql(name))
+
+                self.assertEqual(len(branches), 3)
+                self.assertEqual(len({len(columns) for columns in branches}), 1, branches)
+                self.assertEqual(branches[0][0], f"r.{first_column}")
+                if first_column == "day":
+                    self.assertTrue(all(columns[0].endswith("::date") for columns in branches[1:]))
+
+
+@unittest.skipUnless(DATABASE_URL and shutil.which("psql"), "需要 MPS_TEST_DATABASE_URL 與 psql")
+class TrendsDatabaseTest(unittest.TestCase):
+    """在回滾的事務中調用 get_transaction_trends"""
+
+    def test_trends_rpc_runs_for_each_grouping(self):
+        sql = """
+            BEGIN;
+            INSERT INTO public.app_sessions(session_id, user_role, user_id, expires_at, last_accessed_at)
+            VALUES ('test-trends', 'super_admin', extensions.gen_random_uuid(), now_utc() + interval '1 hour', now_utc());
+            SELECT count(*) FROM get_transaction_trends(now_utc() - interval '90 days', now_utc(), NULL, 'day', 'test-trends');
+            SELECT count(*) FROM get_transaction_trends(now_utc() - interval '90 days', now_utc(), NULL, 'week', 'test-trends');
+            SELECT count(*) FROM get_transaction_trends(now_utc() - interval '90 days', now_utc(), NULL, 'month', 'test-trends');
+            ROLLBACK;
+        """
+        result = subprocess.run(["psql", DATABASE_URL, "-XAtq", "-v", "ON_ERROR_STOP=1", "-f", "-"],
+                                input=sql, capture_output=True, text=True, timeout=60)
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len(result.stdout.split()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
 from typing import Optional, Dict, List
+from config.settings import settings
 from services.admin_service import AdminService
 from services.member_service import MemberService
 from services.qr_service import QRService
+from services.settlement_service import SettlementService
+from services.search_index_service import SearchIndexService
 from services.auth_service import AuthService
 from ui.components.menu import Menu, SimpleMenu
 from ui.components.table import Table
@@ -10,6 +13,7 @@ from ui.base_ui import BaseUI, StatusDisplay
 from utils.formatters import Formatter
 from utils.validators import Validator
 from utils.logger import ui_logger
+from utils.metrics import metrics_registry
 
 class AdminUI:
     """管理員用戶界面"""
@@ -18,12 +22,14 @@ class AdminUI:
         self.admin_service = AdminService()
         self.member_service = MemberService()
         self.qr_service = QRService()
+        self.search_index = SearchIndexService()
         self.auth_service = auth_service
         
         # 設定 auth_service
         self.admin_service.set_auth_service(auth_service)
         self.member_service.set_auth_service(auth_service)
         self.qr_service.set_auth_service(auth_service)
+        self.search_index.set_auth_service(auth_service)
         
         # 從 auth_service 取得資訊
         profile = auth_service.get_current_user()
@@ -297,7 +303,11 @@ class AdminUI:
                 BaseUI.show_loading("Loading members...")
                 
                 offset = (page - 1) * page_size
-                result = self.member_service.get_all_members(page_size, offset)
+                result = None
+                if self._search_index_ready():
+                    result = self.search_index.page_members(page_size, offset)
+                if result is None:
+                    result = self.member_service.get_all_members(page_size, offset)
                 
                 members = result['data']
                 pagination = result['pagination']
@@ -1179,6 +1189,7 @@ class AdminUI:
                 "Today's Transaction Stats",
                 "Transaction Trends Analysis",
                 "System Health Check",
+                "RPC Latency Metrics",
                 "Return to Main Menu"
             ]
             
@@ -1195,6 +1206,8 @@ class AdminUI:
             elif choice == 5:
                 self._show_system_health_check()
             elif choice == 6:
+                self._show_rpc_metrics()
+            elif choice == 7:
                 break
     
     def _show_basic_statistics(self):
@@ -1241,6 +1254,7 @@ class AdminUI:
             today = stats.get("today", {})
             print(f"\n📈 Today's Transactions:")
             print(f"  Transaction Count: {today.get('transaction_count', 0):,}")
+            print(f"  Payment Count: {today.get('payment_count', 0):,}")
             print(f"  Payment Amount: {Formatter.format_currency(today.get('payment_amount', 0))}")
             
             print("═" * 50)
@@ -1480,6 +1494,66 @@ class AdminUI:
             BaseUI.show_error(f"Failed to perform system health check: {e}")
             BaseUI.pause()
     
+    def _show_rpc_metrics(self):
+        """本進程的 RPC / 查詢延遲分位數（按 p95 降序）"""
+        while True:
+            BaseUI.clear_screen()
+            BaseUI.show_header("RPC Latency Metrics")
+            
+            snapshot = metrics_registry.snapshot()
+            if not snapshot:
+                BaseUI.show_info("No RPC calls recorded yet in this session")
+            else:
+                headers = ["Function", "Kind", "Role", "Calls", "Errors",
+                           "p50 ms", "p95 ms", "p99 ms", "Max ms", "Avg Rows"]
+                data = [{
+                    "Function": row["name"],
+                    "Kind": row["kind"],
+                    "Role": row["role"],
+                    "Calls": f"{row['calls']:,}",
+                    "Errors": f"{row['errors']:,}",
+                    "p50 ms": f"{row['p50_ms']:.1f}",
+                    "p95 ms": f"{row['p95_ms']:.1f}",
+                    "p99 ms": f"{row['p99_ms']:.1f}",
+                    "Max ms": f"{row['max_ms']:.1f}",
+                    "Avg Rows": f"{row['rows_total'] / row['calls']:.1f}" if row["rows_total"] else "-"
+                } for row in snapshot]
+                
+                Table(headers, data, f"{len(snapshot)} series").display()
+                
+                errors = [(row["name"], code, count) for row in snapshot
+                          for code, count in sorted(row["error_codes"].items())]
+                if errors:
+                    print("\n❌ Errors by code:")
+                    for name, code, count in errors:
+                        print(f"  {name}: {code} × {count}")
+            
+            pool = self.admin_service.client.get_pool_metrics() if self.admin_service.client.initialized else None
+            if pool:
+                print(f"\n🔌 HTTP pool: {pool['requests']:,} requests, hit ratio {pool['hit_ratio']:.1%}, "
+                      f"errors {pool['errors']:,}")
+            
+            choice = BaseUI.show_menu(
+                ["Refresh", "Export Prometheus Text File", "Reset Metrics", "Return"],
+                "Metrics Options"
+            )
+            
+            if choice == 1:
+                continue
+            elif choice == 2:
+                default_path = settings.metrics.file_path or "logs/mps_metrics.prom"
+                path = input(f"File path [{default_path}]: ").strip() or default_path
+                try:
+                    BaseUI.show_success(f"Metrics written to {metrics_registry.dump(path)}")
+                except OSError as e:
+                    BaseUI.show_error(f"Export failed: {e}")
+                BaseUI.pause()
+            elif choice == 3:
+                if BaseUI.confirm_action("Reset all recorded metrics?"):
+                    metrics_registry.reset()
+            else:
+                break
+    
     def _system_maintenance(self):
         """系統維護"""
         while True:
@@ -1488,6 +1562,7 @@ class AdminUI:
             
             options = [
                 "Batch Rotate QR Codes",
+                "Generate Settlements (All Merchants)",
                 "Clean Expired Data",
                 "System Health Check",
                 "Return to Main Menu"
@@ -1498,11 +1573,13 @@ class AdminUI:
             if choice == 1:
                 self._batch_rotate_qr()
             elif choice == 2:
+                self._generate_all_settlements()
+            elif choice == 3:
                 BaseUI.show_info("Clean expired data feature under development...")
                 BaseUI.pause()
-            elif choice == 3:
-                self._show_system_health_check()
             elif choice == 4:
+                self._show_system_health_check()
+            elif choice == 5:
                 break
     
     def _batch_rotate_qr(self):
@@ -1531,18 +1608,32 @@ class AdminUI:
                 BaseUI.pause()
                 return
             
-            # 執行批量輪換
+            # 執行批量輪換（分塊提交，逐塊顯示進度）
             BaseUI.show_loading("Batch rotating QR codes...")
-            affected_count = self.admin_service.batch_rotate_qr_tokens(ttl_seconds)
+            
+            def show_progress(progress):
+                total = progress.get("total")
+                done = f"{progress['rotated']}/{total}" if total is not None else f"{progress['rotated']}"
+                print(f"\r  Chunk {progress['chunks']}: {done} cards, "
+                      f"{progress['cards_per_second']:.0f} cards/s", end="", flush=True)
+            
+            result = self.admin_service.batch_rotate_qr_tokens(ttl_seconds, progress_callback=show_progress)
+            print()
+            affected_count = result["rotated"]
             
             BaseUI.show_success("Batch QR code rotation completed", {
                 "Affected Cards": f"{affected_count} cards",
+                "Chunks": f"{result['chunks']}",
+                "Throughput": f"{result['cards_per_second']:.0f} cards/s",
+                "Elapsed": f"{result['elapsed_seconds']:.2f} s",
                 "New Validity": f"{ttl_minutes} minutes",
                 "Execution Time": Formatter.format_datetime(None)  # 當前時間
             })
             
             ui_logger.log_user_action("Batch Rotate QR Codes", {
                 "affected_count": affected_count,
+                "chunks": result["chunks"],
+                "cards_per_second": round(result["cards_per_second"], 1),
                 "ttl_seconds": ttl_seconds
             })
             
@@ -1552,8 +1643,88 @@ class AdminUI:
             BaseUI.show_error(f"Batch rotation failed: {e}")
             BaseUI.pause()
     
+    def _generate_all_settlements(self):
+        """為全部商戶批量生成結算"""
+        try:
+            BaseUI.clear_screen()
+            BaseUI.show_header("Generate Settlements (All Merchants)")
+            
+            modes = [("t_plus_1", "T+1 (previous day)"), ("monthly", "Monthly (previous month)")]
+            choice = BaseUI.show_menu([label for _, label in modes] + ["Cancel"], "Settlement Mode")
+            if choice > len(modes):
+                return
+            mode = modes[choice - 1][0]
+            
+            period_start, period_end = SettlementService.settlement_period(mode)
+            print(f"Period: {period_start} ~ {period_end}")
+            print("Existing settlements for this period are skipped, so the job can be safely re-run")
+            
+            if not QuickForm.get_confirmation("Generate settlements for all merchants?"):
+                BaseUI.show_info("Operation cancelled")
+                BaseUI.pause()
+                return
+            
+            BaseUI.show_loading("Generating settlements...")
+            
+            def show_progress(progress):
+                total = progress.get("total")
+                done = f"{progress['merchants']}/{total}" if total is not None else f"{progress['merchants']}"
+                print(f"\r  Chunk {progress['chunks']}: {done} merchants, "
+                      f"{progress['merchants_per_second']:.0f} merchants/s", end="", flush=True)
+            
+            result = self.admin_service.generate_all_settlements(
+                mode, period_start, period_end, progress_callback=show_progress
+            )
+            print()
+            
+            BaseUI.show_success("Settlement generation completed", {
+                "Merchants": f"{result['merchants']}",
+                "Created": f"{result['created']}",
+                "Already Existing": f"{result['skipped_existing']}",
+                "No Activity": f"{result['no_activity']}",
+                "Negative Net (skipped)": f"{result['negative_net']}",
+                "Throughput": f"{result['merchants_per_second']:.0f} merchants/s",
+                "Elapsed": f"{result['elapsed_seconds']:.2f} s"
+            })
+            
+            ui_logger.log_user_action("Generate All Settlements", {
+                "mode": mode,
+                "merchants": result["merchants"],
+                "created": result["created"],
+                "merchants_per_second": round(result["merchants_per_second"], 1)
+            })
+            
+            BaseUI.pause()
+            
+        except Exception as e:
+            BaseUI.show_error(f"Settlement generation failed: {e}")
+            BaseUI.pause()
+    
     # ========== 新增：搜尋並管理功能（零 UUID 暴露）==========
     
+    def _search_index_ready(self) -> bool:
+        """本地搜尋索引是否可用（首次使用時載入，失敗時回退服務端搜尋）"""
+        if not self.search_index.enabled:
+            return False
+        
+        def show_progress(progress):
+            print(f"\r  已載入 會員 {progress['members']} / 卡片 {progress['cards']}，"
+                  f"{progress['rows_per_second']:.0f} 筆/秒", end="", flush=True)
+        
+        try:
+            if not self.search_index.loaded:
+                BaseUI.show_loading("建立本地搜尋索引...")
+                self.search_index.ensure_ready(progress_callback=show_progress)
+                print()
+                if self.search_index.overflowed:
+                    BaseUI.show_warning("資料量超過本地索引上限，改用服務端搜尋")
+            else:
+                self.search_index.ensure_ready()
+            return self.search_index.ready
+        except Exception as e:
+            ui_logger.log_warning("本地搜尋索引不可用，改用服務端搜尋", {"error": str(e)})
+            return False
+    
     def _search_and_manage_members(self):
         """搜尋並管理會員 - 統一入口（零 UUID 暴露）"""
         while True:
@@ -1562,7 +1733,7 @@ class AdminUI:
             
             # 顯示搜尋提示
             print("\n💡 您可以輸入：")
-            print("  • 會員號（如：M202501001）")
+            print("  • 會員號（如：M00000001）")
             print("  • 姓名（如：張三）")
             print("  • 手機號（如：138）- 支持部分匹配")
             print("  • 郵箱（如：user@example.com）")
@@ -1576,7 +1747,11 @@ class AdminUI:
             BaseUI.show_loading("搜尋中...")
             
             try:
-                members = self.member_service.search_members(keyword, 50)
+                members = None
+                if self._search_index_ready():
+                    members = self.search_index.search_members(keyword, 50)
+                if members is None:
+                    members = self.member_service.search_members(keyword, 50)
                 
                 if not members:
                     BaseUI.show_info("未找到匹配的會員")
@@ -1589,6 +1764,7 @@ class AdminUI:
                 if selected_member:
                     # 進入會員操作菜單
                     self._member_action_menu(selected_member)
+                    self.search_index.mark_stale()
                 
             except Exception as e:
                 BaseUI.show_error(f"搜尋失敗：{e}")
@@ -1616,10 +1792,16 @@ class AdminUI:
             # 操作選項
             print("\n操作選項：")
             print(f"  [1-{len(members)}] 選擇會員進行操作")
+            print("  [/關鍵字] 在結果中篩選")
             print("  [R] 重新搜尋")
             print("  [Q] 返回")
             
-            choice = input("\n請選擇: ").strip().upper()
+            choice = input("\n請選擇: ").strip()
+            if choice.startswith('/'):
+                members, keyword = self._refine_results(members, keyword, choice[1:],
+                                                        ('member_no', 'name', 'phone', 'email'))
+                continue
+            choice = choice.upper()
             
             if choice == 'R':
                 return None  # 重新搜尋
@@ -1636,6 +1818,23 @@ class AdminUI:
                 BaseUI.show_error("無效的選擇")
                 BaseUI.pause()
     
+    @staticmethod
+    def _refine_results(items: List, keyword: str, refinement: str, attrs) -> tuple:
+        """在當前結果中本地篩選（不發 RPC），無匹配時保留原結果"""
+        refinement = refinement.strip().casefold()
+        if not refinement:
+            return items, keyword
+        
+        matched = [
+            item for item in items
+            if any(refinement in str(getattr(item, attr, None) or '').casefold() for attr in attrs)
+        ]
+        if not matched:
+            BaseUI.show_info("結果中沒有匹配項")
+            BaseUI.pause()
+            return items, keyword
+        return matched, f"{keyword} / {refinement}"
+    
     def _member_action_menu(self, member):
         """會員操作菜單（零 UUID 暴露）"""
         while True:
@@ -1942,6 +2141,7 @@ class AdminUI:
                     if 1 <= idx <= len(cards):
                         selected_card = cards[idx - 1]
                         self._card_action_menu(selected_card)
+                        self.search_index.mark_stale()
                     else:
                         BaseUI.show_error(f"請輸入 1-{len(cards)}")
                         BaseUI.pause()
@@ -2067,7 +2267,11 @@ class AdminUI:
                 
                 # 獲取會員列表
                 offset = (page - 1) * page_size
-                result = self.member_service.get_all_members(page_size, offset)
+                result = None
+                if self._search_index_ready():
+                    result = self.search_index.page_members(page_size, offset)
+                if result is None:
+                    result = self.member_service.get_all_members(page_size, offset)
                 
                 members = result['data']
                 pagination = result['pagination']
@@ -2111,6 +2315,7 @@ class AdminUI:
                     if 1 <= idx <= len(members):
                         selected_member = members[idx - 1]
                         self._member_action_menu(selected_member)
+                        self.search_index.mark_stale()
                     else:
                         BaseUI.show_error(f"請輸入 1-{len(members)}")
                         BaseUI.pause()
@@ -2155,7 +2360,11 @@ class AdminUI:
             BaseUI.show_loading("搜尋中...")
             
             try:
-                cards = self.admin_service.search_cards_advanced(keyword, 50)
+                cards = None
+                if self._search_index_ready():
+                    cards = self.search_index.search_cards(keyword, 50)
+                if cards is None:
+                    cards = self.admin_service.search_cards_advanced(keyword, 50)
                 
                 if not cards:
                     BaseUI.show_info("未找到匹配的卡片")
@@ -2168,6 +2377,7 @@ class AdminUI:
                 if selected_card:
                     # 進入卡片操作菜單
                     self._card_action_menu(selected_card)
+                    self.search_index.mark_stale()
                 
             except Exception as e:
                 BaseUI.show_error(f"搜尋失敗：{e}")
@@ -2197,10 +2407,16 @@ class AdminUI:
             # 操作選項
             print("\n操作選項：")
             print(f"  [1-{len(cards)}] 選擇卡片進行操作")
+            print("  [/關鍵字] 在結果中篩選")
             print("  [R] 重新搜尋")
             print("  [Q] 返回")
             
-            choice = input("\n請選擇: ").strip().upper()
+            choice = input("\n請選擇: ").strip()
+            if choice.startswith('/'):
+                cards, keyword = self._refine_results(cards, keyword, choice[1:],
+                                                      ('card_no', 'name', 'owner_name', 'owner_phone'))
+                continue
+            choice = choice.upper()
             
             if choice == 'R':
                 return None  # 重新搜尋
@@ -2459,7 +2675,11 @@ class AdminUI:
                 
                 # 獲取卡片列表
                 offset = (page - 1) * page_size
-                result = self.admin_service.get_all_cards(page_size, offset)
+                result = None
+                if self._search_index_ready():
+                    result = self.search_index.page_cards(page_size, offset)
+                if result is None:
+                    result = self.admin_service.get_all_cards(page_size, offset)
                 
                 cards = result['data']
                 pagination = result['pagination']
@@ -2505,6 +2725,7 @@ class AdminUI:
                     if 1 <= idx <= len(cards):
                         selected_card = cards[idx - 1]
                         self._card_action_menu(selected_card)
+                        self.search_index.mark_stale()
                     else:
                         BaseUI.show_error(f"請輸入 1-{len(cards)}")
                         BaseUI.pause()
@@ -206,8 +206,8 @@ class QuickForm:
                 print("✗ QR code cannot be empty")
                 continue
             
-            if len(qr_code) < 16:
-                print("✗ QR code format incorrect (insufficient length)")
+            if not Validator.validate_qr_code(qr_code):
+                print("✗ QR code format incorrect")
                 continue
             
             return qr_code
@@ -123,15 +123,24 @@ class Table:
         print("└" + "─" * (total_width - 2) + "┘")
 
 class PaginatedTable(Table):
-    """分頁表格組件"""
+    """分頁表格組件
+
+    偏移模式：data_fetcher(page, page_size) 返回 {"data": [...], "pagination": {...}}
+    游標模式：data_fetcher(cursor, page_size) 返回 {"data": [...], "next_cursor": ...}，
+    可選 count_fetcher() 提供總數估算（只在開始時調用一次）
+    """
     
     def __init__(self, headers: List[str], data_fetcher: Callable, 
-                 title: Optional[str] = None, page_size: int = 20):
+                 title: Optional[str] = None, page_size: int = 20,
+                 cursor_mode: bool = False, count_fetcher: Optional[Callable] = None):
         self.headers = headers
         self.data_fetcher = data_fetcher
         self.title = title
         self.page_size = page_size
         self.current_page = 0
+        self.cursor_mode = cursor_mode
+        self.count_fetcher = count_fetcher
+        self._page_cursors: List[Optional[str]] = [None]  # 第 n 頁的起始游標
         self.data = []  # 初始化為空
         self.col_widths = self._calculate_initial_widths()
     
@@ -147,6 +156,10 @@ class PaginatedTable(Table):
     
     def display_interactive(self):
         """交互式分頁顯示"""
+        if self.cursor_mode:
+            self._display_cursor_interactive()
+            return
+        
         while True:
             # 獲取當前頁數據
             result = self.data_fetcher(self.current_page, self.page_size)
@@ -197,6 +210,59 @@ class PaginatedTable(Table):
             else:
                 input("Press any key to return...")
                 break
+    
+    def _display_cursor_interactive(self):
+        """游標模式分頁：每頁只從游標處讀取一頁，翻頁成本與頁碼深度無關"""
+        total_estimate = None
+        if self.count_fetcher:
+            try:
+                total_estimate = self.count_fetcher()
+            except Exception:
+                total_estimate = None  # 總數只是輔助信息，獲取失敗不影響翻頁
+        
+        while True:
+            result = self.data_fetcher(self._page_cursors[self.current_page], self.page_size)
+            data = result.get("data", [])
+            next_cursor = result.get("next_cursor")
+            
+            self.data = data
+            if data:
+                self.col_widths = self._calculate_column_widths()
+            
+            self.display()
+            
+            if total_estimate is not None:
+                total_pages = max(1, (total_estimate + self.page_size - 1) // self.page_size)
+                print(f"Page {self.current_page + 1} of ~{total_pages} (About {total_estimate} records)")
+            else:
+                print(f"Page {self.current_page + 1}")
+            
+            if not data:
+                print("📝 No data available")
+                input("Press any key to return...")
+                break
+            
+            actions = []
+            if self.current_page > 0:
+                actions.append("P-Previous")
+            if next_cursor:
+                actions.append("N-Next")
+            actions.append("Q-Quit")
+            
+            if len(actions) > 1:
+                action = input(f"{' | '.join(actions)}: ").upper()
+                if action == "N" and next_cursor:
+                    # 記錄下一頁的起始游標，返回上一頁時直接復用
+                    del self._page_cursors[self.current_page + 1:]
+                    self._page_cursors.append(next_cursor)
+                    self.current_page += 1
+                elif action == "P" and self.current_page > 0:
+                    self.current_page -= 1
+                elif action == "Q":
+                    break
+            else:
+                input("Press any key to return...")
+                break
 
 class SimpleTable:
     """簡化表格組件"""
@@ -9,6 +9,7 @@ from ui.components.form import QuickForm, ValidationForm
 from ui.base_ui import BaseUI, StatusDisplay
 from models.member import Member
 from models.card import Card
+from models.level import LevelTable
 from utils.formatters import Formatter
 from utils.validators import Validator
 from utils.logger import ui_logger
@@ -462,14 +463,18 @@ class MemberUI:
             # 創建分頁表格
             headers = ["Transaction No", "Type", "Amount", "Status", "Time"]
             
-            def fetch_transactions(page: int, page_size: int):
-                return self.member_service.get_member_transactions(
+            def fetch_transactions(cursor, page_size: int):
+                return self.member_service.get_member_transactions_page(
                     self.current_member_id, 
                     page_size, 
-                    page * page_size
+                    cursor
                 )
             
-            paginated_table = PaginatedTable(headers, fetch_transactions, "My Transaction History")
+            def fetch_total():
+                return self.member_service.get_member_transaction_count(self.current_member_id)
+            
+            paginated_table = PaginatedTable(headers, fetch_transactions, "My Transaction History",
+                                             cursor_mode=True, count_fetcher=fetch_total)
             
             # 轉換數據格式
             def format_transaction_data(tx_data):
@@ -487,12 +492,12 @@ class MemberUI:
                 
                 return {
                     "data": formatted_data,
-                    "pagination": tx_data.get("pagination", {})
+                    "next_cursor": tx_data.get("next_cursor")
                 }
             
             # 重新包裝數據獲取函數
-            def wrapped_fetch_transactions(page: int, page_size: int):
-                raw_data = fetch_transactions(page, page_size)
+            def wrapped_fetch_transactions(cursor, page_size: int):
+                raw_data = fetch_transactions(cursor, page_size)
                 return format_transaction_data(raw_data)
             
             paginated_table.data_fetcher = wrapped_fetch_transactions
@@ -649,6 +654,8 @@ class MemberUI:
                 BaseUI.pause()
                 return
             
+            level_table = self.member_service.get_level_table()
+            
             # 顯示每張卡片的積分等級信息
             for i, card in enumerate(cards, 1):
                 print(f"\n📱 Card {i}: {card.card_no}")
@@ -667,7 +674,7 @@ class MemberUI:
                 
                 # 顯示升級信息
                 if card.card_type == 'standard':
-                    self._show_upgrade_info(card.points or 0)
+                    self._show_upgrade_info(card.points or 0, level_table)
             
             BaseUI.pause()
             
@@ -675,34 +682,18 @@ class MemberUI:
             BaseUI.show_error(f"Query failed: {e}")
             BaseUI.pause()
     
-    def _show_upgrade_info(self, current_points: int):
+    def _show_upgrade_info(self, current_points: int, level_table: Optional[LevelTable] = None):
         """顯示升級信息"""
-        from config.constants import MEMBERSHIP_LEVELS
-        
-        current_level = 0
-        next_level = None
-        
-        # 確定當前等級
-        for level, info in MEMBERSHIP_LEVELS.items():
-            if (current_points >= info["min_points"] and 
-                (info["max_points"] is None or current_points <= info["max_points"])):
-                current_level = level
-                break
-        
-        # 找到下一等級
-        for level in sorted(MEMBERSHIP_LEVELS.keys()):
-            if level > current_level:
-                next_level = level
-                break
+        level_table = level_table or self.member_service.get_level_table()
+        next_info = level_table.next_level(current_points)
         
-        if next_level is not None:
-            next_info = MEMBERSHIP_LEVELS[next_level]
-            points_needed = next_info["min_points"] - current_points
+        if next_info is not None:
+            points_needed = next_info.min_points - current_points
             
             print(f"  Upgrade Information:")
-            print(f"    Next Level: {next_info['name']}")
+            print(f"    Next Level: {next_info.name}")
             print(f"    Points Needed: {points_needed:,} points")
-            print(f"    Discount After Upgrade: {Formatter.format_discount(next_info['discount'])}")
+            print(f"    Discount After Upgrade: {Formatter.format_discount(next_info.discount)}")
         else:
             print(f"  🎉 You have reached the highest level!")
     
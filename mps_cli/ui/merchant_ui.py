@@ -223,8 +223,8 @@ class MerchantUI:
             print(f"║  交易時間：  {original_tx.format_datetime('created_at'):<60} ║")
             
             # 計算剩餘可退金額
-            refunded_amount = self._calculate_total_refunded(tx_no)
-            remaining_amount = Decimal(str(original_tx.final_amount)) - refunded_amount
+            refunded_amount = Decimal(str(original_tx.refunded_amount or 0))
+            remaining_amount = original_tx.get_remaining_refundable()
             
             print("╠═══════════════════════════════════════════════════════════════════════════╣")
             print(f"║  已退金額：  {Formatter.format_currency(refunded_amount):<60} ║")
@@ -335,19 +335,6 @@ class MerchantUI:
             
             BaseUI.pause()
     
-    def _calculate_total_refunded(self, original_tx_no: str) -> Decimal:
-        """計算已退款總金額"""
-        try:
-            # 查詢所有退款記錄
-            refunds = self.payment_service.get_refund_history(original_tx_no)
-            total = Decimal("0")
-            for refund in refunds:
-                if refund.get('status') == 'completed':
-                    total += Decimal(str(refund.get('amount', 0)))
-            return total
-        except:
-            return Decimal("0")
-    
     def _view_today_transactions(self):
         """查看今日交易"""
         try:
@@ -392,13 +379,16 @@ class MerchantUI:
             # 創建分頁表格
             headers = ["Transaction No", "Type", "Amount", "Status", "Time"]
             
-            def fetch_transactions(page: int, page_size: int):
-                return self.merchant_service.get_merchant_transactions(
+            def fetch_transactions(cursor, page_size: int):
+                return self.merchant_service.get_merchant_transactions_page(
                     self.current_merchant.id, 
                     page_size, 
-                    page * page_size
+                    cursor
                 )
             
+            def fetch_total():
+                return self.merchant_service.get_merchant_transaction_count(self.current_merchant.id)
+            
             # 轉換數據格式
             def format_transaction_data(tx_data):
                 transactions = tx_data.get("data", [])
@@ -415,14 +405,15 @@ class MerchantUI:
                 
                 return {
                     "data": formatted_data,
-                    "pagination": tx_data.get("pagination", {})
+                    "next_cursor": tx_data.get("next_cursor")
                 }
             
-            def wrapped_fetch_transactions(page: int, page_size: int):
-                raw_data = fetch_transactions(page, page_size)
+            def wrapped_fetch_transactions(cursor, page_size: int):
+                raw_data = fetch_transactions(cursor, page_size)
                 return format_transaction_data(raw_data)
             
-            paginated_table = PaginatedTable(headers, wrapped_fetch_transactions, "Transaction History")
+            paginated_table = PaginatedTable(headers, wrapped_fetch_transactions, "Transaction History",
+                                             cursor_mode=True, count_fetcher=fetch_total)
             paginated_table.display_interactive()
             
         except Exception as e:
@@ -764,6 +755,13 @@ class MerchantUI:
     
     def _show_settlement_detail(self, settlement):
         """顯示結算詳情"""
+        # 列表不返回按日明細，進入詳情時再按需加載一次
+        if settlement.daily_breakdown is None and settlement.id:
+            try:
+                settlement = self.settlement_service.get_settlement_detail(settlement.id)
+            except Exception as e:
+                ui_logger.log_error("Load Settlement Detail", str(e))
+        
         BaseUI.clear_screen()
         print("╔═══════════════════════════════════════════════════════════════════════════╗")
         print("║                        結算詳情                                           ║")
@@ -790,4 +788,40 @@ class MerchantUI:
             print(f"║  結算時間：  {settlement.settled_at:<60} ║")
         print("╚═══════════════════════════════════════════════════════════════════════════╝")
         
-        BaseUI.pause()
\ No newline at end of file
+        if settlement.daily_breakdown:
+            print("\n按日明細：")
+            print("─" * 79)
+            print(f"{'日期':<12} {'支付筆數':<10} {'支付金額':<16} {'退款筆數':<10} {'退款金額':<16}")
+            print("─" * 79)
+            for day in settlement.daily_breakdown:
+                print(f"{str(day.get('day', '')):<12} "
+                      f"{day.get('payment_count', 0):<10} "
+                      f"{Formatter.format_currency(day.get('payment_amount', 0)):<16} "
+                      f"{day.get('refund_count', 0):<10} "
+                      f"{Formatter.format_currency(day.get('refund_amount', 0)):<16}")
+            print("─" * 79)
+        
+        print("\n操作選項：")
+        print("  1. 導出交易明細 (CSV)")
+        print("  2. 導出交易明細 (JSONL)")
+        print("  輸入其他鍵返回")
+        
+        choice = input("\n請選擇: ").strip()
+        if choice in ("1", "2"):
+            self._export_settlement_transactions(settlement, "csv" if choice == "1" else "jsonl")
+        
+        BaseUI.pause()
+    
+    def _export_settlement_transactions(self, settlement, fmt: str):
+        """流式導出結算交易明細到文件"""
+        default_path = f"settlement_{str(settlement.id)[:8]}.{fmt}"
+        path = input(f"導出文件路徑 (默認 {default_path}): ").strip() or default_path
+        
+        try:
+            BaseUI.show_loading("正在導出交易明細...")
+            with open(path, "w", encoding="utf-8", newline="") as output:
+                count = self.settlement_service.export_settlement_transactions(settlement.id, output, fmt)
+            BaseUI.show_success(f"已導出 {count} 筆交易到 {path}")
+        except Exception as e:
+            BaseUI.show_error(f"導出交易明細失敗: {e}")
+            ui_logger.log_error("Export Settlement Transactions", str(e))
\ No newline at end of file
@@ -10,15 +10,24 @@ class ErrorHandler:
     def __init__(self):
         self.logger = logger
     
+    @staticmethod
+    def error_code(error: Exception) -> Optional[str]:
+        """返回錯誤信息中的已知錯誤碼（ERROR_MESSAGES 的鍵），未知錯誤返回 None"""
+        error_str = str(error)
+        for code in ERROR_MESSAGES:
+            if code in error_str:
+                return code
+        return None
+    
     def handle_rpc_error(self, error: Exception) -> Exception:
         """處理 RPC 錯誤"""
         error_str = str(error)
         
         # 查找已知錯誤碼
-        for code, message in ERROR_MESSAGES.items():
-            if code in error_str:
-                self.logger.warning(f"業務錯誤: {code}")
-                return Exception(message)
+        code = self.error_code(error)
+        if code:
+            self.logger.warning(f"業務錯誤: {code}")
+            return Exception(ERROR_MESSAGES[code])
         
         # 未知錯誤
         self.logger.error(f"未知錯誤: {error_str}")
@@ -5,6 +5,7 @@
 
 import re
 from typing import Optional, Tuple
+from utils.validators import Validator
 
 
 class IdentifierResolver:
@@ -12,6 +13,12 @@ class IdentifierResolver:
     
     # UUID 正則表達式
     UUID_PATTERN = r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+    MEMBER_NO_PATTERN = r'^M\d{8}$'
+    CARD_NO_PATTERN = r'^(?:(?:STD|VCH|COR|CARD)\d{8}|C\d{9})$'
+    
+    # 搜尋時可直接走唯一索引精確查找的識別碼類型
+    MEMBER_EXACT_TYPES = ('member_no', 'phone', 'email')
+    CARD_EXACT_TYPES = ('card_no', 'member_no', 'phone', 'email')
     
     @staticmethod
     def is_uuid(identifier: str) -> bool:
@@ -31,7 +38,7 @@ class IdentifierResolver:
     def is_member_no(identifier: str) -> bool:
         """判斷是否為會員號
         
-        會員號格式：M + 9位數字 (如：M202501001)
+        會員號格式：M + 8位數字 (如：M00000001，gen_member_no 生成)
         
         Args:
             identifier: 識別碼字符串
@@ -41,13 +48,14 @@ class IdentifierResolver:
         """
         if not identifier:
             return False
-        return identifier.startswith('M') and len(identifier) == 10 and identifier[1:].isdigit()
+        return bool(re.match(IdentifierResolver.MEMBER_NO_PATTERN, identifier))
     
     @staticmethod
     def is_card_no(identifier: str) -> bool:
         """判斷是否為卡號
         
-        卡號格式：C + 9位數字 (如：C202501001)
+        卡號格式：STD / VCH / COR / CARD + 8位數字 (如：STD00000001，gen_card_no 生成)，
+        或 C + 9位數字 (如：C202501001)
         
         Args:
             identifier: 識別碼字符串
@@ -57,7 +65,7 @@ class IdentifierResolver:
         """
         if not identifier:
             return False
-        return identifier.startswith('C') and len(identifier) == 10 and identifier[1:].isdigit()
+        return bool(re.match(IdentifierResolver.CARD_NO_PATTERN, identifier))
     
     @staticmethod
     def is_phone(identifier: str) -> bool:
@@ -77,7 +85,7 @@ class IdentifierResolver:
     
     @staticmethod
     def is_email(identifier: str) -> bool:
-        """判斷是否為郵箱
+        """判斷是否為完整郵箱（部分關鍵字如 "@gmail.com" 不算）
         
         Args:
             identifier: 識別碼字符串
@@ -85,9 +93,7 @@ class IdentifierResolver:
         Returns:
             bool: 是否為郵箱
         """
-        if not identifier:
-            return False
-        return '@' in identifier and '.' in identifier
+        return Validator.validate_email(identifier)
     
     @staticmethod
     def is_merchant_code(identifier: str) -> bool:
@@ -150,6 +156,19 @@ class IdentifierResolver:
         is_valid = id_type != 'unknown'
         return is_valid, id_type
     
+    @staticmethod
+    def is_exact_search(keyword: str, exact_types: Tuple[str, ...]) -> bool:
+        """關鍵字是否為完整識別碼（搜尋時只做精確查找，不做模糊匹配）
+        
+        Args:
+            keyword: 搜尋關鍵字
+            exact_types: 允許精確查找的識別碼類型
+            
+        Returns:
+            bool: 是否精確查找
+        """
+        return IdentifierResolver.get_identifier_type(keyword) in exact_types
+    
     @staticmethod
     def get_display_name(id_type: str) -> str:
         """獲取識別碼類型的顯示名稱
@@ -1,37 +1,185 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import reprlib
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, List, Optional
 from config.settings import settings
 
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord 自帶屬性；其餘屬性視為 extra 結構化字段（如 rpc / duration_ms / rows）
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_root_handlers: List[logging.Handler] = []
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """每條日誌一行 JSON，extra 傳入的字段原樣輸出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """高頻調試日誌採樣：帶 extra={"sample": True} 的 DEBUG 記錄每 N 條保留 1 條
+
+    N = round(1 / rate)；rate >= 1 時全部保留。其他級別與未標記的記錄不受影響。
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or not getattr(record, "sample", False):
+            return True
+        if self.every == 0:
+            return False
+        with self._lock:
+            self._counter += 1
+            return (self._counter - 1) % self.every == 0
+
+
+class LazyRepr:
+    """延遲、限長的 repr：作為 %s 參數傳入，只有記錄真正輸出時才格式化
+
+    大結果集（如整頁卡片 / 交易）只輸出前幾項與總數，避免格式化成本高於網絡請求。
+    """
+
+    __slots__ = ("value",)
+
+    MAX_LENGTH = 500
+    _repr = reprlib.Repr()
+    _repr.maxlevel = 3
+    _repr.maxlist = _repr.maxtuple = _repr.maxdict = 5
+    _repr.maxstring = _repr.maxother = 60
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        text = self._repr.repr(self.value)
+        if len(text) > self.MAX_LENGTH:
+            text = text[:self.MAX_LENGTH] + "..."
+        if isinstance(self.value, (list, tuple)) and len(self.value) > self._repr.maxlist:
+            text += f" (共 {len(self.value)} 項)"
+        return text
+
+    __repr__ = __str__
+
+
+def lazy_repr(value: Any) -> LazyRepr:
+    return LazyRepr(value)
+
+
+def result_size(result: Any) -> Optional[int]:
+    """RPC 結果的行數（列表返回長度，其他返回 None）"""
+    return len(result) if isinstance(result, list) else None
+
+
+def _build_handlers():
+    formatter = JsonFormatter() if settings.logging.format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [
+        # 控制台處理器
+        logging.StreamHandler(),
+        # 文件處理器（輪轉）
+        RotatingFileHandler(
+            settings.logging.file_path,
+            maxBytes=settings.logging.max_size,
+            backupCount=settings.logging.backup_count,
+            encoding='utf-8'
+        )
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
 def setup_logging():
-    """設置日誌系統"""
-    # 創建日誌目錄
-    log_dir = os.path.dirname(settings.logging.file_path)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    # 配置根日誌器
-    logging.basicConfig(
-        level=getattr(logging, settings.logging.level.upper()),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            # 控制台處理器
-            logging.StreamHandler(),
-            # 文件處理器（輪轉）
-            RotatingFileHandler(
-                settings.logging.file_path,
-                maxBytes=settings.logging.max_size,
-                backupCount=settings.logging.backup_count,
-                encoding='utf-8'
-            )
-        ]
-    )
-    
+    """設置日誌系統
+
+    - LOG_FORMAT=json 時輸出結構化 JSON（含 RPC 耗時等 extra 字段），默認為文本
+    - LOG_ASYNC=true（默認）時根日誌器只掛 QueueHandler，文件 / 控制台寫入由
+      QueueListener 後台線程完成，調用方不再等待磁盤 I/O
+    - LOG_DEBUG_SAMPLE_RATE 控制高頻調試日誌（RPC 參數 / 結果）的採樣比例
+    重複調用時先關閉之前的配置
+    """
+    global _listener, _root_handlers
+
+    with _setup_lock:
+        shutdown_logging()
+
+        # 創建日誌目錄
+        log_dir = os.path.dirname(settings.logging.file_path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        handlers = _build_handlers()
+        sampler = DebugSampler(settings.logging.debug_sample_rate)
+
+        if settings.logging.async_enabled:
+            _listener = QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+            _root_handlers = [QueueHandler(_listener.queue)]
+            _listener.start()
+        else:
+            _root_handlers = handlers
+
+        # 配置根日誌器
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, settings.logging.level.upper()))
+        for handler in _root_handlers:
+            handler.addFilter(sampler)
+            root.addHandler(handler)
+
     # 設置第三方庫的日誌級別
     logging.getLogger('supabase').setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('httpcore').setLevel(logging.WARNING)
     logging.getLogger('urllib3').setLevel(logging.WARNING)
     logging.getLogger('requests').setLevel(logging.WARNING)
 
+
+def shutdown_logging():
+    """移除 setup_logging 掛上的處理器，停止後台寫入線程（排空隊列）"""
+    global _listener, _root_handlers
+
+    root = logging.getLogger()
+    for handler in _root_handlers:
+        root.removeHandler(handler)
+        handler.close()
+    _root_handlers = []
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(name: str) -> logging.Logger:
     """獲取日誌器"""
     return logging.getLogger(name)
@@ -0,0 +1,254 @@
+"""
+RPC / 查詢指標
+按 (類型, 函數或表名, 角色) 記錄延遲直方圖、結果行數與按錯誤碼分類的錯誤數，
+可導出為 Prometheus 文本格式（本地 /metrics 端點或定期寫入的文件）
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import settings
+from utils.error_handler import ErrorHandler
+
+logger = logging.getLogger(__name__)
+
+# 延遲直方圖桶上界（毫秒），最後一個桶為 +Inf
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2.5, 5, 10, 25, 50, 75, 100, 150, 250, 500, 750, 1000, 2500, 5000, 10000
+)
+
+UNKNOWN_ERROR = "UNKNOWN"
+
+
+class LatencyHistogram:
+    """固定桶延遲直方圖（調用方持有鎖）"""
+
+    __slots__ = ("buckets", "count", "sum_ms", "min_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.min_ms = min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶內線性插值估算分位數（同 Prometheus histogram_quantile），結果限制在觀測到的最小 / 最大值之間"""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0.0
+                upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(max(estimate, self.min_ms), self.max_ms)
+            cumulative += bucket_count
+        return self.max_ms
+
+
+class SeriesMetrics:
+    """單個 (類型, 名稱, 角色) 的指標"""
+
+    __slots__ = ("latency", "rows_total", "rows_max", "errors")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows_total = 0
+        self.rows_max = 0
+        self.errors: Dict[str, int] = {}
+
+
+class MetricsRegistry:
+    """線程安全的指標註冊表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str, str], SeriesMetrics] = {}
+        self.started_at = time.time()
+
+    def observe(self, kind: str, name: str, role: Optional[str], duration_ms: float,
+                rows: Optional[int] = None, error: Optional[Exception] = None):
+        """記錄一次調用；error 不為空時按 ERROR_MESSAGES 錯誤碼計數"""
+        if not settings.metrics.enabled:
+            return
+
+        key = (kind, name, role or "anonymous")
+        code = (ErrorHandler.error_code(error) or UNKNOWN_ERROR) if error is not None else None
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = SeriesMetrics()
+            series.latency.observe(duration_ms)
+            if rows is not None:
+                series.rows_total += rows
+                series.rows_max = max(series.rows_max, rows)
+            if code is not None:
+                series.errors[code] = series.errors.get(code, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """每個序列的調用數、錯誤數、平均 / p50 / p95 / p99 延遲（毫秒）與結果行數，按 p95 降序"""
+        with self._lock:
+            rows = []
+            for (kind, name, role), series in self._series.items():
+                latency = series.latency
+                rows.append({
+                    "kind": kind,
+                    "name": name,
+                    "role": role,
+                    "calls": latency.count,
+                    "errors": sum(series.errors.values()),
+                    "error_codes": dict(series.errors),
+                    "avg_ms": latency.sum_ms / latency.count,
+                    "p50_ms": latency.quantile(0.50),
+                    "p95_ms": latency.quantile(0.95),
+                    "p99_ms": latency.quantile(0.99),
+                    "max_ms": latency.max_ms,
+                    "rows_total": series.rows_total,
+                    "rows_max": series.rows_max
+                })
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines = [
+            "# HELP mps_rpc_duration_seconds RPC / query latency.",
+            "# TYPE mps_rpc_duration_seconds histogram",
+        ]
+        rows_lines = [
+            "# HELP mps_rpc_result_rows_total Rows returned.",
+            "# TYPE mps_rpc_result_rows_total counter",
+        ]
+        max_lines = [
+            "# HELP mps_rpc_result_rows_max Largest single result.",
+            "# TYPE mps_rpc_result_rows_max gauge",
+        ]
+        error_lines = [
+            "# HELP mps_rpc_errors_total Failed calls by error code.",
+            "# TYPE mps_rpc_errors_total counter",
+        ]
+
+        with self._lock:
+            for (kind, name, role), series in sorted(self._series.items()):
+                labels = f'kind="{kind}",function="{_escape(name)}",role="{_escape(role)}"'
+                latency = series.latency
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS_MS + (None,), latency.buckets):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound is None else _format_number(bound / 1000)
+                    lines.append(f'mps_rpc_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"mps_rpc_duration_seconds_sum{{{labels}}} {_format_number(latency.sum_ms / 1000)}")
+                lines.append(f"mps_rpc_duration_seconds_count{{{labels}}} {latency.count}")
+
+                rows_lines.append(f"mps_rpc_result_rows_total{{{labels}}} {series.rows_total}")
+                max_lines.append(f"mps_rpc_result_rows_max{{{labels}}} {series.rows_max}")
+                for code, count in sorted(series.errors.items()):
+                    error_lines.append(f'mps_rpc_errors_total{{{labels},code="{code}"}} {count}')
+
+        return "\n".join(lines + rows_lines + max_lines + error_lines) + "\n"
+
+    def dump(self, path: str) -> str:
+        """原子寫入 Prometheus 文本文件（先寫臨時文件再替換），返回路徑"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+        return path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.6f}".rstrip("0").rstrip(".") or "0"
+
+
+# 全局指標註冊表
+metrics_registry = MetricsRegistry()
+
+
+def _serve_metrics(port: int) -> int:
+    """在後台線程啟動只監聽 127.0.0.1 的 /metrics 端點，返回實際端口"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics_registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("指標端點: " + format, *args)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server.server_address[1]
+
+
+_exporters_started = False
+
+
+def start_metrics_exporters() -> Dict[str, Any]:
+    """按配置啟動本地 /metrics 端點與定期寫入文件的後台線程"""
+    global _exporters_started
+
+    config = settings.metrics
+    started: Dict[str, Any] = {}
+    if not config.enabled or _exporters_started:
+        return started
+    _exporters_started = True
+
+    if config.port:
+        try:
+            started["port"] = _serve_metrics(config.port)
+            logger.info("指標端點已啟動: http://127.0.0.1:%s/metrics", started["port"])
+        except OSError as e:
+            logger.warning("指標端點啟動失敗（端口 %s）: %s", config.port, e)
+
+    if config.file_path:
+        def dump():
+            try:
+                metrics_registry.dump(config.file_path)
+            except OSError as e:
+                logger.warning("寫入指標文件失敗: %s", e)
+
+        def dump_loop():
+            while True:
+                time.sleep(max(1, config.dump_interval))
+                dump()
+
+        threading.Thread(target=dump_loop, name="metrics-dump", daemon=True).start()
+        atexit.register(dump)
+        started["file"] = config.file_path
+
+    return started
@@ -0,0 +1,192 @@
+"""
+本地模糊搜尋索引
+管理端批量操作時在進程內回答會員 / 卡片的重複查找，不再每次調用搜尋 RPC
+"""
+
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+
+class SearchIndex:
+    """內存模糊搜尋索引（前綴 + n-gram）
+
+    - 每個字段維護 n-gram 倒排表（gram -> 文檔號集合）與按值排序的 (值, 文檔號) 列表
+    - 完全 / 前綴匹配在有序列表上二分查找；關鍵字長度 >= n 時再取各 gram 倒排表求交集，校驗子串匹配
+    - upsert 為記錄分配新文檔號：倒排表即時更新，有序列表中的舊項延遲清理（查找時跳過，過多時壓縮）
+    - 記錄數達到 max_entries 時拒絕新增（upsert 返回 False），調用方據此回退服務端搜尋
+    - 排序規則與服務端 sec.search_score 一致：完全匹配 > 前綴匹配 > 子串匹配，
+      同分時按字段順序，再按最近寫入優先
+    """
+
+    MAX_CANDIDATES = 200  # 每個字段前綴匹配 / 子串校驗的候選上限，保證高頻關鍵字的查找延遲
+
+    def __init__(self, fields: Sequence[Tuple[str, int]], max_entries: int):
+        """
+        Args:
+            fields: (記錄屬性名, gram 長度)，按匹配優先級排列
+            max_entries: 最多索引的記錄數
+        """
+        self.fields = tuple(fields)
+        self.max_entries = max_entries
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        """清空索引（version 照常遞增，依賴版本號的派生結果隨之失效）"""
+        self.version += 1
+        self._next_doc = 0
+        self._doc_by_key: Dict[str, int] = {}
+        self._records: Dict[int, Any] = {}
+        self._values: Dict[int, Tuple[str, ...]] = {}
+        self._grams: List[Dict[str, Set[int]]] = [{} for _ in self.fields]
+        self._sorted: List[List[Tuple[str, int]]] = [[] for _ in self.fields]
+        self._unsorted = False
+        self._stale_entries = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._doc_by_key
+
+    @staticmethod
+    def normalize(value: Any) -> str:
+        """索引與查找統一使用的規範化形式（去空白、大小寫折疊）"""
+        return str(value).strip().casefold() if value is not None else ''
+
+    @staticmethod
+    def _grams_of(value: str, size: int) -> Set[str]:
+        return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+    def get(self, key: str) -> Optional[Any]:
+        doc = self._doc_by_key.get(key)
+        return None if doc is None else self._records[doc]
+
+    def records(self) -> Iterator[Any]:
+        """全部記錄（按寫入順序）"""
+        return iter(self._records.values())
+
+    def upsert(self, key: str, record: Any) -> bool:
+        """新增或替換記錄，索引已滿時返回 False"""
+        if key in self._doc_by_key:
+            self.remove(key)
+        elif len(self._records) >= self.max_entries:
+            return False
+
+        doc = self._next_doc
+        self._next_doc += 1
+        values = tuple(self.normalize(getattr(record, name, None)) for name, _ in self.fields)
+
+        self._doc_by_key[key] = doc
+        self._records[doc] = record
+        self._values[doc] = values
+        for position, (value, (_, size)) in enumerate(zip(values, self.fields)):
+            if not value:
+                continue
+            self._sorted[position].append((value, doc))
+            postings = self._grams[position]
+            for gram in self._grams_of(value, size):
+                postings.setdefault(gram, set()).add(doc)
+
+        self._unsorted = True
+        self.version += 1
+        return True
+
+    def remove(self, key: str) -> bool:
+        """移除記錄，不存在時返回 False"""
+        doc = self._doc_by_key.pop(key, None)
+        if doc is None:
+            return False
+
+        del self._records[doc]
+        values = self._values.pop(doc)
+        for position, (value, (_, size)) in enumerate(zip(values, self.fields)):
+            if not value:
+                continue
+            self._stale_entries += 1
+            postings = self._grams[position]
+            for gram in self._grams_of(value, size):
+                docs = postings.get(gram)
+                if docs is not None:
+                    docs.discard(doc)
+                    if not docs:
+                        del postings[gram]
+
+        self.version += 1
+        return True
+
+    def _prepare(self):
+        """查找前整理有序列表：排序新追加的項，舊項過多時壓縮"""
+        live_entries = sum(len(entries) for entries in self._sorted) - self._stale_entries
+        if self._stale_entries > max(live_entries, 1024):
+            self._sorted = [
+                [entry for entry in entries if entry[1] in self._records]
+                for entries in self._sorted
+            ]
+            self._stale_entries = 0
+            self._unsorted = True
+
+        if self._unsorted:
+            for entries in self._sorted:
+                entries.sort()
+            self._unsorted = False
+
+    def _prefix_matches(self, position: int, keyword: str) -> Iterator[Tuple[int, int]]:
+        """有序列表上二分查找前綴，產出 (文檔號, 分數)：完全匹配 3，前綴匹配 2"""
+        entries = self._sorted[position]
+        found = 0
+        for index in range(bisect_left(entries, (keyword,)), len(entries)):
+            value, doc = entries[index]
+            if not value.startswith(keyword) or found >= self.MAX_CANDIDATES:
+                return
+            if doc in self._records:
+                found += 1
+                yield doc, 3 if len(value) == len(keyword) else 2
+
+    def _substring_matches(self, position: int, keyword: str) -> Iterator[int]:
+        """gram 倒排表求交集後校驗子串，關鍵字短於 gram 長度時無結果"""
+        size = self.fields[position][1]
+        if len(keyword) < size:
+            return
+
+        postings = self._grams[position]
+        sets = [postings.get(gram) for gram in self._grams_of(keyword, size)]
+        if not all(sets):
+            return
+        sets.sort(key=len)
+        docs = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+
+        # gram 交集可能很大（如順序生成的會員號），只校驗前 MAX_CANDIDATES 個
+        for doc in islice(docs, self.MAX_CANDIDATES):
+            if keyword in self._values[doc][position]:
+                yield doc
+
+    def search(self, keyword: str, limit: int = 50) -> List[Any]:
+        """按相關度返回最多 limit 條匹配記錄"""
+        keyword = self.normalize(keyword)
+        if not keyword or not self._records:
+            return []
+        self._prepare()
+
+        ranks: Dict[int, Tuple[int, int]] = {}
+        for position in range(len(self.fields)):
+            for doc, score in self._prefix_matches(position, keyword):
+                rank = (score, -position)
+                if rank > ranks.get(doc, (0, 0)):
+                    ranks[doc] = rank
+
+        # 有完全匹配（如完整會員號）或完全 / 前綴匹配已足夠時不再查子串匹配（子串匹配分數最低）
+        exact = any(score == 3 for score, _ in ranks.values())
+        for position in range(len(self.fields)):
+            if exact or len(ranks) >= limit:
+                break
+            for doc in self._substring_matches(position, keyword):
+                if doc not in ranks:
+                    ranks[doc] = (1, -position)
+                    if len(ranks) >= limit:
+                        break
+
+        best = heapq.nlargest(limit, ranks.items(), key=lambda item: (item[1], item[0]))
+        return [self._records[doc] for doc, _ in best]
@@ -0,0 +1,107 @@
+"""
+啟動耗時分析（python main.py --profile-startup）
+每個階段在新的解釋器進程中以 -X importtime 冷啟動執行，統計各階段耗時與導入耗時最多的套件
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import wcwidth
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# (階段名稱, 執行語句)；各階段在同一進程內依次執行，耗時為該階段的增量
+STARTUP_STAGES: List[Tuple[str, str]] = [
+    ("main 模塊", "import main"),
+    ("登入界面 ui.login_ui", "import ui.login_ui"),
+    ("Supabase 客戶端", "from config.supabase_client import supabase_client; supabase_client.client"),
+    ("會員界面 ui.member_ui", "import ui.member_ui"),
+    ("商戶界面 ui.merchant_ui", "import ui.merchant_ui"),
+    ("管理員界面 ui.admin_ui", "import ui.admin_ui"),
+]
+
+_CHILD_SCRIPT = """
+import json, sys, time
+results = []
+for name, statement in json.loads(sys.argv[1]):
+    started = time.perf_counter()
+    try:
+        exec(statement, {})
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    results.append({"stage": name, "ms": (time.perf_counter() - started) * 1000, "error": error})
+print(json.dumps(results))
+"""
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """解析 -X importtime 輸出，返回 (模塊名, 自身耗時微秒)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        modules.append((parts[2], int(parts[0])))
+    return modules
+
+
+def profile_startup(stages: Optional[List[Tuple[str, str]]] = None, top: int = 10) -> Dict[str, Any]:
+    """在子進程中冷啟動各階段，返回階段耗時與按頂層套件彙總的導入耗時"""
+    stages = stages or STARTUP_STAGES
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD_SCRIPT, json.dumps(stages)],
+        cwd=str(PROJECT_ROOT), env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0 or not completed.stdout.strip():
+        raise RuntimeError(f"啟動分析子進程失敗: {completed.stderr.strip().splitlines()[-1:]}")
+
+    results = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = _parse_importtime(completed.stderr)
+
+    packages: Dict[str, int] = defaultdict(int)
+    for module, self_us in modules:
+        packages[module.split(".")[0]] += self_us
+
+    return {
+        "python": sys.version.split()[0],
+        "stages": results,
+        "total_ms": sum(result["ms"] for result in results),
+        "import_ms": sum(self_us for _, self_us in modules) / 1000,
+        "top_packages": [
+            (package, self_us / 1000)
+            for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ]
+    }
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """按終端顯示寬度填充（中文字符佔兩格）"""
+    padding = " " * max(0, width - wcwidth.wcswidth(text))
+    return padding + text if right else text + padding
+
+
+def print_startup_profile(report: Dict[str, Any]):
+    """輸出啟動耗時報告"""
+    print(f"啟動耗時分析（Python {report['python']}，冷啟動子進程）")
+    print("─" * 60)
+    print(f"{_pad('階段', 28)} {_pad('耗時(ms)', 10, True)} {_pad('累計(ms)', 10, True)}")
+    print("─" * 60)
+    cumulative = 0.0
+    for result in report["stages"]:
+        cumulative += result["ms"]
+        print(f"{_pad(result['stage'], 28)} {result['ms']:>10.1f} {cumulative:>10.1f}")
+        if result["error"]:
+            print(f"  ⚠️  {result['error'][:56]}")
+    print("─" * 60)
+    print(f"導入耗時合計 {report['import_ms']:.1f} ms，導入耗時最多的套件：")
+    for package, ms in report["top_packages"]:
+        print(f"  {package:<30} {ms:>10.1f}")
@@ -86,8 +86,9 @@ class Validator:
         if not qr_code:
             return False
         
-        # QR 碼至少16位字符
-        return len(qr_code.strip()) >= 16
+        # QR 碼：16位十六進制查找鍵 + "." + 48位十六進制密鑰
+        pattern = r'^[0-9a-fA-F]{16}\.[0-9a-fA-F]{48}$'
+        return bool(re.match(pattern, qr_code.strip()))
     
     @staticmethod
     def validate_password(password: str) -> bool:
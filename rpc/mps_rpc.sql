@@ -8,17 +8,31 @@
 -- 0) ENABLE REQUIRED EXTENSIONS (啟用必要的擴展)
 -- pgcrypto: 用於密碼加密 (gen_salt, crypt 函數)
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
+-- pg_trgm: 會員 / 卡片 / 商戶模糊搜尋（三元組 GIN 索引與相似度排序）
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
 
 -- 1) DROP ALL EXISTING FUNCTIONS (清除所有現有函數以重新建立)
 DROP FUNCTION IF EXISTS test_connection() CASCADE;
 DROP FUNCTION IF EXISTS get_merchant_by_auth_user() CASCADE;
 DROP FUNCTION IF EXISTS get_member_cards(uuid) CASCADE;
+DROP FUNCTION IF EXISTS get_member_cards(uuid, text) CASCADE;
 DROP FUNCTION IF EXISTS get_member_by_auth_user() CASCADE;
 DROP FUNCTION IF EXISTS get_transaction_detail(text) CASCADE;
 DROP FUNCTION IF EXISTS get_merchant_transactions(uuid, integer, integer, timestamptz, timestamptz) CASCADE;
 DROP FUNCTION IF EXISTS get_member_transactions(uuid, integer, integer, timestamptz, timestamptz) CASCADE;
 DROP FUNCTION IF EXISTS list_settlements(uuid, integer, integer) CASCADE;
 DROP FUNCTION IF EXISTS generate_settlement(uuid, settlement_mode, timestamptz, timestamptz) CASCADE;
+DROP FUNCTION IF EXISTS generate_settlement(uuid, settlement_mode, timestamptz, timestamptz, text) CASCADE;
+DROP FUNCTION IF EXISTS list_settlements(uuid, integer, integer, text) CASCADE;
+DROP FUNCTION IF EXISTS get_settlement_detail(uuid) CASCADE;
+DROP FUNCTION IF EXISTS get_settlement_detail(uuid, text) CASCADE;
+DROP FUNCTION IF EXISTS get_settlement_transactions_page(uuid, integer, text, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.merchant_daily_breakdown(uuid, timestamptz, timestamptz) CASCADE;
+DROP FUNCTION IF EXISTS sec.merchant_daily_breakdown(uuid[], timestamptz, timestamptz) CASCADE;
+DROP FUNCTION IF EXISTS sec.settlement_result(uuid, timestamptz, timestamptz, jsonb) CASCADE;
+DROP FUNCTION IF EXISTS sec.generate_settlement_chunk(settlement_mode, timestamptz, timestamptz, integer, uuid) CASCADE;
+DROP FUNCTION IF EXISTS generate_settlements_chunk(settlement_mode, timestamptz, timestamptz, integer, uuid, text) CASCADE;
+DROP PROCEDURE IF EXISTS sec.cron_generate_settlements(settlement_mode, timestamptz, timestamptz, integer) CASCADE;
 DROP FUNCTION IF EXISTS admin_suspend_merchant(uuid) CASCADE;
 DROP FUNCTION IF EXISTS admin_suspend_member(uuid) CASCADE;
 DROP FUNCTION IF EXISTS unfreeze_card(uuid) CASCADE;
@@ -27,7 +41,15 @@ DROP FUNCTION IF EXISTS update_points_and_level(uuid, int, text) CASCADE;
 DROP FUNCTION IF EXISTS user_recharge_card(uuid, numeric, pay_method, jsonb, text, text) CASCADE;
 DROP FUNCTION IF EXISTS merchant_refund_tx(text, text, numeric, jsonb) CASCADE;
 DROP FUNCTION IF EXISTS merchant_charge_by_qr(text, text, numeric, text, jsonb, text) CASCADE;
+DROP FUNCTION IF EXISTS merchant_charge_by_qr(text, text, numeric, text, jsonb, text, text) CASCADE;
+DROP FUNCTION IF EXISTS merchant_charge_batch(text, jsonb, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.find_charge_replay(uuid, text, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.charge_card_payment(merchants, text, numeric, text, jsonb, text) CASCADE;
 DROP FUNCTION IF EXISTS cron_rotate_qr_tokens(integer) CASCADE;
+DROP FUNCTION IF EXISTS cron_rotate_qr_tokens(integer, text) CASCADE;
+DROP FUNCTION IF EXISTS cron_rotate_qr_tokens_chunk(integer, integer, uuid, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.rotate_qr_chunk(integer, integer, uuid) CASCADE;
+DROP PROCEDURE IF EXISTS sec.cron_rotate_qr_tokens_batched(integer, integer) CASCADE;
 DROP FUNCTION IF EXISTS validate_qr_plain(text) CASCADE;
 DROP FUNCTION IF EXISTS revoke_card_qr(uuid) CASCADE;
 DROP FUNCTION IF EXISTS rotate_card_qr(uuid, integer) CASCADE;
@@ -44,7 +66,11 @@ DROP FUNCTION IF EXISTS is_admin() CASCADE;
 DROP FUNCTION IF EXISTS get_user_role() CASCADE;
 DROP FUNCTION IF EXISTS compute_level(int) CASCADE;
 DROP FUNCTION IF EXISTS compute_discount(int) CASCADE;
+DROP FUNCTION IF EXISTS sec.rebuild_level_functions() CASCADE;
+DROP FUNCTION IF EXISTS sec.trg_rebuild_level_functions() CASCADE;
 DROP FUNCTION IF EXISTS sec.card_lock_key(uuid) CASCADE;
+DROP FUNCTION IF EXISTS sec.qr_token_digest(text) CASCADE;
+DROP FUNCTION IF EXISTS sec.issue_qr_token() CASCADE;
 DROP FUNCTION IF EXISTS sec.fixed_search_path() CASCADE;
 DROP FUNCTION IF EXISTS cleanup_expired_sessions() CASCADE;
 DROP FUNCTION IF EXISTS load_session(text) CASCADE;
@@ -52,13 +78,52 @@ DROP FUNCTION IF EXISTS logout_session(text) CASCADE;
 
 -- 新增 RPC 函數的 DROP 語句
 DROP FUNCTION IF EXISTS get_all_members(integer, integer, member_status) CASCADE;
+DROP FUNCTION IF EXISTS get_all_members_page(integer, text, timestamptz, text) CASCADE;
 DROP FUNCTION IF EXISTS search_members_advanced(text, text, text, text, member_status, integer) CASCADE;
 DROP FUNCTION IF EXISTS update_member_profile(uuid, text, text, text) CASCADE;
 DROP FUNCTION IF EXISTS get_all_cards(integer, integer, card_type, card_status, text) CASCADE;
+DROP FUNCTION IF EXISTS get_all_cards_page(integer, text, timestamptz, text) CASCADE;
 DROP FUNCTION IF EXISTS search_cards(text, integer) CASCADE;
+DROP FUNCTION IF EXISTS search_cards(text, integer, boolean, text) CASCADE;
+DROP FUNCTION IF EXISTS search_members(text, integer) CASCADE;
+DROP FUNCTION IF EXISTS search_members(text, integer, boolean, text) CASCADE;
+DROP FUNCTION IF EXISTS search_merchants(text, integer) CASCADE;
+DROP FUNCTION IF EXISTS search_merchants(text, integer, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.search_score(text, text[]) CASCADE;
+DROP FUNCTION IF EXISTS sec.search_candidate_cap() CASCADE;
+DROP FUNCTION IF EXISTS sec.search_fuzzy_min_length() CASCADE;
+DROP FUNCTION IF EXISTS sec.like_escape(text) CASCADE;
 DROP FUNCTION IF EXISTS get_today_transaction_stats(uuid) CASCADE;
+DROP FUNCTION IF EXISTS get_today_transaction_stats(uuid, text) CASCADE;
 DROP FUNCTION IF EXISTS get_transaction_trends(timestamptz, timestamptz, uuid, text) CASCADE;
+DROP FUNCTION IF EXISTS get_transaction_trends(timestamptz, timestamptz, uuid, text, text) CASCADE;
+DROP FUNCTION IF EXISTS refresh_merchant_daily_rollup(date, date, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.customer_sketch_of(uuid) CASCADE;
+DROP FUNCTION IF EXISTS sec.customer_sketch_estimate(bit) CASCADE;
+DROP FUNCTION IF EXISTS sec.rollup_merchant_days(date, date) CASCADE;
+DROP FUNCTION IF EXISTS sec.ensure_merchant_daily_rollup() CASCADE;
+DROP FUNCTION IF EXISTS sec.ensure_merchant_daily_rollup(date) CASCADE;
+DROP FUNCTION IF EXISTS sec.merchant_rollup_watermark() CASCADE;
+DROP PROCEDURE IF EXISTS sec.cron_rollup_merchant_days(integer) CASCADE;
+DROP FUNCTION IF EXISTS sec.stats_merchant_scope(uuid) CASCADE;
+DROP FUNCTION IF EXISTS sec.create_transaction_partition(date) CASCADE;
+DROP FUNCTION IF EXISTS sec.ensure_transaction_partitions(int) CASCADE;
+DROP FUNCTION IF EXISTS sec.archive_transaction_partitions(int) CASCADE;
+DROP FUNCTION IF EXISTS maintain_transaction_partitions(int, int, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.drain_audit_staging(int) CASCADE;
+DROP FUNCTION IF EXISTS sec.create_audit_partition(date) CASCADE;
+DROP FUNCTION IF EXISTS sec.ensure_audit_partitions(int) CASCADE;
+DROP FUNCTION IF EXISTS sec.archive_audit_partitions(int) CASCADE;
+DROP PROCEDURE IF EXISTS sec.cron_drain_audit_events(integer, integer) CASCADE;
+DROP FUNCTION IF EXISTS maintain_audit_log(int, int, text) CASCADE;
+DROP FUNCTION IF EXISTS sec.encode_tx_cursor(timestamptz, uuid) CASCADE;
+DROP FUNCTION IF EXISTS sec.decode_tx_cursor(text) CASCADE;
+DROP FUNCTION IF EXISTS get_merchant_transactions_page(uuid, integer, text, timestamptz, timestamptz, text) CASCADE;
+DROP FUNCTION IF EXISTS get_member_transactions_page(uuid, integer, text, timestamptz, timestamptz, text) CASCADE;
+DROP FUNCTION IF EXISTS get_merchant_transaction_count(uuid, timestamptz, timestamptz, text) CASCADE;
+DROP FUNCTION IF EXISTS get_member_transaction_count(uuid, timestamptz, timestamptz, text) CASCADE;
 DROP FUNCTION IF EXISTS get_system_statistics() CASCADE;
+DROP FUNCTION IF EXISTS get_system_statistics(text) CASCADE;
 DROP FUNCTION IF EXISTS system_health_check() CASCADE;
 
 -- Helper: create sec schema and functions if not exists
@@ -86,48 +151,112 @@ BEGIN
 END;
 $$;
 
--- Compute discount based on points
-CREATE OR REPLACE FUNCTION compute_discount(p_points int)
-RETURNS numeric(4,3)
+-- QR token digest: HMAC-SHA256(secret, sec.qr_token_key)
+CREATE OR REPLACE FUNCTION sec.qr_token_digest(p_secret text)
+RETURNS text
 LANGUAGE plpgsql
+STABLE
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_discount numeric(4,3);
+  v_digest text;
 BEGIN
-  SELECT ml.discount INTO v_discount
-  FROM membership_levels ml
-  WHERE p_points >= ml.min_points
-    AND (ml.max_points IS NULL OR p_points <= ml.max_points)
-    AND ml.is_active = true
-  ORDER BY ml.level DESC
-  LIMIT 1;
-  
-  RETURN COALESCE(v_discount, 1.000);
+  SELECT encode(extensions.hmac(convert_to(p_secret, 'UTF8'), k.secret, 'sha256'), 'hex')
+    INTO v_digest
+  FROM sec.qr_token_key k
+  WHERE k.id;
+
+  IF v_digest IS NULL THEN
+    RAISE EXCEPTION 'QR_TOKEN_KEY_MISSING';
+  END IF;
+  RETURN v_digest;
 END;
 $$;
 
--- Compute level based on points
-CREATE OR REPLACE FUNCTION compute_level(p_points int)
-RETURNS int
+-- QR token issuer: <lookup(16 hex)>.<secret(48 hex)>
+CREATE OR REPLACE FUNCTION sec.issue_qr_token(
+  OUT token_lookup text,
+  OUT qr_plain text,
+  OUT token_hash text
+)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_level int;
+  v_secret text := encode(extensions.gen_random_bytes(24), 'hex');
 BEGIN
-  SELECT ml.level INTO v_level
-  FROM membership_levels ml
-  WHERE p_points >= ml.min_points
-    AND (ml.max_points IS NULL OR p_points <= ml.max_points)
-    AND ml.is_active = true
-  ORDER BY ml.level DESC
-  LIMIT 1;
-  
-  RETURN COALESCE(v_level, 0);
+  token_lookup := encode(extensions.gen_random_bytes(8), 'hex');
+  qr_plain := token_lookup || '.' || v_secret;
+  token_hash := sec.qr_token_digest(v_secret);
+END;
+$$;
+
+-- 會員等級預計算：compute_level / compute_discount 由 membership_levels 生成為 IMMUTABLE SQL 函數
+-- （CASE 表達式內聯常量，不再每筆支付查表兩次）；membership_levels 任何變更時由語句級觸發器重建。
+-- 規則與原查表一致：取 min_points <= 積分 <= max_points 的最高啟用等級，無匹配時為 0 級、無折扣
+CREATE OR REPLACE FUNCTION sec.rebuild_level_functions()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  r record;
+  v_cond text;
+  v_level_case text := '';
+  v_discount_case text := '';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  FOR r IN
+    SELECT ml.level, ml.min_points, ml.max_points, ml.discount
+    FROM public.membership_levels ml
+    WHERE ml.is_active = true
+    ORDER BY ml.level DESC
+  LOOP
+    v_cond := format('p_points >= %s', r.min_points);
+    IF r.max_points IS NOT NULL THEN
+      v_cond := v_cond || format(' AND p_points <= %s', r.max_points);
+    END IF;
+    v_level_case := v_level_case || format(' WHEN %s THEN %s', v_cond, r.level);
+    v_discount_case := v_discount_case || format(' WHEN %s THEN %s::numeric(4,3)', v_cond, r.discount);
+  END LOOP;
+
+  EXECUTE format(
+    'CREATE OR REPLACE FUNCTION public.compute_level(p_points int) RETURNS int '
+    'LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $body$ SELECT %s $body$',
+    CASE WHEN v_level_case = '' THEN '0' ELSE 'CASE' || v_level_case || ' ELSE 0 END' END
+  );
+  EXECUTE format(
+    'CREATE OR REPLACE FUNCTION public.compute_discount(p_points int) RETURNS numeric(4,3) '
+    'LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $body$ SELECT %s $body$',
+    CASE WHEN v_discount_case = '' THEN '1.000::numeric(4,3)'
+         ELSE 'CASE' || v_discount_case || ' ELSE 1.000::numeric(4,3) END' END
+  );
+
+  COMMENT ON FUNCTION public.compute_level(int) IS '按積分計算等級（由 membership_levels 自動生成，勿手動修改）';
+  COMMENT ON FUNCTION public.compute_discount(int) IS '按積分計算折扣（由 membership_levels 自動生成，勿手動修改）';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION sec.trg_rebuild_level_functions()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.rebuild_level_functions();
+  RETURN NULL;
 END;
 $$;
 
+DROP TRIGGER IF EXISTS trg_membership_levels_rebuild ON membership_levels;
+CREATE TRIGGER trg_membership_levels_rebuild
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON membership_levels
+FOR EACH STATEMENT EXECUTE FUNCTION sec.trg_rebuild_level_functions();
+
+-- 初始生成
+SELECT sec.rebuild_level_functions();
+
 -- Grant RLS bypass to functions
 GRANT ALL ON ALL TABLES IN SCHEMA public TO postgres;
 GRANT ALL ON ALL SEQUENCES IN SCHEMA public TO postgres;
@@ -154,6 +283,9 @@ $$;
 COMMENT ON FUNCTION cleanup_expired_sessions IS '清理過期的 session';
 
 -- 驗證並加載 session
+-- 快速路徑：連接上已加載同一 session 時跳過 set_config
+-- 訪問時間合併寫入：last_accessed_at 距今超過 app.session_touch_interval（默認 60 秒）才更新，
+-- 只讀 RPC 不再每次都寫 app_sessions；可用 ALTER DATABASE ... SET app.session_touch_interval = '5 minutes' 調整
 CREATE OR REPLACE FUNCTION load_session(p_session_id text)
 RETURNS boolean
 LANGUAGE plpgsql
@@ -161,12 +293,13 @@ SECURITY DEFINER
 AS $$
 DECLARE
   v_session public.app_sessions%ROWTYPE;
+  v_touch_interval interval;
 BEGIN
   IF p_session_id IS NULL THEN
     RETURN false;
   END IF;
   
-  -- 查詢 session
+  -- 查詢 session（主鍵查找，仍每次驗證以便登出 / 過期立即生效）
   SELECT * INTO v_session
   FROM public.app_sessions
   WHERE session_id = p_session_id
@@ -176,28 +309,39 @@ BEGIN
     RETURN false;
   END IF;
   
-  -- 設置 session 變數
-  PERFORM set_config('app.user_role', v_session.user_role, false);
-  PERFORM set_config('app.user_id', v_session.user_id::text, false);
-  
-  IF v_session.merchant_id IS NOT NULL THEN
-    PERFORM set_config('app.merchant_id', v_session.merchant_id::text, false);
+  -- 設置 session 變數（同一連接已加載此 session 且身份未被登入 / 重置覆蓋時跳過）
+  IF current_setting('app.loaded_session_id', true) IS DISTINCT FROM p_session_id
+     OR current_setting('app.user_id', true) IS DISTINCT FROM v_session.user_id::text
+     OR current_setting('app.user_role', true) IS DISTINCT FROM v_session.user_role THEN
+    PERFORM set_config('app.user_role', v_session.user_role, false);
+    PERFORM set_config('app.user_id', v_session.user_id::text, false);
+    -- 清除上一個 session 遺留的商戶 / 會員身份
+    PERFORM set_config('app.merchant_id', COALESCE(v_session.merchant_id::text, ''), false);
+    PERFORM set_config('app.member_id', COALESCE(v_session.member_id::text, ''), false);
+    PERFORM set_config('app.session_id', p_session_id, false);
+    PERFORM set_config('app.loaded_session_id', p_session_id, false);
   END IF;
   
-  IF v_session.member_id IS NOT NULL THEN
-    PERFORM set_config('app.member_id', v_session.member_id::text, false);
-  END IF;
+  -- 更新最後訪問時間（合併寫入）
+  BEGIN
+    v_touch_interval := COALESCE(NULLIF(current_setting('app.session_touch_interval', true), ''), '60 seconds')::interval;
+  EXCEPTION WHEN OTHERS THEN
+    v_touch_interval := interval '60 seconds';
+  END;
   
-  -- 更新最後訪問時間
-  UPDATE public.app_sessions
-  SET last_accessed_at = now_utc()
-  WHERE session_id = p_session_id;
+  IF v_session.last_accessed_at <= now_utc() - v_touch_interval THEN
+    -- 帶上讀到的舊值，併發請求中只有一個實際寫入
+    UPDATE public.app_sessions
+    SET last_accessed_at = now_utc()
+    WHERE session_id = p_session_id
+      AND last_accessed_at = v_session.last_accessed_at;
+  END IF;
   
   RETURN true;
 END;
 $$;
 
-COMMENT ON FUNCTION load_session IS '驗證並加載 session 到當前連接';
+COMMENT ON FUNCTION load_session IS '驗證並加載 session 到當前連接（訪問時間按 app.session_touch_interval 合併更新）';
 
 -- 登出（刪除 session）
 CREATE OR REPLACE FUNCTION logout_session(p_session_id text)
@@ -218,15 +362,20 @@ COMMENT ON FUNCTION logout_session IS '登出並刪除 session';
 -- ============================================================================
 
 -- 取得當前用戶角色
+-- 自定義登入直接讀 session 變數；Supabase Auth 用戶以單條查詢按優先級解析
+-- （admin_users > merchant_users > member_profiles），結果以事務級 GUC app.auth_role_cache 緩存，
+-- 同一請求內重複調用（check_permission、各 RPC 內的授權分支）不再重查
+-- 寫入緩存 GUC 屬於副作用，因此聲明為 VOLATILE（STABLE 函數不得有副作用，調用可能被規劃器合併）
 CREATE OR REPLACE FUNCTION get_user_role()
 RETURNS text
 LANGUAGE plpgsql
 SECURITY DEFINER
-STABLE
+VOLATILE
 AS $$
 DECLARE
   v_role text;
   v_auth_uid uuid;
+  v_cached text;
 BEGIN
   -- 1. 檢查 session 變數（自定義登入）
   BEGIN
@@ -246,38 +395,38 @@ BEGIN
     RETURN NULL;
   END IF;
   
-  -- 3. 優先檢查 admin_users（super_admin 優先級最高）
-  SELECT role INTO v_role
-  FROM admin_users
-  WHERE auth_user_id = v_auth_uid
-    AND is_active = true
-  LIMIT 1;
-  
-  IF v_role IS NOT NULL THEN
-    RETURN v_role;
+  -- 3. 事務內緩存（格式 <auth_uid>:<role>，無角色時 role 為空）
+  v_cached := current_setting('app.auth_role_cache', true);
+  IF v_cached IS NOT NULL AND split_part(v_cached, ':', 1) = v_auth_uid::text THEN
+    RETURN NULLIF(split_part(v_cached, ':', 2), '');
   END IF;
   
-  -- 4. 檢查 merchant_users
-  SELECT 'merchant' INTO v_role
-  FROM merchant_users
-  WHERE auth_user_id = v_auth_uid
+  -- 4. 單次查詢解析角色，各分支均走 auth_user_id 索引
+  SELECT r.role INTO v_role
+  FROM (
+    SELECT au.role, 1 AS priority
+    FROM admin_users au
+    WHERE au.auth_user_id = v_auth_uid AND au.is_active = true
+    UNION ALL
+    SELECT 'merchant', 2
+    FROM merchant_users mu
+    WHERE mu.auth_user_id = v_auth_uid
+    UNION ALL
+    SELECT 'member', 3
+    FROM member_profiles mp
+    WHERE mp.auth_user_id = v_auth_uid AND mp.status = 'active'
+  ) r
+  ORDER BY r.priority
   LIMIT 1;
   
-  IF v_role IS NOT NULL THEN
-    RETURN v_role;
-  END IF;
-  
-  -- 5. 檢查 member_profiles
-  SELECT 'member' INTO v_role
-  FROM member_profiles
-  WHERE auth_user_id = v_auth_uid
-    AND status = 'active'
-  LIMIT 1;
+  PERFORM set_config('app.auth_role_cache', v_auth_uid::text || ':' || COALESCE(v_role, ''), true);
   
   RETURN v_role;
 END;
 $$;
 
+COMMENT ON FUNCTION get_user_role IS '取得當前用戶角色（Supabase Auth 解析結果按事務緩存）';
+
 -- 檢查是否為管理員
 CREATE OR REPLACE FUNCTION is_admin()
 RETURNS boolean
@@ -346,6 +495,14 @@ BEGIN
   EXCEPTION WHEN OTHERS THEN
     -- 忽略錯誤
   END;
+  
+  BEGIN
+    PERFORM set_config('app.merchant_id', '', false);
+    PERFORM set_config('app.member_id', '', false);
+    PERFORM set_config('app.loaded_session_id', '', false);
+  EXCEPTION WHEN OTHERS THEN
+    -- 忽略錯誤
+  END;
 END;
 $$;
 
@@ -439,7 +596,7 @@ BEGIN
   END IF;
   
   IF NOT (v_member.password_hash = extensions.crypt(p_password, v_member.password_hash)) THEN
-    INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+    INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
     VALUES (NULL, 'LOGIN_FAILED', 'member_profiles', v_member.id,
             jsonb_build_object('identifier', p_identifier), now_utc());
     RAISE EXCEPTION 'INVALID_PASSWORD';
@@ -466,7 +623,7 @@ BEGIN
   PERFORM set_config('app.session_id', v_session_id, false);
   
   -- 記錄成功登入
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (NULL, 'LOGIN_SUCCESS', 'member_profiles', v_member.id,
           jsonb_build_object('identifier', p_identifier), now_utc());
   
@@ -516,7 +673,7 @@ BEGIN
   END IF;
   
   IF NOT (v_merchant.password_hash = extensions.crypt(p_password, v_merchant.password_hash)) THEN
-    INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+    INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
     VALUES (NULL, 'LOGIN_FAILED', 'merchants', v_merchant.id,
             jsonb_build_object('code', p_merchant_code), now_utc());
     RAISE EXCEPTION 'INVALID_PASSWORD';
@@ -543,7 +700,7 @@ BEGIN
   PERFORM set_config('app.session_id', v_session_id, false);
   
   -- 記錄成功登入
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (NULL, 'LOGIN_SUCCESS', 'merchants', v_merchant.id,
           jsonb_build_object('code', p_merchant_code), now_utc());
   
@@ -584,7 +741,7 @@ BEGIN
     RAISE EXCEPTION 'MEMBER_NOT_FOUND';
   END IF;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'PASSWORD_CHANGED', 'member_profiles', p_member_id, '{}'::jsonb, now_utc());
   
   RETURN TRUE;
@@ -617,7 +774,7 @@ BEGIN
     RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
   END IF;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'PASSWORD_CHANGED', 'merchants', p_merchant_id, '{}'::jsonb, now_utc());
   
   RETURN TRUE;
@@ -687,7 +844,7 @@ BEGIN
   END IF;
 
   -- 5) Audit
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'CREATE_MEMBER', 'member_profiles', v_member_id,
           jsonb_build_object('name', p_name, 'phone', p_phone, 'email', p_email), now_utc());
 
@@ -757,7 +914,7 @@ BEGIN
       AND status = 'active';
   END IF;
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'BIND_CARD', 'member_cards', p_card_id,
           jsonb_build_object('member_id', p_member_id, 'role', p_role), now_utc());
   RETURN TRUE;
@@ -803,7 +960,7 @@ BEGIN
       AND status = 'active';
   END IF;
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'UNBIND_CARD', 'member_cards', p_card_id, 
           jsonb_build_object('member_id', p_member_id), now_utc());
   RETURN TRUE;
@@ -823,8 +980,7 @@ LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_plain text := encode(extensions.gen_random_bytes(32),'base64');
-  v_hash  text;
+  v_token record;
   v_expires timestamptz := now_utc() + make_interval(secs => GREATEST(p_ttl_seconds, 60));
   v_user_role text;
   v_has_permission boolean := false;
@@ -887,24 +1043,25 @@ BEGIN
     RAISE EXCEPTION 'PERMISSION_DENIED: 您沒有權限為此卡片生成 QR 碼';
   END IF;
   
-  v_hash := extensions.crypt(v_plain, extensions.gen_salt('bf'));
+  v_token := sec.issue_qr_token();
 
   -- Upsert current QR state
-  INSERT INTO card_qr_state(card_id, token_hash, updated_at, expires_at)
-  VALUES (p_card_id, v_hash, now_utc(), v_expires)
+  INSERT INTO card_qr_state(card_id, token_lookup, token_hash, updated_at, expires_at)
+  VALUES (p_card_id, v_token.token_lookup, v_token.token_hash, now_utc(), v_expires)
   ON CONFLICT (card_id) DO UPDATE
-    SET token_hash = EXCLUDED.token_hash,
+    SET token_lookup = EXCLUDED.token_lookup,
+        token_hash = EXCLUDED.token_hash,
         updated_at = EXCLUDED.updated_at,
         expires_at = EXCLUDED.expires_at;
 
   -- Append history
-  INSERT INTO card_qr_history(card_id, token_hash, issued_at, expires_at)
-  VALUES (p_card_id, v_hash, now_utc(), v_expires);
+  INSERT INTO card_qr_history(card_id, token_lookup, token_hash, issued_at, expires_at)
+  VALUES (p_card_id, v_token.token_lookup, v_token.token_hash, now_utc(), v_expires);
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'QR_ROTATE', 'member_cards', p_card_id, 
           jsonb_build_object('ttl', p_ttl_seconds), now_utc());
-  RETURN QUERY SELECT v_plain, v_expires;
+  RETURN QUERY SELECT v_token.qr_plain, v_expires;
 END;
 $$;
 
@@ -963,8 +1120,9 @@ BEGIN
     RAISE EXCEPTION 'PERMISSION_DENIED: 您沒有權限撤銷此卡片的 QR 碼';
   END IF;
   
-  UPDATE card_qr_state SET expires_at = now_utc() WHERE card_id = p_card_id;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  -- 立即過期：validate_qr_plain 按 expires_at 拒絕該查找鍵
+  UPDATE card_qr_state SET expires_at = now_utc(), updated_at = now_utc() WHERE card_id = p_card_id;
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'QR_REVOKE', 'member_cards', p_card_id, '{}'::jsonb, now_utc());
   RETURN TRUE;
 END;
@@ -977,18 +1135,25 @@ LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
+  v_plain text := lower(btrim(p_qr_plain));
   v_card_id uuid;
+  v_digest text;
 BEGIN
   PERFORM sec.fixed_search_path();
-  IF p_qr_plain IS NULL OR length(p_qr_plain) < 16 THEN
+  IF v_plain IS NULL OR v_plain !~ '^[0-9a-f]{16}\.[0-9a-f]{48}$' THEN
     RAISE EXCEPTION 'INVALID_QR';
   END IF;
 
+  -- 先對 secret 求 HMAC 摘要，再以「查找鍵 + 摘要」定位（uq_qr_state_lookup 單行）：
+  -- secret 本身從不參與比較，被比較的只有攻擊者無法控制的 HMAC 輸出；
+  -- 摘要在查找前無條件計算，查找鍵是否存在不影響耗時
+  v_digest := sec.qr_token_digest(split_part(v_plain, '.', 2));
+
   SELECT s.card_id INTO v_card_id
   FROM card_qr_state s
-  WHERE s.expires_at > now_utc()
-    AND s.token_hash = extensions.crypt(p_qr_plain, s.token_hash)
-  LIMIT 1;
+  WHERE s.token_lookup = split_part(v_plain, '.', 1)
+    AND s.token_hash = v_digest
+    AND s.expires_at > now_utc();
 
   IF v_card_id IS NULL THEN
     RAISE EXCEPTION 'QR_EXPIRED_OR_INVALID';
@@ -998,110 +1163,253 @@ BEGIN
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION cron_rotate_qr_tokens(
-  p_ttl_seconds integer DEFAULT 300
-) RETURNS int
+-- 批量輪換工作函數：按 card_id 順序處理一個分塊，set-based 寫入 state / history
+-- 摘要使用 HMAC-SHA256（密鑰只讀取一次），短效令牌無需 bcrypt 的慢哈希
+CREATE OR REPLACE FUNCTION sec.rotate_qr_chunk(
+  p_ttl_seconds integer,
+  p_chunk_size integer,
+  p_after_card_id uuid,
+  OUT rotated int,
+  OUT last_card_id uuid
+)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_cnt int := 0;
-  r RECORD;
-  v_plain text;
-  v_hash  text;
+  v_key bytea;
+  v_now timestamptz := now_utc();
   v_expires timestamptz := now_utc() + make_interval(secs => GREATEST(p_ttl_seconds, 60));
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  FOR r IN
-    SELECT id FROM member_cards WHERE status='active' AND card_type = 'corporate'
-  LOOP
-    v_plain := encode(extensions.gen_random_bytes(32),'base64');
-    v_hash := extensions.crypt(v_plain, extensions.gen_salt('bf'));
-    INSERT INTO card_qr_state(card_id, token_hash, updated_at, expires_at)
-    VALUES (r.id, v_hash, now_utc(), v_expires)
+
+  SELECT k.secret INTO v_key FROM sec.qr_token_key k WHERE k.id;
+  IF v_key IS NULL THEN
+    RAISE EXCEPTION 'QR_TOKEN_KEY_MISSING';
+  END IF;
+
+  WITH batch AS (
+    SELECT mc.id
+    FROM member_cards mc
+    WHERE mc.status = 'active'
+      AND mc.card_type = 'corporate'
+      AND (p_after_card_id IS NULL OR mc.id > p_after_card_id)
+    ORDER BY mc.id
+    LIMIT GREATEST(p_chunk_size, 1)
+  ), issued AS (
+    SELECT b.id AS card_id,
+           encode(extensions.gen_random_bytes(8), 'hex') AS token_lookup,
+           encode(extensions.gen_random_bytes(24), 'hex') AS secret
+    FROM batch b
+  ), upserted AS (
+    INSERT INTO card_qr_state(card_id, token_lookup, token_hash, updated_at, expires_at)
+    SELECT i.card_id,
+           i.token_lookup,
+           encode(extensions.hmac(convert_to(i.secret, 'UTF8'), v_key, 'sha256'), 'hex'),
+           v_now,
+           v_expires
+    FROM issued i
     ON CONFLICT (card_id) DO UPDATE
-      SET token_hash = EXCLUDED.token_hash,
+      SET token_lookup = EXCLUDED.token_lookup,
+          token_hash = EXCLUDED.token_hash,
           updated_at = EXCLUDED.updated_at,
-          expires_at = EXCLUDED.expires_at;
-    INSERT INTO card_qr_history(card_id, token_hash, issued_at, expires_at)
-    VALUES (r.id, v_hash, now_utc(), v_expires);
-    v_cnt := v_cnt + 1;
-  END LOOP;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+          expires_at = EXCLUDED.expires_at
+    RETURNING card_id, token_lookup, token_hash
+  ), hist AS (
+    INSERT INTO card_qr_history(card_id, token_lookup, token_hash, issued_at, expires_at)
+    SELECT u.card_id, u.token_lookup, u.token_hash, v_now, v_expires
+    FROM upserted u
+    RETURNING card_id
+  )
+  SELECT count(*)::int, max(h.card_id::text COLLATE "C")::uuid
+    INTO rotated, last_card_id
+  FROM hist h;
+END;
+$$;
+
+-- 分塊輪換 RPC：每次調用處理一個分塊並在各自事務中提交，
+-- 客戶端以返回的 last_card_id 作為下一塊的游標，直到 done = true
+CREATE OR REPLACE FUNCTION cron_rotate_qr_tokens_chunk(
+  p_ttl_seconds integer DEFAULT 300,
+  p_chunk_size integer DEFAULT 1000,
+  p_after_card_id uuid DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(rotated int, last_card_id uuid, done boolean, total_cards bigint)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_chunk integer := LEAST(GREATEST(COALESCE(p_chunk_size, 1000), 1), 10000);
+  v_rotated int;
+  v_last uuid;
+  v_total bigint;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  -- 首塊返回總數供客戶端顯示進度
+  IF p_after_card_id IS NULL THEN
+    SELECT count(*) INTO v_total
+    FROM member_cards
+    WHERE status = 'active' AND card_type = 'corporate';
+  END IF;
+
+  SELECT c.rotated, c.last_card_id INTO v_rotated, v_last
+  FROM sec.rotate_qr_chunk(p_ttl_seconds, v_chunk, p_after_card_id) c;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'QR_CRON_ROTATE', 'system', NULL,
+          jsonb_build_object('affected', v_rotated, 'chunk_size', v_chunk,
+                             'after_card_id', p_after_card_id, 'ttl', p_ttl_seconds),
+          now_utc());
+
+  RETURN QUERY SELECT v_rotated, COALESCE(v_last, p_after_card_id), v_rotated < v_chunk, v_total;
+END;
+$$;
+
+COMMENT ON FUNCTION cron_rotate_qr_tokens_chunk IS '分塊批量輪換企業卡 QR 碼（需要 super_admin 權限）';
+
+-- 單次調用輪換全部企業卡（兼容舊調用；大量卡片請使用分塊 RPC）
+CREATE OR REPLACE FUNCTION cron_rotate_qr_tokens(
+  p_ttl_seconds integer DEFAULT 300,
+  p_session_id text DEFAULT NULL
+) RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_cnt int;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  SELECT c.rotated INTO v_cnt
+  FROM sec.rotate_qr_chunk(p_ttl_seconds, 2147483647, NULL) c;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'QR_CRON_ROTATE', 'system', NULL, 
           jsonb_build_object('affected', v_cnt), now_utc());
   RETURN v_cnt;
 END;
 $$;
 
+-- 排程用（pg_cron: CALL sec.cron_rotate_qr_tokens_batched(300, 1000)）
+-- 分塊之間 COMMIT，避免長事務；過程不可為 SECURITY DEFINER，需由資料庫擁有者執行
+CREATE OR REPLACE PROCEDURE sec.cron_rotate_qr_tokens_batched(
+  p_ttl_seconds integer DEFAULT 300,
+  p_chunk_size integer DEFAULT 1000
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_after uuid := NULL;
+  v_rotated int;
+  v_last uuid;
+  v_total int := 0;
+BEGIN
+  LOOP
+    SELECT c.rotated, c.last_card_id INTO v_rotated, v_last
+    FROM sec.rotate_qr_chunk(p_ttl_seconds, p_chunk_size, v_after) c;
+
+    v_total := v_total + v_rotated;
+    COMMIT;
+
+    EXIT WHEN v_rotated < GREATEST(p_chunk_size, 1);
+    v_after := v_last;
+  END LOOP;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (NULL, 'QR_CRON_ROTATE', 'system', NULL,
+          jsonb_build_object('affected', v_total, 'chunk_size', p_chunk_size), now_utc());
+  COMMIT;
+END;
+$$;
+
 -- =======================
 -- C) PAYMENTS / REFUNDS / RECHARGE
 -- =======================
 
-CREATE OR REPLACE FUNCTION merchant_charge_by_qr(
-  p_merchant_code text,
+-- 冪等鍵 / 外部訂單號已登記的扣款（重放時返回既有交易，registered=true）；未登記時不返回行
+CREATE OR REPLACE FUNCTION sec.find_charge_replay(
+  p_merchant_id uuid,
+  p_idempotency_key text,
+  p_external_order_id text
+) RETURNS TABLE (registered boolean, tx_id uuid, tx_no text, card_id uuid, final_amount numeric, discount numeric)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_idempotency_key IS NOT NULL
+     AND EXISTS (SELECT 1 FROM idempotency_registry ir WHERE ir.idempotency_key = p_idempotency_key) THEN
+    RETURN QUERY
+      SELECT true, t.id, t.tx_no, t.card_id, t.final_amount, t.discount_applied
+      FROM idempotency_registry ir
+      LEFT JOIN transactions t ON t.id = ir.tx_id AND t.created_at = ir.created_at AND t.status = 'completed'
+      WHERE ir.idempotency_key = p_idempotency_key
+      LIMIT 1;
+    RETURN;
+  END IF;
+
+  IF p_external_order_id IS NOT NULL
+     AND EXISTS (SELECT 1 FROM merchant_order_registry mo
+                 WHERE mo.merchant_id = p_merchant_id AND mo.external_order_id = p_external_order_id) THEN
+    RETURN QUERY
+      SELECT true, t.id, t.tx_no, t.card_id, t.final_amount, t.discount_applied
+      FROM merchant_order_registry mo
+      LEFT JOIN transactions t ON t.id = mo.tx_id AND t.created_at = mo.created_at AND t.status = 'completed'
+      WHERE mo.merchant_id = p_merchant_id AND mo.external_order_id = p_external_order_id
+      LIMIT 1;
+    RETURN;
+  END IF;
+END;
+$$;
+
+-- 單筆掃碼扣款核心邏輯（不含 session / 商戶授權 / 審計）
+-- 由 merchant_charge_by_qr 與 merchant_charge_batch 共用；replayed=true 表示命中冪等鍵或外部訂單號，返回既有交易
+-- 先查冪等登記再驗證 QR：QR 過期後重試已成功的扣款仍返回原交易
+CREATE OR REPLACE FUNCTION sec.charge_card_payment(
+  p_merch merchants,
   p_qr_plain text,
   p_raw_amount numeric,
-  p_idempotency_key text DEFAULT NULL,
-  p_tag jsonb DEFAULT '{}'::jsonb,
-  p_external_order_id text DEFAULT NULL,
-  p_session_id text DEFAULT NULL
-) RETURNS TABLE (tx_id uuid, tx_no text, card_id uuid, final_amount numeric, discount numeric)
+  p_idempotency_key text,
+  p_tag jsonb,
+  p_external_order_id text
+) RETURNS TABLE (tx_id uuid, tx_no text, card_id uuid, final_amount numeric, discount numeric, replayed boolean)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_merch merchants%ROWTYPE;
-  v_user_role text;
-  v_current_merchant_id text;
-  v_is_authorized boolean := false;
   v_card member_cards%ROWTYPE;
   v_disc numeric(4,3) := 1.000;
   v_final numeric(12,2);
   v_tx_id uuid := extensions.gen_random_uuid();
   v_tx_no text;
-  v_ref_exists uuid;
+  v_replay record;
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  -- 加載 session
-  IF p_session_id IS NOT NULL THEN
-    PERFORM load_session(p_session_id);
-  END IF;
 
   -- 驗證金額
   IF p_raw_amount IS NULL OR p_raw_amount <= 0 THEN
     RAISE EXCEPTION 'INVALID_PRICE';
   END IF;
 
-  -- 獲取商戶
-  SELECT * INTO v_merch FROM merchants WHERE code=p_merchant_code AND status='active';
-  IF NOT FOUND THEN RAISE EXCEPTION 'MERCHANT_NOT_FOUND_OR_INACTIVE'; END IF;
-
-  -- 權限檢查
-  v_user_role := get_user_role();
-  
-  IF v_user_role = 'super_admin' THEN
-    -- Super Admin 可以代替任何商戶執行支付
-    v_is_authorized := true;
-    
-  ELSIF v_user_role = 'merchant' THEN
-    -- Merchant 只能執行自己的支付
-    BEGIN
-      v_current_merchant_id := current_setting('app.merchant_id', true);
-    EXCEPTION WHEN OTHERS THEN
-      v_current_merchant_id := NULL;
-    END;
-    
-    IF v_current_merchant_id = v_merch.id::text THEN
-      v_is_authorized := true;
-    END IF;
-  END IF;
-  
-  IF NOT v_is_authorized THEN
-    RAISE EXCEPTION 'NOT_AUTHORIZED_FOR_THIS_MERCHANT';
+  -- 已登記的冪等鍵 / 外部訂單號直接返回既有交易（不驗證 QR、不鎖卡）
+  SELECT * INTO v_replay FROM sec.find_charge_replay(p_merch.id, p_idempotency_key, p_external_order_id);
+  IF v_replay.registered THEN
+    RETURN QUERY SELECT v_replay.tx_id, v_replay.tx_no, v_replay.card_id, v_replay.final_amount, v_replay.discount, true
+                 WHERE v_replay.tx_id IS NOT NULL;
+    RETURN;
   END IF;
 
   -- Validate QR -> card_id
@@ -1114,12 +1422,11 @@ BEGIN
     BEGIN
       INSERT INTO idempotency_registry(idempotency_key, tx_id, created_at) VALUES (p_idempotency_key, v_tx_id, now_utc());
     EXCEPTION WHEN unique_violation THEN
+      -- 並發請求在上面的查找之後才登記同一冪等鍵
       RETURN QUERY
-        SELECT t.id, t.tx_no, t.card_id, t.final_amount, t.discount_applied
-        FROM idempotency_registry ir
-        JOIN transactions t ON t.id = ir.tx_id
-        WHERE ir.idempotency_key = p_idempotency_key AND t.status='completed'
-        LIMIT 1;
+        SELECT r.tx_id, r.tx_no, r.card_id, r.final_amount, r.discount, true
+        FROM sec.find_charge_replay(p_merch.id, p_idempotency_key, NULL) r
+        WHERE r.tx_id IS NOT NULL;
       RETURN;
     END;
   END IF;
@@ -1128,14 +1435,12 @@ BEGIN
   IF p_external_order_id IS NOT NULL THEN
     BEGIN
       INSERT INTO merchant_order_registry(merchant_id, external_order_id, tx_id, created_at)
-      VALUES (v_merch.id, p_external_order_id, v_tx_id, now_utc());
+      VALUES (p_merch.id, p_external_order_id, v_tx_id, now_utc());
     EXCEPTION WHEN unique_violation THEN
       RETURN QUERY
-        SELECT t.id, t.tx_no, t.card_id, t.final_amount, t.discount_applied
-        FROM merchant_order_registry mo
-        JOIN transactions t ON t.id = mo.tx_id
-        WHERE mo.merchant_id=v_merch.id AND mo.external_order_id=p_external_order_id AND t.status='completed'
-        LIMIT 1;
+        SELECT r.tx_id, r.tx_no, r.card_id, r.final_amount, r.discount, true
+        FROM sec.find_charge_replay(p_merch.id, NULL, p_external_order_id) r
+        WHERE r.tx_id IS NOT NULL;
       RETURN;
     END;
   END IF;
@@ -1158,12 +1463,12 @@ BEGIN
 
   -- Create tx number registry
   v_tx_no := gen_tx_no('payment');
-  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_tx_no, v_tx_id, now_utc()) ON CONFLICT DO NOTHING;
+  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_tx_no, v_tx_id, now_utc());
 
   -- Insert transaction
   INSERT INTO transactions(id, tx_no, card_id, merchant_id, tx_type,
     raw_amount, discount_applied, final_amount, points_earned, status, tag, payment_method, created_at)
-  VALUES (v_tx_id, v_tx_no, v_card.id, v_merch.id, 'payment',
+  VALUES (v_tx_id, v_tx_no, v_card.id, p_merch.id, 'payment',
     p_raw_amount, v_disc, v_final,
     CASE WHEN v_card.card_type = 'standard' THEN floor(p_raw_amount)::int ELSE 0 END,
     'processing', COALESCE(p_tag,'{}'::jsonb), 'balance', now_utc());
@@ -1188,23 +1493,21 @@ BEGIN
             (SELECT points FROM member_cards WHERE id=v_card.id), 'payment_earn', now_utc());
   END IF;
 
-  UPDATE transactions SET status='completed' WHERE id = v_tx_id;
-
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'PAYMENT', 'transactions', v_tx_id, 
-          jsonb_build_object('merchant', v_merch.code, 'final', v_final), now_utc());
+  UPDATE transactions SET status='completed' WHERE id = v_tx_id AND created_at = now_utc();
 
-  RETURN QUERY SELECT v_tx_id, v_tx_no, v_card.id, v_final, v_disc;
+  RETURN QUERY SELECT v_tx_id, v_tx_no, v_card.id, v_final, v_disc, false;
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION merchant_refund_tx(
+CREATE OR REPLACE FUNCTION merchant_charge_by_qr(
   p_merchant_code text,
-  p_original_tx_no text,
-  p_refund_amount numeric,
+  p_qr_plain text,
+  p_raw_amount numeric,
+  p_idempotency_key text DEFAULT NULL,
   p_tag jsonb DEFAULT '{}'::jsonb,
+  p_external_order_id text DEFAULT NULL,
   p_session_id text DEFAULT NULL
-) RETURNS TABLE (refund_tx_id uuid, refund_tx_no text, refunded_amount numeric)
+) RETURNS TABLE (tx_id uuid, tx_no text, card_id uuid, final_amount numeric, discount numeric)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
@@ -1213,10 +1516,7 @@ DECLARE
   v_user_role text;
   v_current_merchant_id text;
   v_is_authorized boolean := false;
-  v_orig transactions%ROWTYPE;
-  v_left numeric(12,2);
-  v_ref_tx_id uuid := extensions.gen_random_uuid();
-  v_ref_tx_no text;
+  v_res record;
 BEGIN
   PERFORM sec.fixed_search_path();
   
@@ -1224,10 +1524,10 @@ BEGIN
   IF p_session_id IS NOT NULL THEN
     PERFORM load_session(p_session_id);
   END IF;
-  
-  -- 驗證退款金額
-  IF p_refund_amount IS NULL OR p_refund_amount <= 0 THEN
-    RAISE EXCEPTION 'INVALID_REFUND_AMOUNT';
+
+  -- 驗證金額
+  IF p_raw_amount IS NULL OR p_raw_amount <= 0 THEN
+    RAISE EXCEPTION 'INVALID_PRICE';
   END IF;
 
   -- 獲取商戶
@@ -1238,18 +1538,17 @@ BEGIN
   v_user_role := get_user_role();
   
   IF v_user_role = 'super_admin' THEN
-    -- Super Admin 可以執行所有商戶的退款
+    -- Super Admin 可以代替任何商戶執行支付
     v_is_authorized := true;
     
   ELSIF v_user_role = 'merchant' THEN
-    -- Merchant 只能退款自己的交易
+    -- Merchant 只能執行自己的支付
     BEGIN
       v_current_merchant_id := current_setting('app.merchant_id', true);
     EXCEPTION WHEN OTHERS THEN
       v_current_merchant_id := NULL;
     END;
     
-    -- 驗證是否為同一商戶
     IF v_current_merchant_id = v_merch.id::text THEN
       v_is_authorized := true;
     END IF;
@@ -1259,38 +1558,251 @@ BEGIN
     RAISE EXCEPTION 'NOT_AUTHORIZED_FOR_THIS_MERCHANT';
   END IF;
 
-  SELECT * INTO v_orig FROM transactions WHERE tx_no=p_original_tx_no AND merchant_id=v_merch.id;
-  IF NOT FOUND THEN RAISE EXCEPTION 'ORIGINAL_TX_NOT_FOUND'; END IF;
-  IF v_orig.tx_type <> 'payment' OR v_orig.status NOT IN ('completed','refunded') THEN
-    RAISE EXCEPTION 'ONLY_COMPLETED_PAYMENT_REFUNDABLE';
-  END IF;
-
-  SELECT v_orig.final_amount - COALESCE((
-    SELECT SUM(final_amount) FROM transactions
-    WHERE tx_type='refund' AND card_id=v_orig.card_id AND reason=v_orig.tx_no AND status IN ('processing','completed')
-  ), 0)
-  INTO v_left;
-  IF v_left IS NULL THEN v_left := v_orig.final_amount; END IF;
-  IF p_refund_amount > v_left THEN RAISE EXCEPTION 'REFUND_EXCEEDS_REMAINING'; END IF;
-
-  v_ref_tx_no := gen_tx_no('refund');
-  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_ref_tx_no, v_ref_tx_id, now_utc()) ON CONFLICT DO NOTHING;
-
-  INSERT INTO transactions(id, tx_no, card_id, merchant_id, tx_type,
-    raw_amount, discount_applied, final_amount, points_earned, status, tag, reason, payment_method, created_at)
-  VALUES (v_ref_tx_id, v_ref_tx_no, v_orig.card_id, v_merch.id, 'refund',
-    p_refund_amount, 1.000, p_refund_amount, 0, 'processing', COALESCE(p_tag,'{}'::jsonb), v_orig.tx_no, v_orig.payment_method, now_utc());
+  SELECT * INTO v_res
+  FROM sec.charge_card_payment(v_merch, p_qr_plain, p_raw_amount, p_idempotency_key, p_tag, p_external_order_id);
 
-  UPDATE member_cards SET balance = balance + p_refund_amount, updated_at = now_utc() WHERE id = v_orig.card_id;
+  -- 冪等重放：返回既有交易，不重複寫審計（既有交易未完成時不返回任何行）
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+  IF v_res.replayed THEN
+    RETURN QUERY SELECT v_res.tx_id, v_res.tx_no, v_res.card_id, v_res.final_amount, v_res.discount;
+    RETURN;
+  END IF;
 
-  UPDATE transactions SET status='completed' WHERE id = v_ref_tx_id;
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'PAYMENT', 'transactions', v_res.tx_id, 
+          jsonb_build_object('merchant', v_merch.code, 'final', v_res.final_amount), now_utc());
 
-  IF p_refund_amount >= v_left THEN
-    UPDATE transactions SET status='refunded' WHERE id = v_orig.id;
-  END IF;
+  RETURN QUERY SELECT v_res.tx_id, v_res.tx_no, v_res.card_id, v_res.final_amount, v_res.discount;
+END;
+$$;
 
-  -- 記錄審計日誌
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+-- 批量掃碼扣款：終端斷線重連後一次提交積壓的收款
+-- session、商戶查詢與授權每批只做一次；每筆在獨立子事務中執行，失敗只回滾該筆並返回錯誤碼；
+-- 每筆保留自身冪等鍵，重放返回既有交易；審計日誌在批次結束時一次多行寫入
+CREATE OR REPLACE FUNCTION merchant_charge_batch(
+  p_merchant_code text,
+  p_items jsonb,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE (
+  item_index int,
+  idempotency_key text,
+  success boolean,
+  tx_id uuid,
+  tx_no text,
+  card_id uuid,
+  final_amount numeric,
+  discount numeric,
+  replayed boolean,
+  error_code text
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_merch merchants%ROWTYPE;
+  v_user_role text;
+  v_current_merchant_id text;
+  v_is_authorized boolean := false;
+  v_item jsonb;
+  v_idx bigint;
+  v_res record;
+  v_audit_tx uuid[] := '{}';
+  v_audit_ctx jsonb[] := '{}';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  -- 加載 session
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  IF p_items IS NULL OR jsonb_typeof(p_items) <> 'array' THEN
+    RAISE EXCEPTION 'INVALID_BATCH_ITEMS';
+  END IF;
+  IF jsonb_array_length(p_items) > 200 THEN
+    RAISE EXCEPTION 'BATCH_TOO_LARGE';
+  END IF;
+
+  -- 獲取商戶
+  SELECT * INTO v_merch FROM merchants WHERE code=p_merchant_code AND status='active';
+  IF NOT FOUND THEN RAISE EXCEPTION 'MERCHANT_NOT_FOUND_OR_INACTIVE'; END IF;
+
+  -- 權限檢查（與 merchant_charge_by_qr 相同）
+  v_user_role := get_user_role();
+
+  IF v_user_role = 'super_admin' THEN
+    v_is_authorized := true;
+  ELSIF v_user_role = 'merchant' THEN
+    BEGIN
+      v_current_merchant_id := current_setting('app.merchant_id', true);
+    EXCEPTION WHEN OTHERS THEN
+      v_current_merchant_id := NULL;
+    END;
+
+    IF v_current_merchant_id = v_merch.id::text THEN
+      v_is_authorized := true;
+    END IF;
+  END IF;
+
+  IF NOT v_is_authorized THEN
+    RAISE EXCEPTION 'NOT_AUTHORIZED_FOR_THIS_MERCHANT';
+  END IF;
+
+  FOR v_item, v_idx IN
+    SELECT e.value, e.ordinality - 1 FROM jsonb_array_elements(p_items) WITH ORDINALITY AS e(value, ordinality)
+  LOOP
+    item_index := v_idx;
+    idempotency_key := v_item->>'idempotency_key';
+    tx_id := NULL; tx_no := NULL; card_id := NULL;
+    final_amount := NULL; discount := NULL; replayed := false; error_code := NULL;
+
+    BEGIN
+      SELECT * INTO v_res
+      FROM sec.charge_card_payment(
+        v_merch,
+        v_item->>'qr_plain',
+        (v_item->>'amount')::numeric,
+        v_item->>'idempotency_key',
+        COALESCE(v_item->'tag', '{}'::jsonb),
+        v_item->>'external_order_id'
+      );
+
+      IF NOT FOUND THEN
+        -- 冪等鍵已存在但對應交易未完成
+        RAISE EXCEPTION 'IDEMPOTENCY_CONFLICT';
+      END IF;
+
+      success := true;
+      tx_id := v_res.tx_id;
+      tx_no := v_res.tx_no;
+      card_id := v_res.card_id;
+      final_amount := v_res.final_amount;
+      discount := v_res.discount;
+      replayed := v_res.replayed;
+
+      IF NOT v_res.replayed THEN
+        v_audit_tx := v_audit_tx || v_res.tx_id;
+        v_audit_ctx := v_audit_ctx || jsonb_build_object('merchant', v_merch.code, 'final', v_res.final_amount, 'batch', true);
+      END IF;
+    EXCEPTION WHEN OTHERS THEN
+      success := false;
+      -- 業務錯誤（RAISE EXCEPTION 'CODE' / 'CODE: 說明'）只返回錯誤碼，其他數據庫錯誤返回 SQLSTATE
+      error_code := CASE
+        WHEN SQLSTATE = 'P0001' THEN COALESCE(substring(SQLERRM FROM '^[A-Z][A-Z0-9_]*'), SQLSTATE)
+        ELSE SQLSTATE
+      END;
+    END;
+
+    RETURN NEXT;
+  END LOOP;
+
+  IF cardinality(v_audit_tx) > 0 THEN
+    INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+    SELECT auth.uid(), 'PAYMENT', 'transactions', a.audit_tx, a.audit_ctx, now_utc()
+    FROM unnest(v_audit_tx, v_audit_ctx) AS a(audit_tx, audit_ctx);
+  END IF;
+END;
+$$;
+
+COMMENT ON FUNCTION merchant_charge_batch IS '批量掃碼扣款（每筆獨立冪等與結果，商戶授權與審計按批次處理，單批最多 200 筆）';
+
+CREATE OR REPLACE FUNCTION merchant_refund_tx(
+  p_merchant_code text,
+  p_original_tx_no text,
+  p_refund_amount numeric,
+  p_tag jsonb DEFAULT '{}'::jsonb,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE (refund_tx_id uuid, refund_tx_no text, refunded_amount numeric)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_merch merchants%ROWTYPE;
+  v_user_role text;
+  v_current_merchant_id text;
+  v_is_authorized boolean := false;
+  v_orig transactions%ROWTYPE;
+  v_left numeric(12,2);
+  v_ref_tx_id uuid := extensions.gen_random_uuid();
+  v_ref_tx_no text;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  -- 加載 session
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+  
+  -- 驗證退款金額
+  IF p_refund_amount IS NULL OR p_refund_amount <= 0 THEN
+    RAISE EXCEPTION 'INVALID_REFUND_AMOUNT';
+  END IF;
+
+  -- 獲取商戶
+  SELECT * INTO v_merch FROM merchants WHERE code=p_merchant_code AND status='active';
+  IF NOT FOUND THEN RAISE EXCEPTION 'MERCHANT_NOT_FOUND_OR_INACTIVE'; END IF;
+
+  -- 權限檢查
+  v_user_role := get_user_role();
+  
+  IF v_user_role = 'super_admin' THEN
+    -- Super Admin 可以執行所有商戶的退款
+    v_is_authorized := true;
+    
+  ELSIF v_user_role = 'merchant' THEN
+    -- Merchant 只能退款自己的交易
+    BEGIN
+      v_current_merchant_id := current_setting('app.merchant_id', true);
+    EXCEPTION WHEN OTHERS THEN
+      v_current_merchant_id := NULL;
+    END;
+    
+    -- 驗證是否為同一商戶
+    IF v_current_merchant_id = v_merch.id::text THEN
+      v_is_authorized := true;
+    END IF;
+  END IF;
+  
+  IF NOT v_is_authorized THEN
+    RAISE EXCEPTION 'NOT_AUTHORIZED_FOR_THIS_MERCHANT';
+  END IF;
+
+  -- 經 tx_registry 取得分區鍵，只掃描原交易所在分區；
+  -- 鎖定原交易行，並發退款在此串行，剩餘可退額直接取累計值
+  SELECT t.* INTO v_orig
+  FROM tx_registry r
+  JOIN transactions t ON t.id = r.tx_id AND t.created_at = r.created_at
+  WHERE r.tx_no = p_original_tx_no AND t.merchant_id = v_merch.id
+  FOR UPDATE OF t;
+  IF NOT FOUND THEN RAISE EXCEPTION 'ORIGINAL_TX_NOT_FOUND'; END IF;
+  IF v_orig.tx_type <> 'payment' OR v_orig.status NOT IN ('completed','refunded') THEN
+    RAISE EXCEPTION 'ONLY_COMPLETED_PAYMENT_REFUNDABLE';
+  END IF;
+
+  v_left := v_orig.final_amount - v_orig.refunded_amount;
+  IF p_refund_amount > v_left THEN RAISE EXCEPTION 'REFUND_EXCEEDS_REMAINING'; END IF;
+
+  v_ref_tx_no := gen_tx_no('refund');
+  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_ref_tx_no, v_ref_tx_id, now_utc());
+
+  INSERT INTO transactions(id, tx_no, card_id, merchant_id, tx_type,
+    raw_amount, discount_applied, final_amount, points_earned, status, tag, reason, original_tx_id, payment_method, created_at)
+  VALUES (v_ref_tx_id, v_ref_tx_no, v_orig.card_id, v_merch.id, 'refund',
+    p_refund_amount, 1.000, p_refund_amount, 0, 'processing', COALESCE(p_tag,'{}'::jsonb), v_orig.tx_no, v_orig.id, v_orig.payment_method, now_utc());
+
+  UPDATE member_cards SET balance = balance + p_refund_amount, updated_at = now_utc() WHERE id = v_orig.card_id;
+
+  UPDATE transactions SET status='completed' WHERE id = v_ref_tx_id AND created_at = now_utc();
+
+  UPDATE transactions t
+  SET refunded_amount = t.refunded_amount + p_refund_amount,
+      status = CASE WHEN p_refund_amount >= v_left THEN 'refunded'::tx_status ELSE t.status END
+  WHERE t.id = v_orig.id AND t.created_at = v_orig.created_at;
+
+  -- 記錄審計日誌
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (
     CASE
       WHEN auth.uid() IS NOT NULL THEN auth.uid()
@@ -1346,7 +1858,7 @@ BEGIN
       RETURN QUERY
         SELECT t.id, t.tx_no, t.card_id, t.final_amount
         FROM idempotency_registry ir
-        JOIN transactions t ON t.id = ir.tx_id
+        JOIN transactions t ON t.id = ir.tx_id AND t.created_at = ir.created_at
         WHERE ir.idempotency_key = p_idempotency_key AND t.status='completed'
         LIMIT 1;
       RETURN;
@@ -1362,7 +1874,7 @@ BEGIN
       RETURN QUERY
         SELECT t.id, t.tx_no, t.card_id, t.final_amount
         FROM merchant_order_registry mo
-        JOIN transactions t ON t.id = mo.tx_id
+        JOIN transactions t ON t.id = mo.tx_id AND t.created_at = mo.created_at
         WHERE mo.merchant_id IS NULL AND mo.external_order_id = p_external_order_id AND t.status='completed'
         LIMIT 1;
       RETURN;
@@ -1370,7 +1882,7 @@ BEGIN
   END IF;
 
   v_tx_no := gen_tx_no('recharge');
-  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_tx_no, v_tx_id, now_utc()) ON CONFLICT DO NOTHING;
+  INSERT INTO tx_registry(tx_no, tx_id, created_at) VALUES (v_tx_no, v_tx_id, now_utc());
 
   INSERT INTO transactions(id, tx_no, card_id, merchant_id, tx_type,
     raw_amount, discount_applied, final_amount, points_earned, status, tag, reason, payment_method, created_at)
@@ -1379,9 +1891,9 @@ BEGIN
 
   UPDATE member_cards SET balance = balance + p_amount, updated_at = now_utc() WHERE id = v_card.id;
 
-  UPDATE transactions SET status='completed' WHERE id = v_tx_id;
+  UPDATE transactions SET status='completed' WHERE id = v_tx_id AND created_at = now_utc();
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'RECHARGE', 'transactions', v_tx_id, 
           jsonb_build_object('amount', p_amount, 'method', p_payment_method), now_utc());
 
@@ -1434,7 +1946,7 @@ BEGIN
   INSERT INTO point_ledger(id, card_id, tx_id, change, balance_before, balance_after, reason, created_at)
   VALUES (extensions.gen_random_uuid(), v_card.id, NULL, p_delta_points, v_card.points, v_new_points, p_reason, now_utc());
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'POINTS_ADJUST', 'member_cards', v_card.id, 
           jsonb_build_object('delta', p_delta_points, 'reason', p_reason), now_utc());
   RETURN TRUE;
@@ -1455,7 +1967,7 @@ BEGIN
   PERFORM sec.fixed_search_path();
   PERFORM check_permission('super_admin');
   UPDATE member_cards SET status='inactive', updated_at=now_utc() WHERE id=p_card_id;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'CARD_FREEZE', 'member_cards', p_card_id, '{}'::jsonb, now_utc());
   RETURN TRUE;
 END;
@@ -1471,7 +1983,7 @@ BEGIN
   PERFORM sec.fixed_search_path();
   PERFORM check_permission('super_admin');
   UPDATE member_cards SET status='active', updated_at=now_utc() WHERE id=p_card_id;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'CARD_UNFREEZE', 'member_cards', p_card_id, '{}'::jsonb, now_utc());
   RETURN TRUE;
 END;
@@ -1487,7 +1999,7 @@ BEGIN
   PERFORM sec.fixed_search_path();
   PERFORM check_permission('super_admin');
   UPDATE member_profiles SET status='suspended', updated_at=now_utc() WHERE id=p_member_id;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'MEMBER_SUSPEND', 'member_profiles', p_member_id, '{}'::jsonb, now_utc());
   RETURN TRUE;
 END;
@@ -1503,7 +2015,7 @@ BEGIN
   PERFORM sec.fixed_search_path();
   PERFORM check_permission('super_admin');
   UPDATE merchants SET status='inactive', updated_at=now_utc() WHERE id=p_merchant_id;
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'MERCHANT_SUSPEND', 'merchants', p_merchant_id, '{}'::jsonb, now_utc());
   RETURN TRUE;
 END;
@@ -1513,604 +2025,886 @@ $$;
 -- F) SETTLEMENTS & QUERIES
 -- =======================
 
-CREATE OR REPLACE FUNCTION generate_settlement(
-  p_merchant_id uuid,
-  p_mode settlement_mode,
-  p_period_start timestamptz,
-  p_period_end   timestamptz
-) RETURNS uuid
+-- 商戶按日收支明細：完整且已彙總的日期讀 merchant_daily_rollup，首尾不完整日期及未彙總日期讀原始交易
+-- 結算與趨勢共用同一口徑（status IN completed / refunded）
+-- 接受商戶 ID 數組，批量結算時一次掃描整批商戶
+CREATE OR REPLACE FUNCTION sec.merchant_daily_breakdown(
+  p_merchant_ids uuid[],
+  p_start timestamptz,
+  p_end timestamptz
+) RETURNS TABLE(merchant_id uuid, day date, payment_count bigint, payment_amount numeric, refund_count bigint, refund_amount numeric)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_id uuid := extensions.gen_random_uuid();
-  v_total numeric(12,2);
-  v_count bigint;
+  v_through date;
+  v_full_from date;
+  v_full_to date;      -- 不含
+  v_full_from_ts timestamptz;
+  v_full_to_ts timestamptz;
 BEGIN
   PERFORM sec.fixed_search_path();
 
-  SELECT COALESCE(SUM(CASE WHEN tx_type='payment' THEN final_amount ELSE -final_amount END),0),
-         COUNT(*)
-  INTO v_total, v_count
-  FROM transactions
-  WHERE merchant_id=p_merchant_id
-    AND created_at >= p_period_start AND created_at < p_period_end
-    AND status IN ('completed','refunded');
+  v_through := sec.merchant_rollup_watermark();
 
-  INSERT INTO settlements(id, merchant_id, period_start, period_end, mode, total_amount, total_tx_count, status, created_at)
-  VALUES (v_id, p_merchant_id, p_period_start, p_period_end, p_mode, v_total, v_count, 'pending', now_utc());
+  v_full_from := (p_start AT TIME ZONE 'UTC')::date;
+  IF (v_full_from::timestamp AT TIME ZONE 'UTC') < p_start THEN
+    v_full_from := v_full_from + 1;
+  END IF;
+  v_full_to := LEAST((p_end AT TIME ZONE 'UTC')::date, COALESCE(v_through + 1, v_full_from));
 
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'SETTLEMENT_GENERATE', 'settlements', v_id,
-          jsonb_build_object('merchant_id', p_merchant_id, 'total', v_total, 'count', v_count), now_utc());
+  IF v_full_to > v_full_from THEN
+    v_full_from_ts := v_full_from::timestamp AT TIME ZONE 'UTC';
+    v_full_to_ts := v_full_to::timestamp AT TIME ZONE 'UTC';
+  ELSE
+    v_full_from_ts := p_end;
+    v_full_to_ts := p_end;
+  END IF;
 
-  RETURN v_id;
+  RETURN QUERY
+  WITH daily AS (
+    SELECT r.merchant_id,
+           r.day,
+           r.payment_count::bigint AS payment_count,
+           r.payment_amount,
+           r.refund_count::bigint AS refund_count,
+           r.refund_amount
+    FROM merchant_daily_rollup r
+    WHERE r.merchant_id = ANY(p_merchant_ids)
+      AND r.day >= v_full_from
+      AND r.day < v_full_to
+    UNION ALL
+    SELECT t.merchant_id,
+           (t.created_at AT TIME ZONE 'UTC')::date,
+           COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0),
+           COUNT(*) FILTER (WHERE t.tx_type = 'refund'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0)
+    FROM transactions t
+    WHERE t.merchant_id = ANY(p_merchant_ids)
+      AND t.created_at >= p_start AND t.created_at < v_full_from_ts
+      AND t.status IN ('completed', 'refunded')
+    GROUP BY t.merchant_id, (t.created_at AT TIME ZONE 'UTC')::date
+    UNION ALL
+    SELECT t.merchant_id,
+           (t.created_at AT TIME ZONE 'UTC')::date,
+           COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0),
+           COUNT(*) FILTER (WHERE t.tx_type = 'refund'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0)
+    FROM transactions t
+    WHERE t.merchant_id = ANY(p_merchant_ids)
+      AND t.created_at >= v_full_to_ts AND t.created_at < p_end
+      AND t.status IN ('completed', 'refunded')
+    GROUP BY t.merchant_id, (t.created_at AT TIME ZONE 'UTC')::date
+  )
+  SELECT d.merchant_id,
+         d.day,
+         SUM(d.payment_count)::bigint,
+         SUM(d.payment_amount),
+         SUM(d.refund_count)::bigint,
+         SUM(d.refund_amount)
+  FROM daily d
+  GROUP BY d.merchant_id, d.day
+  HAVING SUM(d.payment_count) + SUM(d.refund_count) > 0
+  ORDER BY d.merchant_id, d.day;
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION list_settlements(
+-- 結算 payload -> generate_settlement 返回行（新生成與重複調用返回相同結構）
+CREATE OR REPLACE FUNCTION sec.settlement_result(
+  p_settlement_id uuid,
+  p_period_start timestamptz,
+  p_period_end timestamptz,
+  p_payload jsonb
+) RETURNS TABLE(
+  settlement_id uuid,
+  period_start timestamptz,
+  period_end timestamptz,
+  total_transactions bigint,
+  payment_count bigint,
+  refund_count bigint,
+  payment_amount numeric,
+  refund_amount numeric,
+  net_amount numeric,
+  fee_amount numeric,
+  settlement_amount numeric,
+  payload jsonb
+)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT p_settlement_id, p_period_start, p_period_end,
+         COALESCE((t->>'payment_count')::bigint, 0) + COALESCE((t->>'refund_count')::bigint, 0),
+         COALESCE((t->>'payment_count')::bigint, 0),
+         COALESCE((t->>'refund_count')::bigint, 0),
+         COALESCE((t->>'payment_amount')::numeric, 0),
+         COALESCE((t->>'refund_amount')::numeric, 0),
+         COALESCE((t->>'net_amount')::numeric, 0),
+         COALESCE((t->>'fee_amount')::numeric, 0),
+         COALESCE((t->>'net_amount')::numeric, 0) - COALESCE((t->>'fee_amount')::numeric, 0),
+         p_payload
+  FROM (SELECT COALESCE(p_payload->'totals', '{}'::jsonb) AS t) x;
+$$;
+
+-- 生成結算：按日明細寫入 payload（days + totals），總額由明細累加，不再掃描整段原始交易
+-- 明細查看不需要再查交易表；逐筆明細通過 get_settlement_transactions_page 分頁導出
+CREATE OR REPLACE FUNCTION generate_settlement(
   p_merchant_id uuid,
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0,
+  p_mode settlement_mode,
+  p_period_start timestamptz,
+  p_period_end   timestamptz,
   p_session_id text DEFAULT NULL
-) RETURNS TABLE(id uuid, period_start timestamptz, period_end timestamptz, mode settlement_mode, total_amount numeric, total_tx_count bigint, status settlement_status, created_at timestamptz)
+) RETURNS TABLE(
+  settlement_id uuid,
+  period_start timestamptz,
+  period_end timestamptz,
+  total_transactions bigint,
+  payment_count bigint,
+  refund_count bigint,
+  payment_amount numeric,
+  refund_amount numeric,
+  net_amount numeric,
+  fee_amount numeric,
+  settlement_amount numeric,
+  payload jsonb
+)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_id uuid := extensions.gen_random_uuid();
+  v_merchant_id uuid;
+  v_days jsonb;
+  v_payment_count bigint;
+  v_refund_count bigint;
+  v_payment_amount numeric(12,2);
+  v_refund_amount numeric(12,2);
+  v_payload jsonb;
+  v_existing_id uuid;
+  v_inserted_id uuid;
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  -- 加載 session
+
   IF p_session_id IS NOT NULL THEN
     PERFORM load_session(p_session_id);
   END IF;
-  
-  RETURN QUERY
-  SELECT s.id, s.period_start, s.period_end, s.mode, s.total_amount, s.total_tx_count, s.status, s.created_at
+
+  -- 商戶只能為自己生成結算，管理員可指定商戶
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+  IF v_merchant_id IS NULL THEN
+    RAISE EXCEPTION 'MERCHANT_ID_REQUIRED';
+  END IF;
+
+  IF p_period_start IS NULL OR p_period_end IS NULL OR p_period_start >= p_period_end THEN
+    RAISE EXCEPTION 'INVALID_PERIOD';
+  END IF;
+
+  -- 同一（商戶, 模式, 期間）只生成一次，重複調用直接返回既有結算
+  SELECT s.id, s.payload INTO v_existing_id, v_payload
   FROM settlements s
-  WHERE s.merchant_id = p_merchant_id
-  ORDER BY s.created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+  WHERE s.merchant_id = v_merchant_id AND s.mode = p_mode
+    AND s.period_start = p_period_start AND s.period_end = p_period_end;
+
+  IF v_existing_id IS NOT NULL THEN
+    RETURN QUERY SELECT * FROM sec.settlement_result(v_existing_id, p_period_start, p_period_end, v_payload);
+    RETURN;
+  END IF;
+
+  SELECT COALESCE(jsonb_agg(jsonb_build_object(
+           'day', b.day,
+           'payment_count', b.payment_count,
+           'payment_amount', b.payment_amount,
+           'refund_count', b.refund_count,
+           'refund_amount', b.refund_amount
+         ) ORDER BY b.day), '[]'::jsonb),
+         COALESCE(SUM(b.payment_count), 0),
+         COALESCE(SUM(b.refund_count), 0),
+         COALESCE(SUM(b.payment_amount), 0),
+         COALESCE(SUM(b.refund_amount), 0)
+  INTO v_days, v_payment_count, v_refund_count, v_payment_amount, v_refund_amount
+  FROM sec.merchant_daily_breakdown(ARRAY[v_merchant_id], p_period_start, p_period_end) b;
+
+  v_payload := jsonb_build_object(
+    'version', 1,
+    'totals', jsonb_build_object(
+      'payment_count', v_payment_count,
+      'payment_amount', v_payment_amount,
+      'refund_count', v_refund_count,
+      'refund_amount', v_refund_amount,
+      'net_amount', v_payment_amount - v_refund_amount,
+      'fee_amount', 0
+    ),
+    'days', v_days
+  );
+
+  INSERT INTO settlements(id, merchant_id, period_start, period_end, mode, total_amount, total_tx_count, status, payload, created_at)
+  VALUES (v_id, v_merchant_id, p_period_start, p_period_end, p_mode,
+          v_payment_amount - v_refund_amount, v_payment_count + v_refund_count, 'pending', v_payload, now_utc())
+  ON CONFLICT ON CONSTRAINT uq_settlements_merchant_period DO NOTHING
+  RETURNING settlements.id INTO v_inserted_id;
+
+  -- 並發生成時由唯一約束兜底，返回先寫入的結算
+  IF v_inserted_id IS NULL THEN
+    SELECT s.id, s.payload INTO v_id, v_payload
+    FROM settlements s
+    WHERE s.merchant_id = v_merchant_id AND s.mode = p_mode
+      AND s.period_start = p_period_start AND s.period_end = p_period_end;
+  ELSE
+    INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+    VALUES (auth.uid(), 'SETTLEMENT_GENERATE', 'settlements', v_id,
+            jsonb_build_object('merchant_id', v_merchant_id, 'total', v_payment_amount - v_refund_amount,
+                               'count', v_payment_count + v_refund_count), now_utc());
+  END IF;
+
+  RETURN QUERY SELECT * FROM sec.settlement_result(v_id, p_period_start, p_period_end, v_payload);
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION get_member_transactions(
-  p_member_id uuid,
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0,
-  p_start_date timestamptz DEFAULT NULL,
-  p_end_date   timestamptz DEFAULT NULL,
-  p_session_id text DEFAULT NULL
-) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, merchant_id uuid, final_amount numeric, status tx_status, created_at timestamptz, total_count bigint)
+COMMENT ON FUNCTION generate_settlement IS '按商戶日彙總生成結算並在 payload 保存按日明細（商戶限本人，super_admin 可指定商戶）';
+
+-- 批量結算單塊：按商戶 ID 順序取下一批商戶，一次掃描彙總整批商戶的按日明細並批量寫入
+-- （商戶, 模式, 期間）已存在的結算跳過，因此中斷後重跑或從 last_merchant_id 續跑都是冪等的
+-- 遍歷全部商戶（含期間內停用的商戶），無交易的商戶不生成結算；淨額為負（退款多於收款）的商戶不滿足 total_amount >= 0，單獨計數留待人工處理
+CREATE OR REPLACE FUNCTION sec.generate_settlement_chunk(
+  p_mode settlement_mode,
+  p_period_start timestamptz,
+  p_period_end timestamptz,
+  p_chunk_size integer,
+  p_after_merchant_id uuid
+) RETURNS TABLE(scanned int, created int, skipped_existing int, no_activity int, negative_net int, last_merchant_id uuid)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_where text := ' WHERE 1=1 ';
+  v_ids uuid[];
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  -- 加載 session
-  IF p_session_id IS NOT NULL THEN
-    PERFORM load_session(p_session_id);
+
+  SELECT array_agg(m.id ORDER BY m.id) INTO v_ids
+  FROM (
+    SELECT mm.id FROM merchants mm
+    WHERE p_after_merchant_id IS NULL OR mm.id > p_after_merchant_id
+    ORDER BY mm.id
+    LIMIT p_chunk_size
+  ) m;
+
+  IF v_ids IS NULL THEN
+    RETURN QUERY SELECT 0, 0, 0, 0, 0, p_after_merchant_id;
+    RETURN;
   END IF;
-  
+
   RETURN QUERY
-  WITH cte AS (
-    SELECT t.* FROM transactions t
-    JOIN member_cards c ON c.id = t.card_id
-    WHERE c.owner_member_id = p_member_id
-      AND (p_start_date IS NULL OR t.created_at >= p_start_date)
-      AND (p_end_date   IS NULL OR t.created_at <  p_end_date)
+  WITH per_merchant AS (
+    SELECT b.merchant_id,
+           jsonb_agg(jsonb_build_object(
+             'day', b.day,
+             'payment_count', b.payment_count,
+             'payment_amount', b.payment_amount,
+             'refund_count', b.refund_count,
+             'refund_amount', b.refund_amount
+           ) ORDER BY b.day) AS days,
+           SUM(b.payment_count)::bigint AS payment_count,
+           SUM(b.refund_count)::bigint AS refund_count,
+           SUM(b.payment_amount) AS payment_amount,
+           SUM(b.refund_amount) AS refund_amount
+    FROM sec.merchant_daily_breakdown(v_ids, p_period_start, p_period_end) b
+    GROUP BY b.merchant_id
+  ),
+  ins AS (
+    INSERT INTO settlements(merchant_id, period_start, period_end, mode, total_amount, total_tx_count, status, payload, created_at)
+    SELECT pm.merchant_id, p_period_start, p_period_end, p_mode,
+           pm.payment_amount - pm.refund_amount, pm.payment_count + pm.refund_count, 'pending',
+           jsonb_build_object(
+             'version', 1,
+             'totals', jsonb_build_object(
+               'payment_count', pm.payment_count,
+               'payment_amount', pm.payment_amount,
+               'refund_count', pm.refund_count,
+               'refund_amount', pm.refund_amount,
+               'net_amount', pm.payment_amount - pm.refund_amount,
+               'fee_amount', 0
+             ),
+             'days', pm.days
+           ),
+           now_utc()
+    FROM per_merchant pm
+    WHERE pm.payment_amount >= pm.refund_amount
+    ON CONFLICT ON CONSTRAINT uq_settlements_merchant_period DO NOTHING
+    RETURNING settlements.id, settlements.merchant_id, settlements.total_amount, settlements.total_tx_count
+  ),
+  aud AS (
+    INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+    SELECT auth.uid(), 'SETTLEMENT_GENERATE', 'settlements', i.id,
+           jsonb_build_object('merchant_id', i.merchant_id, 'total', i.total_amount,
+                              'count', i.total_tx_count, 'batch', true),
+           now_utc()
+    FROM ins i
+    RETURNING 1
   )
-  SELECT cte.id, cte.tx_no, cte.tx_type, cte.card_id, cte.merchant_id, cte.final_amount, cte.status, cte.created_at,
-         COUNT(*) OVER() AS total_count
-  FROM cte
-  ORDER BY created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+  SELECT cardinality(v_ids),
+         (SELECT count(*)::int FROM ins),
+         (SELECT count(*)::int FROM per_merchant pm WHERE pm.payment_amount >= pm.refund_amount)
+           - (SELECT count(*)::int FROM ins),
+         cardinality(v_ids) - (SELECT count(*)::int FROM per_merchant),
+         (SELECT count(*)::int FROM per_merchant pm WHERE pm.payment_amount < pm.refund_amount),
+         v_ids[cardinality(v_ids)]
+  FROM (SELECT count(*) FROM aud) a;
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION get_merchant_transactions(
-  p_merchant_id uuid,
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0,
-  p_start_date timestamptz DEFAULT NULL,
-  p_end_date   timestamptz DEFAULT NULL,
+-- 批量結算 RPC：每次調用處理一批商戶並在各自事務中提交，
+-- 客戶端以返回的 last_merchant_id 作為下一批的游標，直到 done = true
+CREATE OR REPLACE FUNCTION generate_settlements_chunk(
+  p_mode settlement_mode,
+  p_period_start timestamptz,
+  p_period_end timestamptz,
+  p_chunk_size integer DEFAULT 500,
+  p_after_merchant_id uuid DEFAULT NULL,
   p_session_id text DEFAULT NULL
-) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, final_amount numeric, status tx_status, created_at timestamptz, total_count bigint)
+) RETURNS TABLE(scanned int, created int, skipped_existing int, no_activity int, negative_net int,
+                last_merchant_id uuid, done boolean, total_merchants bigint)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_chunk integer := LEAST(GREATEST(COALESCE(p_chunk_size, 500), 1), 5000);
+  v_total bigint;
+  r record;
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  -- 加載 session
+
   IF p_session_id IS NOT NULL THEN
     PERFORM load_session(p_session_id);
   END IF;
-  
-  RETURN QUERY
-  WITH cte AS (
-    SELECT t.* FROM transactions t
-    WHERE t.merchant_id = p_merchant_id
-      AND (p_start_date IS NULL OR t.created_at >= p_start_date)
-      AND (p_end_date   IS NULL OR t.created_at <  p_end_date)
-  )
-  SELECT cte.id, cte.tx_no, cte.tx_type, cte.card_id, cte.final_amount, cte.status, cte.created_at,
-         COUNT(*) OVER() AS total_count
-  FROM cte
-  ORDER BY created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+
+  PERFORM check_permission('super_admin');
+
+  IF p_period_start IS NULL OR p_period_end IS NULL OR p_period_start >= p_period_end THEN
+    RAISE EXCEPTION 'INVALID_PERIOD';
+  END IF;
+
+  -- 首塊返回總數供客戶端顯示進度
+  IF p_after_merchant_id IS NULL THEN
+    SELECT count(*) INTO v_total FROM merchants;
+  END IF;
+
+  SELECT * INTO r
+  FROM sec.generate_settlement_chunk(p_mode, p_period_start, p_period_end, v_chunk, p_after_merchant_id);
+
+  RETURN QUERY SELECT r.scanned, r.created, r.skipped_existing, r.no_activity, r.negative_net,
+                      r.last_merchant_id, r.scanned < v_chunk, v_total;
 END;
 $$;
 
-CREATE OR REPLACE FUNCTION get_transaction_detail(
-  p_tx_no text
-) RETURNS transactions
+COMMENT ON FUNCTION generate_settlements_chunk IS '分批為全部商戶生成結算（冪等、可續跑，需要 super_admin 權限）';
+
+-- 排程用（pg_cron: CALL sec.cron_generate_settlements('t_plus_1', ...)）
+-- 分塊之間 COMMIT，避免長事務；過程不可為 SECURITY DEFINER，需由資料庫擁有者執行
+CREATE OR REPLACE PROCEDURE sec.cron_generate_settlements(
+  p_mode settlement_mode,
+  p_period_start timestamptz,
+  p_period_end timestamptz,
+  p_chunk_size integer DEFAULT 500
+)
 LANGUAGE plpgsql
-SECURITY DEFINER
 AS $$
 DECLARE
-  v_tx transactions%ROWTYPE;
+  v_after uuid := NULL;
+  v_scanned int;
+  v_created int;
+  v_last uuid;
+  v_merchants int := 0;
+  v_total int := 0;
+  v_started timestamptz := clock_timestamp();
 BEGIN
-  PERFORM sec.fixed_search_path();
-  SELECT * INTO v_tx FROM transactions WHERE tx_no = p_tx_no;
-  IF NOT FOUND THEN RAISE EXCEPTION 'TX_NOT_FOUND'; END IF;
-  RETURN v_tx;
+  LOOP
+    SELECT c.scanned, c.created, c.last_merchant_id INTO v_scanned, v_created, v_last
+    FROM sec.generate_settlement_chunk(p_mode, p_period_start, p_period_end,
+                                       GREATEST(p_chunk_size, 1), v_after) c;
+
+    v_merchants := v_merchants + v_scanned;
+    v_total := v_total + v_created;
+    COMMIT;
+
+    EXIT WHEN v_scanned < GREATEST(p_chunk_size, 1);
+    v_after := v_last;
+  END LOOP;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (NULL, 'SETTLEMENT_BATCH', 'system', NULL,
+          jsonb_build_object('mode', p_mode, 'period_start', p_period_start, 'period_end', p_period_end,
+                             'merchants', v_merchants, 'created', v_total,
+                             'elapsed_ms', round(extract(epoch FROM clock_timestamp() - v_started) * 1000)),
+          now_utc());
+  COMMIT;
 END;
 $$;
 
--- =======================
--- G) HELPER FUNCTIONS FOR CLI
--- =======================
-
--- Get member by auth user
-CREATE OR REPLACE FUNCTION get_member_by_auth_user()
-RETURNS member_profiles
+CREATE OR REPLACE FUNCTION list_settlements(
+  p_merchant_id uuid,
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(
+  id uuid,
+  period_start timestamptz,
+  period_end timestamptz,
+  mode settlement_mode,
+  total_amount numeric,
+  total_tx_count bigint,
+  payment_count bigint,
+  refund_count bigint,
+  payment_amount numeric,
+  refund_amount numeric,
+  status settlement_status,
+  created_at timestamptz
+)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_member member_profiles%ROWTYPE;
+  v_merchant_id uuid;
 BEGIN
   PERFORM sec.fixed_search_path();
   
-  SELECT * INTO v_member
-  FROM member_profiles
-  WHERE binding_user_org = 'supabase'
-    AND binding_org_id = auth.uid()::text;
-    
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+  -- 加載 session
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
   
-  RETURN v_member;
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+  
+  -- 列表只取 payload 中的彙總，不返回按日明細
+  RETURN QUERY
+  SELECT s.id, s.period_start, s.period_end, s.mode, s.total_amount, s.total_tx_count::bigint,
+         (s.payload #>> '{totals,payment_count}')::bigint,
+         (s.payload #>> '{totals,refund_count}')::bigint,
+         (s.payload #>> '{totals,payment_amount}')::numeric,
+         (s.payload #>> '{totals,refund_amount}')::numeric,
+         s.status, s.created_at
+  FROM settlements s
+  WHERE s.merchant_id = v_merchant_id
+  ORDER BY s.created_at DESC
+  LIMIT p_limit OFFSET p_offset;
 END;
 $$;
 
--- Get member cards
-CREATE OR REPLACE FUNCTION get_member_cards(p_member_id uuid DEFAULT NULL)
-RETURNS TABLE(
+-- 結算逐筆明細（按 created_at, id 升序的游標分頁），供 CSV / JSONL 流式導出
+-- 客戶端每次只持有一頁，月結算不論多少筆內存佔用恆定
+CREATE OR REPLACE FUNCTION get_settlement_transactions_page(
+  p_settlement_id uuid,
+  p_limit integer DEFAULT 1000,
+  p_cursor text DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(
   id uuid,
-  card_no text,
-  card_type card_type,
-  name text,
-  balance numeric(12,2),
-  points int,
-  level int,
-  discount numeric(4,3),
-  status card_status,
-  expires_at timestamptz,
-  created_at timestamptz
+  tx_no text,
+  tx_type tx_type,
+  card_id uuid,
+  raw_amount numeric,
+  discount_applied numeric,
+  final_amount numeric,
+  status tx_status,
+  created_at timestamptz,
+  next_cursor text
 )
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_member_id uuid;
+  v_settlement settlements%ROWTYPE;
+  v_limit int := LEAST(GREATEST(COALESCE(p_limit, 1000), 1), 5000);
+  v_after_at timestamptz := '-infinity';
+  v_after_id uuid := '00000000-0000-0000-0000-000000000000';
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  -- If no member_id provided, get from auth user
-  IF p_member_id IS NULL THEN
-    SELECT mp.id INTO v_member_id
-    FROM member_profiles mp
-    WHERE mp.binding_user_org = 'supabase'
-      AND mp.binding_org_id = auth.uid()::text;
-      
-    IF v_member_id IS NULL THEN
-      RAISE EXCEPTION 'MEMBER_NOT_FOUND';
-    END IF;
-  ELSE
-    v_member_id := p_member_id;
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
-  
+
+  SELECT * INTO v_settlement FROM settlements s WHERE s.id = p_settlement_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'SETTLEMENT_NOT_FOUND';
+  END IF;
+
+  IF sec.stats_merchant_scope(v_settlement.merchant_id) IS DISTINCT FROM v_settlement.merchant_id THEN
+    RAISE EXCEPTION 'PERMISSION_DENIED: 無權查看此結算';
+  END IF;
+
+  IF p_cursor IS NOT NULL AND p_cursor <> '' THEN
+    SELECT c.created_at, c.id INTO v_after_at, v_after_id FROM sec.decode_tx_cursor(p_cursor) c;
+  END IF;
+
   RETURN QUERY
-  SELECT mc.id, mc.card_no, mc.card_type, mc.name, mc.balance,
-         mc.points, mc.level, mc.discount, mc.status, mc.expires_at, mc.created_at
-  FROM member_cards mc
-  WHERE mc.owner_member_id = v_member_id
-     OR mc.id IN (
-       SELECT cb.card_id
-       FROM card_bindings cb
-       WHERE cb.member_id = v_member_id
-     )
-  ORDER BY mc.created_at DESC;
+  WITH page AS (
+    SELECT t.id, t.tx_no, t.tx_type, t.card_id, t.raw_amount, t.discount_applied, t.final_amount, t.status, t.created_at,
+           row_number() OVER (ORDER BY t.created_at, t.id) AS rn
+    FROM (
+      SELECT * FROM transactions t
+      WHERE t.merchant_id = v_settlement.merchant_id
+        AND t.created_at >= GREATEST(v_settlement.period_start, v_after_at)
+        AND t.created_at <  v_settlement.period_end
+        AND (t.created_at, t.id) > (v_after_at, v_after_id)
+        AND t.status IN ('completed', 'refunded')
+      ORDER BY t.created_at, t.id
+      LIMIT v_limit + 1
+    ) t
+  )
+  SELECT page.id, page.tx_no, page.tx_type, page.card_id, page.raw_amount, page.discount_applied,
+         page.final_amount, page.status, page.created_at,
+         CASE WHEN EXISTS (SELECT 1 FROM page p2 WHERE p2.rn > v_limit)
+              THEN (SELECT sec.encode_tx_cursor(p3.created_at, p3.id) FROM page p3 WHERE p3.rn = v_limit)
+         END
+  FROM page
+  WHERE page.rn <= v_limit
+  ORDER BY page.rn;
 END;
 $$;
 
+COMMENT ON FUNCTION get_settlement_transactions_page IS '結算逐筆明細游標分頁（升序，next_cursor 為 NULL 表示已到末頁）';
 
--- Get merchant by auth user
-CREATE OR REPLACE FUNCTION get_merchant_by_auth_user()
-RETURNS merchants
+CREATE OR REPLACE FUNCTION get_member_transactions(
+  p_member_id uuid,
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, merchant_id uuid, final_amount numeric, status tx_status, created_at timestamptz, total_count bigint)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_merchant merchants%ROWTYPE;
+  v_where text := ' WHERE 1=1 ';
 BEGIN
   PERFORM sec.fixed_search_path();
   
-  SELECT m.* INTO v_merchant
-  FROM merchants m
-  JOIN merchant_users mu ON mu.merchant_id = m.id
-  WHERE mu.auth_user_id = auth.uid()
-  LIMIT 1;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
+  -- 加載 session
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
   
-  RETURN v_merchant;
+  RETURN QUERY
+  WITH cte AS (
+    SELECT t.* FROM transactions t
+    JOIN member_cards c ON c.id = t.card_id
+    WHERE c.owner_member_id = p_member_id
+      AND t.created_at >= COALESCE(p_start_date, '-infinity')
+      AND t.created_at <  COALESCE(p_end_date, 'infinity')
+  )
+  SELECT cte.id, cte.tx_no, cte.tx_type, cte.card_id, cte.merchant_id, cte.final_amount, cte.status, cte.created_at,
+         COUNT(*) OVER() AS total_count
+  FROM cte
+  ORDER BY created_at DESC
+  LIMIT p_limit OFFSET p_offset;
 END;
 $$;
 
--- Simple connection test function
-CREATE OR REPLACE FUNCTION test_connection()
-RETURNS jsonb
+CREATE OR REPLACE FUNCTION get_merchant_transactions(
+  p_merchant_id uuid,
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, final_amount numeric, status tx_status, created_at timestamptz, total_count bigint)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
-DECLARE
-  v_result jsonb;
-  v_member_count int;
-  v_card_count int;
-  v_merchant_count int;
 BEGIN
   PERFORM sec.fixed_search_path();
   
-  SELECT COUNT(*) INTO v_member_count FROM member_profiles;
-  SELECT COUNT(*) INTO v_card_count FROM member_cards;
-  SELECT COUNT(*) INTO v_merchant_count FROM merchants;
-  
-  v_result := jsonb_build_object(
-    'status', 'success',
-    'timestamp', now_utc(),
-    'stats', jsonb_build_object(
-      'members', v_member_count,
-      'cards', v_card_count,
-      'merchants', v_merchant_count
-    )
-  );
+  -- 加載 session
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
   
-  RETURN v_result;
+  RETURN QUERY
+  WITH cte AS (
+    SELECT t.* FROM transactions t
+    WHERE t.merchant_id = p_merchant_id
+      AND t.created_at >= COALESCE(p_start_date, '-infinity')
+      AND t.created_at <  COALESCE(p_end_date, 'infinity')
+  )
+  SELECT cte.id, cte.tx_no, cte.tx_type, cte.card_id, cte.final_amount, cte.status, cte.created_at,
+         COUNT(*) OVER() AS total_count
+  FROM cte
+  ORDER BY created_at DESC
+  LIMIT p_limit OFFSET p_offset;
 END;
 $$;
 
--- ============================================================================
--- END OF COMMERCIAL RPC FILE
--- ============================================================================
--- ADDITIONAL ADMIN FUNCTIONS (管理員專用函數)
--- ============================================================================
+-- ---------- 交易記錄游標分頁（keyset）----------
+-- 游標是 (created_at, id) 的不透明編碼；按 created_at DESC, id DESC 排序，
+-- 下一頁只從上一頁最後一行之後繼續讀，每頁成本與頁碼深度無關
 
--- 創建商戶
-CREATE OR REPLACE FUNCTION create_merchant(
-  p_code text,
-  p_name text,
-  p_contact text DEFAULT NULL,
-  p_password text DEFAULT NULL
+CREATE OR REPLACE FUNCTION sec.encode_tx_cursor(p_created_at timestamptz, p_id uuid)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT replace(encode(convert_to(
+    to_char(p_created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US') || '|' || p_id::text,
+    'UTF8'), 'base64'), E'\n', '')
+$$;
+
+CREATE OR REPLACE FUNCTION sec.decode_tx_cursor(
+  p_cursor text,
+  OUT created_at timestamptz,
+  OUT id uuid
 )
-RETURNS uuid
 LANGUAGE plpgsql
-SECURITY DEFINER
+IMMUTABLE
 AS $$
 DECLARE
-  v_merchant_id uuid := extensions.gen_random_uuid();
-  v_password_hash text := NULL;
+  v_plain text;
 BEGIN
-  PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  -- 處理密碼雜湊
-  IF p_password IS NOT NULL AND length(p_password) >= 6 THEN
-    v_password_hash := extensions.crypt(p_password, extensions.gen_salt('bf'));
+  IF p_cursor IS NULL OR p_cursor = '' THEN
+    created_at := 'infinity';
+    id := 'ffffffff-ffff-ffff-ffff-ffffffffffff';
+    RETURN;
   END IF;
-  
-  -- 創建商戶
-  INSERT INTO merchants(id, code, name, contact, password_hash, status, created_at, updated_at)
-  VALUES (v_merchant_id, p_code, p_name, p_contact, v_password_hash, 'active', now_utc(), now_utc());
-  
-  -- 記錄審計日誌
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'CREATE_MERCHANT', 'merchants', v_merchant_id,
-          jsonb_build_object('code', p_code, 'name', p_name), now_utc());
-  
-  RETURN v_merchant_id;
+
+  BEGIN
+    v_plain := convert_from(decode(p_cursor, 'base64'), 'UTF8');
+    created_at := split_part(v_plain, '|', 1)::timestamp AT TIME ZONE 'UTC';
+    id := split_part(v_plain, '|', 2)::uuid;
+  EXCEPTION WHEN OTHERS THEN
+    RAISE EXCEPTION 'INVALID_CURSOR';
+  END;
 END;
 $$;
 
-COMMENT ON FUNCTION create_merchant IS '創建商戶（需要 admin 權限）';
-
--- 創建企業卡
-CREATE OR REPLACE FUNCTION create_corporate_card(
-  p_owner_member_id uuid,
-  p_name text DEFAULT NULL,
-  p_initial_balance numeric(12,2) DEFAULT 0,
-  p_fixed_discount numeric(4,3) DEFAULT NULL
-)
-RETURNS uuid
+CREATE OR REPLACE FUNCTION get_merchant_transactions_page(
+  p_merchant_id uuid,
+  p_limit integer DEFAULT 20,
+  p_cursor text DEFAULT NULL,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, final_amount numeric, status tx_status, created_at timestamptz, next_cursor text)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_card_id uuid := extensions.gen_random_uuid();
+  v_merchant_id uuid;
+  v_limit int := LEAST(GREATEST(COALESCE(p_limit, 20), 1), 200);
+  v_after_at timestamptz;
+  v_after_id uuid;
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  -- 驗證會員存在
-  IF NOT EXISTS (SELECT 1 FROM member_profiles WHERE id = p_owner_member_id) THEN
-    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
-  
-  -- 創建企業卡
-  INSERT INTO member_cards(
-    id, card_no, card_type, owner_member_id, name,
-    balance, points, level, discount, fixed_discount,
-    status, created_at, updated_at
+
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+  IF v_merchant_id IS NULL THEN
+    RAISE EXCEPTION 'MERCHANT_ID_REQUIRED';
+  END IF;
+
+  SELECT c.created_at, c.id INTO v_after_at, v_after_id FROM sec.decode_tx_cursor(p_cursor) c;
+
+  -- 多取一行判斷是否還有下一頁
+  RETURN QUERY
+  WITH page AS (
+    SELECT t.id, t.tx_no, t.tx_type, t.card_id, t.final_amount, t.status, t.created_at,
+           row_number() OVER (ORDER BY t.created_at DESC, t.id DESC) AS rn
+    FROM (
+      SELECT * FROM transactions t
+      WHERE t.merchant_id = v_merchant_id
+        AND t.created_at >= COALESCE(p_start_date, '-infinity')
+        AND t.created_at <  COALESCE(p_end_date, 'infinity')
+        AND t.created_at <= v_after_at
+        AND (t.created_at, t.id) < (v_after_at, v_after_id)
+      ORDER BY t.created_at DESC, t.id DESC
+      LIMIT v_limit + 1
+    ) t
   )
-  VALUES (
-    v_card_id,
-    gen_card_no('corporate'),
-    'corporate',
-    p_owner_member_id,
-    p_name,
-    p_initial_balance,
-    0,
-    0,
-    COALESCE(p_fixed_discount, 1.000),
-    p_fixed_discount,
-    'active',
-    now_utc(),
-    now_utc()
-  );
-  
-  -- 綁定擁有者
-  INSERT INTO card_bindings(card_id, member_id, role, created_at)
-  VALUES (v_card_id, p_owner_member_id, 'owner', now_utc());
-  
-  -- 記錄審計日誌
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'CREATE_CORPORATE_CARD', 'member_cards', v_card_id,
-          jsonb_build_object('owner_member_id', p_owner_member_id, 'name', p_name), now_utc());
-  
-  RETURN v_card_id;
+  SELECT page.id, page.tx_no, page.tx_type, page.card_id, page.final_amount, page.status, page.created_at,
+         CASE WHEN EXISTS (SELECT 1 FROM page p2 WHERE p2.rn > v_limit)
+              THEN (SELECT sec.encode_tx_cursor(p3.created_at, p3.id) FROM page p3 WHERE p3.rn = v_limit)
+         END
+  FROM page
+  WHERE page.rn <= v_limit
+  ORDER BY page.rn;
 END;
 $$;
 
-COMMENT ON FUNCTION create_corporate_card IS '創建企業卡（需要 admin 權限）';
-
--- 注意：create_prepaid_card 已移除，所有功能合併到 Standard Card
--- Standard Card 現在支持充值功能
+COMMENT ON FUNCTION get_merchant_transactions_page IS '商戶交易記錄游標分頁（next_cursor 為 NULL 表示沒有下一頁）';
 
--- 設定卡片綁定密碼
-CREATE OR REPLACE FUNCTION set_card_binding_password(
-  p_card_id uuid,
-  p_password text
-)
-RETURNS boolean
+CREATE OR REPLACE FUNCTION get_member_transactions_page(
+  p_member_id uuid,
+  p_limit integer DEFAULT 20,
+  p_cursor text DEFAULT NULL,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(id uuid, tx_no text, tx_type tx_type, card_id uuid, merchant_id uuid, final_amount numeric, status tx_status, created_at timestamptz, next_cursor text)
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_card member_cards%ROWTYPE;
+  v_user_role text;
+  v_limit int := LEAST(GREATEST(COALESCE(p_limit, 20), 1), 200);
+  v_after_at timestamptz;
+  v_after_id uuid;
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  -- 獲取卡片信息
-  SELECT * INTO v_card FROM member_cards WHERE id = p_card_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'CARD_NOT_FOUND';
-  END IF;
-  
-  -- 只有 corporate 卡可以設定綁定密碼
-  IF v_card.card_type NOT IN ('corporate') THEN
-    RAISE EXCEPTION 'CARD_TYPE_NOT_SUPPORT_BINDING_PASSWORD';
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
-  
-  -- 密碼長度檢查
-  IF length(p_password) < 6 THEN
-    RAISE EXCEPTION 'PASSWORD_TOO_SHORT';
+
+  v_user_role := get_user_role();
+  IF v_user_role = 'member' THEN
+    IF p_member_id::text IS DISTINCT FROM current_setting('app.member_id', true) THEN
+      RAISE EXCEPTION 'PERMISSION_DENIED: 只能查看自己的交易記錄';
+    END IF;
+  ELSIF v_user_role IS NULL THEN
+    RAISE EXCEPTION 'NOT_AUTHENTICATED';
+  ELSIF v_user_role NOT IN ('super_admin', 'admin') THEN
+    RAISE EXCEPTION 'PERMISSION_DENIED: 無權查看會員交易記錄';
   END IF;
-  
-  -- 更新綁定密碼
-  UPDATE member_cards
-  SET binding_password_hash = extensions.crypt(p_password, extensions.gen_salt('bf')),
-      updated_at = now_utc()
-  WHERE id = p_card_id;
-  
-  -- 記錄審計日誌
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'SET_BINDING_PASSWORD', 'member_cards', p_card_id, '{}'::jsonb, now_utc());
-  
-  RETURN TRUE;
-END;
-$$;
 
-COMMENT ON FUNCTION set_card_binding_password IS '設定卡片綁定密碼（需要 admin 權限）';
+  SELECT c.created_at, c.id INTO v_after_at, v_after_id FROM sec.decode_tx_cursor(p_cursor) c;
 
--- 恢復會員（取消暫停）
-CREATE OR REPLACE FUNCTION admin_activate_member(
-  p_member_id uuid
-)
-RETURNS boolean
-LANGUAGE plpgsql
-SECURITY DEFINER
-AS $$
-BEGIN
-  PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  UPDATE member_profiles SET status='active', updated_at=now_utc() WHERE id=p_member_id;
-  
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'MEMBER_ACTIVATE', 'member_profiles', p_member_id, '{}'::jsonb, now_utc());
-  
-  RETURN TRUE;
+  RETURN QUERY
+  WITH page AS (
+    SELECT t.id, t.tx_no, t.tx_type, t.card_id, t.merchant_id, t.final_amount, t.status, t.created_at,
+           row_number() OVER (ORDER BY t.created_at DESC, t.id DESC) AS rn
+    FROM (
+      SELECT t.* FROM transactions t
+      JOIN member_cards c ON c.id = t.card_id
+      WHERE c.owner_member_id = p_member_id
+        AND t.created_at >= COALESCE(p_start_date, '-infinity')
+        AND t.created_at <  COALESCE(p_end_date, 'infinity')
+        AND t.created_at <= v_after_at
+        AND (t.created_at, t.id) < (v_after_at, v_after_id)
+      ORDER BY t.created_at DESC, t.id DESC
+      LIMIT v_limit + 1
+    ) t
+  )
+  SELECT page.id, page.tx_no, page.tx_type, page.card_id, page.merchant_id, page.final_amount, page.status, page.created_at,
+         CASE WHEN EXISTS (SELECT 1 FROM page p2 WHERE p2.rn > v_limit)
+              THEN (SELECT sec.encode_tx_cursor(p3.created_at, p3.id) FROM page p3 WHERE p3.rn = v_limit)
+         END
+  FROM page
+  WHERE page.rn <= v_limit
+  ORDER BY page.rn;
 END;
 $$;
 
-COMMENT ON FUNCTION admin_activate_member IS '恢復會員（需要 admin 權限）';
+COMMENT ON FUNCTION get_member_transactions_page IS '會員交易記錄游標分頁（next_cursor 為 NULL 表示沒有下一頁）';
 
--- 恢復商戶（取消暫停）
-CREATE OR REPLACE FUNCTION admin_activate_merchant(
-  p_merchant_id uuid
-)
-RETURNS boolean
+-- 商戶交易筆數：與 get_merchant_transactions_page 同一口徑（全部狀態），
+-- 走 (merchant_id, created_at) 索引計數；客戶端按查詢條件緩存，不隨翻頁重算
+CREATE OR REPLACE FUNCTION get_merchant_transaction_count(
+  p_merchant_id uuid,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS bigint
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_merchant_id uuid;
+  v_count bigint;
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  UPDATE merchants SET status='active', updated_at=now_utc() WHERE id=p_merchant_id;
-  
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'MERCHANT_ACTIVATE', 'merchants', p_merchant_id, '{}'::jsonb, now_utc());
-  
-  RETURN TRUE;
-END;
-$$;
 
-COMMENT ON FUNCTION admin_activate_merchant IS '恢復商戶（需要 admin 權限）';
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
 
--- 創建優惠券卡
-CREATE OR REPLACE FUNCTION create_voucher_card(
-  p_owner_member_id uuid,
-  p_name text DEFAULT NULL,
-  p_initial_balance numeric(12,2) DEFAULT 0,
-  p_expires_at timestamptz DEFAULT NULL
-)
-RETURNS uuid
-LANGUAGE plpgsql
-SECURITY DEFINER
-AS $$
-DECLARE
-  v_card_id uuid := extensions.gen_random_uuid();
-BEGIN
-  PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
-  
-  -- 驗證會員存在
-  IF NOT EXISTS (SELECT 1 FROM member_profiles WHERE id = p_owner_member_id) THEN
-    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+  IF v_merchant_id IS NULL THEN
+    RAISE EXCEPTION 'MERCHANT_ID_REQUIRED';
   END IF;
-  
-  -- 創建優惠券卡
-  INSERT INTO member_cards(
-    id, card_no, card_type, owner_member_id, name,
-    balance, points, level, discount,
-    status, expires_at, created_at, updated_at
-  )
-  VALUES (
-    v_card_id,
-    gen_card_no('voucher'),
-    'voucher',
-    p_owner_member_id,
-    p_name,
-    p_initial_balance,
-    0,
-    0,
-    1.000,
-    'active',
-    p_expires_at,
-    now_utc(),
-    now_utc()
-  );
-  
-  -- 綁定擁有者
-  INSERT INTO card_bindings(card_id, member_id, role, created_at)
-  VALUES (v_card_id, p_owner_member_id, 'owner', now_utc());
-  
-  -- 記錄審計日誌
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'CREATE_VOUCHER_CARD', 'member_cards', v_card_id,
-          jsonb_build_object('owner_member_id', p_owner_member_id, 'name', p_name), now_utc());
-  
-  RETURN v_card_id;
+
+  SELECT COUNT(*) INTO v_count
+  FROM transactions t
+  WHERE t.merchant_id = v_merchant_id
+    AND t.created_at >= COALESCE(p_start_date, '-infinity')
+    AND t.created_at <  COALESCE(p_end_date, 'infinity');
+
+  RETURN v_count;
 END;
 $$;
 
-COMMENT ON FUNCTION create_voucher_card IS '創建優惠券卡（需要 admin 權限）';
+COMMENT ON FUNCTION get_merchant_transaction_count IS '商戶交易筆數（配合游標分頁顯示總數）';
 
--- 獲取商戶詳情
-CREATE OR REPLACE FUNCTION get_merchant_detail(
-  p_merchant_id uuid
-)
-RETURNS merchants
+CREATE OR REPLACE FUNCTION get_member_transaction_count(
+  p_member_id uuid,
+  p_start_date timestamptz DEFAULT NULL,
+  p_end_date   timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS bigint
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_merchant merchants%ROWTYPE;
+  v_user_role text;
+  v_count bigint;
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  SELECT * INTO v_merchant FROM merchants WHERE id = p_merchant_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
   END IF;
-  
-  RETURN v_merchant;
+
+  v_user_role := get_user_role();
+  IF v_user_role = 'member' THEN
+    IF p_member_id::text IS DISTINCT FROM current_setting('app.member_id', true) THEN
+      RAISE EXCEPTION 'PERMISSION_DENIED: 只能查看自己的交易記錄';
+    END IF;
+  ELSIF v_user_role IS NULL THEN
+    RAISE EXCEPTION 'NOT_AUTHENTICATED';
+  ELSIF v_user_role NOT IN ('super_admin', 'admin') THEN
+    RAISE EXCEPTION 'PERMISSION_DENIED: 無權查看會員交易記錄';
+  END IF;
+
+  SELECT COUNT(*) INTO v_count
+  FROM transactions t
+  JOIN member_cards c ON c.id = t.card_id
+  WHERE c.owner_member_id = p_member_id
+    AND t.created_at >= COALESCE(p_start_date, '-infinity')
+    AND t.created_at <  COALESCE(p_end_date, 'infinity');
+
+  RETURN v_count;
 END;
 $$;
 
-COMMENT ON FUNCTION get_merchant_detail IS '獲取商戶詳情';
+COMMENT ON FUNCTION get_member_transaction_count IS '會員交易筆數（配合游標分頁顯示總數）';
 
--- 獲取卡片詳情
-CREATE OR REPLACE FUNCTION get_card_detail(
-  p_card_id uuid
-)
-RETURNS member_cards
+CREATE OR REPLACE FUNCTION get_transaction_detail(
+  p_tx_no text
+) RETURNS transactions
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_card member_cards%ROWTYPE;
+  v_tx transactions%ROWTYPE;
 BEGIN
   PERFORM sec.fixed_search_path();
-  
-  SELECT * INTO v_card FROM member_cards WHERE id = p_card_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'CARD_NOT_FOUND';
-  END IF;
-  
-  RETURN v_card;
+  SELECT t.* INTO v_tx
+  FROM tx_registry r
+  JOIN transactions t ON t.id = r.tx_id AND t.created_at = r.created_at
+  WHERE r.tx_no = p_tx_no;
+  IF NOT FOUND THEN RAISE EXCEPTION 'TX_NOT_FOUND'; END IF;
+  RETURN v_tx;
 END;
 $$;
 
-COMMENT ON FUNCTION get_card_detail IS '獲取卡片詳情';
+-- =======================
+-- G) HELPER FUNCTIONS FOR CLI
+-- =======================
 
--- 獲取會員詳情
-CREATE OR REPLACE FUNCTION get_member_detail(
-  p_member_id uuid
-)
+-- Get member by auth user
+CREATE OR REPLACE FUNCTION get_member_by_auth_user()
 RETURNS member_profiles
 LANGUAGE plpgsql
 SECURITY DEFINER
@@ -2120,8 +2914,11 @@ DECLARE
 BEGIN
   PERFORM sec.fixed_search_path();
   
-  SELECT * INTO v_member FROM member_profiles WHERE id = p_member_id;
-  
+  SELECT * INTO v_member
+  FROM member_profiles
+  WHERE binding_user_org = 'supabase'
+    AND binding_org_id = auth.uid()::text;
+    
   IF NOT FOUND THEN
     RAISE EXCEPTION 'MEMBER_NOT_FOUND';
   END IF;
@@ -2130,458 +2927,1889 @@ BEGIN
 END;
 $$;
 
-COMMENT ON FUNCTION get_member_detail IS '獲取會員詳情';
-
--- 獲取卡片綁定列表
-CREATE OR REPLACE FUNCTION get_card_bindings(
-  p_card_id uuid
-)
-RETURNS TABLE(
-  id uuid,
-  member_id uuid,
-  member_no text,
-  member_name text,
-  role bind_role,
-  created_at timestamptz
-)
-LANGUAGE plpgsql
-SECURITY DEFINER
-AS $$
-BEGIN
-  PERFORM sec.fixed_search_path();
-  
-  RETURN QUERY
-  SELECT 
-    cb.id,
-    cb.member_id,
-    mp.member_no,
-    mp.name as member_name,
-    cb.role,
-    cb.created_at
-  FROM card_bindings cb
-  JOIN member_profiles mp ON mp.id = cb.member_id
-  WHERE cb.card_id = p_card_id
-  ORDER BY cb.created_at DESC;
-END;
-$$;
-
-COMMENT ON FUNCTION get_card_bindings IS '獲取卡片綁定列表';
-
--- 搜尋會員
-CREATE OR REPLACE FUNCTION search_members(
-  p_keyword text,
-  p_limit integer DEFAULT 50
+-- Get member cards
+CREATE OR REPLACE FUNCTION get_member_cards(
+  p_member_id uuid DEFAULT NULL,
+  p_session_id text DEFAULT NULL
 )
 RETURNS TABLE(
   id uuid,
-  member_no text,
+  card_no text,
+  card_type card_type,
+  owner_member_id uuid,
   name text,
-  phone text,
-  email text,
-  status member_status,
-  created_at timestamptz
+  balance numeric(12,2),
+  points int,
+  level int,
+  discount numeric(4,3),
+  corporate_discount numeric(4,3),
+  fixed_discount numeric(4,3),
+  status card_status,
+  expires_at timestamptz,
+  created_at timestamptz,
+  updated_at timestamptz,
+  binding_role text
 )
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_member_id uuid;
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
   
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+  
+  -- If no member_id provided, get from session / auth user
+  IF p_member_id IS NULL THEN
+    v_member_id := NULLIF(current_setting('app.member_id', true), '')::uuid;
+    
+    IF v_member_id IS NULL THEN
+      SELECT mp.id INTO v_member_id
+      FROM member_profiles mp
+      WHERE mp.binding_user_org = 'supabase'
+        AND mp.binding_org_id = auth.uid()::text;
+    END IF;
+      
+    IF v_member_id IS NULL THEN
+      RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+    END IF;
+  ELSE
+    v_member_id := p_member_id;
+  END IF;
+  
+  -- 擁有的卡片與綁定的卡片各走索引（idx_cards_owner_type / idx_bindings_member），
+  -- 同一張卡同時擁有與綁定時以 owner 為準
   RETURN QUERY
-  SELECT 
-    mp.id,
-    mp.member_no,
-    mp.name,
-    mp.phone,
-    mp.email,
-    mp.status,
-    mp.created_at
-  FROM member_profiles mp
-  WHERE 
-    mp.name ILIKE '%' || p_keyword || '%'
-    OR mp.phone ILIKE '%' || p_keyword || '%'
-    OR mp.email ILIKE '%' || p_keyword || '%'
-    OR mp.member_no ILIKE '%' || p_keyword || '%'
-  ORDER BY mp.created_at DESC
-  LIMIT p_limit;
+  WITH linked AS (
+    SELECT mc.id AS card_id, 'owner'::text AS role
+    FROM member_cards mc
+    WHERE mc.owner_member_id = v_member_id
+    UNION ALL
+    SELECT cb.card_id, cb.role::text
+    FROM card_bindings cb
+    WHERE cb.member_id = v_member_id
+  ), resolved AS (
+    SELECT DISTINCT ON (l.card_id) l.card_id, l.role
+    FROM linked l
+    ORDER BY l.card_id, (l.role = 'owner') DESC
+  )
+  SELECT mc.id, mc.card_no, mc.card_type, mc.owner_member_id, mc.name, mc.balance,
+         mc.points, mc.level, mc.discount, mc.corporate_discount, mc.fixed_discount,
+         mc.status, mc.expires_at, mc.created_at, mc.updated_at, r.role
+  FROM resolved r
+  JOIN member_cards mc ON mc.id = r.card_id
+  ORDER BY mc.created_at DESC;
 END;
 $$;
 
-COMMENT ON FUNCTION search_members IS '搜尋會員（需要 admin 權限）';
+COMMENT ON FUNCTION get_member_cards IS '獲取會員擁有及綁定的卡片（含綁定角色，單次查詢）';
 
--- 搜尋商戶
-CREATE OR REPLACE FUNCTION search_merchants(
-  p_keyword text,
-  p_limit integer DEFAULT 50
-)
-RETURNS TABLE(
-  id uuid,
-  code text,
-  name text,
-  contact text,
-  status text,
-  created_at timestamptz
-)
+
+-- Get merchant by auth user
+CREATE OR REPLACE FUNCTION get_merchant_by_auth_user()
+RETURNS merchants
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_merchant merchants%ROWTYPE;
 BEGIN
   PERFORM sec.fixed_search_path();
-  PERFORM check_permission('super_admin');
   
-  RETURN QUERY
-  SELECT 
-    m.id,
-    m.code,
-    m.name,
-    m.contact,
-    m.status,
-    m.created_at
+  SELECT m.* INTO v_merchant
   FROM merchants m
-  WHERE 
-    m.name ILIKE '%' || p_keyword || '%'
-    OR m.code ILIKE '%' || p_keyword || '%'
-    OR m.contact ILIKE '%' || p_keyword || '%'
-  ORDER BY m.created_at DESC
-  LIMIT p_limit;
+  JOIN merchant_users mu ON mu.merchant_id = m.id
+  WHERE mu.auth_user_id = auth.uid()
+  LIMIT 1;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
+  END IF;
+  
+  RETURN v_merchant;
 END;
 $$;
 
-COMMENT ON FUNCTION search_merchants IS '搜尋商戶（需要 admin 權限）';
-
--- 獲取積分記錄
-CREATE OR REPLACE FUNCTION get_point_ledger(
-  p_card_id uuid,
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0
-)
-RETURNS TABLE(
-  id uuid,
-  change int,
-  balance_before int,
-  balance_after int,
-  reason text,
-  tx_id uuid,
-  created_at timestamptz
-)
+-- Simple connection test function
+CREATE OR REPLACE FUNCTION test_connection()
+RETURNS jsonb
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_result jsonb;
+  v_member_count int;
+  v_card_count int;
+  v_merchant_count int;
 BEGIN
   PERFORM sec.fixed_search_path();
   
-  RETURN QUERY
-  SELECT 
-    pl.id,
-    pl.change,
-    pl.balance_before,
-    pl.balance_after,
-    pl.reason,
-    pl.tx_id,
-    pl.created_at
-  FROM point_ledger pl
-  WHERE pl.card_id = p_card_id
-  ORDER BY pl.created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+  SELECT COUNT(*) INTO v_member_count FROM member_profiles;
+  SELECT COUNT(*) INTO v_card_count FROM member_cards;
+  SELECT COUNT(*) INTO v_merchant_count FROM merchants;
+  
+  v_result := jsonb_build_object(
+    'status', 'success',
+    'timestamp', now_utc(),
+    'stats', jsonb_build_object(
+      'members', v_member_count,
+      'cards', v_card_count,
+      'merchants', v_merchant_count
+    )
+  );
+  
+  RETURN v_result;
 END;
 $$;
 
-COMMENT ON FUNCTION get_point_ledger IS '獲取積分記錄';
+-- ============================================================================
+-- END OF COMMERCIAL RPC FILE
+-- ============================================================================
+-- ADDITIONAL ADMIN FUNCTIONS (管理員專用函數)
+-- ============================================================================
 
--- 更新結算狀態
-CREATE OR REPLACE FUNCTION update_settlement_status(
-  p_settlement_id uuid,
-  p_status settlement_status
+-- 創建商戶
+CREATE OR REPLACE FUNCTION create_merchant(
+  p_code text,
+  p_name text,
+  p_contact text DEFAULT NULL,
+  p_password text DEFAULT NULL
 )
-RETURNS boolean
+RETURNS uuid
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
+DECLARE
+  v_merchant_id uuid := extensions.gen_random_uuid();
+  v_password_hash text := NULL;
 BEGIN
   PERFORM sec.fixed_search_path();
   PERFORM check_permission('super_admin');
   
-  UPDATE settlements
-  SET status = p_status,
-      updated_at = now_utc()
-  WHERE id = p_settlement_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'SETTLEMENT_NOT_FOUND';
+  -- 處理密碼雜湊
+  IF p_password IS NOT NULL AND length(p_password) >= 6 THEN
+    v_password_hash := extensions.crypt(p_password, extensions.gen_salt('bf'));
   END IF;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'SETTLEMENT_STATUS_UPDATE', 'settlements', p_settlement_id,
-          jsonb_build_object('new_status', p_status), now_utc());
+  -- 創建商戶
+  INSERT INTO merchants(id, code, name, contact, password_hash, status, created_at, updated_at)
+  VALUES (v_merchant_id, p_code, p_name, p_contact, v_password_hash, 'active', now_utc(), now_utc());
   
-  RETURN TRUE;
+  -- 記錄審計日誌
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'CREATE_MERCHANT', 'merchants', v_merchant_id,
+          jsonb_build_object('code', p_code, 'name', p_name), now_utc());
+  
+  RETURN v_merchant_id;
 END;
 $$;
 
-COMMENT ON FUNCTION update_settlement_status IS '更新結算狀態（需要 admin 權限）';
+COMMENT ON FUNCTION create_merchant IS '創建商戶（需要 admin 權限）';
 
--- 獲取結算詳情
-CREATE OR REPLACE FUNCTION get_settlement_detail(
-  p_settlement_id uuid
+-- 創建企業卡
+CREATE OR REPLACE FUNCTION create_corporate_card(
+  p_owner_member_id uuid,
+  p_name text DEFAULT NULL,
+  p_initial_balance numeric(12,2) DEFAULT 0,
+  p_fixed_discount numeric(4,3) DEFAULT NULL
 )
-RETURNS settlements
+RETURNS uuid
 LANGUAGE plpgsql
 SECURITY DEFINER
 AS $$
 DECLARE
-  v_settlement settlements%ROWTYPE;
+  v_card_id uuid := extensions.gen_random_uuid();
 BEGIN
   PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
   
-  SELECT * INTO v_settlement FROM settlements WHERE id = p_settlement_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'SETTLEMENT_NOT_FOUND';
+  -- 驗證會員存在
+  IF NOT EXISTS (SELECT 1 FROM member_profiles WHERE id = p_owner_member_id) THEN
+    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
   END IF;
   
-  RETURN v_settlement;
-END;
-$$;
-
-COMMENT ON FUNCTION get_settlement_detail IS '獲取結算詳情';
-
--- ============================================================================
--- NEW RPC FUNCTIONS FOR UI IMPROVEMENTS
--- ============================================================================
-
--- =======================
--- 會員管理擴展函數
--- =======================
-
--- 分頁獲取所有會員
-CREATE OR REPLACE FUNCTION get_all_members(
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0,
-  p_status member_status DEFAULT NULL
+  -- 創建企業卡
+  INSERT INTO member_cards(
+    id, card_no, card_type, owner_member_id, name,
+    balance, points, level, discount, fixed_discount,
+    status, created_at, updated_at
+  )
+  VALUES (
+    v_card_id,
+    gen_card_no('corporate'),
+    'corporate',
+    p_owner_member_id,
+    p_name,
+    p_initial_balance,
+    0,
+    0,
+    COALESCE(p_fixed_discount, 1.000),
+    p_fixed_discount,
+    'active',
+    now_utc(),
+    now_utc()
+  );
+  
+  -- 綁定擁有者
+  INSERT INTO card_bindings(card_id, member_id, role, created_at)
+  VALUES (v_card_id, p_owner_member_id, 'owner', now_utc());
+  
+  -- 記錄審計日誌
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'CREATE_CORPORATE_CARD', 'member_cards', v_card_id,
+          jsonb_build_object('owner_member_id', p_owner_member_id, 'name', p_name), now_utc());
+  
+  RETURN v_card_id;
+END;
+$$;
+
+COMMENT ON FUNCTION create_corporate_card IS '創建企業卡（需要 admin 權限）';
+
+-- 注意：create_prepaid_card 已移除，所有功能合併到 Standard Card
+-- Standard Card 現在支持充值功能
+
+-- 設定卡片綁定密碼
+CREATE OR REPLACE FUNCTION set_card_binding_password(
+  p_card_id uuid,
+  p_password text
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_card member_cards%ROWTYPE;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
+  
+  -- 獲取卡片信息
+  SELECT * INTO v_card FROM member_cards WHERE id = p_card_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'CARD_NOT_FOUND';
+  END IF;
+  
+  -- 只有 corporate 卡可以設定綁定密碼
+  IF v_card.card_type NOT IN ('corporate') THEN
+    RAISE EXCEPTION 'CARD_TYPE_NOT_SUPPORT_BINDING_PASSWORD';
+  END IF;
+  
+  -- 密碼長度檢查
+  IF length(p_password) < 6 THEN
+    RAISE EXCEPTION 'PASSWORD_TOO_SHORT';
+  END IF;
+  
+  -- 更新綁定密碼
+  UPDATE member_cards
+  SET binding_password_hash = extensions.crypt(p_password, extensions.gen_salt('bf')),
+      updated_at = now_utc()
+  WHERE id = p_card_id;
+  
+  -- 記錄審計日誌
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'SET_BINDING_PASSWORD', 'member_cards', p_card_id, '{}'::jsonb, now_utc());
+  
+  RETURN TRUE;
+END;
+$$;
+
+COMMENT ON FUNCTION set_card_binding_password IS '設定卡片綁定密碼（需要 admin 權限）';
+
+-- 恢復會員（取消暫停）
+CREATE OR REPLACE FUNCTION admin_activate_member(
+  p_member_id uuid
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
+  
+  UPDATE member_profiles SET status='active', updated_at=now_utc() WHERE id=p_member_id;
+  
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'MEMBER_ACTIVATE', 'member_profiles', p_member_id, '{}'::jsonb, now_utc());
+  
+  RETURN TRUE;
+END;
+$$;
+
+COMMENT ON FUNCTION admin_activate_member IS '恢復會員（需要 admin 權限）';
+
+-- 恢復商戶（取消暫停）
+CREATE OR REPLACE FUNCTION admin_activate_merchant(
+  p_merchant_id uuid
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
+  
+  UPDATE merchants SET status='active', updated_at=now_utc() WHERE id=p_merchant_id;
+  
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'MERCHANT_ACTIVATE', 'merchants', p_merchant_id, '{}'::jsonb, now_utc());
+  
+  RETURN TRUE;
+END;
+$$;
+
+COMMENT ON FUNCTION admin_activate_merchant IS '恢復商戶（需要 admin 權限）';
+
+-- 創建優惠券卡
+CREATE OR REPLACE FUNCTION create_voucher_card(
+  p_owner_member_id uuid,
+  p_name text DEFAULT NULL,
+  p_initial_balance numeric(12,2) DEFAULT 0,
+  p_expires_at timestamptz DEFAULT NULL
+)
+RETURNS uuid
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_card_id uuid := extensions.gen_random_uuid();
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
+  
+  -- 驗證會員存在
+  IF NOT EXISTS (SELECT 1 FROM member_profiles WHERE id = p_owner_member_id) THEN
+    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+  END IF;
+  
+  -- 創建優惠券卡
+  INSERT INTO member_cards(
+    id, card_no, card_type, owner_member_id, name,
+    balance, points, level, discount,
+    status, expires_at, created_at, updated_at
+  )
+  VALUES (
+    v_card_id,
+    gen_card_no('voucher'),
+    'voucher',
+    p_owner_member_id,
+    p_name,
+    p_initial_balance,
+    0,
+    0,
+    1.000,
+    'active',
+    p_expires_at,
+    now_utc(),
+    now_utc()
+  );
+  
+  -- 綁定擁有者
+  INSERT INTO card_bindings(card_id, member_id, role, created_at)
+  VALUES (v_card_id, p_owner_member_id, 'owner', now_utc());
+  
+  -- 記錄審計日誌
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'CREATE_VOUCHER_CARD', 'member_cards', v_card_id,
+          jsonb_build_object('owner_member_id', p_owner_member_id, 'name', p_name), now_utc());
+  
+  RETURN v_card_id;
+END;
+$$;
+
+COMMENT ON FUNCTION create_voucher_card IS '創建優惠券卡（需要 admin 權限）';
+
+-- 獲取商戶詳情
+CREATE OR REPLACE FUNCTION get_merchant_detail(
+  p_merchant_id uuid
+)
+RETURNS merchants
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_merchant merchants%ROWTYPE;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  SELECT * INTO v_merchant FROM merchants WHERE id = p_merchant_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
+  END IF;
+  
+  RETURN v_merchant;
+END;
+$$;
+
+COMMENT ON FUNCTION get_merchant_detail IS '獲取商戶詳情';
+
+-- 獲取卡片詳情
+CREATE OR REPLACE FUNCTION get_card_detail(
+  p_card_id uuid
+)
+RETURNS member_cards
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_card member_cards%ROWTYPE;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  SELECT * INTO v_card FROM member_cards WHERE id = p_card_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'CARD_NOT_FOUND';
+  END IF;
+  
+  RETURN v_card;
+END;
+$$;
+
+COMMENT ON FUNCTION get_card_detail IS '獲取卡片詳情';
+
+-- 獲取會員詳情
+CREATE OR REPLACE FUNCTION get_member_detail(
+  p_member_id uuid
+)
+RETURNS member_profiles
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_member member_profiles%ROWTYPE;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  SELECT * INTO v_member FROM member_profiles WHERE id = p_member_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+  END IF;
+  
+  RETURN v_member;
+END;
+$$;
+
+COMMENT ON FUNCTION get_member_detail IS '獲取會員詳情';
+
+-- 獲取卡片綁定列表
+CREATE OR REPLACE FUNCTION get_card_bindings(
+  p_card_id uuid
+)
+RETURNS TABLE(
+  id uuid,
+  member_id uuid,
+  member_no text,
+  member_name text,
+  role bind_role,
+  created_at timestamptz
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  RETURN QUERY
+  SELECT 
+    cb.id,
+    cb.member_id,
+    mp.member_no,
+    mp.name as member_name,
+    cb.role,
+    cb.created_at
+  FROM card_bindings cb
+  JOIN member_profiles mp ON mp.id = cb.member_id
+  WHERE cb.card_id = p_card_id
+  ORDER BY cb.created_at DESC;
+END;
+$$;
+
+COMMENT ON FUNCTION get_card_bindings IS '獲取卡片綁定列表';
+
+-- 搜尋輔助：轉義 LIKE 通配符，使關鍵字中的 % / _ 按字面匹配
+CREATE OR REPLACE FUNCTION sec.like_escape(p_text text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT replace(replace(replace(p_text, '\', '\\'), '%', '\%'), '_', '\_');
+$$;
+
+-- 搜尋排序分數：完全相等 3 分，前綴匹配 2 分 + 相似度，其餘按 pg_trgm 單詞相似度（0~1）
+CREATE OR REPLACE FUNCTION sec.search_score(p_keyword text, p_values text[])
+RETURNS real
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT COALESCE(MAX(
+           CASE
+             WHEN lower(v) = lower(p_keyword) THEN 3
+             WHEN lower(v) LIKE sec.like_escape(lower(p_keyword)) || '%' THEN 2 + extensions.similarity(v, p_keyword)
+             ELSE extensions.word_similarity(p_keyword, v)
+           END), 0)::real
+  FROM unnest(p_values) AS v
+  WHERE v IS NOT NULL;
+$$;
+
+-- 模糊搜尋每個字段 / 每個階段最多評分的候選行數：常見關鍵字的延遲與匹配行數無關
+CREATE OR REPLACE FUNCTION sec.search_candidate_cap()
+RETURNS integer
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT 500;
+$$;
+
+-- 子串模糊匹配的最短關鍵字長度：pg_trgm 對少於 3 個字符的關鍵字無法使用 GIN 索引
+CREATE OR REPLACE FUNCTION sec.search_fuzzy_min_length()
+RETURNS integer
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT 3;
+$$;
+
+-- 搜尋會員
+-- 1) 關鍵字是完整的會員號 / 手機號 / 郵箱時走唯一索引精確查找，命中即返回
+-- 2) 前綴匹配：各字段的 (lower(col) COLLATE "C") B-tree 索引範圍掃描，任意長度關鍵字（含 1~2 字的中文姓名）可用，
+--    每字段按索引順序最多取 sec.search_candidate_cap() 行，合併後按分數排序截取；前綴結果已滿 p_limit 時返回
+-- 3) 子串匹配（pg_trgm GIN）只在前綴結果不足且關鍵字至少 3 個字符時執行，候選同樣有上限：
+--    短關鍵字無法使用 trigram 索引，常見關鍵字（如 "138"）會匹配大量行，兩者都不能退化為全表掃描 / 全量評分
+-- p_exact_only = true（客戶端已識別為完整識別碼）時不做模糊搜尋
+CREATE OR REPLACE FUNCTION search_members(
+  p_keyword text,
+  p_limit integer DEFAULT 50,
+  p_exact_only boolean DEFAULT false,
+  p_session_id text DEFAULT NULL
+)
+RETURNS TABLE(
+  id uuid,
+  member_no text,
+  name text,
+  phone text,
+  email text,
+  status member_status,
+  created_at timestamptz,
+  score real
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_keyword text := btrim(p_keyword);
+  v_limit integer := LEAST(GREATEST(COALESCE(p_limit, 50), 1), 200);
+  v_cap integer := sec.search_candidate_cap();
+  v_lower text;
+  v_upper text;
+  v_pattern text;
+  v_found integer;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  IF v_keyword IS NULL OR v_keyword = '' THEN
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+  SELECT mp.id, mp.member_no, mp.name, mp.phone, mp.email, mp.status, mp.created_at, 3::real
+  FROM member_profiles mp
+  WHERE mp.member_no = v_keyword
+     OR mp.phone = v_keyword
+     OR mp.email = v_keyword
+  LIMIT v_limit;
+
+  IF FOUND OR p_exact_only THEN
+    RETURN;
+  END IF;
+
+  v_lower := lower(v_keyword);
+  v_upper := v_lower || chr(1114111);
+
+  RETURN QUERY
+  WITH candidates AS (
+    (SELECT m.id FROM member_profiles m WHERE lower(m.member_no) COLLATE "C" >= v_lower
+       AND lower(m.member_no) COLLATE "C" < v_upper
+     ORDER BY lower(m.member_no) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT m.id FROM member_profiles m WHERE lower(m.phone) COLLATE "C" >= v_lower
+       AND lower(m.phone) COLLATE "C" < v_upper
+     ORDER BY lower(m.phone) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT m.id FROM member_profiles m WHERE lower(m.email) COLLATE "C" >= v_lower
+       AND lower(m.email) COLLATE "C" < v_upper
+     ORDER BY lower(m.email) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT m.id FROM member_profiles m WHERE lower(m.name) COLLATE "C" >= v_lower
+       AND lower(m.name) COLLATE "C" < v_upper
+     ORDER BY lower(m.name) COLLATE "C" LIMIT v_cap)
+  )
+  SELECT mp.id, mp.member_no, mp.name, mp.phone, mp.email, mp.status, mp.created_at,
+         sec.search_score(v_keyword, ARRAY[mp.member_no, mp.name, mp.phone, mp.email]) AS score
+  FROM candidates cand
+  JOIN member_profiles mp ON mp.id = cand.id
+  ORDER BY score DESC, mp.created_at DESC
+  LIMIT v_limit;
+
+  GET DIAGNOSTICS v_found = ROW_COUNT;
+  IF v_found >= v_limit OR char_length(v_keyword) < sec.search_fuzzy_min_length() THEN
+    RETURN;
+  END IF;
+
+  -- 前綴結果不足 p_limit 說明前綴匹配未被截斷，已全部返回，此處排除即可
+  v_pattern := '%' || sec.like_escape(v_keyword) || '%';
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT m.id FROM member_profiles m
+    WHERE (m.name ILIKE v_pattern
+       OR m.phone ILIKE v_pattern
+       OR m.email ILIKE v_pattern
+       OR m.member_no ILIKE v_pattern)
+      AND (starts_with(lower(m.member_no), v_lower)
+        OR starts_with(lower(m.phone), v_lower)
+        OR starts_with(lower(m.email), v_lower)
+        OR starts_with(lower(m.name), v_lower)) IS NOT TRUE
+    LIMIT v_cap
+  )
+  SELECT mp.id, mp.member_no, mp.name, mp.phone, mp.email, mp.status, mp.created_at,
+         sec.search_score(v_keyword, ARRAY[mp.member_no, mp.name, mp.phone, mp.email]) AS score
+  FROM candidates cand
+  JOIN member_profiles mp ON mp.id = cand.id
+  ORDER BY score DESC, mp.created_at DESC
+  LIMIT v_limit - v_found;
+END;
+$$;
+
+COMMENT ON FUNCTION search_members IS '搜尋會員：識別碼精確匹配優先，其次前綴匹配，不足時以有上限的 pg_trgm 子串匹配補足，按相關度排序（需要 super_admin 權限）';
+
+-- 搜尋商戶（商戶代碼精確匹配優先；其次前綴匹配，不足 p_limit 時再做有上限的子串匹配，規則同 search_members）
+CREATE OR REPLACE FUNCTION search_merchants(
+  p_keyword text,
+  p_limit integer DEFAULT 50,
+  p_session_id text DEFAULT NULL
+)
+RETURNS TABLE(
+  id uuid,
+  code text,
+  name text,
+  contact text,
+  status text,
+  created_at timestamptz,
+  score real
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_keyword text := btrim(p_keyword);
+  v_limit integer := LEAST(GREATEST(COALESCE(p_limit, 50), 1), 200);
+  v_cap integer := sec.search_candidate_cap();
+  v_lower text;
+  v_upper text;
+  v_pattern text;
+  v_found integer;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  IF v_keyword IS NULL OR v_keyword = '' THEN
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+  SELECT m.id, m.code, m.name, m.contact, m.status, m.created_at, 3::real
+  FROM merchants m
+  WHERE m.code = v_keyword;
+
+  IF FOUND THEN
+    RETURN;
+  END IF;
+
+  v_lower := lower(v_keyword);
+  v_upper := v_lower || chr(1114111);
+
+  RETURN QUERY
+  WITH candidates AS (
+    (SELECT x.id FROM merchants x WHERE lower(x.code) COLLATE "C" >= v_lower
+       AND lower(x.code) COLLATE "C" < v_upper
+     ORDER BY lower(x.code) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT x.id FROM merchants x WHERE lower(x.name) COLLATE "C" >= v_lower
+       AND lower(x.name) COLLATE "C" < v_upper
+     ORDER BY lower(x.name) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT x.id FROM merchants x WHERE lower(x.contact) COLLATE "C" >= v_lower
+       AND lower(x.contact) COLLATE "C" < v_upper
+     ORDER BY lower(x.contact) COLLATE "C" LIMIT v_cap)
+  )
+  SELECT m.id, m.code, m.name, m.contact, m.status, m.created_at,
+         sec.search_score(v_keyword, ARRAY[m.code, m.name, m.contact]) AS score
+  FROM candidates cand
+  JOIN merchants m ON m.id = cand.id
+  ORDER BY score DESC, m.created_at DESC
+  LIMIT v_limit;
+
+  GET DIAGNOSTICS v_found = ROW_COUNT;
+  IF v_found >= v_limit OR char_length(v_keyword) < sec.search_fuzzy_min_length() THEN
+    RETURN;
+  END IF;
+
+  v_pattern := '%' || sec.like_escape(v_keyword) || '%';
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT x.id FROM merchants x
+    WHERE (x.name ILIKE v_pattern
+       OR x.code ILIKE v_pattern
+       OR x.contact ILIKE v_pattern)
+      AND (starts_with(lower(x.code), v_lower)
+        OR starts_with(lower(x.name), v_lower)
+        OR starts_with(lower(x.contact), v_lower)) IS NOT TRUE
+    LIMIT v_cap
+  )
+  SELECT m.id, m.code, m.name, m.contact, m.status, m.created_at,
+         sec.search_score(v_keyword, ARRAY[m.code, m.name, m.contact]) AS score
+  FROM candidates cand
+  JOIN merchants m ON m.id = cand.id
+  ORDER BY score DESC, m.created_at DESC
+  LIMIT v_limit - v_found;
+END;
+$$;
+
+COMMENT ON FUNCTION search_merchants IS '搜尋商戶：代碼精確匹配優先，其次前綴匹配，不足時以有上限的 pg_trgm 子串匹配補足，按相關度排序（需要 super_admin 權限）';
+
+-- 獲取積分記錄
+CREATE OR REPLACE FUNCTION get_point_ledger(
+  p_card_id uuid,
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0
+)
+RETURNS TABLE(
+  id uuid,
+  change int,
+  balance_before int,
+  balance_after int,
+  reason text,
+  tx_id uuid,
+  created_at timestamptz
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  RETURN QUERY
+  SELECT 
+    pl.id,
+    pl.change,
+    pl.balance_before,
+    pl.balance_after,
+    pl.reason,
+    pl.tx_id,
+    pl.created_at
+  FROM point_ledger pl
+  WHERE pl.card_id = p_card_id
+  ORDER BY pl.created_at DESC
+  LIMIT p_limit OFFSET p_offset;
+END;
+$$;
+
+COMMENT ON FUNCTION get_point_ledger IS '獲取積分記錄';
+
+-- 更新結算狀態
+CREATE OR REPLACE FUNCTION update_settlement_status(
+  p_settlement_id uuid,
+  p_status settlement_status
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM check_permission('super_admin');
+  
+  UPDATE settlements
+  SET status = p_status,
+      updated_at = now_utc()
+  WHERE id = p_settlement_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'SETTLEMENT_NOT_FOUND';
+  END IF;
+  
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'SETTLEMENT_STATUS_UPDATE', 'settlements', p_settlement_id,
+          jsonb_build_object('new_status', p_status), now_utc());
+  
+  RETURN TRUE;
+END;
+$$;
+
+COMMENT ON FUNCTION update_settlement_status IS '更新結算狀態（需要 admin 權限）';
+
+-- 獲取結算詳情
+CREATE OR REPLACE FUNCTION get_settlement_detail(
+  p_settlement_id uuid,
+  p_session_id text DEFAULT NULL
+)
+RETURNS settlements
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_settlement settlements%ROWTYPE;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+  
+  SELECT * INTO v_settlement FROM settlements WHERE id = p_settlement_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'SETTLEMENT_NOT_FOUND';
+  END IF;
+  
+  IF sec.stats_merchant_scope(v_settlement.merchant_id) IS DISTINCT FROM v_settlement.merchant_id THEN
+    RAISE EXCEPTION 'PERMISSION_DENIED: 無權查看此結算';
+  END IF;
+  
+  RETURN v_settlement;
+END;
+$$;
+
+COMMENT ON FUNCTION get_settlement_detail IS '獲取結算詳情（含 payload 按日明細）';
+
+-- ============================================================================
+-- NEW RPC FUNCTIONS FOR UI IMPROVEMENTS
+-- ============================================================================
+
+-- =======================
+-- 會員管理擴展函數
+-- =======================
+
+-- 分頁獲取所有會員
+CREATE OR REPLACE FUNCTION get_all_members(
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0,
+  p_status member_status DEFAULT NULL
+) RETURNS TABLE(
+  id uuid,
+  member_no text,
+  name text,
+  phone text,
+  email text,
+  status member_status,
+  created_at timestamptz,
+  total_count bigint
+) LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+  PERFORM check_permission('super_admin');
+  
+  RETURN QUERY
+  SELECT
+    mp.id,
+    mp.member_no,
+    mp.name,
+    mp.phone,
+    mp.email,
+    mp.status,
+    mp.created_at,
+    COUNT(*) OVER() AS total_count
+  FROM member_profiles mp
+  WHERE (p_status IS NULL OR mp.status = p_status)
+  ORDER BY mp.created_at DESC
+  LIMIT p_limit OFFSET p_offset;
+END;
+$$;
+
+COMMENT ON FUNCTION get_all_members IS '分頁獲取所有會員（需要 super_admin 權限）';
+
+-- 按 (updated_at, id) 升序的游標分頁，供管理端本地搜尋索引流式載入與增量刷新
+-- p_updated_after 只在首頁（p_cursor 為空）生效：NULL 為全量載入，否則只返回此時間之後變更的會員
+CREATE OR REPLACE FUNCTION get_all_members_page(
+  p_limit integer DEFAULT 1000,
+  p_cursor text DEFAULT NULL,
+  p_updated_after timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(
+  id uuid,
+  member_no text,
+  name text,
+  phone text,
+  email text,
+  status member_status,
+  created_at timestamptz,
+  updated_at timestamptz,
+  next_cursor text
+) LANGUAGE plpgsql SECURITY DEFINER AS $$
+DECLARE
+  v_limit int := LEAST(GREATEST(COALESCE(p_limit, 1000), 1), 5000);
+  v_after_at timestamptz := COALESCE(p_updated_after, '-infinity');
+  v_after_id uuid := '00000000-0000-0000-0000-000000000000';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  IF p_cursor IS NOT NULL AND p_cursor <> '' THEN
+    SELECT c.created_at, c.id INTO v_after_at, v_after_id FROM sec.decode_tx_cursor(p_cursor) c;
+  END IF;
+
+  RETURN QUERY
+  WITH page AS (
+    SELECT mp.id, mp.member_no, mp.name, mp.phone, mp.email, mp.status, mp.created_at, mp.updated_at,
+           row_number() OVER (ORDER BY mp.updated_at, mp.id) AS rn
+    FROM (
+      SELECT * FROM member_profiles mp
+      WHERE (mp.updated_at, mp.id) > (v_after_at, v_after_id)
+      ORDER BY mp.updated_at, mp.id
+      LIMIT v_limit + 1
+    ) mp
+  )
+  SELECT page.id, page.member_no, page.name, page.phone, page.email, page.status,
+         page.created_at, page.updated_at,
+         CASE WHEN EXISTS (SELECT 1 FROM page p2 WHERE p2.rn > v_limit)
+              THEN (SELECT sec.encode_tx_cursor(p3.updated_at, p3.id) FROM page p3 WHERE p3.rn = v_limit)
+         END
+  FROM page
+  WHERE page.rn <= v_limit
+  ORDER BY page.rn;
+END;
+$$;
+
+COMMENT ON FUNCTION get_all_members_page IS '按 updated_at 游標分頁獲取會員（增量同步，next_cursor 為 NULL 表示已到末頁，需要 super_admin 權限）';
+
+-- 高級會員搜尋
+CREATE OR REPLACE FUNCTION search_members_advanced(
+  p_name text DEFAULT NULL,
+  p_phone text DEFAULT NULL,
+  p_email text DEFAULT NULL,
+  p_member_no text DEFAULT NULL,
+  p_status member_status DEFAULT NULL,
+  p_limit integer DEFAULT 50
+) RETURNS TABLE(
+  id uuid,
+  member_no text,
+  name text,
+  phone text,
+  email text,
+  status member_status,
+  created_at timestamptz
+) LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+  PERFORM check_permission('super_admin');
+  
+  RETURN QUERY
+  SELECT
+    mp.id,
+    mp.member_no,
+    mp.name,
+    mp.phone,
+    mp.email,
+    mp.status,
+    mp.created_at
+  FROM member_profiles mp
+  WHERE
+    (p_name IS NULL OR mp.name ILIKE '%' || p_name || '%')
+    AND (p_phone IS NULL OR mp.phone ILIKE '%' || p_phone || '%')
+    AND (p_email IS NULL OR mp.email ILIKE '%' || p_email || '%')
+    AND (p_member_no IS NULL OR mp.member_no ILIKE '%' || p_member_no || '%')
+    AND (p_status IS NULL OR mp.status = p_status)
+  ORDER BY mp.created_at DESC
+  LIMIT p_limit;
+END;
+$$;
+
+COMMENT ON FUNCTION search_members_advanced IS '高級會員搜尋（需要 super_admin 權限）';
+
+-- 更新會員資料
+CREATE OR REPLACE FUNCTION update_member_profile(
+  p_member_id uuid,
+  p_name text DEFAULT NULL,
+  p_phone text DEFAULT NULL,
+  p_email text DEFAULT NULL
+) RETURNS boolean LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+  PERFORM check_permission('super_admin');
+  
+  UPDATE member_profiles SET
+    name = COALESCE(p_name, name),
+    phone = COALESCE(p_phone, phone),
+    email = COALESCE(p_email, email),
+    updated_at = now_utc()
+  WHERE id = p_member_id;
+  
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
+  END IF;
+  
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'UPDATE_MEMBER', 'member_profiles', p_member_id,
+          jsonb_build_object('name', p_name, 'phone', p_phone, 'email', p_email), now_utc());
+  
+  RETURN TRUE;
+END;
+$$;
+
+COMMENT ON FUNCTION update_member_profile IS '更新會員資料（需要 super_admin 權限）';
+
+-- =======================
+-- 卡片管理擴展函數
+-- =======================
+
+-- 分頁獲取所有卡片
+CREATE OR REPLACE FUNCTION get_all_cards(
+  p_limit integer DEFAULT 50,
+  p_offset integer DEFAULT 0,
+  p_card_type card_type DEFAULT NULL,
+  p_status card_status DEFAULT NULL,
+  p_owner_name text DEFAULT NULL
+) RETURNS TABLE(
+  id uuid,
+  card_no text,
+  card_type card_type,
+  name text,
+  balance numeric(12,2),
+  points int,
+  level int,
+  discount numeric(4,3),
+  status card_status,
+  owner_member_id uuid,
+  owner_name text,
+  owner_phone text,
+  created_at timestamptz,
+  total_count bigint
+) LANGUAGE plpgsql SECURITY DEFINER AS $$
+BEGIN
+  PERFORM check_permission('super_admin');
+  
+  RETURN QUERY
+  SELECT
+    mc.id,
+    mc.card_no,
+    mc.card_type,
+    mc.name,
+    mc.balance,
+    mc.points,
+    mc.level,
+    mc.discount,
+    mc.status,
+    mc.owner_member_id,
+    mp.name as owner_name,
+    mp.phone as owner_phone,
+    mc.created_at,
+    COUNT(*) OVER() AS total_count
+  FROM member_cards mc
+  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
+  WHERE
+    (p_card_type IS NULL OR mc.card_type = p_card_type)
+    AND (p_status IS NULL OR mc.status = p_status)
+    AND (p_owner_name IS NULL OR mp.name ILIKE '%' || p_owner_name || '%')
+  ORDER BY mc.created_at DESC
+  LIMIT p_limit OFFSET p_offset;
+END;
+$$;
+
+COMMENT ON FUNCTION get_all_cards IS '分頁獲取所有卡片（需要 super_admin 權限）';
+
+-- 按 (updated_at, id) 升序的游標分頁，規則同 get_all_members_page
+-- 持卡人姓名 / 手機變更不會更新卡片的 updated_at，由客戶端隨會員增量一併更新
+CREATE OR REPLACE FUNCTION get_all_cards_page(
+  p_limit integer DEFAULT 1000,
+  p_cursor text DEFAULT NULL,
+  p_updated_after timestamptz DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(
+  id uuid,
+  card_no text,
+  card_type card_type,
+  name text,
+  balance numeric(12,2),
+  points int,
+  level int,
+  discount numeric(4,3),
+  status card_status,
+  owner_member_id uuid,
+  owner_name text,
+  owner_phone text,
+  created_at timestamptz,
+  updated_at timestamptz,
+  next_cursor text
+) LANGUAGE plpgsql SECURITY DEFINER AS $$
+DECLARE
+  v_limit int := LEAST(GREATEST(COALESCE(p_limit, 1000), 1), 5000);
+  v_after_at timestamptz := COALESCE(p_updated_after, '-infinity');
+  v_after_id uuid := '00000000-0000-0000-0000-000000000000';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+
+  IF p_cursor IS NOT NULL AND p_cursor <> '' THEN
+    SELECT c.created_at, c.id INTO v_after_at, v_after_id FROM sec.decode_tx_cursor(p_cursor) c;
+  END IF;
+
+  RETURN QUERY
+  WITH page AS (
+    SELECT mc.id, mc.card_no, mc.card_type, mc.name, mc.balance, mc.points, mc.level, mc.discount,
+           mc.status, mc.owner_member_id, mp.name AS owner_name, mp.phone AS owner_phone,
+           mc.created_at, mc.updated_at,
+           row_number() OVER (ORDER BY mc.updated_at, mc.id) AS rn
+    FROM (
+      SELECT * FROM member_cards mc
+      WHERE (mc.updated_at, mc.id) > (v_after_at, v_after_id)
+      ORDER BY mc.updated_at, mc.id
+      LIMIT v_limit + 1
+    ) mc
+    LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
+  )
+  SELECT page.id, page.card_no, page.card_type, page.name, page.balance, page.points, page.level,
+         page.discount, page.status, page.owner_member_id, page.owner_name, page.owner_phone,
+         page.created_at, page.updated_at,
+         CASE WHEN EXISTS (SELECT 1 FROM page p2 WHERE p2.rn > v_limit)
+              THEN (SELECT sec.encode_tx_cursor(p3.updated_at, p3.id) FROM page p3 WHERE p3.rn = v_limit)
+         END
+  FROM page
+  WHERE page.rn <= v_limit
+  ORDER BY page.rn;
+END;
+$$;
+
+COMMENT ON FUNCTION get_all_cards_page IS '按 updated_at 游標分頁獲取卡片（增量同步，next_cursor 為 NULL 表示已到末頁，需要 super_admin 權限）';
+
+-- 搜尋卡片
+-- 1) 完整卡號走唯一索引；完整會員號 / 手機號 / 郵箱先精確找到會員，再按 owner_member_id 取其卡片
+-- 2) 否則在卡片（卡號、卡名）與持卡人（姓名、手機）上先做前綴匹配，不足 p_limit 且關鍵字至少 3 個字符時
+--    再做 pg_trgm 子串匹配；兩個階段的候選數均有上限，規則同 search_members
+CREATE OR REPLACE FUNCTION search_cards(
+  p_keyword text,
+  p_limit integer DEFAULT 50,
+  p_exact_only boolean DEFAULT false,
+  p_session_id text DEFAULT NULL
 ) RETURNS TABLE(
   id uuid,
-  member_no text,
+  card_no text,
+  card_type card_type,
   name text,
-  phone text,
-  email text,
-  status member_status,
+  balance numeric(12,2),
+  points int,
+  level int,
+  discount numeric(4,3),
+  status card_status,
+  owner_member_id uuid,
+  owner_name text,
+  owner_phone text,
   created_at timestamptz,
-  total_count bigint
+  score real
 ) LANGUAGE plpgsql SECURITY DEFINER AS $$
+DECLARE
+  v_keyword text := btrim(p_keyword);
+  v_limit integer := LEAST(GREATEST(COALESCE(p_limit, 50), 1), 200);
+  v_cap integer := sec.search_candidate_cap();
+  v_lower text;
+  v_upper text;
+  v_pattern text;
+  v_found integer;
 BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
   PERFORM check_permission('super_admin');
-  
+
+  IF v_keyword IS NULL OR v_keyword = '' THEN
+    RETURN;
+  END IF;
+
   RETURN QUERY
-  SELECT
-    mp.id,
-    mp.member_no,
-    mp.name,
-    mp.phone,
-    mp.email,
-    mp.status,
-    mp.created_at,
-    COUNT(*) OVER() AS total_count
-  FROM member_profiles mp
-  WHERE (p_status IS NULL OR mp.status = p_status)
-  ORDER BY mp.created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+  SELECT mc.id, mc.card_no, mc.card_type, mc.name, mc.balance, mc.points, mc.level, mc.discount,
+         mc.status, mc.owner_member_id, mp.name, mp.phone, mc.created_at, 3::real
+  FROM member_cards mc
+  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
+  WHERE mc.card_no = v_keyword
+     OR mc.owner_member_id IN (
+          SELECT m.id FROM member_profiles m
+          WHERE m.member_no = v_keyword OR m.phone = v_keyword OR m.email = v_keyword
+        )
+  ORDER BY mc.created_at DESC
+  LIMIT v_limit;
+
+  IF FOUND OR p_exact_only THEN
+    RETURN;
+  END IF;
+
+  v_lower := lower(v_keyword);
+  v_upper := v_lower || chr(1114111);
+
+  RETURN QUERY
+  WITH owners AS (
+    (SELECT m.id FROM member_profiles m WHERE lower(m.name) COLLATE "C" >= v_lower
+       AND lower(m.name) COLLATE "C" < v_upper
+     ORDER BY lower(m.name) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT m.id FROM member_profiles m WHERE lower(m.phone) COLLATE "C" >= v_lower
+       AND lower(m.phone) COLLATE "C" < v_upper
+     ORDER BY lower(m.phone) COLLATE "C" LIMIT v_cap)
+  ), candidates AS (
+    (SELECT c.id FROM member_cards c WHERE lower(c.card_no) COLLATE "C" >= v_lower
+       AND lower(c.card_no) COLLATE "C" < v_upper
+     ORDER BY lower(c.card_no) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT c.id FROM member_cards c WHERE lower(c.name) COLLATE "C" >= v_lower
+       AND lower(c.name) COLLATE "C" < v_upper
+     ORDER BY lower(c.name) COLLATE "C" LIMIT v_cap)
+    UNION
+    (SELECT c.id FROM owners o JOIN member_cards c ON c.owner_member_id = o.id LIMIT v_cap)
+  )
+  SELECT mc.id, mc.card_no, mc.card_type, mc.name, mc.balance, mc.points, mc.level, mc.discount,
+         mc.status, mc.owner_member_id, mp.name, mp.phone, mc.created_at,
+         sec.search_score(v_keyword, ARRAY[mc.card_no, mc.name, mp.name, mp.phone]) AS score
+  FROM candidates cand
+  JOIN member_cards mc ON mc.id = cand.id
+  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
+  ORDER BY score DESC, mc.created_at DESC
+  LIMIT v_limit;
+
+  GET DIAGNOSTICS v_found = ROW_COUNT;
+  IF v_found >= v_limit OR char_length(v_keyword) < sec.search_fuzzy_min_length() THEN
+    RETURN;
+  END IF;
+
+  v_pattern := '%' || sec.like_escape(v_keyword) || '%';
+
+  RETURN QUERY
+  WITH candidates AS (
+    (SELECT c.id FROM member_cards c
+     WHERE c.card_no ILIKE v_pattern OR c.name ILIKE v_pattern
+     LIMIT v_cap)
+    UNION
+    (SELECT c.id FROM member_profiles m
+     JOIN member_cards c ON c.owner_member_id = m.id
+     WHERE m.name ILIKE v_pattern OR m.phone ILIKE v_pattern
+     LIMIT v_cap)
+  )
+  SELECT mc.id, mc.card_no, mc.card_type, mc.name, mc.balance, mc.points, mc.level, mc.discount,
+         mc.status, mc.owner_member_id, mp.name, mp.phone, mc.created_at,
+         sec.search_score(v_keyword, ARRAY[mc.card_no, mc.name, mp.name, mp.phone]) AS score
+  FROM candidates cand
+  JOIN member_cards mc ON mc.id = cand.id
+  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
+  WHERE (starts_with(lower(mc.card_no), v_lower)
+      OR starts_with(lower(mc.name), v_lower)
+      OR starts_with(lower(mp.name), v_lower)
+      OR starts_with(lower(mp.phone), v_lower)) IS NOT TRUE
+  ORDER BY score DESC, mc.created_at DESC
+  LIMIT v_limit - v_found;
 END;
 $$;
 
-COMMENT ON FUNCTION get_all_members IS '分頁獲取所有會員（需要 super_admin 權限）';
+COMMENT ON FUNCTION search_cards IS '搜尋卡片：卡號 / 持卡人識別碼精確匹配優先，其次前綴匹配，不足時以有上限的 pg_trgm 子串匹配補足，按相關度排序（需要 super_admin 權限）';
 
--- 高級會員搜尋
-CREATE OR REPLACE FUNCTION search_members_advanced(
-  p_name text DEFAULT NULL,
-  p_phone text DEFAULT NULL,
-  p_email text DEFAULT NULL,
-  p_member_no text DEFAULT NULL,
-  p_status member_status DEFAULT NULL,
-  p_limit integer DEFAULT 50
-) RETURNS TABLE(
-  id uuid,
-  member_no text,
-  name text,
-  phone text,
-  email text,
-  status member_status,
-  created_at timestamptz
-) LANGUAGE plpgsql SECURITY DEFINER AS $$
+-- =======================
+-- 交易統計擴展函數
+-- =======================
+
+-- 今日交易統計
+-- ---------- 商戶日彙總（merchant_daily_rollup）----------
+
+-- 去重客戶位圖：每張卡片映射到 8192 位中的一位
+CREATE OR REPLACE FUNCTION sec.customer_sketch_of(p_card_id uuid)
+RETURNS bit(8192)
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT set_bit(repeat('0', 8192)::bit(8192),
+                 (hashtextextended(p_card_id::text, 0) & 8191)::int, 1)::bit(8192)
+$$;
+
+-- 線性計數估算：n ≈ -m·ln(空位 / m)，位圖飽和時返回上限
+CREATE OR REPLACE FUNCTION sec.customer_sketch_estimate(p_sketch bit)
+RETURNS bigint
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN p_sketch IS NULL THEN 0
+    WHEN bit_count(p_sketch) >= 8192 THEN round(8192 * ln(8192::numeric))::bigint
+    ELSE round(-8192 * ln((8192 - bit_count(p_sketch))::numeric / 8192))::bigint
+  END
+$$;
+
+-- 重算 [p_from, p_to] 各日的彙總行（冪等），並推進 rolled_through
+CREATE OR REPLACE FUNCTION sec.rollup_merchant_days(p_from date, p_to date)
+RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows int;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  -- 已歸檔月份的原始交易不在分區表中，保留其彙總
+  p_from := GREATEST(p_from, (SELECT archived_before FROM merchant_daily_rollup_state WHERE id));
+
+  IF p_from IS NULL OR p_to IS NULL OR p_from > p_to THEN
+    RETURN 0;
+  END IF;
+
+  DELETE FROM merchant_daily_rollup WHERE day BETWEEN p_from AND p_to;
+
+  INSERT INTO merchant_daily_rollup(
+    merchant_id, day,
+    payment_count, payment_amount,
+    refund_count, refund_amount,
+    recharge_count, recharge_amount,
+    customer_sketch, refreshed_at
+  )
+  SELECT t.merchant_id,
+         (t.created_at AT TIME ZONE 'UTC')::date,
+         COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+         COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0),
+         COUNT(*) FILTER (WHERE t.tx_type = 'refund'),
+         COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0),
+         COUNT(*) FILTER (WHERE t.tx_type = 'recharge'),
+         COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'recharge'), 0),
+         bit_or(sec.customer_sketch_of(t.card_id)) FILTER (WHERE t.tx_type = 'payment'),
+         now_utc()
+  FROM transactions t
+  WHERE t.created_at >= (p_from::timestamp AT TIME ZONE 'UTC')
+    AND t.created_at < ((p_to + 1)::timestamp AT TIME ZONE 'UTC')
+    AND t.status IN ('completed', 'refunded')
+  GROUP BY t.merchant_id, (t.created_at AT TIME ZONE 'UTC')::date;
+
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  UPDATE merchant_daily_rollup_state
+  SET rolled_through = GREATEST(COALESCE(rolled_through, p_to), p_to),
+      updated_at = now_utc()
+  WHERE id;
+
+  RETURN v_rows;
+END;
+$$;
+
+-- 彙總水位線：rolled_through 及之前的完整日期可讀 merchant_daily_rollup，之後的日期讀原始交易
+-- 統計 / 結算 RPC 只讀水位線，不在用戶請求內補算彙總
+CREATE OR REPLACE FUNCTION sec.merchant_rollup_watermark()
+RETURNS date
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  PERFORM sec.fixed_search_path();
+  RETURN (SELECT rolled_through FROM merchant_daily_rollup_state WHERE id);
+END;
+$$;
+
+-- 在當前事務內補齊到 p_through 為止的彙總（歸檔等維護任務調用），返回補齊後的 rolled_through
+-- 阻塞等待正在重算的會話（cron / refresh）：歸檔依賴彙總已覆蓋被歸檔的日期，不能跳過
+CREATE OR REPLACE FUNCTION sec.ensure_merchant_daily_rollup(p_through date)
+RETURNS date
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_through date;
+BEGIN
+  PERFORM sec.fixed_search_path();
+  PERFORM pg_advisory_xact_lock(hashtext('merchant_daily_rollup'));
+
+  SELECT rolled_through INTO v_through FROM merchant_daily_rollup_state WHERE id;
+
+  IF v_through IS NULL OR v_through < p_through THEN
+    PERFORM sec.rollup_merchant_days(
+      COALESCE(v_through + 1,
+               (SELECT (min(created_at) AT TIME ZONE 'UTC')::date FROM transactions),
+               p_through),
+      p_through);
+  END IF;
+
+  RETURN (SELECT rolled_through FROM merchant_daily_rollup_state WHERE id);
+END;
+$$;
+
+-- 統計範圍：商戶只能看自己；管理員可指定任意商戶或全部（NULL）
+-- 商戶從不返回 NULL：無自定義 session 時按 merchant_users 解析（關聯多個商戶時須指定其中之一）
+CREATE OR REPLACE FUNCTION sec.stats_merchant_scope(p_merchant_id uuid)
+RETURNS uuid
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_user_role text := get_user_role();
+  v_merchant_id uuid;
+BEGIN
+  IF v_user_role IN ('super_admin', 'admin') THEN
+    RETURN p_merchant_id;
+  ELSIF v_user_role = 'merchant' THEN
+    v_merchant_id := NULLIF(current_setting('app.merchant_id', true), '')::uuid;
+
+    IF v_merchant_id IS NULL AND auth.uid() IS NOT NULL THEN
+      SELECT CASE WHEN count(*) = 1 THEN min(mu.merchant_id::text)::uuid END INTO v_merchant_id
+      FROM merchant_users mu
+      WHERE mu.auth_user_id = auth.uid()
+        AND (p_merchant_id IS NULL OR mu.merchant_id = p_merchant_id);
+    END IF;
+
+    IF v_merchant_id IS NULL THEN
+      RAISE EXCEPTION 'PERMISSION_DENIED: 無法確定商戶身份';
+    END IF;
+    RETURN v_merchant_id;
+  ELSIF v_user_role IS NULL THEN
+    RAISE EXCEPTION 'NOT_AUTHENTICATED';
+  END IF;
+  RAISE EXCEPTION 'PERMISSION_DENIED: 無權查看交易統計';
+END;
+$$;
+
+-- 手動 / 排程重算指定日期範圍（例如修正歷史交易後）
+CREATE OR REPLACE FUNCTION refresh_merchant_daily_rollup(
+  p_from date DEFAULT NULL,
+  p_to date DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_to date := LEAST(COALESCE(p_to, (now() AT TIME ZONE 'UTC')::date - 1),
+                     (now() AT TIME ZONE 'UTC')::date - 1);
+  v_from date;
+  v_rows int;
 BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
   PERFORM check_permission('super_admin');
-  
-  RETURN QUERY
-  SELECT
-    mp.id,
-    mp.member_no,
-    mp.name,
-    mp.phone,
-    mp.email,
-    mp.status,
-    mp.created_at
-  FROM member_profiles mp
-  WHERE
-    (p_name IS NULL OR mp.name ILIKE '%' || p_name || '%')
-    AND (p_phone IS NULL OR mp.phone ILIKE '%' || p_phone || '%')
-    AND (p_email IS NULL OR mp.email ILIKE '%' || p_email || '%')
-    AND (p_member_no IS NULL OR mp.member_no ILIKE '%' || p_member_no || '%')
-    AND (p_status IS NULL OR mp.status = p_status)
-  ORDER BY mp.created_at DESC
-  LIMIT p_limit;
+  PERFORM pg_advisory_xact_lock(hashtext('merchant_daily_rollup'));
+
+  v_from := COALESCE(p_from,
+                     (SELECT rolled_through + 1 FROM merchant_daily_rollup_state WHERE id),
+                     (SELECT (min(created_at) AT TIME ZONE 'UTC')::date FROM transactions),
+                     v_to);
+
+  v_rows := sec.rollup_merchant_days(v_from, v_to);
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'ROLLUP_REFRESH', 'merchant_daily_rollup', NULL,
+          jsonb_build_object('from', v_from, 'to', v_to, 'rows', v_rows), now_utc());
+  RETURN v_rows;
+END;
+$$;
+
+COMMENT ON FUNCTION refresh_merchant_daily_rollup IS '重算商戶日彙總（需要 super_admin 權限）';
+
+-- 排程用（pg_cron 每日: CALL sec.cron_rollup_merchant_days(31)）
+-- 從水位線續算到昨天，每批 p_days_per_batch 天並 COMMIT；新部署首次執行時分批補齊全部歷史
+-- 其他會話正在重算時直接結束，由下次排程繼續；過程不可為 SECURITY DEFINER，需由資料庫擁有者執行
+CREATE OR REPLACE PROCEDURE sec.cron_rollup_merchant_days(
+  p_days_per_batch integer DEFAULT 31
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_yesterday date := (now() AT TIME ZONE 'UTC')::date - 1;
+  v_from date;
+  v_to date;
+BEGIN
+  LOOP
+    IF NOT pg_try_advisory_xact_lock(hashtext('merchant_daily_rollup')) THEN
+      EXIT;
+    END IF;
+
+    -- 已歸檔月份不再重算（rollup_merchant_days 會跳過），從歸檔邊界起算
+    SELECT GREATEST(COALESCE(rolled_through + 1,
+                             (SELECT (min(created_at) AT TIME ZONE 'UTC')::date FROM transactions),
+                             v_yesterday),
+                    archived_before)
+    INTO v_from
+    FROM merchant_daily_rollup_state WHERE id;
+    EXIT WHEN v_from IS NULL OR v_from > v_yesterday;
+
+    v_to := LEAST(v_from + GREATEST(p_days_per_batch, 1) - 1, v_yesterday);
+    PERFORM sec.rollup_merchant_days(v_from, v_to);
+    COMMIT;
+  END LOOP;
+END;
+$$;
+
+-- ---------- 交易表月度分區維護 ----------
+
+-- 建立 p_month 所在月份的分區（UTC 月界）；已存在時返回 NULL
+CREATE OR REPLACE FUNCTION sec.create_transaction_partition(p_month date)
+RETURNS text
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_month timestamp := date_trunc('month', p_month::timestamp);
+  v_start timestamptz := v_month AT TIME ZONE 'UTC';
+  v_end timestamptz := (v_month + interval '1 month') AT TIME ZONE 'UTC';
+  v_name text := 'transactions_p' || to_char(v_month, 'YYYYMM');
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF to_regclass('public.' || v_name) IS NOT NULL THEN
+    RETURN NULL;
+  END IF;
+
+  -- 默認分區裡若已有該月數據，ATTACH 會失敗：先建獨立表，把數據搬過去再掛載
+  EXECUTE format('CREATE TABLE public.%I (LIKE public.transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM public.transactions_default WHERE created_at >= $1 AND created_at < $2 RETURNING *)
+     INSERT INTO public.%I SELECT * FROM moved', v_name)
+  USING v_start, v_end;
+  EXECUTE format('ALTER TABLE public.transactions ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                 v_name, v_start, v_end);
+  EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', v_name);
+
+  RETURN v_name;
+END;
+$$;
+
+-- 確保本月及之後 p_months_ahead 個月的分區存在，返回新建數量
+CREATE OR REPLACE FUNCTION sec.ensure_transaction_partitions(p_months_ahead int DEFAULT 3)
+RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_this_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+  v_created int := 0;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  FOR i IN 0..GREATEST(p_months_ahead, 0) LOOP
+    IF sec.create_transaction_partition((v_this_month + make_interval(months => i))::date) IS NOT NULL THEN
+      v_created := v_created + 1;
+    END IF;
+  END LOOP;
+
+  RETURN v_created;
+END;
+$$;
+
+-- 分離早於 p_keep_months 個月的分區並移入 archive schema，返回已歸檔的分區名
+-- tx_registry 不清理，歸檔後 tx_no 仍保持全局唯一；對應日期的商戶日彙總保留
+CREATE OR REPLACE FUNCTION sec.archive_transaction_partitions(p_keep_months int)
+RETURNS SETOF text
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_cutoff date := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::date;
+  v_name text;
+  v_month date;
+  v_through date;
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_keep_months IS NULL OR p_keep_months < 1 THEN
+    RAISE EXCEPTION 'INVALID_KEEP_MONTHS';
+  END IF;
+
+  -- 歸檔前在同一事務內把彙總補齊到歸檔邊界，之後趨勢 / 結算查詢仍能讀到這些日期
+  v_through := sec.ensure_merchant_daily_rollup(v_cutoff - 1);
+
+  FOR v_name IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.transactions'::regclass
+      AND c.relname ~ '^transactions_p[0-9]{6}$'
+      AND to_date(substr(c.relname, 15), 'YYYYMM') < v_cutoff
+    ORDER BY c.relname
+  LOOP
+    v_month := to_date(substr(v_name, 15), 'YYYYMM');
+
+    -- archived_before 之前的日期不再重算：彙總未覆蓋整月時不能歸檔，否則這些日期永久缺失
+    IF v_through IS NULL OR (v_month + interval '1 month')::date > v_through + 1 THEN
+      RAISE EXCEPTION 'ROLLUP_BEHIND: % (rolled_through %)', v_name, v_through;
+    END IF;
+
+    EXECUTE format('ALTER TABLE public.transactions DETACH PARTITION public.%I', v_name);
+    EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', v_name);
+
+    UPDATE merchant_daily_rollup_state
+    SET archived_before = GREATEST(COALESCE(archived_before, v_month), (v_month + interval '1 month')::date),
+        updated_at = now_utc()
+    WHERE id;
+
+    RETURN NEXT v_name;
+  END LOOP;
+END;
+$$;
+
+-- 分區維護入口（建議每日由排程以 super_admin 身份調用）
+CREATE OR REPLACE FUNCTION maintain_transaction_partitions(
+  p_months_ahead int DEFAULT 3,
+  p_keep_months int DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(created_count int, archived_partitions text[])
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_created int;
+  v_archived text[] := '{}';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  PERFORM check_permission('super_admin');
+  PERFORM pg_advisory_xact_lock(hashtext('transaction_partitions'));
+
+  v_created := sec.ensure_transaction_partitions(p_months_ahead);
+
+  IF p_keep_months IS NOT NULL THEN
+    SELECT COALESCE(array_agg(a), '{}') INTO v_archived
+    FROM sec.archive_transaction_partitions(p_keep_months) a;
+  END IF;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'TX_PARTITION_MAINTAIN', 'transactions', NULL,
+          jsonb_build_object('created', v_created, 'archived', v_archived), now_utc());
+
+  RETURN QUERY SELECT v_created, v_archived;
 END;
 $$;
 
-COMMENT ON FUNCTION search_members_advanced IS '高級會員搜尋（需要 super_admin 權限）';
+COMMENT ON FUNCTION maintain_transaction_partitions IS '建立未來月份的交易分區並歸檔過期分區（需要 super_admin 權限）';
 
--- 更新會員資料
-CREATE OR REPLACE FUNCTION update_member_profile(
-  p_member_id uuid,
-  p_name text DEFAULT NULL,
-  p_phone text DEFAULT NULL,
-  p_email text DEFAULT NULL
-) RETURNS boolean LANGUAGE plpgsql SECURITY DEFINER AS $$
+-- ---------- 審計日誌管道 ----------
+
+-- 把 staging 中最多 p_batch_size 條事件按時間順序搬入 audit.event_log，返回搬移條數
+-- SKIP LOCKED：多個排程並發排空時互不阻塞
+CREATE OR REPLACE FUNCTION sec.drain_audit_staging(p_batch_size int DEFAULT 5000)
+RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_moved int;
 BEGIN
-  PERFORM check_permission('super_admin');
-  
-  UPDATE member_profiles SET
-    name = COALESCE(p_name, name),
-    phone = COALESCE(p_phone, phone),
-    email = COALESCE(p_email, email),
-    updated_at = now_utc()
-  WHERE id = p_member_id;
-  
-  IF NOT FOUND THEN
-    RAISE EXCEPTION 'MEMBER_NOT_FOUND';
-  END IF;
-  
+  PERFORM sec.fixed_search_path();
+
+  WITH batch AS (
+    DELETE FROM audit.event_staging s
+    WHERE s.ctid = ANY(ARRAY(
+      SELECT ctid FROM audit.event_staging
+      LIMIT GREATEST(p_batch_size, 1)
+      FOR UPDATE SKIP LOCKED
+    ))
+    RETURNING s.*
+  )
   INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
-  VALUES (auth.uid(), 'UPDATE_MEMBER', 'member_profiles', p_member_id,
-          jsonb_build_object('name', p_name, 'phone', p_phone, 'email', p_email), now_utc());
-  
-  RETURN TRUE;
+  SELECT b.actor_user_id, b.action, b.object_type, b.object_id, b.context, b.happened_at
+  FROM batch b
+  ORDER BY b.happened_at;
+
+  GET DIAGNOSTICS v_moved = ROW_COUNT;
+  RETURN v_moved;
 END;
 $$;
 
-COMMENT ON FUNCTION update_member_profile IS '更新會員資料（需要 super_admin 權限）';
+-- 建立 p_month 所在月份的審計分區（UTC 月界）；已存在時返回 NULL
+CREATE OR REPLACE FUNCTION sec.create_audit_partition(p_month date)
+RETURNS text
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_month timestamp := date_trunc('month', p_month::timestamp);
+  v_start timestamptz := v_month AT TIME ZONE 'UTC';
+  v_end timestamptz := (v_month + interval '1 month') AT TIME ZONE 'UTC';
+  v_name text := 'event_log_p' || to_char(v_month, 'YYYYMM');
+BEGIN
+  PERFORM sec.fixed_search_path();
 
--- =======================
--- 卡片管理擴展函數
--- =======================
+  IF to_regclass('audit.' || v_name) IS NOT NULL THEN
+    RETURN NULL;
+  END IF;
 
--- 分頁獲取所有卡片
-CREATE OR REPLACE FUNCTION get_all_cards(
-  p_limit integer DEFAULT 50,
-  p_offset integer DEFAULT 0,
-  p_card_type card_type DEFAULT NULL,
-  p_status card_status DEFAULT NULL,
-  p_owner_name text DEFAULT NULL
-) RETURNS TABLE(
-  id uuid,
-  card_no text,
-  card_type card_type,
-  name text,
-  balance numeric(12,2),
-  points int,
-  level int,
-  discount numeric(4,3),
-  status card_status,
-  owner_member_id uuid,
-  owner_name text,
-  owner_phone text,
-  created_at timestamptz,
-  total_count bigint
-) LANGUAGE plpgsql SECURITY DEFINER AS $$
+  -- 與交易分區相同：先把默認分區中該月的數據搬出再掛載
+  EXECUTE format('CREATE TABLE audit.%I (LIKE audit.event_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM audit.event_log_default WHERE happened_at >= $1 AND happened_at < $2 RETURNING *)
+     INSERT INTO audit.%I SELECT * FROM moved', v_name)
+  USING v_start, v_end;
+  EXECUTE format('ALTER TABLE audit.event_log ATTACH PARTITION audit.%I FOR VALUES FROM (%L) TO (%L)',
+                 v_name, v_start, v_end);
+
+  RETURN v_name;
+END;
+$$;
+
+-- 確保本月及之後 p_months_ahead 個月的審計分區存在，返回新建數量
+CREATE OR REPLACE FUNCTION sec.ensure_audit_partitions(p_months_ahead int DEFAULT 3)
+RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_this_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+  v_created int := 0;
 BEGIN
-  PERFORM check_permission('super_admin');
-  
-  RETURN QUERY
-  SELECT
-    mc.id,
-    mc.card_no,
-    mc.card_type,
-    mc.name,
-    mc.balance,
-    mc.points,
-    mc.level,
-    mc.discount,
-    mc.status,
-    mc.owner_member_id,
-    mp.name as owner_name,
-    mp.phone as owner_phone,
-    mc.created_at,
-    COUNT(*) OVER() AS total_count
-  FROM member_cards mc
-  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
-  WHERE
-    (p_card_type IS NULL OR mc.card_type = p_card_type)
-    AND (p_status IS NULL OR mc.status = p_status)
-    AND (p_owner_name IS NULL OR mp.name ILIKE '%' || p_owner_name || '%')
-  ORDER BY mc.created_at DESC
-  LIMIT p_limit OFFSET p_offset;
+  PERFORM sec.fixed_search_path();
+
+  FOR i IN 0..GREATEST(p_months_ahead, 0) LOOP
+    IF sec.create_audit_partition((v_this_month + make_interval(months => i))::date) IS NOT NULL THEN
+      v_created := v_created + 1;
+    END IF;
+  END LOOP;
+
+  RETURN v_created;
 END;
 $$;
 
-COMMENT ON FUNCTION get_all_cards IS '分頁獲取所有卡片（需要 super_admin 權限）';
+-- 分離早於 p_keep_months 個月的審計分區並移入 archive schema，返回已歸檔的分區名
+CREATE OR REPLACE FUNCTION sec.archive_audit_partitions(p_keep_months int)
+RETURNS SETOF text
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_cutoff date := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::date;
+  v_name text;
+BEGIN
+  PERFORM sec.fixed_search_path();
 
--- 搜尋卡片
-CREATE OR REPLACE FUNCTION search_cards(
-  p_keyword text,
-  p_limit integer DEFAULT 50
-) RETURNS TABLE(
-  id uuid,
-  card_no text,
-  card_type card_type,
-  name text,
-  balance numeric(12,2),
-  points int,
-  level int,
-  discount numeric(4,3),
-  status card_status,
-  owner_member_id uuid,
-  owner_name text,
-  owner_phone text,
-  created_at timestamptz
-) LANGUAGE plpgsql SECURITY DEFINER AS $$
+  IF p_keep_months IS NULL OR p_keep_months < 1 THEN
+    RAISE EXCEPTION 'INVALID_KEEP_MONTHS';
+  END IF;
+
+  FOR v_name IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'audit.event_log'::regclass
+      AND c.relname ~ '^event_log_p[0-9]{6}$'
+      AND to_date(substr(c.relname, 12), 'YYYYMM') < v_cutoff
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('ALTER TABLE audit.event_log DETACH PARTITION audit.%I', v_name);
+    EXECUTE format('ALTER TABLE audit.%I SET SCHEMA archive', v_name);
+    RETURN NEXT v_name;
+  END LOOP;
+END;
+$$;
+
+-- 排程用（pg_cron 每分鐘: CALL sec.cron_drain_audit_events(5000, 20)）
+-- 每批之間 COMMIT，排空過程不持有長事務；過程不可為 SECURITY DEFINER，需由資料庫擁有者執行
+CREATE OR REPLACE PROCEDURE sec.cron_drain_audit_events(
+  p_batch_size integer DEFAULT 5000,
+  p_max_batches integer DEFAULT 20
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_moved int;
 BEGIN
-  PERFORM check_permission('super_admin');
-  
-  RETURN QUERY
-  SELECT
-    mc.id,
-    mc.card_no,
-    mc.card_type,
-    mc.name,
-    mc.balance,
-    mc.points,
-    mc.level,
-    mc.discount,
-    mc.status,
-    mc.owner_member_id,
-    mp.name as owner_name,
-    mp.phone as owner_phone,
-    mc.created_at
-  FROM member_cards mc
-  LEFT JOIN member_profiles mp ON mp.id = mc.owner_member_id
-  WHERE
-    mc.card_no ILIKE '%' || p_keyword || '%'
-    OR mc.name ILIKE '%' || p_keyword || '%'
-    OR mp.name ILIKE '%' || p_keyword || '%'
-    OR mp.phone ILIKE '%' || p_keyword || '%'
-  ORDER BY mc.created_at DESC
-  LIMIT p_limit;
+  FOR i IN 1..GREATEST(p_max_batches, 1) LOOP
+    v_moved := sec.drain_audit_staging(p_batch_size);
+    COMMIT;
+    EXIT WHEN v_moved < GREATEST(p_batch_size, 1);
+  END LOOP;
 END;
 $$;
 
-COMMENT ON FUNCTION search_cards IS '搜尋卡片（需要 super_admin 權限）';
+-- 審計維護入口：排空 staging、預建未來分區、歸檔過期分區（建議每日由排程以 super_admin 身份調用）
+CREATE OR REPLACE FUNCTION maintain_audit_log(
+  p_months_ahead int DEFAULT 3,
+  p_keep_months int DEFAULT NULL,
+  p_session_id text DEFAULT NULL
+) RETURNS TABLE(drained_count int, created_count int, archived_partitions text[])
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_drained int := 0;
+  v_moved int;
+  v_created int;
+  v_archived text[] := '{}';
+BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
 
--- =======================
--- 交易統計擴展函數
--- =======================
+  PERFORM check_permission('super_admin');
+  PERFORM pg_advisory_xact_lock(hashtext('audit_partitions'));
 
--- 今日交易統計
+  -- 先建分區，避免排空的事件落入默認分區
+  v_created := sec.ensure_audit_partitions(p_months_ahead);
+
+  -- 單次調用最多排空 10 批，積壓更多時由 sec.cron_drain_audit_events 分事務處理
+  FOR i IN 1..10 LOOP
+    v_moved := sec.drain_audit_staging(5000);
+    v_drained := v_drained + v_moved;
+    EXIT WHEN v_moved < 5000;
+  END LOOP;
+
+  IF p_keep_months IS NOT NULL THEN
+    SELECT COALESCE(array_agg(a), '{}') INTO v_archived
+    FROM sec.archive_audit_partitions(p_keep_months) a;
+  END IF;
+
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
+  VALUES (auth.uid(), 'AUDIT_MAINTAIN', 'system', NULL,
+          jsonb_build_object('drained', v_drained, 'created', v_created, 'archived', v_archived), now_utc());
+
+  RETURN QUERY SELECT v_drained, v_created, v_archived;
+END;
+$$;
+
+COMMENT ON FUNCTION maintain_audit_log IS '排空審計 staging、建立未來月份審計分區並歸檔過期分區（需要 super_admin 權限）';
+
+-- 今日交易統計：只讀當天原始交易，created_at 範圍條件可走 idx_tx_created_at / idx_tx_merchant_time
 CREATE OR REPLACE FUNCTION get_today_transaction_stats(
-  p_merchant_id uuid DEFAULT NULL
+  p_merchant_id uuid DEFAULT NULL,
+  p_session_id text DEFAULT NULL
 ) RETURNS TABLE(
   transaction_count bigint,
   payment_amount numeric(12,2),
@@ -2591,32 +4819,44 @@ CREATE OR REPLACE FUNCTION get_today_transaction_stats(
   average_transaction numeric(12,2)
 ) LANGUAGE plpgsql SECURITY DEFINER AS $$
 DECLARE
-  v_today_start timestamptz := date_trunc('day', now_utc());
+  v_today_start timestamptz := (((now() AT TIME ZONE 'UTC')::date)::timestamp AT TIME ZONE 'UTC');
+  v_merchant_id uuid;
 BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+
   RETURN QUERY
   SELECT
-    COUNT(*) FILTER (WHERE tx_type = 'payment') AS transaction_count,
-    COALESCE(SUM(CASE WHEN tx_type = 'payment' THEN final_amount ELSE 0 END), 0) AS payment_amount,
-    COALESCE(SUM(CASE WHEN tx_type = 'refund' THEN final_amount ELSE 0 END), 0) AS refund_amount,
-    COALESCE(SUM(CASE WHEN tx_type = 'payment' THEN final_amount ELSE -final_amount END), 0) AS net_amount,
-    COUNT(DISTINCT card_id) FILTER (WHERE tx_type = 'payment') AS unique_customers,
-    COALESCE(AVG(CASE WHEN tx_type = 'payment' THEN final_amount ELSE NULL END), 0) AS average_transaction
-  FROM transactions
-  WHERE
-    date_trunc('day', created_at) = v_today_start
-    AND (p_merchant_id IS NULL OR merchant_id = p_merchant_id)
-    AND status IN ('completed', 'refunded');
+    COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+    COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0)::numeric(12,2),
+    COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0)::numeric(12,2),
+    (COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0)
+     - COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0))::numeric(12,2),
+    COUNT(DISTINCT t.card_id) FILTER (WHERE t.tx_type = 'payment'),
+    COALESCE(AVG(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0)::numeric(12,2)
+  FROM transactions t
+  WHERE t.created_at >= v_today_start
+    AND (v_merchant_id IS NULL OR t.merchant_id = v_merchant_id)
+    AND t.status IN ('completed', 'refunded');
 END;
 $$;
 
 COMMENT ON FUNCTION get_today_transaction_stats IS '今日交易統計';
 
--- 交易趨勢分析
+-- 交易趨勢分析：已彙總的完整日期讀 merchant_daily_rollup，
+-- 其餘（未彙總的日期、今天、首尾不足一天的部分）讀原始交易；
+-- 首尾兩段各自是單一 created_at 範圍，執行時只掃描涉及的月份分區
 CREATE OR REPLACE FUNCTION get_transaction_trends(
   p_start_date timestamptz,
   p_end_date timestamptz,
   p_merchant_id uuid DEFAULT NULL,
-  p_group_by text DEFAULT 'day'  -- 'day', 'week', 'month'
+  p_group_by text DEFAULT 'day',  -- 'day', 'week', 'month'
+  p_session_id text DEFAULT NULL
 ) RETURNS TABLE(
   period_start timestamptz,
   period_end timestamptz,
@@ -2627,25 +4867,94 @@ CREATE OR REPLACE FUNCTION get_transaction_trends(
   unique_customers bigint,
   average_transaction numeric(12,2)
 ) LANGUAGE plpgsql SECURITY DEFINER AS $$
+DECLARE
+  v_merchant_id uuid;
+  v_through date;
+  v_full_from date;
+  v_full_to date;      -- 不含
+  v_full_from_ts timestamptz;
+  v_full_to_ts timestamptz;
 BEGIN
+  PERFORM sec.fixed_search_path();
+
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+
+  IF p_group_by NOT IN ('day', 'week', 'month') THEN
+    RAISE EXCEPTION 'INVALID_GROUP_BY: %', p_group_by;
+  END IF;
+
+  v_merchant_id := sec.stats_merchant_scope(p_merchant_id);
+  v_through := sec.merchant_rollup_watermark();
+
+  -- 可由彙總表覆蓋的完整日期 [v_full_from, v_full_to)
+  v_full_from := (p_start_date AT TIME ZONE 'UTC')::date;
+  IF (v_full_from::timestamp AT TIME ZONE 'UTC') < p_start_date THEN
+    v_full_from := v_full_from + 1;
+  END IF;
+  v_full_to := LEAST((p_end_date AT TIME ZONE 'UTC')::date, COALESCE(v_through + 1, v_full_from));
+
+  IF v_full_to > v_full_from THEN
+    v_full_from_ts := v_full_from::timestamp AT TIME ZONE 'UTC';
+    v_full_to_ts := v_full_to::timestamp AT TIME ZONE 'UTC';
+  ELSE
+    v_full_from_ts := p_end_date;
+    v_full_to_ts := p_end_date;
+  END IF;
+
   RETURN QUERY
-  SELECT
-    date_trunc(p_group_by, created_at) AS period_start,
-    (date_trunc(p_group_by, created_at) + INTERVAL '1 ' || p_group_by) AS period_end,
-    COUNT(*) FILTER (WHERE tx_type = 'payment') AS transaction_count,
-    COALESCE(SUM(CASE WHEN tx_type = 'payment' THEN final_amount ELSE 0 END), 0) AS payment_amount,
-    COALESCE(SUM(CASE WHEN tx_type = 'refund' THEN final_amount ELSE 0 END), 0) AS refund_amount,
-    COALESCE(SUM(CASE WHEN tx_type = 'payment' THEN final_amount ELSE -final_amount END), 0) AS net_amount,
-    COUNT(DISTINCT card_id) FILTER (WHERE tx_type = 'payment') AS unique_customers,
-    COALESCE(AVG(CASE WHEN tx_type = 'payment' THEN final_amount ELSE NULL END), 0) AS average_transaction
-  FROM transactions
-  WHERE
-    created_at >= p_start_date
-    AND created_at < p_end_date
-    AND (p_merchant_id IS NULL OR merchant_id = p_merchant_id)
-    AND status IN ('completed', 'refunded')
-  GROUP BY date_trunc(p_group_by, created_at)
-  ORDER BY period_start;
+  WITH daily AS (
+    SELECT r.day,
+           r.payment_count::bigint AS payment_count,
+           r.payment_amount,
+           r.refund_amount,
+           r.customer_sketch
+    FROM merchant_daily_rollup r
+    WHERE r.day >= v_full_from
+      AND r.day < v_full_to
+      AND (v_merchant_id IS NULL OR r.merchant_id = v_merchant_id)
+    UNION ALL
+    SELECT (t.created_at AT TIME ZONE 'UTC')::date,
+           COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0),
+           bit_or(sec.customer_sketch_of(t.card_id)) FILTER (WHERE t.tx_type = 'payment')
+    FROM transactions t
+    WHERE t.created_at >= p_start_date AND t.created_at < v_full_from_ts
+      AND (v_merchant_id IS NULL OR t.merchant_id = v_merchant_id)
+      AND t.status IN ('completed', 'refunded')
+    GROUP BY (t.created_at AT TIME ZONE 'UTC')::date
+    UNION ALL
+    SELECT (t.created_at AT TIME ZONE 'UTC')::date,
+           COUNT(*) FILTER (WHERE t.tx_type = 'payment'),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'payment'), 0),
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.tx_type = 'refund'), 0),
+           bit_or(sec.customer_sketch_of(t.card_id)) FILTER (WHERE t.tx_type = 'payment')
+    FROM transactions t
+    WHERE t.created_at >= v_full_to_ts AND t.created_at < p_end_date
+      AND (v_merchant_id IS NULL OR t.merchant_id = v_merchant_id)
+      AND t.status IN ('completed', 'refunded')
+    GROUP BY (t.created_at AT TIME ZONE 'UTC')::date
+  ), periods AS (
+    SELECT date_trunc(p_group_by, d.day::timestamp) AS bucket,
+           SUM(d.payment_count)::bigint AS payment_count,
+           SUM(d.payment_amount) AS payment_amount,
+           SUM(d.refund_amount) AS refund_amount,
+           bit_or(d.customer_sketch) AS customer_sketch
+    FROM daily d
+    GROUP BY 1
+  )
+  SELECT (p.bucket AT TIME ZONE 'UTC'),
+         ((p.bucket + ('1 ' || p_group_by)::interval) AT TIME ZONE 'UTC'),
+         p.payment_count,
+         p.payment_amount::numeric(12,2),
+         p.refund_amount::numeric(12,2),
+         (p.payment_amount - p.refund_amount)::numeric(12,2),
+         sec.customer_sketch_estimate(p.customer_sketch),
+         COALESCE(p.payment_amount / NULLIF(p.payment_count, 0), 0)::numeric(12,2)
+  FROM periods p
+  ORDER BY p.bucket;
 END;
 $$;
 
@@ -2656,7 +4965,9 @@ COMMENT ON FUNCTION get_transaction_trends IS '交易趨勢分析';
 -- =======================
 
 -- 系統統計擴展
-CREATE OR REPLACE FUNCTION get_system_statistics()
+CREATE OR REPLACE FUNCTION get_system_statistics(
+  p_session_id text DEFAULT NULL
+)
 RETURNS TABLE(
   members_total bigint,
   members_active bigint,
@@ -2671,6 +4982,8 @@ RETURNS TABLE(
   merchants_inactive bigint,
   transactions_today bigint,
   transactions_today_amount numeric(12,2),
+  payments_today bigint,
+  payments_today_amount numeric(12,2),
   transactions_this_month bigint,
   transactions_this_month_amount numeric(12,2)
 ) LANGUAGE plpgsql SECURITY DEFINER AS $$
@@ -2679,35 +4992,62 @@ DECLARE
   v_month_start timestamptz := date_trunc('month', now_utc());
   v_cards_by_type jsonb;
 BEGIN
+  PERFORM sec.fixed_search_path();
+  
+  IF p_session_id IS NOT NULL THEN
+    PERFORM load_session(p_session_id);
+  END IF;
+  
+  PERFORM check_permission('super_admin');
+  
   -- 統計卡片類型
-  SELECT jsonb_object_agg(card_type, count) INTO v_cards_by_type
+  SELECT COALESCE(jsonb_object_agg(t.card_type, t.cnt), '{}'::jsonb) INTO v_cards_by_type
   FROM (
-    SELECT card_type, COUNT(*) as count
-    FROM member_cards
-    GROUP BY card_type
+    SELECT mc.card_type, COUNT(*) AS cnt
+    FROM member_cards mc
+    GROUP BY mc.card_type
   ) t;
   
+  -- 每張表只掃描一次（FILTER 聚合）；交易只讀本月範圍（idx_tx_created_at），返回單行
   RETURN QUERY
   SELECT
-    (SELECT COUNT(*) FROM member_profiles) AS members_total,
-    (SELECT COUNT(*) FROM member_profiles WHERE status = 'active') AS members_active,
-    (SELECT COUNT(*) FROM member_profiles WHERE status = 'inactive') AS members_inactive,
-    (SELECT COUNT(*) FROM member_profiles WHERE status = 'suspended') AS members_suspended,
-    (SELECT COUNT(*) FROM member_cards) AS cards_total,
-    (SELECT COUNT(*) FROM member_cards WHERE status = 'active') AS cards_active,
-    (SELECT COUNT(*) FROM member_cards WHERE status = 'inactive') AS cards_inactive,
-    v_cards_by_type AS cards_by_type,
-    (SELECT COUNT(*) FROM merchants) AS merchants_total,
-    (SELECT COUNT(*) FROM merchants WHERE status = 'active') AS merchants_active,
-    (SELECT COUNT(*) FROM merchants WHERE status = 'inactive') AS merchants_inactive,
-    (SELECT COUNT(*) FROM transactions
-     WHERE created_at >= v_today_start AND status IN ('completed', 'refunded')) AS transactions_today,
-    (SELECT COALESCE(SUM(final_amount), 0) FROM transactions
-     WHERE created_at >= v_today_start AND status IN ('completed', 'refunded')) AS transactions_today_amount,
-    (SELECT COUNT(*) FROM transactions
-     WHERE created_at >= v_month_start AND status IN ('completed', 'refunded')) AS transactions_this_month,
-    (SELECT COALESCE(SUM(final_amount), 0) FROM transactions
-     WHERE created_at >= v_month_start AND status IN ('completed', 'refunded')) AS transactions_this_month_amount;
+    m.total, m.active, m.inactive, m.suspended,
+    c.total, c.active, c.inactive,
+    v_cards_by_type,
+    mer.total, mer.active, mer.inactive,
+    tx.today_count, tx.today_amount,
+    tx.today_payments, tx.today_payment_amount,
+    tx.month_count, tx.month_amount
+  FROM (
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE mp.status = 'active') AS active,
+           COUNT(*) FILTER (WHERE mp.status = 'inactive') AS inactive,
+           COUNT(*) FILTER (WHERE mp.status = 'suspended') AS suspended
+    FROM member_profiles mp
+  ) m
+  CROSS JOIN (
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE mc.status = 'active') AS active,
+           COUNT(*) FILTER (WHERE mc.status = 'inactive') AS inactive
+    FROM member_cards mc
+  ) c
+  CROSS JOIN (
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE mr.status = 'active') AS active,
+           COUNT(*) FILTER (WHERE mr.status = 'inactive') AS inactive
+    FROM merchants mr
+  ) mer
+  CROSS JOIN (
+    SELECT COUNT(*) FILTER (WHERE t.created_at >= v_today_start) AS today_count,
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.created_at >= v_today_start), 0)::numeric(12,2) AS today_amount,
+           COUNT(*) FILTER (WHERE t.created_at >= v_today_start AND t.tx_type = 'payment') AS today_payments,
+           COALESCE(SUM(t.final_amount) FILTER (WHERE t.created_at >= v_today_start AND t.tx_type = 'payment'), 0)::numeric(12,2) AS today_payment_amount,
+           COUNT(*) AS month_count,
+           COALESCE(SUM(t.final_amount), 0)::numeric(12,2) AS month_amount
+    FROM transactions t
+    WHERE t.created_at >= v_month_start
+      AND t.status IN ('completed', 'refunded')
+  ) tx;
 END;
 $$;
 
@@ -108,7 +108,7 @@ BEGIN
     RAISE EXCEPTION 'MEMBER_NOT_FOUND';
   END IF;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'DELETE_TEST_MEMBER', 'member_profiles', p_member_id, '{}'::jsonb, now_utc());
   
   RETURN TRUE;
@@ -150,7 +150,7 @@ BEGIN
     RAISE EXCEPTION 'MERCHANT_NOT_FOUND';
   END IF;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'DELETE_TEST_MERCHANT', 'merchants', p_merchant_id, '{}'::jsonb, now_utc());
   
   RETURN TRUE;
@@ -203,7 +203,7 @@ BEGIN
   )
   SELECT COUNT(*) INTO v_deleted_merchants FROM deleted;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'CLEANUP_TEST_DATA', 'system', NULL,
           jsonb_build_object(
             'deleted_members', v_deleted_members,
@@ -243,7 +243,7 @@ BEGIN
   -- ALTER SEQUENCE seq_card_no RESTART WITH 1;
   -- ALTER SEQUENCE seq_tx_no RESTART WITH 1;
   
-  INSERT INTO audit.event_log(actor_user_id, action, object_type, object_id, context, happened_at)
+  INSERT INTO audit.event_staging(actor_user_id, action, object_type, object_id, context, happened_at)
   VALUES (auth.uid(), 'RESET_TEST_ENVIRONMENT', 'system', NULL, v_result, now_utc());
   
   RETURN jsonb_build_object(
@@ -14,7 +14,10 @@
 
 -- 0) DROP EXISTING TABLES (清除所有表格以重新建立)
 DROP TABLE IF EXISTS audit.event_log CASCADE;
+DROP TABLE IF EXISTS audit.event_staging CASCADE;
 DROP TABLE IF EXISTS point_ledger CASCADE;
+DROP TABLE IF EXISTS merchant_daily_rollup_state CASCADE;
+DROP TABLE IF EXISTS merchant_daily_rollup CASCADE;
 DROP TABLE IF EXISTS transactions CASCADE;
 DROP TABLE IF EXISTS settlements CASCADE;
 DROP TABLE IF EXISTS merchant_order_registry CASCADE;
@@ -54,6 +57,10 @@ CREATE SCHEMA audit;
 
 REVOKE ALL ON SCHEMA audit FROM public;
 
+-- EXTENSIONS
+-- pg_trgm: 模糊搜尋的三元組 GIN 索引（安裝在 extensions schema，與 Supabase 預設一致）
+create extension if not exists pg_trgm with schema extensions;
+
 -- 1) ENUMS (在 public schema 中創建)
 do $$ begin create type card_type as enum ('standard','voucher','corporate'); exception when duplicate_object then null; end $$;
 do $$ begin create type card_status as enum ('active','inactive','lost','expired','suspended','closed'); exception when duplicate_object then null; end $$;
@@ -253,6 +260,9 @@ create table merchant_users (
   unique (merchant_id, auth_user_id)
 );
 
+-- get_user_role 按 auth_user_id 查找（唯一約束以 merchant_id 開頭，無法覆蓋此查詢）
+create index idx_merchant_users_auth_user on merchant_users(auth_user_id);
+
 -- 3.7 App Sessions (應用程式 Session 管理表)
 CREATE TABLE app_sessions (
   session_id text PRIMARY KEY,
@@ -271,17 +281,23 @@ CREATE INDEX idx_app_sessions_user ON app_sessions(user_id);
 COMMENT ON TABLE app_sessions IS '應用程式 Session 管理（用於自定義登入）';
 
 -- 4) QR TABLES
+-- QR 令牌格式：<token_lookup>.<secret>
+--   token_lookup: 16 位十六進制查找鍵（唯一索引，單行定位）
+--   token_hash:   secret 的 HMAC-SHA256 摘要（密鑰見 sec.qr_token_key）
 create table card_qr_state (
   card_id uuid primary key references member_cards(id) on delete cascade,
+  token_lookup text not null,
   token_hash text not null,
   expires_at timestamptz not null,
   updated_at timestamptz not null default now_utc()
 );
 create index idx_qr_state_expires on card_qr_state(expires_at);
+create unique index uq_qr_state_lookup on card_qr_state(token_lookup);
 
 create table card_qr_history (
   id uuid primary key default gen_random_uuid(),
   card_id uuid not null references member_cards(id) on delete cascade,
+  token_lookup text,
   token_hash text not null,
   expires_at timestamptz not null,
   issued_by uuid,
@@ -289,11 +305,25 @@ create table card_qr_history (
 );
 create index idx_qr_hist_card_time on card_qr_history(card_id, issued_at desc);
 
+-- QR 令牌摘要密鑰（單行，僅 SECURITY DEFINER 函數可讀）
+CREATE SCHEMA IF NOT EXISTS sec;
+DROP TABLE IF EXISTS sec.qr_token_key CASCADE;
+create table sec.qr_token_key (
+  id boolean primary key default true check (id),
+  secret bytea not null default extensions.gen_random_bytes(32),
+  created_at timestamptz not null default now_utc()
+);
+insert into sec.qr_token_key default values;
+REVOKE ALL ON sec.qr_token_key FROM public;
+
 -- 5) REGISTRIES
+-- tx_registry 是 tx_no / 交易 id 的全局唯一登記處（分區表無法建立不含分區鍵的唯一索引），
+-- created_at 與交易行一致，按 tx_no 查交易時可帶上分區鍵只掃描一個分區
 create table tx_registry (
   tx_no text primary key,
   tx_id uuid unique not null,
-  created_at timestamptz not null default now_utc()
+  created_at timestamptz not null default now_utc(),
+  unique (tx_no, tx_id, created_at)
 );
 
 create table idempotency_registry (
@@ -310,9 +340,9 @@ create table merchant_order_registry (
   unique (merchant_id, external_order_id)
 );
 
--- 6) TRANSACTIONS
+-- 6) TRANSACTIONS（按 created_at 月度範圍分區，分區名 transactions_pYYYYMM）
 create table transactions (
-  id uuid primary key default gen_random_uuid(),
+  id uuid not null default gen_random_uuid(),
   tx_no text not null,
   tx_type tx_type not null,
   card_id uuid not null references member_cards(id),
@@ -326,26 +356,79 @@ create table transactions (
   payment_method pay_method default 'balance',
   external_order_id text,
   idempotency_key text,
-  original_tx_id uuid references transactions(id),
+  original_tx_id uuid references tx_registry(tx_id),
   processed_by_user_id uuid references auth.users(id),
   tag jsonb not null default '{}'::jsonb,
+  refunded_amount numeric(12,2) not null default 0,   -- 支付交易的累計退款額，退款時在鎖定原交易行後累加
   created_at timestamptz not null default now_utc(),
   updated_at timestamptz not null default now_utc(),
-  check (raw_amount > 0 and final_amount >= 0)
-);
-create unique index uq_tx_tx_no on transactions(tx_no);
+  check (raw_amount > 0 and final_amount >= 0),
+  check (refunded_amount >= 0 and refunded_amount <= final_amount),
+  primary key (id, created_at),
+  -- 每行必須先在 tx_registry 登記：tx_no 與 id 的全局唯一性由登記表保證
+  foreign key (tx_no, id, created_at) references tx_registry(tx_no, tx_id, created_at)
+) partition by range (created_at);
 create index idx_tx_card_time on transactions(card_id, created_at desc);
 create index idx_tx_merchant_time on transactions(merchant_id, created_at desc);
-create index idx_tx_status on transactions(status);
 create index idx_tx_type_time on transactions(tx_type, created_at desc);
 create index idx_tx_created_at on transactions(created_at);
 create index idx_tx_tag_gin on transactions using gin(tag);
 create index idx_tx_original on transactions(original_tx_id);
 
+-- 未覆蓋月份的兜底分區；建立對應月份分區時 sec.create_transaction_partition 會把數據搬出
+create table transactions_default partition of transactions default;
+
+-- 預建本月起 4 個月的分區（之後由 maintain_transaction_partitions 滾動維護）
+DO $$
+DECLARE
+  v_month timestamp;
+BEGIN
+  FOR i IN 0..3 LOOP
+    v_month := date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => i);
+    EXECUTE format(
+      'create table %I partition of transactions for values from (%L) to (%L)',
+      'transactions_p' || to_char(v_month, 'YYYYMM'),
+      v_month AT TIME ZONE 'UTC',
+      (v_month + interval '1 month') AT TIME ZONE 'UTC'
+    );
+  END LOOP;
+END;
+$$;
+
+-- 歸檔分區存放處（DETACH 後移入，不再參與查詢）
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- 6.b MERCHANT DAILY ROLLUP（按商戶按日預聚合，UTC 日界；統計/趨勢 RPC 讀取）
+--   merchant_id 為 NULL 的行彙總無商戶交易（充值）
+--   customer_sketch: 付款卡片的線性計數位圖（8192 位），可跨日 bit_or 合併後估算去重客戶數
+create table merchant_daily_rollup (
+  merchant_id uuid references merchants(id) on delete cascade,
+  day date not null,
+  payment_count int not null default 0,
+  payment_amount numeric(14,2) not null default 0,
+  refund_count int not null default 0,
+  refund_amount numeric(14,2) not null default 0,
+  recharge_count int not null default 0,
+  recharge_amount numeric(14,2) not null default 0,
+  customer_sketch bit(8192),
+  refreshed_at timestamptz not null default now_utc(),
+  unique nulls not distinct (merchant_id, day)
+);
+create index idx_rollup_day on merchant_daily_rollup(day);
+
+-- 已完整彙總到哪一天（含），之後的日期由 RPC 讀原始交易
+create table merchant_daily_rollup_state (
+  id boolean primary key default true check (id),
+  rolled_through date,
+  archived_before date,   -- 早於此日的交易分區已歸檔，重算彙總時不得覆蓋
+  updated_at timestamptz not null default now_utc()
+);
+insert into merchant_daily_rollup_state default values;
+
 create table point_ledger (
   id uuid primary key default gen_random_uuid(),
   card_id uuid not null references member_cards(id) on delete cascade,
-  tx_id uuid references transactions(id),
+  tx_id uuid references tx_registry(tx_id),
   change int not null,
   balance_before int not null,
   balance_after int not null,
@@ -366,21 +449,57 @@ create table settlements (
   payload jsonb not null default '{}'::jsonb,
   created_at timestamptz not null default now_utc(),
   updated_at timestamptz not null default now_utc(),
-  check (total_amount >= 0 and total_tx_count >= 0)
+  check (total_amount >= 0 and total_tx_count >= 0),
+  -- 同一商戶、模式、期間只允許一張結算，批量結算重跑時依此去重
+  constraint uq_settlements_merchant_period unique (merchant_id, mode, period_start, period_end)
 );
 
 -- 8) AUDIT
-create table audit.event_log (
-  id bigserial primary key,
+-- RPC 只寫 audit.event_staging（無索引的追加表，不拖慢支付事務），
+-- 由 sec.drain_audit_staging 分批搬入按月分區的 audit.event_log。
+-- staging 仍寫 WAL：審計是資金操作的憑證，不能因崩潰丟失
+create table audit.event_staging (
   happened_at timestamptz not null default now_utc(),
   actor_user_id uuid,
   action text not null,
   object_type text not null,
   object_id uuid,
   context jsonb not null default '{}'::jsonb
-);
+) with (autovacuum_vacuum_scale_factor = 0, autovacuum_vacuum_threshold = 10000);
+
+create table audit.event_log (
+  id bigserial,
+  happened_at timestamptz not null default now_utc(),
+  actor_user_id uuid,
+  action text not null,
+  object_type text not null,
+  object_id uuid,
+  context jsonb not null default '{}'::jsonb,
+  primary key (id, happened_at)
+) partition by range (happened_at);
+-- 按時間順序批量寫入，happened_at 與物理順序高度相關，BRIN 足以支撐時間範圍查詢
+create index idx_event_happened_brin on audit.event_log using brin(happened_at);
 create index idx_event_object on audit.event_log(object_type, object_id);
 
+create table audit.event_log_default partition of audit.event_log default;
+
+-- 預建本月起 4 個月的分區（之後由 maintain_audit_log 滾動維護）
+DO $$
+DECLARE
+  v_month timestamp;
+BEGIN
+  FOR i IN 0..3 LOOP
+    v_month := date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => i);
+    EXECUTE format(
+      'create table audit.%I partition of audit.event_log for values from (%L) to (%L)',
+      'event_log_p' || to_char(v_month, 'YYYYMM'),
+      v_month AT TIME ZONE 'UTC',
+      (v_month + interval '1 month') AT TIME ZONE 'UTC'
+    );
+  END LOOP;
+END;
+$$;
+
 -- 9) TRIGGERS (only updated_at maintenance)
 create trigger trg_member_profiles_updated_at
 before update on member_profiles
@@ -424,6 +543,34 @@ create index idx_bindings_status on card_bindings(status);
 create index idx_bindings_card_status on card_bindings(card_id, status);
 create index idx_levels_level on membership_levels(level);
 
+-- 模糊搜尋（search_members / search_cards / search_merchants 的 ILIKE '%kw%'）
+-- 完整識別碼走既有唯一索引（member_no / phone / email / card_no / code）
+create index idx_member_profiles_name_trgm on member_profiles using gin (name extensions.gin_trgm_ops);
+create index idx_member_profiles_phone_trgm on member_profiles using gin (phone extensions.gin_trgm_ops);
+create index idx_member_profiles_email_trgm on member_profiles using gin (email extensions.gin_trgm_ops);
+create index idx_member_profiles_member_no_trgm on member_profiles using gin (member_no extensions.gin_trgm_ops);
+create index idx_cards_card_no_trgm on member_cards using gin (card_no extensions.gin_trgm_ops);
+create index idx_cards_name_trgm on member_cards using gin (name extensions.gin_trgm_ops);
+create index idx_merchants_name_trgm on merchants using gin (name extensions.gin_trgm_ops);
+create index idx_merchants_code_trgm on merchants using gin (code extensions.gin_trgm_ops);
+create index idx_merchants_contact_trgm on merchants using gin (contact extensions.gin_trgm_ops);
+
+-- 前綴搜尋（search_* 的第一階段）：C 排序規則的 B-tree 支持任意長度前綴的範圍掃描並按索引順序截取候選，
+-- 少於 3 個字符的關鍵字（如 1~2 字的中文姓名、"138"）也不需要全表掃描
+create index idx_member_profiles_name_prefix on member_profiles (lower(name) COLLATE "C");
+create index idx_member_profiles_phone_prefix on member_profiles (lower(phone) COLLATE "C");
+create index idx_member_profiles_email_prefix on member_profiles (lower(email) COLLATE "C");
+create index idx_member_profiles_member_no_prefix on member_profiles (lower(member_no) COLLATE "C");
+create index idx_cards_card_no_prefix on member_cards (lower(card_no) COLLATE "C");
+create index idx_cards_name_prefix on member_cards (lower(name) COLLATE "C");
+create index idx_merchants_code_prefix on merchants (lower(code) COLLATE "C");
+create index idx_merchants_name_prefix on merchants (lower(name) COLLATE "C");
+create index idx_merchants_contact_prefix on merchants (lower(contact) COLLATE "C");
+
+-- 按 updated_at 游標增量同步（get_all_members_page / get_all_cards_page，管理端本地搜尋索引）
+create index idx_member_profiles_updated on member_profiles(updated_at, id);
+create index idx_cards_updated on member_cards(updated_at, id);
+
 -- 12) SEED DATA
 insert into membership_levels(level, name, min_points, max_points, discount, is_active) values
   (0, '普通會員', 0, 999, 1.000, true),
@@ -450,7 +597,19 @@ ALTER TABLE tx_registry ENABLE ROW LEVEL SECURITY;
 ALTER TABLE idempotency_registry ENABLE ROW LEVEL SECURITY;
 ALTER TABLE merchant_order_registry ENABLE ROW LEVEL SECURITY;
 ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+-- 分區可被直接查詢，必須各自啟用 RLS（無策略 = 僅 SECURITY DEFINER 函數可訪問）
+DO $$
+DECLARE
+  v_part regclass;
+BEGIN
+  FOR v_part IN SELECT inhrelid::regclass FROM pg_inherits WHERE inhparent = 'transactions'::regclass LOOP
+    EXECUTE format('ALTER TABLE %s ENABLE ROW LEVEL SECURITY', v_part);
+  END LOOP;
+END;
+$$;
 ALTER TABLE point_ledger ENABLE ROW LEVEL SECURITY;
+ALTER TABLE merchant_daily_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE merchant_daily_rollup_state ENABLE ROW LEVEL SECURITY;
 ALTER TABLE settlements ENABLE ROW LEVEL SECURITY;
 ALTER TABLE admin_users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE app_sessions ENABLE ROW LEVEL SECURITY;
@@ -735,10 +894,10 @@ CREATE POLICY "Authenticated users can view admin_users" ON admin_users
         auth.uid() IS NOT NULL
     );
 
--- 只有 super_admin 可以修改（使用函數避免遞歸）
+-- 只有 super_admin 可以修改（使用函數避免遞歸；子查詢包裹使 VOLATILE 函數每條語句只求值一次）
 CREATE POLICY "Only super admins can modify admin_users" ON admin_users
     FOR ALL USING (
-        get_user_role() = 'super_admin'
+        (SELECT get_user_role()) = 'super_admin'
     );
 
 -- End of SCHEMA ONLY (補強版) - PUBLIC SCHEMA WITH RLS